@@ -95,6 +95,15 @@ def create_app():
     app.config['MAIL_PASSWORD'] = os.getenv('MAIL_PASSWORD')
     app.config['MAIL_DEFAULT_SENDER'] = os.getenv('MAIL_DEFAULT_SENDER', 'noreply@chamalink.com')
 
+    # Background jobs - 'local' runs workers inside the web process, 'redis' hands them to run_worker.py
+    app.config['REDIS_URL'] = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
+    app.config['JOB_QUEUE_BACKEND'] = os.getenv('JOB_QUEUE_BACKEND', 'local')
+    app.config['JOB_WORKER_CONCURRENCY'] = int(os.getenv('JOB_WORKER_CONCURRENCY', 4))
+    app.config['MPESA_ASYNC_STK_PUSH'] = os.getenv('MPESA_ASYNC_STK_PUSH', 'False').lower() == 'true'
+
+    # Let the web server (Apache/lighttpd X-Sendfile) stream stored documents instead of Python
+    app.config['USE_X_SENDFILE'] = os.getenv('USE_X_SENDFILE', 'False').lower() == 'true'
+
     # Initialize extensions
     db.init_app(app)
     migrate.init_app(app, db)
@@ -125,12 +134,13 @@ def create_app():
     def inject_now():
         return {'now': datetime.now}
 
-    # Inject a dummy translation function 't' into Jinja2 context
-    def t(s):
-        return s  # Replace with real translation logic if needed
-    @app.context_processor
-    def inject_t():
-        return dict(t=t)
+    # Translation function 't', |t filter and language/theme context
+    from app.utils.internationalization import init_internationalization
+    init_internationalization(app)
+
+    # Session hooks that invalidate cached dashboard fragments on commit,
+    # log changes for mobile delta sync and keep unread notification counters
+    from app.utils import fragment_cache, mobile_sync, notification_counters, aml_monitor  # noqa: F401
 
     # Register Blueprints
     try:
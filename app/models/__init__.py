@@ -10,7 +10,18 @@ from .chama import (
     ManualPaymentVerification, Receipt, RecurringPayment, MultiSignatureTransaction,
     LeadershipElection, ElectionCandidate, ElectionVote
 )
-from .notification import Notification
+from .ledger import LedgerEntry, MemberBalance
+from .jobs import OutboxJob
+from .mpesa import MpesaCallback
+from .analytics import DailyMetric
+from .sync import SyncChange, SyncAction
+from .sms import SmsMessage
+from .email import EmailMessage
+from .document import DocumentArtifact
+from .aml import AmlAlert, AmlCursor
+from .fraud import MemberRiskProfile, FraudScore
+from .reconciliation import ReconciliationRun, ReconciliationItem
+from .notification import Notification, NotificationCounter, NotificationBroadcast
 from .audit_log import AuditLog
 from .subscription import (
     SubscriptionPlan, UserSubscription, SubscriptionPayment,
@@ -0,0 +1,66 @@
+from app import db
+from datetime import datetime
+
+class AmlAlert(db.Model):
+    """A monitoring rule that fired for one transaction.
+
+    source/source_id point at the row that triggered it (a Transaction or
+    an MpesaTransaction); one rule fires at most once per row, so replaying
+    history never duplicates alerts.
+    """
+    __tablename__ = 'aml_alerts'
+
+    id = db.Column(db.Integer, primary_key=True)
+    rule = db.Column(db.String(50), nullable=False)  # large_transaction, rapid_transactions, structuring, cross_border
+    severity = db.Column(db.String(10), nullable=False, default='medium')  # low, medium, high
+    source = db.Column(db.String(20), nullable=False)  # transaction, mpesa
+    source_id = db.Column(db.Integer, nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'))
+    chama_id = db.Column(db.Integer, db.ForeignKey('chamas.id'))
+    amount = db.Column(db.Float)
+    details = db.Column(db.JSON)
+    status = db.Column(db.String(20), nullable=False, default='open')  # open, reviewed, dismissed, escalated
+    event_time = db.Column(db.DateTime, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    reviewed_by = db.Column(db.Integer, db.ForeignKey('users.id'))
+    reviewed_at = db.Column(db.DateTime)
+
+    user = db.relationship('User', foreign_keys=[user_id])
+
+    __table_args__ = (
+        db.UniqueConstraint('source', 'source_id', 'rule', name='uq_aml_alerts_source_rule'),
+        db.Index('ix_aml_alerts_status_created_at', 'status', 'created_at'),
+        db.Index('ix_aml_alerts_user_id_event_time', 'user_id', 'event_time'),
+    )
+
+    def __repr__(self):
+        return f'<AmlAlert {self.id}: {self.rule} {self.source}:{self.source_id}>'
+
+    def to_dict(self):
+        """Convert to dictionary for JSON responses"""
+        return {
+            'id': self.id,
+            'rule': self.rule,
+            'severity': self.severity,
+            'source': self.source,
+            'source_id': self.source_id,
+            'user_id': self.user_id,
+            'chama_id': self.chama_id,
+            'amount': self.amount,
+            'details': self.details,
+            'status': self.status,
+            'event_time': self.event_time.isoformat() if self.event_time else None,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
+class AmlCursor(db.Model):
+    """How far the monitor has read each transaction stream (the last id evaluated)"""
+    __tablename__ = 'aml_cursors'
+
+    source = db.Column(db.String(20), primary_key=True)
+    position = db.Column(db.Integer, nullable=False, default=0)
+    processed = db.Column(db.BigInteger, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<AmlCursor {self.source}: {self.position}>'
@@ -0,0 +1,27 @@
+from app import db
+from datetime import datetime
+
+class DailyMetric(db.Model):
+    """One pre-aggregated figure per metric, day and breakdown.
+
+    Platform-wide rows have chama_id 0 and an empty dimension; contribution
+    volume is broken down by chama and transaction type. Maintained by the
+    analytics rollup job, read by the admin dashboards.
+    """
+    __tablename__ = 'daily_metrics'
+
+    id = db.Column(db.Integer, primary_key=True)
+    metric = db.Column(db.String(50), nullable=False)  # new_users, new_chamas, logins, transactions
+    day = db.Column(db.Date, nullable=False)
+    chama_id = db.Column(db.Integer, nullable=False, default=0)
+    dimension = db.Column(db.String(50), nullable=False, default='')
+    count = db.Column(db.Integer, nullable=False, default=0)
+    amount = db.Column(db.Float, nullable=False, default=0.0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('metric', 'day', 'chama_id', 'dimension', name='uq_daily_metrics_metric_day'),
+    )
+
+    def __repr__(self):
+        return f'<DailyMetric {self.metric} {self.day}: {self.count}>'
@@ -2,6 +2,7 @@ from app import db
 from datetime import datetime, timedelta
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.ext.hybrid import hybrid_property
+from sqlalchemy import and_
 import uuid
 
 class Chama(db.Model):
@@ -18,7 +19,7 @@ class Chama(db.Model):
     meeting_time = db.Column(db.Time)
     next_meeting_date = db.Column(db.DateTime)  # Next scheduled meeting
     status = db.Column(db.String(20), default='active')  # active, inactive, completed
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Relationships
@@ -232,6 +233,9 @@ class Chama(db.Model):
         )
         db.session.commit()
         
+        from app.utils.permissions import invalidate_user_memberships
+        invalidate_user_memberships(user_id)
+        
         # Send notification
         from app.models.notification import Notification
         notification = Notification(
@@ -294,6 +298,9 @@ class Chama(db.Model):
             joined_at=datetime.utcnow()
         )
         db.session.execute(stmt)
+        
+        from app.utils.permissions import invalidate_user_memberships
+        invalidate_user_memberships(user_id)
         return True, "Member added successfully"
     
     def remove_member(self, user_id):
@@ -310,6 +317,8 @@ class Chama(db.Model):
         result = db.session.execute(stmt)
         
         if result.rowcount > 0:
+            from app.utils.permissions import invalidate_user_memberships
+            invalidate_user_memberships(user_id)
             return True, "Member removed successfully"
         else:
             return False, "Member not found in this chama"
@@ -321,7 +330,9 @@ chama_members = db.Table('chama_members',
     db.Column('role', db.String(20), default='member'),  # member, chairperson, secretary, treasurer, creator
     db.Column('joined_at', db.DateTime, default=datetime.utcnow),
     db.Column('elected_at', db.DateTime),  # When they were elected to leadership position
-    db.Column('term_end_date', db.DateTime)  # When their leadership term ends
+    db.Column('term_end_date', db.DateTime),  # When their leadership term ends
+    # The primary key serves user -> chamas; this serves chama -> members
+    db.Index('ix_chama_members_chama_id_user_id', 'chama_id', 'user_id')
 )
 
 class ChamaMember:
@@ -623,7 +634,7 @@ class Transaction(db.Model):
     status = db.Column(db.String(20), default='completed')  # pending, completed, failed
     payment_method = db.Column(db.String(20), default='mpesa')  # mpesa, bank_transfer, cash
     transaction_id = db.Column(db.String(100))  # M-Pesa receipt or bank reference
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     
     # Foreign keys
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -638,7 +649,14 @@ class Transaction(db.Model):
     currency = db.Column(db.String(3), default='KES')  # ISO currency code
     exchange_rate = db.Column(db.Float, default=1.0)  # Rate at time of transaction
     original_amount = db.Column(db.Float)  # Amount in original currency
-    
+
+    __table_args__ = (
+        db.Index('ix_transactions_chama_id_created_at', 'chama_id', 'created_at'),
+        db.Index('ix_transactions_chama_id_type_created_at', 'chama_id', 'type', 'created_at'),
+        db.Index('ix_transactions_user_id_chama_id', 'user_id', 'chama_id'),
+        db.Index('ix_transactions_transaction_id', 'transaction_id'),
+    )
+
     def __repr__(self):
         return f'<Transaction {self.type}: {self.amount}>'
     
@@ -678,7 +696,11 @@ class Event(db.Model):
     # Relationships
     chama = db.relationship('Chama', backref='events')
     creator = db.relationship('User', backref='created_events')
-    
+
+    __table_args__ = (
+        db.Index('ix_events_chama_id_event_date', 'chama_id', 'event_date'),
+    )
+
     def __repr__(self):
         return f'<Event {self.title}>'
     
@@ -719,7 +741,12 @@ class LoanApplication(db.Model):
     # Currency fields
     currency = db.Column(db.String(3), default='KES')  # ISO currency code
     exchange_rate = db.Column(db.Float, default=1.0)  # Rate at time of application
-    
+
+    __table_args__ = (
+        db.Index('ix_loan_applications_chama_id_application_date', 'chama_id', 'application_date'),
+        db.Index('ix_loan_applications_user_id_status', 'user_id', 'status'),
+    )
+
     @property
     def formatted_amount(self):
         return f"KES {self.amount:,.0f}"
@@ -783,7 +810,12 @@ class Penalty(db.Model):
     # Currency fields
     currency = db.Column(db.String(3), default='KES')  # ISO currency code
     exchange_rate = db.Column(db.Float, default=1.0)  # Rate at time of penalty
-    
+
+    __table_args__ = (
+        db.Index('ix_penalties_chama_id_created_date', 'chama_id', 'created_date'),
+        db.Index('ix_penalties_user_id_status', 'user_id', 'status'),
+    )
+
     @property
     def formatted_amount(self):
         return f"KES {self.amount:,.0f}"
@@ -849,7 +881,7 @@ class MpesaTransaction(db.Model):
     transaction_date = db.Column(db.DateTime)
     result_code = db.Column(db.String(10))
     result_desc = db.Column(db.Text)
-    status = db.Column(db.String(20), default='pending')  # pending, completed, failed
+    status = db.Column(db.String(20), default='pending')  # queued, pending, completed, failed
     created_date = db.Column(db.DateTime, default=datetime.utcnow)
     
     # Foreign keys
@@ -861,7 +893,15 @@ class MpesaTransaction(db.Model):
     user = db.relationship('User', backref='mpesa_transactions')
     chama = db.relationship('Chama', backref='mpesa_transactions')
     transaction = db.relationship('Transaction', backref='mpesa_transaction')
-    
+
+    __table_args__ = (
+        db.Index('ix_mpesa_transactions_user_id_created_date', 'user_id', 'created_date'),
+        db.Index('ix_mpesa_transactions_chama_id_status', 'chama_id', 'status'),
+        db.Index('ix_mpesa_transactions_transaction_id', 'transaction_id'),
+        db.Index('ix_mpesa_transactions_created_date', 'created_date'),
+        db.Index('ix_mpesa_transactions_mpesa_receipt_number', 'mpesa_receipt_number'),
+    )
+
     def __repr__(self):
         return f'<MpesaTransaction {self.id}: {self.amount}>'
 
@@ -880,6 +920,11 @@ class RegistrationFeePayment(db.Model):
     # Relationships
     user = db.relationship('User', backref='registration_fee_payments')
     chama = db.relationship('Chama', backref='registration_fee_payments')
+
+    __table_args__ = (
+        db.Index('ix_registration_fee_payments_mpesa_receipt_number', 'mpesa_receipt_number'),
+        db.Index('ix_registration_fee_payments_created_at', 'created_at'),
+    )
     
     def __repr__(self):
         return f'<RegistrationFeePayment {self.user.username} - {self.chama.name}>'
@@ -904,6 +949,11 @@ class ManualPaymentVerification(db.Model):
     user = db.relationship('User', foreign_keys=[user_id], backref='payment_verifications')
     verifier = db.relationship('User', foreign_keys=[verified_by])
     chama = db.relationship('Chama', backref='payment_verifications')
+
+    __table_args__ = (
+        db.Index('ix_manual_payment_verifications_transaction_id', 'transaction_id'),
+        db.Index('ix_manual_payment_verifications_created_at', 'created_at'),
+    )
     
     def __repr__(self):
         return f'<ManualPaymentVerification {self.user.username} - {self.amount}>'
@@ -0,0 +1,33 @@
+from app import db
+from datetime import datetime
+
+class DocumentArtifact(db.Model):
+    """A rendered document and the blob in the artifact store that holds it.
+
+    document_key names the document (receipt:12, statement:3:7:2026-09, ...)
+    and data_hash fingerprints the data it was drawn from, so a download
+    only re-renders when that data has changed. layout_version is the
+    DOCUMENT_LAYOUT_VERSION it was drawn with, for documents whose data is
+    never re-read. content_hash is the artifact store key of the PDF itself.
+    """
+    __tablename__ = 'document_artifacts'
+
+    id = db.Column(db.Integer, primary_key=True)
+    document_key = db.Column(db.String(200), unique=True, nullable=False)
+    kind = db.Column(db.String(50), nullable=False)  # receipt, chama_report, financial_report, minutes, statement
+    data_hash = db.Column(db.String(64), nullable=False)
+    layout_version = db.Column(db.Integer, nullable=False, default=1)
+    content_hash = db.Column(db.String(64), nullable=False)
+    size = db.Column(db.Integer, nullable=False)
+    filename = db.Column(db.String(255), nullable=False)
+    chama_id = db.Column(db.Integer, db.ForeignKey('chamas.id'))
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    rendered_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_document_artifacts_chama_id_kind', 'chama_id', 'kind'),
+    )
+
+    def __repr__(self):
+        return f'<DocumentArtifact {self.document_key}: {self.content_hash[:12]}>'
@@ -0,0 +1,41 @@
+from app import db
+from datetime import datetime
+
+class EmailMessage(db.Model):
+    """One email to one recipient, queued for the email dispatcher.
+
+    The body is rendered when the message is queued, so the dispatcher only
+    has to build the MIME message and hand it to a pooled SMTP session.
+    dedupe_key, when set, stops a scheduled job from queueing the same
+    email twice; broadcast_id ties a broadcast's emails together for its
+    delivery counts. Failed sends stay queued with a later next_attempt_at
+    until max_attempts is reached.
+    """
+    __tablename__ = 'email_messages'
+
+    id = db.Column(db.Integer, primary_key=True)
+    recipient = db.Column(db.String(120), nullable=False)
+    subject = db.Column(db.String(255), nullable=False)
+    html_content = db.Column(db.Text, nullable=False)
+    text_content = db.Column(db.Text)
+    category = db.Column(db.String(50))  # subscription_warning, security_alert, ...
+    dedupe_key = db.Column(db.String(120), unique=True)
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, sending, sent, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=5)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    claim_token = db.Column(db.String(32))
+    last_error = db.Column(db.Text)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'))
+    broadcast_id = db.Column(db.Integer, db.ForeignKey('notification_broadcasts.id'))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index('ix_email_messages_status_next_attempt_at', 'status', 'next_attempt_at'),
+        db.Index('ix_email_messages_broadcast_id_status', 'broadcast_id', 'status'),
+        db.Index('ix_email_messages_claim_token', 'claim_token'),
+    )
+
+    def __repr__(self):
+        return f'<EmailMessage {self.id}: {self.recipient} {self.status}>'
@@ -0,0 +1,71 @@
+from app import db
+from datetime import datetime
+
+class MemberRiskProfile(db.Model):
+    """Rolling statistics of a member's recent payments, used as the baseline for fraud scoring.
+
+    Rebuilt from the last FRAUD_HISTORY_DAYS of transactions by the
+    fraud_profiles job; scoring reads profiles through a cache and never
+    aggregates history itself.
+    """
+    __tablename__ = 'member_risk_profiles'
+
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    transaction_count = db.Column(db.Integer, nullable=False, default=0)
+    amount_mean = db.Column(db.Float, nullable=False, default=0.0)
+    amount_std = db.Column(db.Float, nullable=False, default=0.0)
+    hour_counts = db.Column(db.JSON)  # 24 counts, transactions per hour of day
+    phones = db.Column(db.JSON)  # phone numbers paid from
+    devices = db.Column(db.JSON)  # user agent fingerprints seen on payments
+    ips = db.Column(db.JSON)  # addresses payments came from
+    last_transaction_at = db.Column(db.DateTime)
+    computed_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<MemberRiskProfile {self.user_id}: {self.transaction_count} transactions>'
+
+class FraudScore(db.Model):
+    """The fraud score of one transaction, with the features it was computed from"""
+    __tablename__ = 'fraud_scores'
+
+    id = db.Column(db.Integer, primary_key=True)
+    transaction_id = db.Column(db.Integer, db.ForeignKey('transactions.id'), unique=True, nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    chama_id = db.Column(db.Integer, db.ForeignKey('chamas.id'))
+    amount = db.Column(db.Float)
+    score = db.Column(db.Float, nullable=False)
+    decision = db.Column(db.String(10), nullable=False, default='allow')  # allow, review, block
+    features = db.Column(db.JSON)
+    reasons = db.Column(db.JSON)
+    phone_number = db.Column(db.String(20))
+    device = db.Column(db.String(16))  # fingerprint of the user agent
+    ip_address = db.Column(db.String(45))
+    source = db.Column(db.String(20), nullable=False, default='payment')  # payment, rescore
+    scored_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    user = db.relationship('User', foreign_keys=[user_id])
+    transaction = db.relationship('Transaction', foreign_keys=[transaction_id])
+
+    __table_args__ = (
+        db.Index('ix_fraud_scores_decision_scored_at', 'decision', 'scored_at'),
+        db.Index('ix_fraud_scores_user_id_scored_at', 'user_id', 'scored_at'),
+    )
+
+    def __repr__(self):
+        return f'<FraudScore {self.transaction_id}: {self.score:.2f} {self.decision}>'
+
+    def to_dict(self):
+        """Convert to dictionary for JSON responses"""
+        return {
+            'id': self.id,
+            'transaction_id': self.transaction_id,
+            'user_id': self.user_id,
+            'chama_id': self.chama_id,
+            'amount': self.amount,
+            'score': round(self.score, 4),
+            'decision': self.decision,
+            'features': self.features,
+            'reasons': self.reasons,
+            'source': self.source,
+            'scored_at': self.scored_at.isoformat() if self.scored_at else None
+        }
@@ -0,0 +1,65 @@
+from app import db
+from datetime import datetime
+
+class LedgerEntry(db.Model):
+    """Append-only record of every movement of money in or out of a chama"""
+    __tablename__ = 'ledger_entries'
+
+    id = db.Column(db.Integer, primary_key=True)
+    chama_id = db.Column(db.Integer, db.ForeignKey('chamas.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)  # Null for unattributed entries (opening balances)
+    entry_type = db.Column(db.String(50), nullable=False)  # contribution, loan_disbursement, loan_repayment, penalty_payment, opening_balance, adjustment
+    amount = db.Column(db.Float, nullable=False)  # Signed: credits are positive, debits negative
+    balance_after = db.Column(db.Float)  # Chama balance immediately after this entry was applied
+    description = db.Column(db.Text)
+    transaction_id = db.Column(db.Integer, db.ForeignKey('transactions.id'), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_ledger_entries_chama_id_id', 'chama_id', 'id'),
+        db.Index('ix_ledger_entries_chama_id_user_id', 'chama_id', 'user_id'),
+    )
+
+    # Relationships
+    chama = db.relationship('Chama', backref=db.backref('ledger_entries', lazy='dynamic'))
+    user = db.relationship('User', backref=db.backref('ledger_entries', lazy='dynamic'))
+    transaction = db.relationship('Transaction', backref='ledger_entries')
+
+    def __repr__(self):
+        return f'<LedgerEntry {self.entry_type}: {self.amount} chama={self.chama_id}>'
+
+    def to_dict(self):
+        """Convert to dictionary for JSON responses"""
+        return {
+            'id': self.id,
+            'chama_id': self.chama_id,
+            'user_id': self.user_id,
+            'entry_type': self.entry_type,
+            'amount': self.amount,
+            'balance_after': self.balance_after,
+            'description': self.description,
+            'transaction_id': self.transaction_id,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
+class MemberBalance(db.Model):
+    """Running balance snapshot for a member within a chama, maintained from the ledger"""
+    __tablename__ = 'member_balances'
+
+    chama_id = db.Column(db.Integer, db.ForeignKey('chamas.id'), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    balance = db.Column(db.Float, nullable=False, default=0.0)  # Net of all the member's ledger entries
+    total_contributions = db.Column(db.Float, nullable=False, default=0.0)
+    entry_count = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # Relationships
+    chama = db.relationship('Chama', backref=db.backref('member_balances', lazy='dynamic'))
+    user = db.relationship('User', backref=db.backref('member_balances', lazy='dynamic'))
+
+    def __repr__(self):
+        return f'<MemberBalance chama={self.chama_id} user={self.user_id}: {self.balance}>'
+
+    @property
+    def formatted_balance(self):
+        return f"KES {self.balance:,.0f}"
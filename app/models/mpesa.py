@@ -0,0 +1,26 @@
+from app import db
+from datetime import datetime
+
+class MpesaCallback(db.Model):
+    """Raw STK push callback as received from Safaricom.
+
+    One row per CheckoutRequestID: Safaricom's retries hit the unique
+    constraint and are acknowledged without being applied again.
+    """
+    __tablename__ = 'mpesa_callbacks'
+
+    id = db.Column(db.Integer, primary_key=True)
+    checkout_request_id = db.Column(db.String(200), nullable=False, unique=True)
+    result_code = db.Column(db.String(10))
+    result_desc = db.Column(db.Text)
+    payload = db.Column(db.JSON, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='received')  # received, applied, duplicate, unmatched, orphaned
+    received_at = db.Column(db.DateTime, default=datetime.utcnow)
+    processed_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index('ix_mpesa_callbacks_status_id', 'status', 'id'),
+    )
+
+    def __repr__(self):
+        return f'<MpesaCallback {self.checkout_request_id}: {self.status}>'
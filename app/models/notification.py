@@ -15,11 +15,18 @@ class Notification(db.Model):
     is_read = Column(Boolean, nullable=True, default=False)
     created_date = Column(DateTime, nullable=True, default=datetime.utcnow)
     related_id = Column(Integer, nullable=True)  # For linking to other entities
+    broadcast_id = Column(Integer, ForeignKey('notification_broadcasts.id'), nullable=True)  # Set on fanned-out rows
     
     # Relationships
     user = relationship('User', backref='notifications')
     chama = relationship('Chama', backref='notifications', foreign_keys=[chama_id])
-    
+
+    __table_args__ = (
+        db.Index('ix_notifications_user_id_is_read_created_date', 'user_id', 'is_read', 'created_date'),
+        db.Index('ix_notifications_user_id_created_date', 'user_id', 'created_date'),
+        db.Index('ix_notifications_broadcast_id_user_id', 'broadcast_id', 'user_id'),
+    )
+
     def __repr__(self):
         return f'<Notification {self.id}: {self.title} for User {self.user_id}>'
     
@@ -71,11 +78,9 @@ class Notification(db.Model):
     
     @staticmethod
     def get_unread_count(user_id):
-        """Get count of unread notifications for a user"""
-        return Notification.query.filter_by(
-            user_id=user_id,
-            is_read=False
-        ).count()
+        """Get count of unread notifications for a user (cached counter)"""
+        from app.utils.notification_counters import get_unread_count
+        return get_unread_count(user_id)
     
     @staticmethod
     def get_user_notifications(user_id, limit=50, unread_only=False):
@@ -86,3 +91,89 @@ class Notification(db.Model):
             query = query.filter_by(is_read=False)
         
         return query.order_by(Notification.created_date.desc()).limit(limit).all()
+
+class NotificationCounter(db.Model):
+    """Denormalized count of a user's unread notifications.
+
+    Kept up to date in the writing transaction by the session hooks in
+    app.utils.notification_counters, repaired by its reconciliation job and
+    read through its cache. Users who never had a notification written
+    since the table was added have no row; their count is taken with a
+    COUNT until their first write seeds one.
+    """
+    __tablename__ = 'notification_counters'
+
+    user_id = Column(Integer, ForeignKey('users.id'), primary_key=True)
+    unread = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<NotificationCounter user={self.user_id} unread={self.unread}>'
+
+class NotificationBroadcast(db.Model):
+    """A notice fanned out to many users by background jobs.
+
+    Notifications are inserted in chunks of recipients ordered by user id;
+    last_user_id is the highest id inserted so far, so a retried chunk
+    resumes where the last committed one stopped. Delivery jobs hand emails
+    and SMS to the outboxes and bump the queued/skipped counters atomically;
+    whether a message was sent is read from the outbox.
+    """
+    __tablename__ = 'notification_broadcasts'
+
+    id = Column(Integer, primary_key=True)
+    created_by = Column(Integer, ForeignKey('users.id'), nullable=True)
+    kind = Column(String(50), nullable=False)  # platform_notice, system_alert
+    audience = Column(String(50), nullable=False)  # chama_creators, active_users
+    title = Column(String(200), nullable=False)
+    message = Column(Text, nullable=False)
+    type = Column(String(50), nullable=False, default='system')
+    priority = Column(String(20), nullable=False, default='info')
+    channels = Column(db.JSON, nullable=False, default=list)  # email, sms
+    status = Column(String(20), nullable=False, default='queued')  # queued, inserting, delivering, completed
+    last_user_id = Column(Integer, nullable=False, default=0)
+    recipients = Column(Integer, nullable=False, default=0)
+    emails_queued = Column(Integer, nullable=False, default=0)
+    emails_skipped = Column(Integer, nullable=False, default=0)  # no address, or a number already sent to
+    sms_queued = Column(Integer, nullable=False, default=0)
+    sms_skipped = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    inserted_at = Column(DateTime)
+
+    sender = relationship('User', foreign_keys=[created_by])
+
+    def __repr__(self):
+        return f'<NotificationBroadcast {self.id}: {self.kind} {self.status}>'
+
+    def to_dict(self, outbox=None):
+        """Progress report for the status endpoint.
+
+        ``outbox`` maps each channel to its outbox message counts by status
+        (see notification_fanout.delivery_counts).
+        """
+        outbox = outbox or {}
+        inserting = self.status in ('queued', 'inserting')
+        deliveries = {}
+        for channel in self.channels or []:
+            counts = outbox.get(channel, {})
+            skipped = self.emails_skipped if channel == 'email' else self.sms_skipped
+            sent, failed = counts.get('sent', 0), counts.get('failed', 0)
+            deliveries[channel] = {
+                'queued': self.emails_queued if channel == 'email' else self.sms_queued,
+                'sent': sent,
+                'failed': failed,
+                'skipped': skipped,
+                'pending': max(self.recipients - sent - failed - skipped, 0)
+            }
+        done = not inserting and all(d['pending'] == 0 for d in deliveries.values())
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'audience': self.audience,
+            'title': self.title,
+            'status': 'completed' if done else self.status,
+            'recipients': self.recipients,
+            'deliveries': deliveries,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'inserted_at': self.inserted_at.isoformat() if self.inserted_at else None
+        }
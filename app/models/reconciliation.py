@@ -0,0 +1,109 @@
+from app import db
+from datetime import datetime
+
+class ReconciliationRun(db.Model):
+    """One M-Pesa or bank statement file checked against the payment records"""
+    __tablename__ = 'reconciliation_runs'
+
+    id = db.Column(db.Integer, primary_key=True)
+    filename = db.Column(db.String(255), nullable=False)
+    statement_type = db.Column(db.String(20))  # mpesa, bank
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, completed, failed
+    created_by = db.Column(db.Integer, db.ForeignKey('users.id'))
+
+    rows_read = db.Column(db.Integer, nullable=False, default=0)
+    credits = db.Column(db.Integer, nullable=False, default=0)  # money-in lines that were reconciled
+    skipped = db.Column(db.Integer, nullable=False, default=0)  # debits and lines not completed
+    matched = db.Column(db.Integer, nullable=False, default=0)  # by receipt number
+    fuzzy_matched = db.Column(db.Integer, nullable=False, default=0)  # by amount, phone and time
+    unmatched_lines = db.Column(db.Integer, nullable=False, default=0)
+    duplicate_lines = db.Column(db.Integer, nullable=False, default=0)
+    duplicate_records = db.Column(db.Integer, nullable=False, default=0)
+    amount_mismatches = db.Column(db.Integer, nullable=False, default=0)
+    unmatched_records = db.Column(db.Integer, nullable=False, default=0)
+    period_start = db.Column(db.DateTime)
+    period_end = db.Column(db.DateTime)
+
+    rows_per_second = db.Column(db.Float)
+    index_bytes = db.Column(db.BigInteger)  # memory held by the receipt and record indexes at the end
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+
+    items = db.relationship('ReconciliationItem', backref='run', lazy='dynamic', cascade='all, delete-orphan')
+
+    def __repr__(self):
+        return f'<ReconciliationRun {self.id}: {self.filename} {self.status}>'
+
+    def to_dict(self):
+        """Convert to dictionary for JSON responses"""
+        return {
+            'id': self.id,
+            'filename': self.filename,
+            'statement_type': self.statement_type,
+            'status': self.status,
+            'rows_read': self.rows_read,
+            'credits': self.credits,
+            'skipped': self.skipped,
+            'matched': self.matched,
+            'fuzzy_matched': self.fuzzy_matched,
+            'unmatched_lines': self.unmatched_lines,
+            'duplicate_lines': self.duplicate_lines,
+            'duplicate_records': self.duplicate_records,
+            'amount_mismatches': self.amount_mismatches,
+            'unmatched_records': self.unmatched_records,
+            'period_start': self.period_start.isoformat() if self.period_start else None,
+            'period_end': self.period_end.isoformat() if self.period_end else None,
+            'rows_per_second': self.rows_per_second,
+            'index_bytes': self.index_bytes,
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+
+class ReconciliationItem(db.Model):
+    """An exception found by a reconciliation run.
+
+    kind is one of:
+        unmatched_line   - on the statement, not in any payment record
+        fuzzy_match      - matched to a record without a receipt by amount, phone and time
+        duplicate_line   - a receipt number appearing on the statement again
+        duplicate_record - a receipt number recorded twice in the same table
+        amount_mismatch  - matched by receipt number, but the amounts differ
+        unmatched_record - a settled payment record missing from the statement
+    """
+    __tablename__ = 'reconciliation_items'
+
+    id = db.Column(db.Integer, primary_key=True)
+    run_id = db.Column(db.Integer, db.ForeignKey('reconciliation_runs.id'), nullable=False)
+    kind = db.Column(db.String(30), nullable=False)
+    receipt_number = db.Column(db.String(100))
+    amount = db.Column(db.Float)
+    phone_number = db.Column(db.String(20))
+    occurred_at = db.Column(db.DateTime)
+    line_number = db.Column(db.Integer)
+    record_type = db.Column(db.String(30))  # mpesa, transaction, manual, registration_fee
+    record_id = db.Column(db.Integer)
+    details = db.Column(db.JSON)
+
+    __table_args__ = (
+        db.Index('ix_reconciliation_items_run_id_kind', 'run_id', 'kind'),
+    )
+
+    def __repr__(self):
+        return f'<ReconciliationItem {self.kind}: {self.receipt_number}>'
+
+    def to_dict(self):
+        """Convert to dictionary for JSON responses"""
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'receipt_number': self.receipt_number,
+            'amount': self.amount,
+            'phone_number': self.phone_number,
+            'occurred_at': self.occurred_at.isoformat() if self.occurred_at else None,
+            'line_number': self.line_number,
+            'record_type': self.record_type,
+            'record_id': self.record_id,
+            'details': self.details
+        }
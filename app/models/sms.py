@@ -0,0 +1,43 @@
+from app import db
+from datetime import datetime
+
+class SmsMessage(db.Model):
+    """One SMS to one phone number, queued for the SMS dispatcher.
+
+    Messages with the same text share a message_hash, so the dispatcher can
+    coalesce them into a single bulk request to the provider. dedupe_key,
+    when set, stops a job from queueing the same message twice; broadcast_id
+    ties a broadcast's messages together for its delivery counts. Failed sends
+    stay queued with a later next_attempt_at until max_attempts is reached.
+    """
+    __tablename__ = 'sms_messages'
+
+    id = db.Column(db.Integer, primary_key=True)
+    phone_number = db.Column(db.String(20), nullable=False)
+    message = db.Column(db.Text, nullable=False)
+    message_hash = db.Column(db.String(40), nullable=False)
+    category = db.Column(db.String(50))  # agm_reminder, meeting_reminder, emergency_alert, ...
+    dedupe_key = db.Column(db.String(120), unique=True)
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, sending, sent, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=5)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    claim_token = db.Column(db.String(32))
+    provider_message_id = db.Column(db.String(100))
+    cost = db.Column(db.String(30))
+    last_error = db.Column(db.Text)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'))
+    chama_id = db.Column(db.Integer, db.ForeignKey('chamas.id'))
+    broadcast_id = db.Column(db.Integer, db.ForeignKey('notification_broadcasts.id'))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index('ix_sms_messages_status_next_attempt_at', 'status', 'next_attempt_at'),
+        db.Index('ix_sms_messages_broadcast_id_status', 'broadcast_id', 'status'),
+        db.Index('ix_sms_messages_message_hash_status', 'message_hash', 'status'),
+        db.Index('ix_sms_messages_claim_token', 'claim_token'),
+    )
+
+    def __repr__(self):
+        return f'<SmsMessage {self.id}: {self.phone_number} {self.status}>'
@@ -142,7 +142,7 @@ class LoginAttempt(db.Model):
     ip_address = db.Column(db.String(45))
     user_agent = db.Column(db.Text)
     success = db.Column(db.Boolean, default=False)
-    attempt_time = db.Column(db.DateTime, default=datetime.utcnow)
+    attempt_time = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     
     # Relationships
     user = db.relationship('User', backref='login_attempts')
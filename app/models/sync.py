@@ -0,0 +1,52 @@
+from app import db
+from datetime import datetime
+
+class SyncChange(db.Model):
+    """One row per insert, update or delete of a record mobile clients sync.
+
+    The id doubles as the sync token: a client that has seen every change up
+    to id N asks for the visible changes after N. Rows are written in the
+    same transaction as the change itself and scoped by chama and/or user
+    so a sync only reads what the member can see.
+    """
+    __tablename__ = 'sync_changes'
+
+    id = db.Column(db.Integer, primary_key=True)
+    entity = db.Column(db.String(30), nullable=False)  # chama, membership, transaction, notification, event
+    entity_key = db.Column(db.String(50), nullable=False)  # row id, or "chama_id:user_id" for memberships
+    operation = db.Column(db.String(10), nullable=False, default='upsert')  # upsert, delete
+    chama_id = db.Column(db.Integer)
+    user_id = db.Column(db.Integer)
+    changed_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_sync_changes_chama_id_id', 'chama_id', 'id'),
+        db.Index('ix_sync_changes_user_id_id', 'user_id', 'id'),
+        db.Index('ix_sync_changes_changed_at', 'changed_at'),
+    )
+
+    def __repr__(self):
+        return f'<SyncChange {self.id}: {self.operation} {self.entity} {self.entity_key}>'
+
+class SyncAction(db.Model):
+    """An offline action a mobile client has already replayed, keyed for idempotency.
+
+    Resending the same idempotency key returns the stored result instead of
+    applying the action twice.
+    """
+    __tablename__ = 'sync_actions'
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    idempotency_key = db.Column(db.String(100), nullable=False)
+    action_type = db.Column(db.String(50), nullable=False)
+    status = db.Column(db.String(20), nullable=False)  # success, error
+    result = db.Column(db.JSON)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'idempotency_key', name='uq_sync_actions_user_id_key'),
+    )
+
+    def __repr__(self):
+        return f'<SyncAction {self.idempotency_key}: {self.action_type} {self.status}>'
@@ -39,7 +39,7 @@ class User(UserMixin, db.Model):
     guardian_relationship = db.Column(db.String(50))
     
     # Timestamps
-    created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
+    created_at = db.Column(db.DateTime, default=db.func.current_timestamp(), index=True)
     last_login = db.Column(db.DateTime)
     is_active = db.Column(db.Boolean, default=True)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -83,12 +83,8 @@ class User(UserMixin, db.Model):
     
     def get_chama_role(self, chama_id):
         """Get user's role in a specific chama"""
-        from app.models.chama import chama_members
-        membership = db.session.query(chama_members).filter(
-            chama_members.c.user_id == self.id,
-            chama_members.c.chama_id == chama_id
-        ).first()
-        return membership.role if membership else None
+        from app.utils.permissions import get_user_chama_role
+        return get_user_chama_role(self.id, chama_id)
     
     def has_pending_loans(self, chama_id=None):
         """Check if user has pending loans"""
@@ -110,8 +106,8 @@ class User(UserMixin, db.Model):
     
     def get_unread_notifications_count(self):
         """Get count of unread notifications"""
-        from app.models.notification import Notification
-        return Notification.query.filter_by(user_id=self.id, is_read=False).count()
+        from app.utils.notification_counters import get_unread_count
+        return get_unread_count(self.id)
 
     @property
     def full_name(self):
@@ -159,12 +155,8 @@ class User(UserMixin, db.Model):
     
     def is_member_of_chama(self, chama_id):
         """Check if user is a member of a specific chama"""
-        from app.models.chama import chama_members
-        membership = db.session.query(chama_members).filter(
-            chama_members.c.user_id == self.id,
-            chama_members.c.chama_id == chama_id
-        ).first()
-        return membership is not None
+        from app.utils.permissions import user_can_access_chama
+        return user_can_access_chama(self.id, chama_id)
     
     def member_since(self, chama_id):
         """Get the date when user joined a specific chama"""
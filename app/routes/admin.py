@@ -4,6 +4,7 @@ from app.models.chama import Chama, chama_members, ChamaMembershipRequest
 from app.models.notification import Notification
 from app.models.meeting_minutes import ChamaAnnouncement
 from app.models.user import User
+from app.utils.permissions import invalidate_user_memberships
 from app import db
 from datetime import datetime, timedelta
 import json
@@ -325,6 +326,7 @@ def approve_membership_request(request_id):
             role='member'
         )
         db.session.execute(membership)
+        invalidate_user_memberships(membership_request.user_id)
         
         # Update request status
         membership_request.status = 'approved'
@@ -1,7 +1,9 @@
 from flask import Blueprint, render_template
 from flask_login import login_required, current_user
+from datetime import datetime, timedelta
 from app.models.user import User
 from app.models.audit_log import AuditLog
+from app.utils.analytics_rollup import metric_total, daily_series
 from app import db
 
 admin_analytics_bp = Blueprint('admin_analytics', __name__, url_prefix='/admin-analytics')
@@ -16,9 +18,22 @@ def dashboard():
     it_count = User.query.filter(User.role=='it').count()
     audit_count = AuditLog.query.count()
     recent_audits = AuditLog.query.order_by(AuditLog.created_at.desc()).limit(10).all()
+    
+    # Last 30 days from the daily rollups
+    today = datetime.utcnow().date()
+    month_ago = today - timedelta(days=29)
+    new_users_30d, _ = metric_total('new_users', month_ago, today)
+    logins_30d, _ = metric_total('logins', month_ago, today)
+    contributions_30d, contribution_volume_30d = metric_total('transactions', month_ago, today, dimension='contribution')
+    user_growth = daily_series('new_users', month_ago, today)
     return render_template('admin_analytics/dashboard.html',
         user_count=user_count,
         admin_count=admin_count,
         it_count=it_count,
         audit_count=audit_count,
-        recent_audits=recent_audits)
+        recent_audits=recent_audits,
+        new_users_30d=new_users_30d,
+        logins_30d=logins_30d,
+        contributions_30d=contributions_30d,
+        contribution_volume_30d=contribution_volume_30d,
+        user_growth=user_growth)
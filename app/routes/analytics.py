@@ -9,6 +9,7 @@ from flask_login import login_required, current_user
 from app.models import Chama, User, ChamaMember, SubscriptionPlan
 from app.utils.permissions import admin_required
 from app import db
+from app.utils.analytics_rollup import daily_series, monthly_series
 from sqlalchemy import func, extract, and_, or_
 from datetime import datetime, timedelta
 import json
@@ -33,27 +34,13 @@ def dashboard():
             func.sum(SubscriptionPlan.price).label('total')
         ).scalar() or 0
         
-        # Growth Analytics (last 12 months)
-        growth_data = []
-        for i in range(12):
-            month_start = datetime.now().replace(day=1) - timedelta(days=i*30)
-            month_end = month_start + timedelta(days=30)
-            
-            users_count = User.query.filter(
-                User.created_at.between(month_start, month_end)
-            ).count()
-            
-            chamas_count = Chama.query.filter(
-                Chama.created_at.between(month_start, month_end)
-            ).count()
-            
-            growth_data.append({
-                'month': month_start.strftime('%Y-%m'),
-                'users': users_count,
-                'chamas': chamas_count
-            })
-        
-        growth_data.reverse()
+        # Growth Analytics (last 12 months) from the daily rollups
+        users_by_month = monthly_series('new_users', months=12)
+        chamas_by_month = monthly_series('new_chamas', months=12)
+        growth_data = [
+            {'month': users['month'], 'users': users['count'], 'chamas': chamas['count']}
+            for users, chamas in zip(users_by_month, chamas_by_month)
+        ]
         
         # Chama Performance Analytics
         chama_performance = db.session.query(
@@ -232,17 +219,12 @@ def widget_data(widget_type):
     """API endpoint for custom dashboard widgets"""
     try:
         if widget_type == 'user_growth':
-            # User growth widget data
-            data = []
-            for i in range(30):
-                date = datetime.now() - timedelta(days=i)
-                count = User.query.filter(
-                    func.date(User.created_at) == date.date()
-                ).count()
-                data.append({
-                    'date': date.strftime('%Y-%m-%d'),
-                    'count': count
-                })
+            # User growth widget data, newest day first
+            today = datetime.utcnow().date()
+            data = [
+                {'date': day['date'], 'count': day['count']}
+                for day in reversed(daily_series('new_users', today - timedelta(days=29), today))
+            ]
             return jsonify({'success': True, 'data': data})
             
         elif widget_type == 'chama_status':
@@ -1,4 +1,4 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, url_for
 from flask_login import login_required, current_user
 from app.models.chama import Chama, ChamaMember, Contribution, Receipt
 from app import db
@@ -564,58 +564,26 @@ def send_system_notification():
         if not message:
             return jsonify({'error': 'Message is required', 'success': False}), 400
         
-        from app.models.user import User
-        from app.models.notification import Notification
+        from app.utils.notification_fanout import start_broadcast, audience_size
         
-        # Get all active users
-        users = User.query.filter_by(is_active=True).all()
-        
-        if not users:
+        recipients_count = audience_size('active_users')
+        if not recipients_count:
             return jsonify({'error': 'No active users found', 'success': False}), 404
         
-        # Create notifications for all users
-        notifications_created = 0
-        for user in users:
-            try:
-                notification = Notification(
-                    user_id=user.id,
-                    title=f"System Alert" + (f" ({priority.upper()} Priority)" if priority == 'high' else ''),
-                    message=message,
-                    type='system',
-                    is_read=False,
-                    created_date=datetime.utcnow()
-                )
-                db.session.add(notification)
-                notifications_created += 1
-                
-                # Send email for high priority notifications
-                if priority == 'high' and user.email:
-                    try:
-                        from app.utils.email_service import send_email
-                        email_subject = "🚨 High Priority System Alert - CHAMAlink"
-                        email_body = f"""
-                        <h2>System Alert</h2>
-                        <p><strong>Priority:</strong> {priority.upper()}</p>
-                        <p><strong>Message:</strong> {message}</p>
-                        <p><strong>Sent by:</strong> System Administrator ({current_user.full_name})</p>
-                        <p><strong>Time:</strong> {datetime.now().strftime('%B %d, %Y at %I:%M %p')}</p>
-                        <hr>
-                        <p><small>This is an automated system notification from CHAMAlink.</small></p>
-                        """
-                        send_email(user.email, email_subject, email_body)
-                    except Exception as email_error:
-                        print(f"Failed to send email to {user.email}: {email_error}")
-                        
-            except Exception as notification_error:
-                print(f"Failed to create notification for user {user.id}: {notification_error}")
-        
+        # Notifications (and emails for high priority) are fanned out by background jobs
+        broadcast = start_broadcast(
+            'system_alert', 'active_users', 'System Alert', message,
+            sender=current_user, priority=priority, channels=['email'] if priority == 'high' else []
+        )
         db.session.commit()
         
         return jsonify({
             'success': True,
-            'message': 'System notification sent successfully',
-            'recipients_count': notifications_created
-        })
+            'message': 'System notification queued',
+            'recipients_count': recipients_count,
+            'broadcast_id': broadcast.id,
+            'status_url': url_for('api.notification_broadcast_status', broadcast_id=broadcast.id)
+        }), 202
         
     except Exception as e:
         db.session.rollback()
@@ -627,6 +595,22 @@ def send_system_notification():
             'success': False
         }), 500
 
+@api_bp.route('/notification-broadcasts/<int:broadcast_id>', methods=['GET'])
+@login_required
+def notification_broadcast_status(broadcast_id):
+    """Progress of a platform notice or system notification fan-out"""
+    if not current_user.is_super_admin:
+        return jsonify({'error': 'Access denied', 'success': False}), 403
+    
+    from app.models.notification import NotificationBroadcast
+    from app.utils.notification_fanout import delivery_counts
+    
+    broadcast = db.session.get(NotificationBroadcast, broadcast_id)
+    if not broadcast:
+        return jsonify({'error': 'Broadcast not found', 'success': False}), 404
+    
+    return jsonify({'success': True, 'broadcast': broadcast.to_dict(delivery_counts(broadcast))})
+
 # Test endpoint for debugging
 @api_bp.route('/test-notification', methods=['GET'])
 def test_notification_endpoint():
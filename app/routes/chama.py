@@ -5,11 +5,17 @@ from app.models import (
     ChamaMembershipRequest, Notification, ManualPaymentVerification, RegistrationFeePayment
 )
 from app.models.chama import chama_members as chama_members_table  # Import the table with alias
-from app.utils.permissions import chama_member_required, chama_admin_required, user_can_access_chama, get_user_chama_role
+from app.utils.permissions import chama_member_required, chama_admin_required, user_can_access_chama, get_user_chama_role, invalidate_user_memberships
 from app.utils.mpesa import initiate_stk_push
+from app.utils.ledger import post_entry, get_member_balances
+from app.utils.transaction_feed import transaction_page
+from app.utils.documents import financial_report_data, serve_document
+from app.utils.fragment_cache import (cached_fragment, chama_namespace, user_namespace,
+                                      transaction_snapshot, event_snapshot)
 from app import db
 from datetime import datetime, date
 from sqlalchemy import desc, and_, or_, func
+from sqlalchemy.orm import joinedload
 
 chama_bp = Blueprint('chama', __name__, url_prefix='/chama')
 
@@ -195,43 +201,10 @@ def chama_detail(chama_id):
             flash('You do not have permission to access this chama.', 'error')
             return redirect(url_for('main.dashboard'))
         
-        # Get chama statistics with proper error handling
-        try:
-            total_contributions = db.session.query(db.func.sum(Transaction.amount)).filter(
-                Transaction.chama_id == chama_id,
-                Transaction.type == 'contribution'
-            ).scalar() or 0
-        except Exception as e:
-            current_app.logger.warning(f"Error getting contributions: {e}")
-            total_contributions = 0
-        
-        try:
-            total_loans = db.session.query(db.func.sum(Transaction.amount)).filter(
-                Transaction.chama_id == chama_id,
-                Transaction.type == 'loan'
-            ).scalar() or 0
-        except Exception as e:
-            current_app.logger.warning(f"Error getting loans: {e}")
-            total_loans = 0
-        
-        # Get recent transactions for this chama
-        try:
-            recent_transactions = Transaction.query.filter(
-                Transaction.chama_id == chama_id
-            ).order_by(desc(Transaction.created_at)).limit(10).all()
-        except Exception as e:
-            current_app.logger.warning(f"Error getting transactions: {e}")
-            recent_transactions = []
-        
-        # Get upcoming events for this chama
-        try:
-            upcoming_events = Event.query.filter(
-                Event.chama_id == chama_id,
-                Event.event_date >= date.today()
-            ).order_by(Event.event_date).limit(5).all()
-        except Exception as e:
-            current_app.logger.warning(f"Error getting events: {e}")
-            upcoming_events = []
+        # Totals, recent transactions and upcoming events are shared by every
+        # member and cached until the chama changes
+        overview = cached_fragment('chama.chama_detail', [chama_namespace(chama_id)],
+                                   lambda: _chama_overview(chama_id), parts=(date.today(),))
         
         # Get user's role in this chama
         try:
@@ -262,10 +235,10 @@ def chama_detail(chama_id):
         
         return render_template('chama/detail.html',
                              chama=chama,
-                             total_contributions=total_contributions,
-                             total_loans=total_loans,
-                             recent_transactions=recent_transactions,
-                             upcoming_events=upcoming_events,
+                             total_contributions=overview['total_contributions'],
+                             total_loans=overview['total_loans'],
+                             recent_transactions=overview['recent_transactions'],
+                             upcoming_events=overview['upcoming_events'],
                              user_role=user_role)
                              
     except Exception as e:
@@ -275,6 +248,113 @@ def chama_detail(chama_id):
         flash(f'Error accessing chama details: {str(e)}', 'error')
         return redirect(url_for('main.dashboard'))
 
+def _chama_overview(chama_id):
+    """Contribution/loan totals, last 10 transactions and next 5 events of a chama"""
+    # Get chama statistics with proper error handling
+    try:
+        total_contributions = db.session.query(db.func.sum(Transaction.amount)).filter(
+            Transaction.chama_id == chama_id,
+            Transaction.type == 'contribution'
+        ).scalar() or 0
+    except Exception as e:
+        current_app.logger.warning(f"Error getting contributions: {e}")
+        total_contributions = 0
+    
+    try:
+        total_loans = db.session.query(db.func.sum(Transaction.amount)).filter(
+            Transaction.chama_id == chama_id,
+            Transaction.type == 'loan'
+        ).scalar() or 0
+    except Exception as e:
+        current_app.logger.warning(f"Error getting loans: {e}")
+        total_loans = 0
+    
+    # Get recent transactions for this chama
+    try:
+        recent_transactions = [transaction_snapshot(t) for t in Transaction.query.options(
+            joinedload(Transaction.user)
+        ).filter(
+            Transaction.chama_id == chama_id
+        ).order_by(desc(Transaction.created_at)).limit(10)]
+    except Exception as e:
+        current_app.logger.warning(f"Error getting transactions: {e}")
+        recent_transactions = []
+    
+    # Get upcoming events for this chama
+    try:
+        upcoming_events = [event_snapshot(e) for e in Event.query.filter(
+            Event.chama_id == chama_id,
+            Event.event_date >= date.today()
+        ).order_by(Event.event_date).limit(5)]
+    except Exception as e:
+        current_app.logger.warning(f"Error getting events: {e}")
+        upcoming_events = []
+    
+    return {
+        'total_contributions': total_contributions,
+        'total_loans': total_loans,
+        'recent_transactions': recent_transactions,
+        'upcoming_events': upcoming_events
+    }
+
+def _chama_members_data(chama_id, chama_name):
+    """Members of a chama with role, join date and contribution total"""
+    members_data = []
+    try:
+        members_with_roles = db.session.query(
+            User, chama_members_table.c.role, chama_members_table.c.joined_at
+        ).join(chama_members_table, User.id == chama_members_table.c.user_id).filter(
+            chama_members_table.c.chama_id == chama_id  # CRITICAL: Filter by THIS chama_id
+        ).all()
+        
+        current_app.logger.info(f"📊 Found {len(members_with_roles)} members in {chama_name}")
+        
+        # Ledger snapshots for THIS CHAMA ONLY, loaded in one query
+        member_balances = get_member_balances(chama_id)
+        
+        for user, role, joined_at in members_with_roles:
+            # Total contributions for this member IN THIS CHAMA ONLY
+            member_balance = member_balances.get(user.id)
+            total_contributions = member_balance.total_contributions if member_balance else 0
+            
+            members_data.append({
+                'user': {'id': user.id, 'username': user.username, 'email': user.email},
+                'role': role,
+                'joined_at': joined_at,
+                'total_contributions': float(total_contributions)
+            })
+    except Exception as e:
+        current_app.logger.error(f"Error fetching members for {chama_name}: {str(e)}")
+        members_data = []
+    return members_data
+
+def _chama_transactions_data(chama_id, chama_name, user_id=None):
+    """Last 20 transactions of a chama, or of one member in it"""
+    try:
+        query = Transaction.query.options(joinedload(Transaction.user)).filter(
+            Transaction.chama_id == chama_id  # CRITICAL: Filter by THIS chama_id
+        )
+        if user_id is not None:
+            query = query.filter(Transaction.user_id == user_id)
+        transactions = [transaction_snapshot(t) for t in query.order_by(desc(Transaction.created_at)).limit(20)]
+        current_app.logger.info(f"📋 Loaded {len(transactions)} transactions for {chama_name}")
+        return transactions
+    except Exception as e:
+        current_app.logger.error(f"Error fetching transactions for {chama_name}: {str(e)}")
+        return []
+
+def _chama_monthly_contributions(chama_id, chama_name, start_of_month):
+    try:
+        monthly_contributions = db.session.query(func.sum(Transaction.amount)).filter(
+            Transaction.chama_id == chama_id,  # CRITICAL: Filter by THIS chama_id
+            Transaction.type == 'contribution',
+            Transaction.created_at >= start_of_month
+        ).scalar() or 0
+        return float(monthly_contributions)
+    except Exception as e:
+        current_app.logger.error(f"Error calculating monthly contributions for {chama_name}: {str(e)}")
+        return 0
+
 @chama_bp.route('/<int:chama_id>/dashboard')
 @login_required
 @chama_member_required
@@ -296,52 +376,25 @@ def chama_dashboard(chama_id):
         
         current_app.logger.info(f"✅ User role in {chama.name}: {user_role}")
         
-        # Get all members with their roles and contribution totals FOR THIS CHAMA ONLY
-        members_data = []
-        try:
-            members_with_roles = db.session.query(
-                User, chama_members_table.c.role, chama_members_table.c.joined_at
-            ).join(chama_members_table, User.id == chama_members_table.c.user_id).filter(
-                chama_members_table.c.chama_id == chama_id  # CRITICAL: Filter by THIS chama_id
-            ).all()
-            
-            current_app.logger.info(f"📊 Found {len(members_with_roles)} members in {chama.name}")
-            
-            for user, role, joined_at in members_with_roles:
-                # Calculate total contributions for this member IN THIS CHAMA ONLY
-                total_contributions = db.session.query(func.sum(Transaction.amount)).filter(
-                    Transaction.user_id == user.id,
-                    Transaction.chama_id == chama_id,  # CRITICAL: Filter by THIS chama_id
-                    Transaction.type == 'contribution'
-                ).scalar() or 0
-                
-                members_data.append({
-                    'user': user,
-                    'role': role,
-                    'joined_at': joined_at,
-                    'total_contributions': float(total_contributions),
-                    'can_edit': user_role in ['admin', 'creator'] or user.id == current_user.id
-                })
-        except Exception as e:
-            current_app.logger.error(f"Error fetching members for {chama.name}: {str(e)}")
-            members_data = []
+        # Members and their contribution totals FOR THIS CHAMA ONLY, cached
+        # until the chama changes; edit rights depend on the viewer
+        members_data = [
+            dict(member, can_edit=user_role in ['admin', 'creator'] or member['user']['id'] == current_user.id)
+            for member in cached_fragment('chama.chama_dashboard.members', [chama_namespace(chama_id)],
+                                          lambda: _chama_members_data(chama_id, chama.name))
+        ]
         
         # Get transactions based on role FOR THIS CHAMA ONLY
-        transactions = []
-        try:
-            if user_role in ['admin', 'creator']:
-                # Admins see all transactions FOR THIS CHAMA ONLY
-                transactions = Transaction.query.filter_by(chama_id=chama_id).order_by(desc(Transaction.created_date)).limit(20).all()
-                current_app.logger.info(f"📋 Admin {current_user.username} viewing {len(transactions)} transactions for {chama.name}")
-            else:
-                # Members see only their transactions IN THIS CHAMA ONLY
-                transactions = Transaction.query.filter(
-                    Transaction.chama_id == chama_id,  # CRITICAL: Filter by THIS chama_id
-                    Transaction.user_id == current_user.id
-                ).order_by(desc(Transaction.created_date)).limit(20).all()
-                current_app.logger.info(f"📋 Member {current_user.username} viewing {len(transactions)} own transactions for {chama.name}")
-        except Exception as e:
-            current_app.logger.error(f"Error fetching transactions for {chama.name}: {str(e)}")
+        if user_role in ['admin', 'creator']:
+            # Admins see all transactions FOR THIS CHAMA ONLY
+            transactions = cached_fragment('chama.chama_dashboard.transactions', [chama_namespace(chama_id)],
+                                           lambda: _chama_transactions_data(chama_id, chama.name))
+        else:
+            # Members see only their transactions IN THIS CHAMA ONLY
+            transactions = cached_fragment('chama.chama_dashboard.transactions',
+                                           [chama_namespace(chama_id), user_namespace(current_user.id)],
+                                           lambda: _chama_transactions_data(chama_id, chama.name, current_user.id),
+                                           parts=(current_user.id,))
         
         # Get pending requests FOR THIS CHAMA ONLY (admin only)
         pending_requests = []
@@ -365,17 +418,12 @@ def chama_dashboard(chama_id):
         }
         
         # Calculate monthly contributions FOR THIS CHAMA ONLY
-        try:
-            from datetime import datetime
-            start_of_month = datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-            monthly_contributions = db.session.query(func.sum(Transaction.amount)).filter(
-                Transaction.chama_id == chama_id,  # CRITICAL: Filter by THIS chama_id
-                Transaction.type == 'contribution',
-                Transaction.created_date >= start_of_month
-            ).scalar() or 0
-            stats['monthly_contributions'] = float(monthly_contributions)
-        except Exception as e:
-            current_app.logger.error(f"Error calculating monthly contributions for {chama.name}: {str(e)}")
+        start_of_month = datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        stats['monthly_contributions'] = cached_fragment(
+            'chama.chama_dashboard.monthly', [chama_namespace(chama_id)],
+            lambda: _chama_monthly_contributions(chama_id, chama.name, start_of_month),
+            parts=(start_of_month.date(),)
+        )
         
         current_app.logger.info(f"✅ Successfully loaded dashboard for {chama.name} - Balance: {stats['total_balance']}, Members: {stats['total_members']}")
         
@@ -393,52 +441,6 @@ def chama_dashboard(chama_id):
         traceback.print_exc()
         flash('Error loading chama dashboard. Please try again.', 'error')
         return redirect(url_for('main.dashboard'))
-        
-        # Get pending requests (admin only)
-        pending_requests = []
-        if user_role in ['admin', 'creator']:
-            try:
-                pending_requests = ChamaMembershipRequest.query.filter_by(
-                    chama_id=chama_id,
-                    status='pending',
-                    request_type='join'
-                ).all()
-            except Exception as e:
-                current_app.logger.error(f"Error fetching pending requests: {str(e)}")
-        
-        # Calculate statistics
-        stats = {
-            'total_members': len(members_data),
-            'total_balance': float(chama.total_balance or 0),
-            'monthly_contributions': 0,
-            'pending_requests': len(pending_requests)
-        }
-        
-        # Calculate monthly contributions
-        try:
-            from datetime import datetime
-            start_of_month = datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-            monthly_contributions = db.session.query(func.sum(Transaction.amount)).filter(
-                Transaction.chama_id == chama_id,
-                Transaction.type == 'contribution',
-                Transaction.created_date >= start_of_month
-            ).scalar() or 0
-            stats['monthly_contributions'] = float(monthly_contributions)
-        except Exception as e:
-            current_app.logger.error(f"Error calculating monthly contributions: {str(e)}")
-        
-        return render_template('chama/dashboard.html',
-                             chama=chama,
-                             user_role=user_role,
-                             members_data=members_data,
-                             transactions=transactions,
-                             pending_requests=pending_requests,
-                             stats=stats)
-                             
-    except Exception as e:
-        current_app.logger.error(f"Error in chama_dashboard: {str(e)}")
-        flash('Error loading chama dashboard. Please try again.', 'error')
-        return redirect(url_for('main.dashboard'))
 
 @chama_bp.route('/<int:chama_id>/members')
 @login_required
@@ -491,16 +493,21 @@ def contribute(chama_id):
             chama_id=chama_id  # CRITICAL: Ensure transaction is linked to correct chama
         )
         
-        # Update the balance of THIS SPECIFIC chama
-        old_balance = chama.total_balance or 0
-        chama.total_balance = old_balance + amount
-        
         # Verify the transaction is created correctly
         if transaction.chama_id != chama_id:
             raise ValueError(f"Transaction chama_id mismatch: expected {chama_id}, got {transaction.chama_id}")
         
-        # Add transaction and commit
+        # Add transaction and update the balance of THIS SPECIFIC chama through the ledger
         db.session.add(transaction)
+        db.session.flush()
+        post_entry(
+            chama_id=chama_id,
+            entry_type='contribution',
+            amount=amount,
+            user_id=current_user.id,
+            transaction_id=transaction.id,
+            description=transaction.description
+        )
         db.session.commit()
         
         current_app.logger.info(f"✅ Contribution successful: {amount} to '{chama.name}', new balance: {chama.total_balance}")
@@ -699,20 +706,20 @@ def chama_transactions(chama_id):
     """View all transactions for a chama"""
     chama = Chama.query.get_or_404(chama_id)
     
-    # Get pagination parameters
-    page = request.args.get('page', 1, type=int)
+    # Keyset pagination: each page continues after the cursor of the last one
+    cursor = request.args.get('cursor') or None
     per_page = 20
     
-    # Get transactions with pagination
-    transactions = Transaction.query.filter(
-        Transaction.chama_id == chama_id
-    ).order_by(desc(Transaction.created_at)).paginate(
-        page=page, per_page=per_page, error_out=False
-    )
+    try:
+        page = transaction_page([chama_id], cursor, per_page)
+    except ValueError:
+        return redirect(url_for('chama.chama_transactions', chama_id=chama_id))
     
     return render_template('chama/transactions.html',
                          chama=chama,
-                         transactions=transactions)
+                         transactions=page['transactions'],
+                         next_cursor=page['next_cursor'],
+                         is_first_page=cursor is None)
 
 @chama_bp.route('/<int:chama_id>/pay-registration-fee', methods=['POST'])
 @login_required
@@ -1025,6 +1032,7 @@ def make_chama_admin(chama_id, member_id):
         ).values(role='admin')
         
         result = db.session.execute(stmt)
+        invalidate_user_memberships(member_id)
         
         if result.rowcount > 0:
             # Send notification to new admin
@@ -1158,9 +1166,17 @@ def approve_payment_verification(verification_id):
                 chama_id=chama.id
             )
             db.session.add(transaction)
+            db.session.flush()
             
             # Update chama balance
-            chama.total_balance += verification.amount
+            post_entry(
+                chama_id=chama.id,
+                entry_type='contribution',
+                amount=verification.amount,
+                user_id=verification.user_id,
+                transaction_id=transaction.id,
+                description=transaction.description
+            )
             
         elif verification.payment_type == 'registration_fee':
             # Create registration fee payment record
@@ -1276,6 +1292,7 @@ def appoint_role(chama_id):
                 )
             ).values(role=new_role)
         )
+        invalidate_user_memberships(user_id)
         
         # Create notification for the appointed user
         user = User.query.get(user_id)
@@ -1381,15 +1398,7 @@ def download_transactions(chama_id):
 @login_required
 @chama_member_required
 def download_financial_report(chama_id):
-    """Download comprehensive financial report as PDF"""
-    import io
-    from reportlab.pdfgen import canvas
-    from reportlab.lib.pagesizes import letter
-    from reportlab.lib import colors
-    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-    from reportlab.lib.styles import getSampleStyleSheet
-    from flask import send_file
-    
+    """Download comprehensive financial report as PDF, re-rendered only when its figures change"""
     chama = Chama.query.get_or_404(chama_id)
     user_role = current_user.get_chama_role(chama_id)
     
@@ -1398,88 +1407,9 @@ def download_financial_report(chama_id):
         flash('Access denied. Only admins and treasurers can download financial reports.', 'error')
         return redirect(url_for('chama.chama_detail', chama_id=chama_id))
     
-    buffer = io.BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=letter)
-    elements = []
-    styles = getSampleStyleSheet()
-    
-    # Title
-    title = Paragraph(f"<b>Financial Report - {chama.name}</b>", styles['Title'])
-    elements.append(title)
-    elements.append(Spacer(1, 20))
-    
-    # Summary statistics
-    total_contributions = db.session.query(db.func.sum(Transaction.amount)).filter(
-        Transaction.chama_id == chama_id,
-        Transaction.type == 'contribution'
-    ).scalar() or 0
-    
-    total_loans = db.session.query(db.func.sum(Transaction.amount)).filter(
-        Transaction.chama_id == chama_id,
-        Transaction.type == 'loan'
-    ).scalar() or 0
-    
-    summary_data = [
-        ['Financial Summary', ''],
-        ['Total Balance', f'KES {chama.total_balance:,.2f}'],
-        ['Total Contributions', f'KES {total_contributions:,.2f}'],
-        ['Total Loans', f'KES {total_loans:,.2f}'],
-        ['Monthly Target', f'KES {chama.monthly_contribution:,.2f}'],
-        ['Number of Members', str(chama.member_count)]
-    ]
-    
-    summary_table = Table(summary_data, colWidths=[200, 200])
-    summary_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 14),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black)
-    ]))
-    
-    elements.append(summary_table)
-    elements.append(Spacer(1, 30))
-    
-    # Recent transactions
-    recent_transactions = Transaction.query.filter(
-        Transaction.chama_id == chama_id
-    ).order_by(desc(Transaction.created_at)).limit(20).all()
-    
-    if recent_transactions:
-        elements.append(Paragraph("<b>Recent Transactions</b>", styles['Heading2']))
-        elements.append(Spacer(1, 10))
-        
-        transaction_data = [['Date', 'Type', 'Amount', 'Member']]
-        for transaction in recent_transactions:
-            transaction_data.append([
-                transaction.created_at.strftime('%Y-%m-%d'),
-                transaction.type.title(),
-                f'KES {transaction.amount:,.2f}',
-                transaction.user.username
-            ])
-        
-        transaction_table = Table(transaction_data, colWidths=[100, 80, 100, 120])
-        transaction_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 12),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black)
-        ]))
-        
-        elements.append(transaction_table)
-    
-    doc.build(elements)
-    buffer.seek(0)
-    
     filename = f"{chama.name}_financial_report_{datetime.now().strftime('%Y%m%d')}.pdf"
-    return send_file(buffer, as_attachment=True, download_name=filename, mimetype='application/pdf')
+    return serve_document('financial_report', f'financial_report:{chama.id}', lambda: financial_report_data(chama),
+                          filename, chama_id=chama.id)
 
 def get_user_chama_role(user_id, chama_id):
     """Get the role of a user in a specific chama"""
@@ -6,8 +6,9 @@ KYC automation, regulatory reporting, and compliance monitoring
 
 from flask import Blueprint, render_template, request, jsonify, flash, send_file
 from flask_login import login_required, current_user
-from app.models import User, Chama, ChamaMember
+from app.models import User, Chama, ChamaMember, AmlAlert
 from app.utils.permissions import admin_required
+from app.utils.aml_monitor import RULES as AML_RULES, alert_summary
 from app import db
 from datetime import datetime, timedelta
 import json
@@ -18,6 +19,9 @@ import os
 
 compliance_bp = Blueprint('compliance', __name__, url_prefix='/compliance')
 
+# Open alerts listed on the AML monitoring page
+AML_RECENT_ALERTS = 50
+
 @compliance_bp.route('/dashboard')
 @login_required
 @admin_required
@@ -47,7 +51,7 @@ def dashboard():
             'aml_monitoring': {
                 'status': 'active',
                 'description': 'Anti-Money Laundering transaction monitoring',
-                'alerts_count': 0
+                'alerts_count': AmlAlert.query.filter_by(status='open').count()
             },
             'regulatory_reporting': {
                 'status': 'active',
@@ -389,39 +393,32 @@ def export_report(report_type):
 def aml_monitoring():
     """Anti-Money Laundering monitoring dashboard"""
     try:
+        summary = alert_summary()
+        
         # AML monitoring data
         monitoring_data = {
-            'risk_score': 'Low',
-            'active_alerts': 0,
-            'transactions_monitored': 0,  # Would come from transaction table
-            'suspicious_patterns': [],
+            'risk_score': summary['risk_score'],
+            'active_alerts': summary['active_alerts'],
+            'transactions_monitored': summary['transactions_monitored'],
+            'suspicious_patterns': AmlAlert.query.filter_by(status='open').order_by(
+                AmlAlert.event_time.desc()
+            ).limit(AML_RECENT_ALERTS).all(),
             'watchlist_matches': 0,
-            'last_update': datetime.now()
+            'last_update': summary['last_update']
         }
         
-        # Monitoring rules
+        # Monitoring rules, as the engine evaluates them
         monitoring_rules = [
             {
-                'id': 'large_transactions',
-                'name': 'Large Transaction Detection',
-                'description': 'Monitor transactions above KES 100,000',
-                'threshold': 100000,
-                'status': 'active'
-            },
-            {
-                'id': 'rapid_transactions',
-                'name': 'Rapid Transaction Pattern',
-                'description': 'Detect rapid succession of transactions',
-                'threshold': '5 transactions in 1 hour',
-                'status': 'active'
-            },
-            {
-                'id': 'cross_border',
-                'name': 'Cross-border Transactions',
-                'description': 'Monitor international transfers',
-                'threshold': 'Any international transaction',
+                'id': rule.name,
+                'name': rule.name.replace('_', ' ').title(),
+                'description': rule.__doc__,
+                'threshold': rule.describe(),
+                'severity': rule.severity,
+                'open_alerts': summary['alerts_by_rule'].get(rule.name, 0),
                 'status': 'active'
             }
+            for rule in AML_RULES
         ]
         
         return render_template('compliance/aml_monitoring.html',
@@ -433,6 +430,31 @@ def aml_monitoring():
         return render_template('compliance/aml_monitoring.html',
                              monitoring_data={}, monitoring_rules=[])
 
+@compliance_bp.route('/monitoring/aml/alerts/<int:alert_id>', methods=['POST'])
+@login_required
+@admin_required
+def review_aml_alert(alert_id):
+    """Mark an AML alert reviewed, dismissed or escalated"""
+    alert = AmlAlert.query.get_or_404(alert_id)
+    data = request.get_json() or {}
+    status = data.get('status')
+    
+    if status not in ('reviewed', 'dismissed', 'escalated'):
+        return jsonify({
+            'success': False,
+            'error': 'Status must be reviewed, dismissed or escalated'
+        }), 400
+    
+    alert.status = status
+    alert.reviewed_by = current_user.id
+    alert.reviewed_at = datetime.utcnow()
+    db.session.commit()
+    
+    return jsonify({
+        'success': True,
+        'alert': alert.to_dict()
+    })
+
 @compliance_bp.route('/api/compliance-check', methods=['POST'])
 @login_required
 @admin_required
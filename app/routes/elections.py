@@ -2,7 +2,7 @@ from flask import Blueprint, render_template, request, redirect, url_for, flash,
 from flask_login import login_required, current_user
 from app.models import Chama, User, chama_members
 from app.models.chama import LeadershipElection, ElectionCandidate, ElectionVote
-from app.utils.permissions import chama_member_required, get_user_chama_role
+from app.utils.permissions import chama_member_required, get_user_chama_role, invalidate_all_memberships
 from app import db
 from datetime import datetime, timedelta
 from sqlalchemy import desc, and_, or_, func
@@ -341,6 +341,7 @@ def finalize_election(election_id):
                 )
             ).values(role='member')
         )
+        invalidate_all_memberships()
         
         # Assign new leadership role
         election.chama.assign_leadership_role(winner_candidate_id, election.position)
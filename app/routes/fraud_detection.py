@@ -1,17 +1,46 @@
 from flask import Blueprint, render_template, request, jsonify
-from flask_login import login_required
+from flask_login import login_required, current_user
+from app.models import FraudScore
+from app.utils.permissions import admin_api_required, is_system_admin
+from app.utils.fraud_scoring import fraud_summary, start_rescore
+from app import db
+from datetime import datetime, timedelta
 
 fraud_detection_bp = Blueprint('fraud_detection', __name__, url_prefix='/fraud')
 
+# Flagged payments listed on the dashboard
+FRAUD_RECENT_ALERTS = 50
+
 @fraud_detection_bp.route('/')
 @login_required
 def fraud_dashboard():
     """Fraud detection dashboard."""
-    # TODO: Show fraud alerts
-    return render_template('fraud/dashboard.html', alerts=[])
+    # Admins see every flagged payment, members their own
+    is_admin = is_system_admin(current_user)
+    query = FraudScore.query.filter(FraudScore.decision.in_(['review', 'block']))
+    if not is_admin:
+        query = query.filter(FraudScore.user_id == current_user.id)
+    alerts = query.order_by(FraudScore.scored_at.desc()).limit(FRAUD_RECENT_ALERTS).all()
+    summary = fraud_summary(user_id=None if is_admin else current_user.id)
+    return render_template('fraud/dashboard.html', alerts=alerts, summary=summary, is_admin=is_admin)
 
 @fraud_detection_bp.route('/api/scan', methods=['POST'])
 @login_required
+@admin_api_required
 def scan_fraud():
-    # TODO: Implement fraud detection logic
-    return jsonify({'status': 'ok', 'message': 'No fraud detected.'})
+    """Queue rescoring of recent payments against the members' current baselines"""
+    data = request.get_json(silent=True) or {}
+    try:
+        days = int(data.get('days', 30))
+    except (TypeError, ValueError):
+        return jsonify({'status': 'error', 'message': 'days must be a number'}), 400
+    if days <= 0:
+        return jsonify({'status': 'error', 'message': 'days must be positive'}), 400
+    
+    job = start_rescore(since=datetime.utcnow() - timedelta(days=days))
+    db.session.commit()
+    return jsonify({
+        'status': 'queued',
+        'message': f'Rescoring payments from the last {days} days.',
+        'job_id': job.id
+    }), 202
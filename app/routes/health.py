@@ -1,5 +1,9 @@
 from flask import Blueprint, jsonify
 from flask_login import login_required
+from app.utils.permissions import get_membership_cache_stats
+from app.utils.mpesa import get_mpesa_metrics
+from app.utils.rate_limiter import get_limiter_backend
+from app.utils.fragment_cache import get_fragment_cache
 
 health_bp = Blueprint('health', __name__, url_prefix='/health')
 
@@ -7,4 +11,13 @@ health_bp = Blueprint('health', __name__, url_prefix='/health')
 @login_required
 def health_check():
     """Basic health check endpoint."""
-    return jsonify({'status': 'ok', 'message': 'CHAMAlink is healthy'})
+    return jsonify({
+        'status': 'ok',
+        'message': 'CHAMAlink is healthy',
+        'caches': {
+            'memberships': get_membership_cache_stats(),
+            'rate_limits': get_limiter_backend().stats(),
+            'fragments': get_fragment_cache().stats()
+        },
+        'mpesa': get_mpesa_metrics()
+    })
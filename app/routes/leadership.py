@@ -8,7 +8,7 @@ from flask_login import login_required, current_user
 from app.models.chama import Chama, chama_members, LeadershipElection, ElectionVote
 from app.models.user import User
 from app.models.notification import Notification
-from app.utils.permissions import user_can_admin_chama
+from app.utils.permissions import user_can_admin_chama, invalidate_user_memberships
 from app import db
 from datetime import datetime, timedelta
 import json
@@ -85,6 +85,7 @@ def assign_role(chama_id):
                 elected_at=datetime.utcnow()
             )
         )
+        invalidate_user_memberships(user_id)
         
         # Create notification
         notification = Notification(
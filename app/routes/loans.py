@@ -6,6 +6,7 @@ from app.models import (
 )
 from app.utils.permissions import chama_member_required, chama_admin_required, user_can_access_chama
 from app.utils.mpesa import initiate_stk_push
+from app.utils.ledger import post_entry
 from app import db
 from datetime import datetime, timedelta
 from sqlalchemy import desc, and_
@@ -261,8 +262,18 @@ def disburse_loan(loan_id):
                 chama_id=loan_application.chama_id
             )
             
+            db.session.add(transaction)
+            db.session.flush()
+            
             # Update chama balance
-            chama.total_balance -= loan_application.amount
+            post_entry(
+                chama_id=loan_application.chama_id,
+                entry_type='loan_disbursement',
+                amount=loan_application.amount,
+                user_id=loan_application.user_id,
+                transaction_id=transaction.id,
+                description=transaction.description
+            )
             
             # Create M-Pesa transaction record
             mpesa_transaction = MpesaTransaction(
@@ -275,7 +286,6 @@ def disburse_loan(loan_id):
                 chama_id=loan_application.chama_id
             )
             
-            db.session.add(transaction)
             db.session.add(mpesa_transaction)
             
             # Notify user
@@ -348,9 +358,18 @@ def repay_loan(loan_id):
                 chama_id=loan_application.chama_id
             )
             
+            db.session.add(transaction)
+            db.session.flush()
+            
             # Update chama balance
-            chama = Chama.query.get(loan_application.chama_id)
-            chama.total_balance += amount
+            post_entry(
+                chama_id=loan_application.chama_id,
+                entry_type='loan_repayment',
+                amount=amount,
+                user_id=current_user.id,
+                transaction_id=transaction.id,
+                description=transaction.description
+            )
             
             # Create M-Pesa transaction record
             mpesa_transaction = MpesaTransaction(
@@ -364,7 +383,6 @@ def repay_loan(loan_id):
                 transaction_id=transaction.id
             )
             
-            db.session.add(transaction)
             db.session.add(mpesa_transaction)
             db.session.commit()
             
@@ -1,9 +1,14 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, current_app
 from flask_login import login_required, current_user
-from app.models import Chama, Transaction, Event, User
+from app.models import Chama, Transaction, Event, User, chama_members
+from app.utils.ledger import post_entry
+from app.utils.permissions import invalidate_user_memberships, get_user_memberships
+from app.utils.fragment_cache import (cached_fragment, chama_namespace, user_namespace,
+                                      transaction_snapshot, event_snapshot)
 from app import db
 from datetime import datetime, date, timedelta
 from sqlalchemy import desc, extract
+from sqlalchemy.orm import joinedload
 
 main = Blueprint('main', __name__)
 
@@ -30,50 +35,96 @@ def dashboard():
     if not current_user.is_super_admin:
         # Check subscription status and show warnings if needed
         from app.utils.subscription_utils import check_trial_expiry, ensure_user_has_subscription
+        from app.utils.subscription_middleware import get_subscription_state, invalidate_subscription_state
+        
+        state = get_subscription_state()
+        if state['status'] == 'active':
+            # Cached state is enough for the common case; no subscription queries
+            trial_warning = None
+            if state['is_trial'] and state['end_date']:
+                end_date = datetime.utcfromtimestamp(state['end_date'])
+                days_remaining = max((end_date - datetime.utcnow()).days, 0)
+                if days_remaining <= 7:
+                    trial_warning = {
+                        'days_remaining': days_remaining,
+                        'expires_on': end_date.strftime('%B %d, %Y')
+                    }
+        else:
+            # Ensure user has a subscription (create trial if needed)
+            subscription = ensure_user_has_subscription(current_user)
+            invalidate_subscription_state()
+            
+            # Check if trial is expiring soon
+            trial_warning = check_trial_expiry()
+            
+            # Check if subscription is expired
+            if not subscription.is_active:
+                flash('Your subscription has expired. Please upgrade to continue using ChamaLink.', 'danger')
+                return redirect(url_for('subscription.plans'))
         
-        # Ensure user has a subscription (create trial if needed)
-        subscription = ensure_user_has_subscription(current_user)
-        
-        # Check if trial is expiring soon
-        trial_warning = check_trial_expiry()
         if trial_warning:
             flash(f"Your free trial expires in {trial_warning['days_remaining']} days on {trial_warning['expires_on']}. Upgrade now to continue!", 'warning')
-        
-        # Check if subscription is expired
-        if not subscription.is_active:
-            flash('Your subscription has expired. Please upgrade to continue using ChamaLink.', 'danger')
-            return redirect(url_for('subscription.plans'))
     
-    # Get user's chamas
-    user_chamas = current_user.chamas
+    # Chamas, recent transactions and events come from the fragment cache,
+    # invalidated whenever the user or any of their chamas changes
+    chama_ids = sorted(get_user_memberships(current_user.id))
+    namespaces = [user_namespace(current_user.id)] + [chama_namespace(chama_id) for chama_id in chama_ids]
+    data = cached_fragment('main.dashboard', namespaces,
+                           lambda: _dashboard_data(chama_ids), parts=(date.today(),))
+    user_chamas = data['user_chamas']
     
     # Calculate dashboard statistics
     total_chamas = len(user_chamas)
-    total_savings = sum(chama.total_balance for chama in user_chamas)
-    monthly_contributions = sum(chama.monthly_contribution for chama in user_chamas)
+    total_savings = sum(chama['total_balance'] for chama in user_chamas)
+    monthly_contributions = sum(chama['monthly_contribution'] for chama in user_chamas)
     
     # Calculate average ROI (placeholder calculation)
     avg_roi = 8.5  # This would be calculated based on actual investment performance
     
+    return render_template('dashboard.html', 
+                         user_chamas=user_chamas,
+                         total_chamas=total_chamas,
+                         total_savings=total_savings,
+                         monthly_contributions=monthly_contributions,
+                         avg_roi=avg_roi,
+                         recent_transactions=data['recent_transactions'],
+                         upcoming_events=data['upcoming_events'])
+
+def _dashboard_data(chama_ids):
+    """Chama cards, last 10 transactions and next 5 events across the user's chamas"""
+    if not chama_ids:
+        return {'user_chamas': [], 'recent_transactions': [], 'upcoming_events': []}
+    
+    member_counts = dict(db.session.query(
+        chama_members.c.chama_id, db.func.count(chama_members.c.user_id)
+    ).filter(chama_members.c.chama_id.in_(chama_ids)).group_by(chama_members.c.chama_id).all())
+    
+    user_chamas = [{
+        'id': chama.id,
+        'name': chama.name,
+        'status': chama.status or 'active',
+        'member_count': member_counts.get(chama.id, 0),
+        'total_balance': chama.total_balance or 0,
+        'monthly_contribution': chama.monthly_contribution or 0,
+        'formatted_balance': chama.formatted_balance
+    } for chama in Chama.query.filter(Chama.id.in_(chama_ids)).order_by(Chama.id)]
+    
     # Get recent transactions (last 10)
-    recent_transactions = Transaction.query.join(Chama).filter(
-        Chama.id.in_([chama.id for chama in user_chamas])
+    recent_transactions = Transaction.query.options(joinedload(Transaction.user)).filter(
+        Transaction.chama_id.in_(chama_ids)
     ).order_by(desc(Transaction.created_at)).limit(10).all()
     
     # Get upcoming events (next 5)
-    upcoming_events = Event.query.join(Chama).filter(
-        Chama.id.in_([chama.id for chama in user_chamas]),
+    upcoming_events = Event.query.filter(
+        Event.chama_id.in_(chama_ids),
         Event.event_date >= date.today()
     ).order_by(Event.event_date).limit(5).all()
     
-    return render_template('dashboard.html', 
-                         user_chamas=user_chamas,
-                         total_chamas=total_chamas,
-                         total_savings=total_savings,
-                         monthly_contributions=monthly_contributions,
-                         avg_roi=avg_roi,
-                         recent_transactions=recent_transactions,
-                         upcoming_events=upcoming_events)
+    return {
+        'user_chamas': user_chamas,
+        'recent_transactions': [transaction_snapshot(t) for t in recent_transactions],
+        'upcoming_events': [event_snapshot(e) for e in upcoming_events]
+    }
 
 @main.route("/supabase-test")
 def supabase_test():
@@ -134,6 +185,7 @@ def create_chama():
         )
         db.session.execute(membership)
         db.session.commit()
+        invalidate_user_memberships(current_user.id)
         
         return jsonify({'success': True, 'message': 'Chama created successfully!', 'chama_id': chama.id})
     
@@ -180,12 +232,17 @@ def contribute():
             status='completed'
         )
         
-        # Update chama balance if it exists
-        if hasattr(chama, 'total_balance'):
-            chama.total_balance += amount
-        
-        # Add transaction to session and commit
+        # Add transaction and post it to the chama ledger
         db.session.add(transaction)
+        db.session.flush()
+        post_entry(
+            chama_id=chama.id,
+            entry_type='contribution',
+            amount=amount,
+            user_id=current_user.id,
+            transaction_id=transaction.id,
+            description=transaction.description
+        )
         db.session.commit()
         
         current_app.logger.info(f"Contribution recorded successfully: transaction_id={transaction.id}")
@@ -480,6 +537,12 @@ def founder_dashboard():
     total_users = User.query.count()
     verified_users = User.query.filter_by(is_email_verified=True).count()
     
+    # Growth over the last 30 days from the daily rollups
+    from app.utils.analytics_rollup import metric_total
+    today = datetime.utcnow().date()
+    new_users_30d, _ = metric_total('new_users', today - timedelta(days=29), today)
+    _, contribution_volume_30d = metric_total('transactions', today - timedelta(days=29), today, dimension='contribution')
+    
     # Chamas by status
     pending_chamas = Chama.query.filter_by(status='pending').all()
     flagged_chamas = Chama.query.filter_by(status='flagged').all()
@@ -504,6 +567,8 @@ def founder_dashboard():
                          admin_users=admin_users,
                          total_users=total_users,
                          verified_users=verified_users,
+                         new_users_30d=new_users_30d,
+                         contribution_volume_30d=contribution_volume_30d,
                          pending_chamas=pending_chamas,
                          flagged_chamas=flagged_chamas,
                          all_chamas=all_chamas,
@@ -567,54 +632,57 @@ def export_all_chamas():
         flash('Access denied. Founder privileges required.', 'error')
         return redirect(url_for('main.dashboard'))
     
-    import csv
-    from io import StringIO
-    from flask import make_response
+    from sqlalchemy import case
+    from app.models.chama import chama_members
+    from app.utils.csv_export import stream_csv, display_name, YIELD_PER
     
-    # Get all chamas with statistics
-    chamas = Chama.query.all()
+    # Contribution and loan totals for every chama in a single pass over transactions
+    transaction_totals = db.session.query(
+        Transaction.chama_id.label('chama_id'),
+        db.func.sum(case((Transaction.type == 'contribution', Transaction.amount), else_=0)).label('contributions'),
+        db.func.sum(case((Transaction.type == 'loan', Transaction.amount), else_=0)).label('loans')
+    ).group_by(Transaction.chama_id).subquery()
     
-    # Create CSV data
-    output = StringIO()
-    writer = csv.writer(output)
+    member_counts = db.session.query(
+        chama_members.c.chama_id.label('chama_id'),
+        db.func.count().label('member_count')
+    ).group_by(chama_members.c.chama_id).subquery()
     
-    # Write header
-    writer.writerow([
-        'ID', 'Name', 'Admin', 'Status', 'Members Count', 'Total Contributions', 
-        'Total Loans', 'Created Date', 'Description'
-    ])
-    
-    # Write chama data
-    for chama in chamas:
-        # Calculate statistics
-        total_contributions = db.session.query(db.func.sum(Transaction.amount)).filter(
-            Transaction.chama_id == chama.id,
-            Transaction.type == 'contribution'
-        ).scalar() or 0
-        
-        total_loans = db.session.query(db.func.sum(Transaction.amount)).filter(
-            Transaction.chama_id == chama.id,
-            Transaction.type == 'loan'
-        ).scalar() or 0
-        
-        writer.writerow([
-            chama.id,
-            chama.name,
-            chama.creator.full_name if chama.creator else 'N/A',
-            chama.status,
-            len(chama.members),
-            f"KES {total_contributions:,.2f}",
-            f"KES {total_loans:,.2f}",
-            chama.created_at.strftime('%Y-%m-%d') if chama.created_at else 'N/A',
-            chama.description or 'N/A'
-        ])
+    # One grouped query joined to creators, read through a server-side cursor
+    chama_rows = db.session.query(
+        Chama.id, Chama.name, Chama.status, Chama.created_at, Chama.description,
+        User.first_name, User.last_name, User.username,
+        db.func.coalesce(member_counts.c.member_count, 0),
+        db.func.coalesce(transaction_totals.c.contributions, 0),
+        db.func.coalesce(transaction_totals.c.loans, 0)
+    ).outerjoin(User, User.id == Chama.creator_id) \
+     .outerjoin(member_counts, member_counts.c.chama_id == Chama.id) \
+     .outerjoin(transaction_totals, transaction_totals.c.chama_id == Chama.id) \
+     .order_by(Chama.id) \
+     .yield_per(YIELD_PER)
     
-    # Create response
-    response = make_response(output.getvalue())
-    response.headers['Content-Type'] = 'text/csv'
-    response.headers['Content-Disposition'] = f'attachment; filename=chamalink_all_chamas_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv'
+    def rows():
+        for (chama_id, name, status, created_at, description,
+             first_name, last_name, username,
+             member_count, total_contributions, total_loans) in chama_rows:
+            yield [
+                chama_id,
+                name,
+                display_name(first_name, last_name, username, default='N/A'),
+                status,
+                member_count,
+                f"KES {total_contributions:,.2f}",
+                f"KES {total_loans:,.2f}",
+                created_at.strftime('%Y-%m-%d') if created_at else 'N/A',
+                description or 'N/A'
+            ]
     
-    return response
+    return stream_csv(
+        f'chamalink_all_chamas_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv',
+        ['ID', 'Name', 'Admin', 'Status', 'Members Count', 'Total Contributions',
+         'Total Loans', 'Created Date', 'Description'],
+        rows()
+    )
 
 # Test email route has been replaced with production system notification feature
 # System notifications can be sent from the founder dashboard using /api/system-notification
@@ -720,62 +788,33 @@ def send_platform_notice():
         message = data.get('message')
         priority = data.get('priority', 'info')
         send_email = data.get('send_email', False)
+        send_sms = data.get('send_sms', False)
         
         if not title or not message:
             return jsonify({'success': False, 'message': 'Title and message are required'}), 400
         
-        # Import models
-        from app.models.user import User
-        from app.models.chama import Chama
-        from app.models.notification import Notification
+        from app.utils.notification_fanout import start_broadcast, audience_size
         
-        # Get all chama creators and their emails
-        creators = User.query.join(Chama, User.id == Chama.creator_id).distinct().all()
-        
-        notification_count = 0
-        email_count = 0
-        
-        # Create in-app notifications for all chama creators
-        for creator in creators:
-            notification = Notification(
-                user_id=creator.id,
-                title=f"📢 Platform Notice: {title}",
-                message=message,
-                type='system'
-            )
-            db.session.add(notification)
-            notification_count += 1
-        
-        # Send emails if requested
-        if send_email:
-            from app.utils.email_utils import send_system_email
-            for creator in creators:
-                try:
-                    success, _ = send_system_email(
-                        to_email=creator.email,
-                        subject=f"📢 Important Notice from ChamaLink: {title}",
-                        template='emails/platform_notice.html',
-                        user=creator,
-                        title=title,
-                        message=message,
-                        priority=priority
-                    )
-                    if success:
-                        email_count += 1
-                except Exception as e:
-                    print(f"Failed to send email to {creator.email}: {e}")
-        
-        # Commit all notifications
+        # Notifications and emails are fanned out by background jobs
+        broadcast = start_broadcast(
+            'platform_notice', 'chama_creators', title, message,
+            sender=current_user, priority=priority,
+            channels=[channel for channel, wanted in (('email', send_email), ('sms', send_sms)) if wanted]
+        )
+        recipients_count = audience_size('chama_creators')
         db.session.commit()
         
-        result_message = f'Platform notice sent to {notification_count} chama creators'
-        if send_email:
-            result_message += f' ({email_count} emails sent)'
+        result_message = f'Platform notice queued for {recipients_count} chama creators'
+        if send_email or send_sms:
+            result_message += ' (emails/SMS are sent in the background)'
         
         return jsonify({
             'success': True,
-            'message': result_message
-        })
+            'message': result_message,
+            'recipients_count': recipients_count,
+            'broadcast_id': broadcast.id,
+            'status_url': url_for('api.notification_broadcast_status', broadcast_id=broadcast.id)
+        }), 202
     except Exception as e:
         db.session.rollback()
         return jsonify({'success': False, 'message': str(e)}), 500
@@ -993,6 +1032,7 @@ def admin_add_user_to_chama():
         )
         db.session.execute(membership)
         db.session.commit()
+        invalidate_user_memberships(user_id)
         
         return jsonify({
             'success': True, 
@@ -1039,6 +1079,7 @@ def admin_remove_user_from_chama():
             )
         )
         db.session.commit()
+        invalidate_user_memberships(user_id)
         
         return jsonify({
             'success': True, 
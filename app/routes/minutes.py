@@ -14,6 +14,7 @@ from reportlab.lib.units import inch
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, PageBreak
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.enums import TA_CENTER
+from app.utils.documents import minutes_data, serve_document
 
 minutes_bp = Blueprint('minutes', __name__, url_prefix='/minutes')
 
@@ -204,79 +205,13 @@ def download_all_minutes(chama_id):
         flash('Access denied.', 'error')
         return redirect(url_for('main.dashboard'))
     
-    # Get all minutes for this chama
-    minutes_list = MeetingMinutes.query.filter_by(chama_id=chama_id).order_by(
-        MeetingMinutes.meeting_date.desc()
-    ).all()
-    
-    if not minutes_list:
+    if not MeetingMinutes.query.filter_by(chama_id=chama_id).first():
         flash('No minutes found for this chama.', 'info')
         return redirect(url_for('minutes.chama_minutes', chama_id=chama_id))
     
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=letter)
-    elements = []
-    styles = getSampleStyleSheet()
-    
-    # Title page
-    title = Paragraph(f"<b>All Meeting Minutes - {chama.name}</b>", styles['Title'])
-    elements.append(title)
-    elements.append(Spacer(1, 20))
-    
-    subtitle = Paragraph(f"<i>Generated on {datetime.now().strftime('%B %d, %Y')}</i>", styles['Normal'])
-    elements.append(subtitle)
-    elements.append(Spacer(1, 30))
-    
-    # Table of contents
-    toc_title = Paragraph("<b>Table of Contents</b>", styles['Heading1'])
-    elements.append(toc_title)
-    elements.append(Spacer(1, 10))
-    
-    for i, minutes in enumerate(minutes_list, 1):
-        toc_entry = Paragraph(f"{i}. {minutes.title} - {minutes.meeting_date.strftime('%B %d, %Y')}", styles['Normal'])
-        elements.append(toc_entry)
-    
-    elements.append(PageBreak())
-    
-    # Add each minutes document
-    for i, minutes in enumerate(minutes_list, 1):
-        # Minutes header
-        minutes_title = Paragraph(f"<b>{i}. {minutes.title}</b>", styles['Heading1'])
-        elements.append(minutes_title)
-        elements.append(Spacer(1, 10))
-        
-        # Meeting details
-        details = f"<b>Date:</b> {minutes.meeting_date.strftime('%B %d, %Y')}<br/>"
-        details += f"<b>Type:</b> {minutes.meeting_type.title()}<br/>"
-        details += f"<b>Secretary:</b> {minutes.secretary.username}<br/>"
-        if minutes.attendees:
-            details += f"<b>Attendees:</b> {minutes.attendees}<br/>"
-        
-        details_para = Paragraph(details, styles['Normal'])
-        elements.append(details_para)
-        elements.append(Spacer(1, 20))
-        
-        # Content
-        content_title = Paragraph("<b>Meeting Content:</b>", styles['Heading2'])
-        elements.append(content_title)
-        elements.append(Spacer(1, 10))
-        
-        # Split content into paragraphs
-        content_lines = minutes.content.split('\n')
-        for line in content_lines:
-            if line.strip():
-                content_para = Paragraph(line, styles['Normal'])
-                elements.append(content_para)
-        
-        # Add page break between minutes (except for the last one)
-        if i < len(minutes_list):
-            elements.append(PageBreak())
-    
-    doc.build(elements)
-    buffer.seek(0)
-    
     filename = f"{chama.name}_all_minutes_{datetime.now().strftime('%Y%m%d')}.pdf"
-    return send_file(buffer, as_attachment=True, download_name=filename, mimetype='application/pdf')
+    return serve_document('minutes', f'minutes:{chama.id}', lambda: minutes_data(chama), filename,
+                          chama_id=chama.id)
 
 @minutes_bp.route('/chama/<int:chama_id>/save', methods=['POST'])
 @login_required
@@ -20,8 +20,11 @@ from flask_login import current_user
 from app.models import User, Chama, ChamaMember
 from app import db
 from app.utils.api_response import APIResponse, APIValidator, handle_api_exceptions, StatusCode
+from app.utils.permissions import get_user_memberships
+from app.utils.mobile_sync import apply_offline_actions, sync_changes
+from app.utils.transaction_feed import feed_data, parse_filter, etag_json, FEED_PAGE_SIZE, FEED_MAX_PAGE_SIZE
 from werkzeug.security import check_password_hash
-from datetime import timedelta
+from datetime import datetime, timedelta
 import json
 
 mobile_api = Blueprint('mobile_api', __name__, url_prefix='/api/mobile')
@@ -323,51 +326,51 @@ def get_mobile_notifications():
 @mobile_api.route('/sync', methods=['POST'])
 @jwt_required()
 def mobile_sync():
-    """Sync mobile app data with server"""
+    """Delta sync with the mobile app.
+    
+    Body: {"sync_token": "<token from the last sync, omit for a full snapshot>",
+           "offline_actions": [{"idempotency_key": "...", "type": "...", "data": {...}}]}
+    
+    Offline actions are applied first, in one transaction, so the returned
+    changes already include them. Keep syncing while has_more is true.
+    """
     try:
-        user_id = get_jwt_identity()
-        data = request.get_json()
+        user_id = int(get_jwt_identity())
+        user = User.query.get(user_id)
+        
+        if not user:
+            return jsonify({
+                'success': False,
+                'error': 'User not found'
+            }), 404
+        
+        data = request.get_json(silent=True) or {}
         
         # Handle offline data sync
-        offline_actions = data.get('offline_actions', [])
-        sync_results = []
-        
-        for action in offline_actions:
-            try:
-                # Process offline action
-                action_type = action.get('type')
-                action_data = action.get('data')
-                
-                if action_type == 'update_profile':
-                    user = User.query.get(user_id)
-                    if user:
-                        user.first_name = action_data.get('first_name', user.first_name)
-                        user.last_name = action_data.get('last_name', user.last_name)
-                        db.session.commit()
-                
-                sync_results.append({
-                    'action_id': action.get('id'),
-                    'status': 'success'
-                })
-                
-            except Exception as e:
-                sync_results.append({
-                    'action_id': action.get('id'),
-                    'status': 'error',
-                    'error': str(e)
-                })
-        
-        # Return latest data for sync
+        sync_results = apply_offline_actions(user, data.get('offline_actions') or [])
+        if sync_results:
+            db.session.commit()
+        
+        try:
+            delta = sync_changes(user_id, data.get('sync_token'))
+        except ValueError:
+            return jsonify({
+                'success': False,
+                'error': 'Invalid sync token'
+            }), 400
+        
+        delta.update({
+            'sync_results': sync_results,
+            'server_timestamp': datetime.utcnow().isoformat() + 'Z',
+            'sync_status': 'partial' if delta['has_more'] else 'complete'
+        })
         return jsonify({
             'success': True,
-            'data': {
-                'sync_results': sync_results,
-                'server_timestamp': '2025-07-12T15:30:00Z',
-                'sync_status': 'complete'
-            }
+            'data': delta
         })
         
     except Exception as e:
+        db.session.rollback()
         return jsonify({
             'success': False,
             'error': str(e)
@@ -444,12 +447,40 @@ def get_mobile_app_config():
             'error': str(e)
         }), 500
 
+def _feed_args():
+    """Cursor, page size and SQL filters shared by the transaction endpoints"""
+    limit = min(max(request.args.get('limit', FEED_PAGE_SIZE, type=int), 1), FEED_MAX_PAGE_SIZE)
+    return {
+        'cursor': request.args.get('cursor') or None,
+        'limit': limit,
+        'types': parse_filter(request.args.get('type')),
+        'statuses': parse_filter(request.args.get('status'))
+    }
+
+def _transaction_feed(chama_ids):
+    """Page of transactions plus filtered totals, served with an ETag"""
+    args = _feed_args()
+    try:
+        data, etag = feed_data(chama_ids, args['cursor'], args['limit'], types=args['types'],
+                               statuses=args['statuses'])
+    except ValueError:
+        return jsonify({
+            'success': False,
+            'error': 'Invalid cursor'
+        }), 400
+    
+    return etag_json(data, etag)
+
 @mobile_api.route('/transactions', methods=['GET'])
 @jwt_required()
 def get_transactions():
-    """Get user's transactions for mobile app"""
+    """Get user's transactions across all their chamas, newest first.
+    
+    Query params: cursor (from pagination.next_cursor), limit (max 100),
+    type and status (comma-separated). Send If-None-Match to revalidate.
+    """
     try:
-        user_id = get_jwt_identity()
+        user_id = int(get_jwt_identity())
         user = User.query.get(user_id)
         
         if not user:
@@ -458,52 +489,7 @@ def get_transactions():
                 'error': 'User not found'
             }), 404
         
-        # Get transactions from user's chamas
-        transactions = []
-        for membership in user.chama_memberships:
-            chama = membership.chama
-            # This would typically fetch from a Transaction model
-            # For now, return mock data structure
-            transactions.extend([
-                {
-                    'id': f'txn_{chama.id}_001',
-                    'chama_id': chama.id,
-                    'chama_name': chama.name,
-                    'type': 'contribution',
-                    'amount': 5000,
-                    'currency': 'KSH',
-                    'date': '2025-07-29T10:00:00Z',
-                    'status': 'completed',
-                    'description': 'Monthly contribution'
-                },
-                {
-                    'id': f'txn_{chama.id}_002',
-                    'chama_id': chama.id,
-                    'chama_name': chama.name,
-                    'type': 'withdrawal',
-                    'amount': 2000,
-                    'currency': 'KSH',
-                    'date': '2025-07-25T14:30:00Z',
-                    'status': 'pending',
-                    'description': 'Emergency withdrawal request'
-                }
-            ])
-        
-        # Sort by date (newest first)
-        transactions.sort(key=lambda x: x['date'], reverse=True)
-        
-        return jsonify({
-            'success': True,
-            'data': {
-                'transactions': transactions,
-                'total_count': len(transactions),
-                'summary': {
-                    'total_contributions': sum(t['amount'] for t in transactions if t['type'] == 'contribution'),
-                    'total_withdrawals': sum(t['amount'] for t in transactions if t['type'] == 'withdrawal'),
-                    'pending_count': sum(1 for t in transactions if t['status'] == 'pending')
-                }
-            }
-        })
+        return _transaction_feed(list(get_user_memberships(user_id)))
         
     except Exception as e:
         return jsonify({
@@ -514,9 +500,9 @@ def get_transactions():
 @mobile_api.route('/transactions/<int:chama_id>', methods=['GET'])
 @jwt_required()
 def get_chama_transactions(chama_id):
-    """Get transactions for a specific chama"""
+    """Get transactions for a specific chama (same query params as /transactions)"""
     try:
-        user_id = get_jwt_identity()
+        user_id = int(get_jwt_identity())
         user = User.query.get(user_id)
         
         if not user:
@@ -526,12 +512,7 @@ def get_chama_transactions(chama_id):
             }), 404
         
         # Check if user is member of this chama
-        membership = ChamaMember.query.filter_by(
-            user_id=user_id,
-            chama_id=chama_id
-        ).first()
-        
-        if not membership:
+        if chama_id not in get_user_memberships(user_id):
             return jsonify({
                 'success': False,
                 'error': 'Access denied'
@@ -544,54 +525,7 @@ def get_chama_transactions(chama_id):
                 'error': 'Chama not found'
             }), 404
         
-        # Get pagination parameters
-        page = request.args.get('page', 1, type=int)
-        per_page = request.args.get('per_page', 50, type=int)
-        transaction_type = request.args.get('type')  # 'contribution', 'withdrawal', etc.
-        
-        # Mock transactions for this chama
-        all_transactions = [
-            {
-                'id': f'txn_{chama_id}_{i:03d}',
-                'chama_id': chama_id,
-                'chama_name': chama.name,
-                'type': 'contribution' if i % 3 != 0 else 'withdrawal',
-                'amount': 5000 if i % 3 != 0 else 2000,
-                'currency': 'KSH',
-                'date': f'2025-07-{29-i:02d}T{10+i%12:02d}:00:00Z',
-                'status': 'completed' if i % 4 != 0 else 'pending',
-                'description': f'Transaction #{i:03d}',
-                'member_name': user.username,
-                'reference': f'REF{chama_id}{i:06d}'
-            } for i in range(1, 101)  # 100 mock transactions
-        ]
-        
-        # Filter by type if specified
-        if transaction_type:
-            all_transactions = [t for t in all_transactions if t['type'] == transaction_type]
-        
-        # Pagination
-        start = (page - 1) * per_page
-        end = start + per_page
-        transactions = all_transactions[start:end]
-        
-        return jsonify({
-            'success': True,
-            'data': {
-                'transactions': transactions,
-                'pagination': {
-                    'page': page,
-                    'per_page': per_page,
-                    'total': len(all_transactions),
-                    'pages': (len(all_transactions) + per_page - 1) // per_page
-                },
-                'summary': {
-                    'total_contributions': sum(t['amount'] for t in all_transactions if t['type'] == 'contribution'),
-                    'total_withdrawals': sum(t['amount'] for t in all_transactions if t['type'] == 'withdrawal'),
-                    'balance': sum(t['amount'] if t['type'] == 'contribution' else -t['amount'] for t in all_transactions if t['status'] == 'completed')
-                }
-            }
-        })
+        return _transaction_feed([chama_id])
         
     except Exception as e:
         return jsonify({
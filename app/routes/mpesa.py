@@ -1,9 +1,13 @@
-from flask import Blueprint, request, jsonify, flash, redirect, url_for
+from flask import Blueprint, request, jsonify, flash, redirect, url_for, current_app
 from flask_login import login_required, current_user
 from app.models import Chama, Transaction, MpesaTransaction, User
 from app.utils.mpesa import get_mpesa_api
 from app.utils.permissions import user_can_access_chama
-from app import db
+from app.utils.ledger import post_entry
+from app.utils.mpesa_async import queue_stk_push, query_payment_status
+from app.utils.mpesa_callbacks import record_callback, settle_payment
+from app.utils.fraud_scoring import score_payment
+from app import db, csrf
 from datetime import datetime
 
 mpesa_bp = Blueprint('mpesa', __name__, url_prefix='/mpesa')
@@ -45,10 +49,33 @@ def initiate_payment():
         db.session.add(transaction)
         db.session.flush()  # Get transaction ID
         
+        # Score the payment before any prompt reaches the phone
+        fraud_score = score_payment(transaction, phone_number)
+        if fraud_score is not None and fraud_score.decision == 'block':
+            transaction.status = 'failed'
+            transaction.description = f'{transaction.description} (blocked by fraud screening)'
+            db.session.commit()
+            return jsonify({
+                'success': False,
+                'message': 'This payment could not be processed. Please contact support if you believe this is an error.'
+            }), 403
+        
         # Initiate M-Pesa payment
         account_reference = f"CHAMA{chama_id}T{transaction.id}"
         transaction_desc = f"Contribution to {chama.name}"
         
+        if current_app.config.get('MPESA_ASYNC_STK_PUSH'):
+            # Hand the Daraja call to a job worker and answer immediately
+            mpesa_transaction = queue_stk_push(transaction, phone_number, account_reference, transaction_desc)
+            db.session.commit()
+            
+            return jsonify({
+                'success': True,
+                'message': 'Payment request received. You will get an M-Pesa prompt on your phone shortly.',
+                'payment_id': mpesa_transaction.id,
+                'checkout_request_id': None
+            }), 202
+        
         mpesa_result = get_mpesa_api().stk_push(
             phone_number=phone_number,
             amount=amount,
@@ -96,61 +123,86 @@ def check_payment_status():
     try:
         data = request.get_json()
         checkout_request_id = data.get('checkout_request_id')
+        payment_id = data.get('payment_id')
         
-        if not checkout_request_id:
+        if not checkout_request_id and not payment_id:
             return jsonify({'success': False, 'message': 'Checkout request ID is required'}), 400
         
         # Get the M-Pesa transaction
-        mpesa_transaction = MpesaTransaction.query.filter_by(
-            checkout_request_id=checkout_request_id,
-            user_id=current_user.id
-        ).first()
+        query = MpesaTransaction.query.filter_by(user_id=current_user.id)
+        if checkout_request_id:
+            query = query.filter_by(checkout_request_id=checkout_request_id)
+        else:
+            query = query.filter_by(id=payment_id)
+        mpesa_transaction = query.first()
         
         if not mpesa_transaction:
             return jsonify({'success': False, 'message': 'Transaction not found'}), 404
         
-        # Check payment status with M-Pesa
-        status_result = get_mpesa_api().query_transaction_status(checkout_request_id)
-        
-        if status_result.get('ResultCode') == '0':
-            # Payment successful
-            mpesa_transaction.status = 'completed'
-            mpesa_transaction.mpesa_receipt_number = status_result.get('MpesaReceiptNumber')
-            mpesa_transaction.transaction_date = datetime.now()
-            mpesa_transaction.result_code = status_result.get('ResultCode')
-            mpesa_transaction.result_desc = status_result.get('ResultDesc')
-            
-            # Update the main transaction
-            transaction = mpesa_transaction.transaction
-            transaction.status = 'completed'
-            
-            # Update chama balance
-            chama = Chama.query.get(mpesa_transaction.chama_id)
-            chama.total_balance += mpesa_transaction.amount
-            
-            db.session.commit()
-            
+        # Settled payments (e.g. by the callback) need no trip to Daraja
+        if mpesa_transaction.status == 'completed':
             return jsonify({
                 'success': True,
                 'status': 'completed',
                 'message': 'Payment completed successfully',
                 'receipt_number': mpesa_transaction.mpesa_receipt_number
             })
-        elif status_result.get('ResultCode') == '1032':
-            # Payment cancelled by user
-            mpesa_transaction.status = 'failed'
-            mpesa_transaction.result_code = status_result.get('ResultCode')
-            mpesa_transaction.result_desc = 'Payment cancelled by user'
-            
-            transaction = mpesa_transaction.transaction
-            transaction.status = 'failed'
+        if mpesa_transaction.status == 'failed':
+            cancelled = mpesa_transaction.result_code == '1032'
+            return jsonify({
+                'success': False,
+                'status': 'cancelled' if cancelled else 'failed',
+                'message': 'Payment was cancelled' if cancelled else (mpesa_transaction.result_desc or 'Payment failed')
+            })
+        if mpesa_transaction.status == 'queued':
+            return jsonify({
+                'success': True,
+                'status': 'pending',
+                'message': 'Sending payment request to your phone'
+            })
+        
+        # Check payment status with M-Pesa (throttled per checkout)
+        checkout_request_id = mpesa_transaction.checkout_request_id
+        status_result = query_payment_status(checkout_request_id)
+        
+        if status_result.get('ResultCode') in ('0', '1032'):
+            succeeded = status_result.get('ResultCode') == '0'
+            values = {'result_code': status_result.get('ResultCode')}
+            if succeeded:
+                values.update(mpesa_receipt_number=status_result.get('MpesaReceiptNumber'),
+                              transaction_date=datetime.now(), result_desc=status_result.get('ResultDesc'))
+            else:
+                values['result_desc'] = 'Payment cancelled by user'
             
+            # Only the writer that moves the payment out of pending updates the
+            # transaction and credits the chama; a callback batch may have won
+            if settle_payment(mpesa_transaction, 'completed' if succeeded else 'failed', **values):
+                transaction = mpesa_transaction.transaction
+                transaction.status = 'completed' if succeeded else 'failed'
+                if succeeded:
+                    # Update chama balance
+                    post_entry(
+                        chama_id=mpesa_transaction.chama_id,
+                        entry_type='contribution',
+                        amount=mpesa_transaction.amount,
+                        user_id=mpesa_transaction.user_id,
+                        transaction_id=transaction.id,
+                        description=f'M-Pesa {mpesa_transaction.mpesa_receipt_number}'
+                    )
             db.session.commit()
             
+            if mpesa_transaction.status == 'completed':
+                return jsonify({
+                    'success': True,
+                    'status': 'completed',
+                    'message': 'Payment completed successfully',
+                    'receipt_number': mpesa_transaction.mpesa_receipt_number
+                })
+            cancelled = mpesa_transaction.result_code == '1032'
             return jsonify({
                 'success': False,
-                'status': 'cancelled',
-                'message': 'Payment was cancelled'
+                'status': 'cancelled' if cancelled else 'failed',
+                'message': 'Payment was cancelled' if cancelled else (mpesa_transaction.result_desc or 'Payment failed')
             })
         else:
             # Payment still pending or failed
@@ -158,65 +210,31 @@ def check_payment_status():
             return jsonify({
                 'success': True,
                 'status': status,
-                'message': status_result.get('ResultDesc', 'Payment pending')
+                'message': status_result.get('ResultDesc', 'Payment pending'),
+                'checkout_request_id': checkout_request_id
             })
             
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
 
 @mpesa_bp.route('/callback', methods=['POST'])
+@csrf.exempt
 def mpesa_callback():
-    """Handle M-Pesa callback"""
+    """Handle M-Pesa callback: store it in the inbox and acknowledge at once"""
     try:
         callback_data = request.get_json()
         
-        # Extract relevant data from callback
-        result_code = callback_data.get('Body', {}).get('stkCallback', {}).get('ResultCode')
-        result_desc = callback_data.get('Body', {}).get('stkCallback', {}).get('ResultDesc')
-        checkout_request_id = callback_data.get('Body', {}).get('stkCallback', {}).get('CheckoutRequestID')
-        
-        # Find the M-Pesa transaction
-        mpesa_transaction = MpesaTransaction.query.filter_by(
-            checkout_request_id=checkout_request_id
-        ).first()
-        
-        if not mpesa_transaction:
-            return jsonify({'success': False, 'message': 'Transaction not found'}), 404
-        
-        # Update transaction status
-        mpesa_transaction.result_code = str(result_code)
-        mpesa_transaction.result_desc = result_desc
-        
-        if result_code == 0:
-            # Payment successful
-            callback_metadata = callback_data.get('Body', {}).get('stkCallback', {}).get('CallbackMetadata', {})
-            items = callback_metadata.get('Item', [])
-            
-            for item in items:
-                if item.get('Name') == 'MpesaReceiptNumber':
-                    mpesa_transaction.mpesa_receipt_number = item.get('Value')
-                elif item.get('Name') == 'TransactionDate':
-                    mpesa_transaction.transaction_date = datetime.now()
-            
-            mpesa_transaction.status = 'completed'
-            
-            # Update main transaction
-            transaction = mpesa_transaction.transaction
-            transaction.status = 'completed'
-            
-            # Update chama balance
-            chama = Chama.query.get(mpesa_transaction.chama_id)
-            chama.total_balance += mpesa_transaction.amount
-            
-        else:
-            # Payment failed
-            mpesa_transaction.status = 'failed'
-            transaction = mpesa_transaction.transaction
-            transaction.status = 'failed'
+        if not record_callback(callback_data):
+            # Safaricom retry of a callback we already hold
+            return jsonify({'success': True, 'message': 'Callback already received'}), 200
         
         db.session.commit()
         
-        return jsonify({'success': True, 'message': 'Callback processed'}), 200
+        return jsonify({'success': True, 'message': 'Callback received'}), 200
         
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': str(e)}), 400
     except Exception as e:
+        db.session.rollback()
         return jsonify({'success': False, 'message': str(e)}), 500
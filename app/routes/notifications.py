@@ -2,6 +2,7 @@ from flask import Blueprint, render_template, request, redirect, url_for, flash,
 from flask_login import login_required, current_user
 from app.models.chama import Chama, chama_members
 from app.models.notification import Notification
+from app.utils.notification_counters import get_unread_count
 from app import db
 from datetime import datetime
 from sqlalchemy import desc, and_
@@ -50,7 +51,7 @@ def mark_all_read():
 @login_required
 def notification_count():
     """Get unread notification count"""
-    count = Notification.query.filter_by(user_id=current_user.id, is_read=False).count()
+    count = get_unread_count(current_user.id)
     return jsonify({'count': count})
 
 @notifications_bp.route('/group')
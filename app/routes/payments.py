@@ -6,10 +6,9 @@ from app.models import (
 )
 from app.models.chama import chama_members as chama_members_table  # Import with alias to avoid conflicts
 from app.utils.permissions import chama_member_required
+from app.utils.csv_export import stream_csv, merge_sorted, display_name, YIELD_PER
 from app import db
 from datetime import datetime, timedelta
-import csv
-import io
 from sqlalchemy import func, or_, and_
 
 payments_bp = Blueprint('payments', __name__, url_prefix='/payments')
@@ -97,46 +96,33 @@ def export_comprehensive_history(chama_id):
         flash('You are not a member of this chama.', 'error')
         return redirect(url_for('main.dashboard'))
     
-    # Get comprehensive payment data
-    all_payments = get_comprehensive_payment_data(chama_id, member)
-    
-    # Generate CSV
-    output = io.StringIO()
-    writer = csv.writer(output)
+    is_manager = member.role in ['admin', 'treasurer']
     
     # Write headers
     headers = ['Date', 'Time', 'Type', 'Amount', 'Method', 'Status', 
                'Transaction ID', 'Description']
-    if member.role in ['admin', 'treasurer']:
+    if is_manager:
         headers.insert(2, 'Member')
     
-    writer.writerow(headers)
-    
-    # Write data
-    for payment in all_payments:
-        row = [
-            payment.created_at.strftime('%Y-%m-%d'),
-            payment.created_at.strftime('%H:%M:%S'),
-            payment.type.replace('_', ' ').title(),
-            f'KES {payment.amount:,.2f}',
-            (payment.payment_method or 'Unknown').title(),
-            payment.status.title(),
-            payment.transaction_id or payment.mpesa_receipt_number or 'N/A',
-            payment.description or ''
-        ]
-        
-        if member.role in ['admin', 'treasurer']:
-            row.insert(2, payment.user.full_name if payment.user else 'System')
-        
-        writer.writerow(row)
-    
-    output.seek(0)
-    
-    response = make_response(output.getvalue())
-    response.headers['Content-Type'] = 'text/csv'
-    response.headers['Content-Disposition'] = f'attachment; filename={chama.name}_comprehensive_payment_history.csv'
-    
-    return response
+    def rows():
+        for payment in iter_comprehensive_payment_rows(chama_id, member):
+            row = [
+                payment['created_at'].strftime('%Y-%m-%d'),
+                payment['created_at'].strftime('%H:%M:%S'),
+                payment['type'].replace('_', ' ').title(),
+                f"KES {payment['amount']:,.2f}",
+                (payment['payment_method'] or 'Unknown').title(),
+                (payment['status'] or '').title(),
+                payment['reference'] or 'N/A',
+                payment['description'] or ''
+            ]
+            
+            if is_manager:
+                row.insert(2, payment['member_name'])
+            
+            yield row
+    
+    return stream_csv(f'{chama.name}_comprehensive_payment_history.csv', headers, rows())
 
 @payments_bp.route('/api/payment-details/<int:payment_id>')
 @login_required
@@ -217,6 +203,61 @@ def get_comprehensive_payment_data(chama_id, member):
     
     return all_payments
 
+def iter_comprehensive_payment_rows(chama_id, member):
+    """Stream the same payments as get_comprehensive_payment_data, newest first.
+    
+    Each source is read through a server-side cursor already sorted by date and
+    the streams are merged lazily, so memory stays flat for any history size.
+    """
+    own_only = member.role not in ['admin', 'treasurer']
+    
+    def source(model, date_column, columns, filters):
+        query = db.session.query(
+            date_column, *columns, User.first_name, User.last_name, User.username
+        ).outerjoin(User, User.id == model.user_id).filter(model.chama_id == chama_id, *filters)
+        if own_only:
+            query = query.filter(model.user_id == current_user.id)
+        for created_at, payment_type, amount, method, status, reference, description, first_name, last_name, username in \
+                query.order_by(date_column.desc()).yield_per(YIELD_PER):
+            if created_at is None:
+                continue
+            yield {
+                'created_at': created_at,
+                'type': payment_type,
+                'amount': amount,
+                'payment_method': method,
+                'status': status,
+                'reference': reference,
+                'description': description,
+                'member_name': display_name(first_name, last_name, username)
+            }
+    
+    contributions = source(Contribution, Contribution.created_at, [
+        Contribution.type, Contribution.amount, Contribution.payment_method,
+        Contribution.status, Contribution.transaction_id, Contribution.description
+    ], [])
+    
+    transactions = source(Transaction, Transaction.created_at, [
+        Transaction.type, Transaction.amount, Transaction.payment_method,
+        Transaction.status, Transaction.transaction_id, Transaction.description
+    ], [Transaction.type.in_(['loan_repayment', 'loan_disbursement', 'penalty_payment'])])
+    
+    # M-Pesa payments not already represented by a contribution or transaction
+    recorded_contribution = db.session.query(Contribution.id).filter(
+        Contribution.transaction_id == MpesaTransaction.checkout_request_id
+    ).exists()
+    recorded_transaction = db.session.query(Transaction.id).filter(
+        Transaction.transaction_id == MpesaTransaction.checkout_request_id
+    ).exists()
+    mpesa = source(MpesaTransaction, MpesaTransaction.created_date, [
+        db.literal('mpesa_payment'), MpesaTransaction.amount, db.literal('mpesa'),
+        MpesaTransaction.status,
+        func.coalesce(MpesaTransaction.mpesa_receipt_number, MpesaTransaction.checkout_request_id),
+        MpesaTransaction.transaction_desc
+    ], [~recorded_contribution, ~recorded_transaction])
+    
+    return merge_sorted(contributions, transactions, mpesa, key=lambda p: p['created_at'], reverse=True)
+
 def calculate_payment_summary(payments):
     """Calculate summary statistics for payments"""
     summary = {
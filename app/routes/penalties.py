@@ -6,6 +6,7 @@ from app.models import (
 )
 from app.utils.permissions import chama_member_required, chama_admin_required, user_can_access_chama
 from app.utils.mpesa import initiate_stk_push
+from app.utils.ledger import post_entry
 from app import db
 from datetime import datetime, timedelta
 from sqlalchemy import desc, and_
@@ -165,9 +166,18 @@ def pay_penalty(penalty_id):
                 chama_id=penalty.chama_id
             )
             
+            db.session.add(transaction)
+            db.session.flush()
+            
             # Update chama balance
-            chama = Chama.query.get(penalty.chama_id)
-            chama.total_balance += penalty.amount
+            post_entry(
+                chama_id=penalty.chama_id,
+                entry_type='penalty_payment',
+                amount=penalty.amount,
+                user_id=current_user.id,
+                transaction_id=transaction.id,
+                description=transaction.description
+            )
             
             # Create M-Pesa transaction record
             mpesa_transaction = MpesaTransaction(
@@ -181,7 +191,6 @@ def pay_penalty(penalty_id):
                 transaction_id=transaction.id
             )
             
-            db.session.add(transaction)
             db.session.add(mpesa_transaction)
             db.session.commit()
             
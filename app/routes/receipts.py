@@ -1,25 +1,15 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, make_response
 from flask_login import login_required, current_user
-from app.models.chama import Chama, Contribution, Receipt, chama_members
+from app.models.chama import Chama, ChamaMember, Contribution, Receipt, chama_members
 from app.models.user import User
 from app import db
+from app.utils.documents import (REPORTLAB_AVAILABLE as PDF_AVAILABLE, receipt_data, statements_data,
+                                 statement_key, period_bounds, serve_document)
 from datetime import datetime
 import io
 import csv
 import uuid
 
-# Optional PDF generation imports - graceful fallback if not available
-try:
-    from reportlab.lib.pagesizes import letter
-    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
-    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-    from reportlab.lib.units import inch
-    from reportlab.lib import colors
-    from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
-    PDF_AVAILABLE = True
-except ImportError:
-    PDF_AVAILABLE = False
-
 receipts_bp = Blueprint('receipts', __name__)
 
 @receipts_bp.route('/receipt/<int:receipt_id>')
@@ -44,7 +34,7 @@ def view_receipt(receipt_id):
 @receipts_bp.route('/receipt/<int:receipt_id>/download')
 @login_required
 def download_receipt(receipt_id):
-    """Download receipt as PDF"""
+    """Download receipt as PDF, rendered once and then served from storage"""
     if not PDF_AVAILABLE:
         flash('PDF generation is temporarily unavailable. Please contact support.', 'error')
         return redirect(url_for('receipts.view_receipt', receipt_id=receipt_id))
@@ -53,82 +43,45 @@ def download_receipt(receipt_id):
     
     # Check if user has access to this receipt
     if receipt.user_id != current_user.id:
-        member = ChamaMember.query.filter_by(
-            user_id=current_user.id,
-            chama_id=receipt.chama_id
-        ).first()
+        member = ChamaMember.get_by_user_chama(current_user.id, receipt.chama_id)
         
         if not member or member.role not in ['admin', 'treasurer']:
             flash('You do not have permission to download this receipt.', 'error')
             return redirect(url_for('main.dashboard'))
     
-    # Generate PDF
-    buffer = io.BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=letter)
-    styles = getSampleStyleSheet()
-    story = []
-    
-    # Title
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=24,
-        spaceAfter=30,
-        alignment=TA_CENTER
-    )
-    story.append(Paragraph("PAYMENT RECEIPT", title_style))
-    story.append(Spacer(1, 20))
-    
-    # Receipt details
-    receipt_data = [
-        ['Receipt No:', receipt.receipt_number],
-        ['Date:', receipt.generated_at.strftime('%Y-%m-%d %H:%M')],
-        ['Chama:', receipt.chama.name],
-        ['Member:', receipt.user.full_name],
-        ['Payment Type:', receipt.payment_type.title()],
-        ['Amount:', f'KES {receipt.amount:,.2f}'],
-        ['Status:', receipt.status.title()],
-    ]
-    
-    if receipt.transaction_id:
-        receipt_data.append(['Transaction ID:', receipt.transaction_id])
-    
-    if receipt.notes:
-        receipt_data.append(['Notes:', receipt.notes])
-    
-    receipt_table = Table(receipt_data, colWidths=[2*inch, 4*inch])
-    receipt_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (0, -1), colors.grey),
-        ('TEXTCOLOR', (0, 0), (0, -1), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
-        ('FONTSIZE', (0, 0), (-1, -1), 12),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 12),
-        ('BACKGROUND', (1, 0), (1, -1), colors.beige),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black)
-    ]))
-    
-    story.append(receipt_table)
-    story.append(Spacer(1, 30))
-    
-    # Footer
-    footer_style = ParagraphStyle(
-        'Footer',
-        parent=styles['Normal'],
-        fontSize=10,
-        alignment=TA_CENTER
+    # Receipts never change once issued, so a stored copy is always current
+    return serve_document(
+        'receipt', f'receipt:{receipt.id}', lambda: receipt_data(receipt),
+        f'receipt_{receipt.receipt_number}.pdf',
+        chama_id=receipt.chama_id, user_id=receipt.user_id, immutable=True
     )
-    story.append(Paragraph("This is an official receipt generated by ChamaLink", footer_style))
-    story.append(Paragraph(f"Generated on: {datetime.now().strftime('%Y-%m-%d %H:%M')}", footer_style))
+
+@receipts_bp.route('/chama/<int:chama_id>/statement/<period>')
+@login_required
+def download_statement(chama_id, period):
+    """Download the member's statement for a month (YYYY-MM)"""
+    if not PDF_AVAILABLE:
+        flash('PDF generation is temporarily unavailable. Please contact support.', 'error')
+        return redirect(url_for('main.dashboard'))
     
-    doc.build(story)
-    buffer.seek(0)
+    try:
+        period_bounds(period)
+    except ValueError:
+        flash('Invalid statement period.', 'error')
+        return redirect(url_for('receipts.my_receipts'))
     
-    response = make_response(buffer.getvalue())
-    response.headers['Content-Type'] = 'application/pdf'
-    response.headers['Content-Disposition'] = f'attachment; filename=receipt_{receipt.receipt_number}.pdf'
+    chama = Chama.query.get_or_404(chama_id)
+    if not ChamaMember.get_by_user_chama(current_user.id, chama.id):
+        flash('You are not a member of this chama.', 'error')
+        return redirect(url_for('main.dashboard'))
     
-    return response
+    # Normally rendered by the month-end job; rendered here if that has not run yet
+    return serve_document(
+        'statement', statement_key(chama.id, current_user.id, period),
+        lambda: statements_data(chama.id, period, user_ids=[current_user.id])[current_user.id],
+        f'{chama.name}_statement_{period}.pdf',
+        chama_id=chama.id, user_id=current_user.id
+    )
 
 @receipts_bp.route('/chama/<int:chama_id>/receipts')
 @login_required
@@ -1,17 +1,63 @@
 from flask import Blueprint, render_template, request, jsonify
-from flask_login import login_required
+from flask_login import login_required, current_user
+from werkzeug.utils import secure_filename
+from app.models import ReconciliationRun
+from app.utils.permissions import admin_api_required, is_system_admin
+from app.utils.reconciliation import queue_statement
+from app import db
 
 reconciliation_bp = Blueprint('reconciliation', __name__, url_prefix='/reconciliation')
 
+# Runs listed on the dashboard
+RECONCILIATION_RECENT_RUNS = 20
+
+# Exceptions of the selected run shown on the dashboard
+RECONCILIATION_ITEMS_SHOWN = 200
+
 @reconciliation_bp.route('/')
 @login_required
 def reconciliation_dashboard():
     """Automated reconciliation dashboard."""
-    # TODO: Show reconciliation results
-    return render_template('reconciliation/dashboard.html', results=[])
+    is_admin = is_system_admin(current_user)
+    runs, selected, items = [], None, []
+    if is_admin:
+        runs = ReconciliationRun.query.order_by(ReconciliationRun.created_at.desc()).limit(
+            RECONCILIATION_RECENT_RUNS).all()
+        run_id = request.args.get('run', type=int)
+        selected = db.session.get(ReconciliationRun, run_id) if run_id else (runs[0] if runs else None)
+        if selected is not None:
+            items = selected.items.limit(RECONCILIATION_ITEMS_SHOWN).all()
+    return render_template('reconciliation/dashboard.html', results=runs, selected=selected, items=items,
+                           is_admin=is_admin)
 
 @reconciliation_bp.route('/api/check', methods=['POST'])
 @login_required
+@admin_api_required
 def check_reconciliation():
-    # TODO: Implement reconciliation logic
-    return jsonify({'status': 'ok', 'message': 'Reconciliation complete.'})
+    """Queue reconciliation of an uploaded M-Pesa or bank statement (CSV)"""
+    statement = request.files.get('statement')
+    if statement is None or not statement.filename:
+        return jsonify({'status': 'error', 'message': 'Upload a statement file as "statement".'}), 400
+    filename = secure_filename(statement.filename)
+    if not filename.lower().endswith('.csv'):
+        return jsonify({'status': 'error', 'message': 'Statements must be CSV exports.'}), 400
+
+    run = queue_statement(statement, filename, user_id=current_user.id)
+    db.session.commit()
+    return jsonify({
+        'status': 'queued',
+        'message': f'Reconciling {filename}.',
+        'run_id': run.id
+    }), 202
+
+@reconciliation_bp.route('/api/runs/<int:run_id>')
+@login_required
+@admin_api_required
+def reconciliation_run(run_id):
+    """Progress and totals of a reconciliation run, with its first exceptions"""
+    run = db.session.get(ReconciliationRun, run_id)
+    if run is None:
+        return jsonify({'status': 'error', 'message': 'Run not found'}), 404
+    result = run.to_dict()
+    result['items'] = [item.to_dict() for item in run.items.limit(RECONCILIATION_ITEMS_SHOWN)]
+    return jsonify(result)
@@ -4,6 +4,7 @@ from app import db
 from app.models.subscription import SubscriptionPlan, UserSubscription, SubscriptionPayment
 from app.utils.mpesa import initiate_subscription_payment
 from app.utils.email_service import send_subscription_email
+from app.utils.subscription_middleware import invalidate_subscription_state
 from datetime import datetime, timedelta
 import logging
 
@@ -135,6 +136,7 @@ def process_multi_month_payment():
             payment.subscription_id = new_subscription.id
         
         db.session.commit()
+        invalidate_subscription_state()
         
         return jsonify({
             'success': True,
@@ -0,0 +1,613 @@
+"""
+CHAMAlink AML Transaction Monitoring
+====================================
+Anti-money-laundering rules evaluated over the transactions and M-Pesa
+payments tables as they grow.
+
+Each table is read as a stream: an AmlCursor row records the last id
+evaluated, and the monitor job reads the rows after it in id order. Rules
+are evaluated incrementally against per-user sliding windows kept in
+memory (a deque and running total per window length), so evaluating a
+payment costs the same whether the user has ten transactions or ten
+thousand; history is never rescanned. When a process starts, or finds
+that another process moved the cursor, it rebuilds its windows from just
+the rows inside the longest window before the cursor.
+
+Rules:
+    large_transaction  - one transaction at or above AML_LARGE_TRANSACTION
+    rapid_transactions - AML_VELOCITY_COUNT transactions within AML_VELOCITY_WINDOW
+    structuring        - transactions each below the large-transaction
+                         threshold that together reach it within a day
+    cross_border       - foreign currency, or a non-Kenyan phone number
+Windowed rules fire once per user per window rather than on every later
+transaction in a burst.
+
+Cursors advance with a compare-and-set, so any number of workers can run
+the monitor: the one that loses the race discards its results.
+
+Ids are handed out at insert but rows become visible at commit, so a row
+can commit after the monitor has read past its id. The live engine notes
+the ids missing from each batch it reads; every monitor run looks for
+those that have since appeared (for up to AML_LATE_ROW_WINDOW seconds)
+and re-evaluates the stream from the first of them. The re-evaluation
+replays the alerts already raised, so it keeps their cooldowns and only
+adds what the late rows change; alerts are unique per (row, rule). Commits
+that insert monitored rows wake the monitor (at most once every
+AML_WAKE_INTERVAL seconds per process); a periodic task catches anything
+else, such as bulk inserts. History from before monitoring started is
+evaluated by backfill jobs in chunks of AML_BACKFILL_CHUNK rows.
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta
+from sqlalchemy import event, func, insert, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app import db
+from app.utils.jobs import job_handler, periodic_task, enqueue_job
+
+logger = logging.getLogger(__name__)
+
+AML_LARGE_TRANSACTION = float(os.getenv('AML_LARGE_TRANSACTION', 100000))
+AML_VELOCITY_COUNT = int(os.getenv('AML_VELOCITY_COUNT', 5))
+AML_VELOCITY_WINDOW = 60 * 60
+AML_STRUCTURING_WINDOW = 24 * 60 * 60
+HOME_CURRENCY = 'KES'
+
+# Rows read and evaluated per monitor job before it hands over to the next
+AML_BATCH_LIMIT = 20000
+
+# Rows fetched from the database per round trip
+AML_FETCH_SIZE = 2000
+
+# Rows evaluated per backfill job
+AML_BACKFILL_CHUNK = 50000
+
+# Seconds between periodic checks for rows no commit hook announced
+AML_POLL_INTERVAL = 30
+
+# A process enqueues at most one wake-up job this often
+AML_WAKE_INTERVAL = 2
+
+# Idle users are dropped from memory every this many events
+AML_EVICT_EVERY = 10000
+
+# Seconds a missing id is watched for a late commit before it counts as rolled back
+AML_LATE_ROW_WINDOW = 300
+
+# Gaps wider than this are sequence jumps, not transactions in flight
+AML_MAX_GAP = 1000
+
+# Missing ids watched per stream
+AML_MAX_MISSING_IDS = 10000
+
+_EPOCH = datetime(1970, 1, 1)
+
+def _seconds(when):
+    return (when - _EPOCH).total_seconds()
+
+class ThresholdRule:
+    """Fires for each transaction at or above an amount"""
+    window = 0
+
+    def __init__(self, name, severity, threshold):
+        self.name = name
+        self.severity = severity
+        self.threshold = threshold
+
+    def describe(self):
+        return f'Single transaction of KES {self.threshold:,.0f} or more'
+
+    def check(self, event, state):
+        if event[3] >= self.threshold:
+            return {'threshold': self.threshold}
+        return None
+
+class VelocityRule:
+    """Fires when a user makes `count` transactions within `window` seconds"""
+
+    def __init__(self, name, severity, count, window):
+        self.name = name
+        self.severity = severity
+        self.count = count
+        self.window = window
+
+    def describe(self):
+        return f'{self.count} transactions in {self.window // 60} minutes'
+
+    def check(self, event, state):
+        count = state.count(self.window)
+        if count >= self.count:
+            return {'count': count, 'window_seconds': self.window}
+        return None
+
+class StructuringRule:
+    """Fires when transactions that each stay under the threshold add up to it within `window` seconds"""
+
+    def __init__(self, name, severity, threshold, window):
+        self.name = name
+        self.severity = severity
+        self.threshold = threshold
+        self.window = window
+
+    def describe(self):
+        return f'Transactions below KES {self.threshold:,.0f} totalling it within {self.window // 3600} hours'
+
+    def check(self, event, state):
+        if event[3] >= self.threshold:
+            return None
+        total = state.total(self.window) - state.large_total(self.window)
+        if total >= self.threshold:
+            return {'total': round(total, 2), 'count': state.count(self.window), 'window_seconds': self.window}
+        return None
+
+class CrossBorderRule:
+    """Fires for each transaction in a foreign currency or from a foreign phone number"""
+    window = 0
+
+    def __init__(self, name, severity):
+        self.name = name
+        self.severity = severity
+
+    def describe(self):
+        return 'Any international transaction'
+
+    def check(self, event, state):
+        if event[5]:
+            return {'origin': event[5]}
+        return None
+
+RULES = (
+    ThresholdRule('large_transaction', 'high', AML_LARGE_TRANSACTION),
+    VelocityRule('rapid_transactions', 'medium', AML_VELOCITY_COUNT, AML_VELOCITY_WINDOW),
+    StructuringRule('structuring', 'high', AML_LARGE_TRANSACTION, AML_STRUCTURING_WINDOW),
+    CrossBorderRule('cross_border', 'medium'),
+)
+
+class UserWindows:
+    """One user's recent transactions: a deque and running totals per window length"""
+    __slots__ = ('events', 'totals', 'large', 'last_alert', 'last_seen')
+
+    def __init__(self, windows):
+        self.events = {window: deque() for window in windows}
+        self.totals = dict.fromkeys(windows, 0.0)
+        self.large = dict.fromkeys(windows, 0.0)
+        self.last_alert = {}
+        self.last_seen = None
+
+    def add(self, when, amount, large):
+        timestamp = _seconds(when)
+        for window, events in self.events.items():
+            events.append((timestamp, amount, large))
+            self.totals[window] += amount
+            if large:
+                self.large[window] += amount
+            # Events are read in id order, which is (almost) time order
+            cutoff = timestamp - window
+            while events and events[0][0] <= cutoff:
+                _, old_amount, old_large = events.popleft()
+                self.totals[window] -= old_amount
+                if old_large:
+                    self.large[window] -= old_amount
+        self.last_seen = timestamp
+
+    def count(self, window):
+        return len(self.events[window])
+
+    def total(self, window):
+        return self.totals[window]
+
+    def large_total(self, window):
+        return self.large[window]
+
+    def cooling_down(self, rule, timestamp):
+        last = self.last_alert.get(rule.name)
+        return last is not None and timestamp - last < rule.window
+
+def _is_foreign_phone(phone):
+    digits = (phone or '').strip().lstrip('+')
+    if not digits or digits.startswith('254') or digits.startswith('0'):
+        return False
+    return len(digits) > 10
+
+def _transaction_events(after_id, until_id=None, limit=AML_FETCH_SIZE):
+    """(id, user_id, chama_id, amount, time, foreign origin) for transactions after an id"""
+    from app.models.chama import Transaction
+
+    query = db.session.query(
+        Transaction.id, Transaction.user_id, Transaction.chama_id, Transaction.amount,
+        Transaction.created_at, Transaction.currency
+    ).filter(Transaction.id > after_id)
+    if until_id is not None:
+        query = query.filter(Transaction.id <= until_id)
+    return [
+        (row_id, user_id, chama_id, float(amount or 0), created_at,
+         currency if currency and currency != HOME_CURRENCY else None)
+        for row_id, user_id, chama_id, amount, created_at, currency in query.order_by(Transaction.id).limit(limit)
+    ]
+
+def _mpesa_events(after_id, until_id=None, limit=AML_FETCH_SIZE):
+    """(id, user_id, chama_id, amount, time, foreign origin) for M-Pesa payments after an id"""
+    from app.models.chama import MpesaTransaction
+
+    query = db.session.query(
+        MpesaTransaction.id, MpesaTransaction.user_id, MpesaTransaction.chama_id, MpesaTransaction.amount,
+        MpesaTransaction.created_date, MpesaTransaction.phone_number
+    ).filter(MpesaTransaction.id > after_id)
+    if until_id is not None:
+        query = query.filter(MpesaTransaction.id <= until_id)
+    return [
+        (row_id, user_id, chama_id, float(amount or 0), created_date,
+         phone if _is_foreign_phone(phone) else None)
+        for row_id, user_id, chama_id, amount, created_date, phone in query.order_by(MpesaTransaction.id).limit(limit)
+    ]
+
+def _table(source):
+    """(model, time column) behind a stream"""
+    from app.models.chama import Transaction, MpesaTransaction
+
+    if source == 'transaction':
+        return Transaction, Transaction.created_at
+    return MpesaTransaction, MpesaTransaction.created_date
+
+def _max_id(source):
+    model, _ = _table(source)
+    return db.session.query(func.max(model.id)).scalar() or 0
+
+SOURCES = {
+    'transaction': _transaction_events,
+    'mpesa': _mpesa_events,
+}
+
+class AmlEngine:
+    """Rule evaluation over one stream, with the per-user window state it needs"""
+
+    def __init__(self, source, rules=RULES):
+        self.source = source
+        self.rules = rules
+        self.windows = sorted({rule.window for rule in rules if rule.window})
+        self.max_window = max(self.windows) if self.windows else 0
+        self.large_threshold = min((rule.threshold for rule in rules if isinstance(rule, ThresholdRule)),
+                                   default=float('inf'))
+        self.users = {}
+        self.position = None
+        self.lock = threading.Lock()
+        self._since_evict = 0
+        self.missing = {}  # ids skipped by the live stream -> when they were first missed
+
+    def reset(self):
+        """Drop the window state; the next batch rebuilds it. Missing ids are kept."""
+        self.users = {}
+        self.position = None
+
+    def note_gaps(self, after_id, events):
+        """Remember ids missing between after_id and the events read, in case they commit later"""
+        now = time.monotonic()
+        previous = after_id
+        for event in events:
+            if 1 < event[0] - previous <= AML_MAX_GAP:
+                for missing_id in range(previous + 1, event[0]):
+                    self.missing.setdefault(missing_id, now)
+            previous = event[0]
+        while len(self.missing) > AML_MAX_MISSING_IDS:
+            self.missing.pop(next(iter(self.missing)))
+
+    def _state(self, user_id):
+        state = self.users.get(user_id)
+        if state is None:
+            state = self.users[user_id] = UserWindows(self.windows)
+        return state
+
+    def observe(self, event, emit=True):
+        """Add one event to its user's windows; returns the alert rows it raises"""
+        row_id, user_id, chama_id, amount, when, origin = event
+        state = self._state(user_id)
+        state.add(when, amount, amount >= self.large_threshold)
+        self._since_evict += 1
+        if not emit:
+            return []
+
+        timestamp = state.last_seen
+        alerts = []
+        for rule in self.rules:
+            if rule.window and state.cooling_down(rule, timestamp):
+                continue
+            details = rule.check(event, state)
+            if details is None:
+                continue
+            if rule.window:
+                state.last_alert[rule.name] = timestamp
+            alerts.append({
+                'rule': rule.name, 'severity': rule.severity, 'source': self.source, 'source_id': row_id,
+                'user_id': user_id, 'chama_id': chama_id, 'amount': amount, 'details': details,
+                'status': 'open', 'event_time': when, 'created_at': datetime.utcnow()
+            })
+        return alerts
+
+    def process(self, events, raised=None):
+        """Evaluate events in id order; returns the alert rows raised.
+
+        raised maps row ids to the rules that already fired for them: those
+        alerts are not raised again, but still start their cooldowns.
+        """
+        alerts = []
+        windowed = {rule.name for rule in self.rules if rule.window}
+        for event in events:
+            fired = raised.get(event[0], ()) if raised else ()
+            for rule in fired:
+                if rule in windowed:
+                    self._state(event[1]).last_alert[rule] = _seconds(event[4])
+            alerts.extend(alert for alert in self.observe(event) if alert['rule'] not in fired)
+        if events:
+            self.position = events[-1][0]
+        if self._since_evict >= AML_EVICT_EVERY and events:
+            self._evict(events[-1][4])
+        return alerts
+
+    def _evict(self, now):
+        """Forget users with nothing left in any window"""
+        cutoff = _seconds(now) - self.max_window
+        self.users = {user_id: state for user_id, state in self.users.items() if state.last_seen > cutoff}
+        self._since_evict = 0
+
+    def warm(self, position):
+        """Rebuild window state as it stood after row `position` from the rows inside the longest window"""
+        from app.models.aml import AmlAlert
+
+        self.reset()
+        model, time_column = _table(self.source)
+        latest = db.session.query(time_column).filter(model.id <= position).order_by(
+            model.id.desc()).limit(1).scalar() if position else None
+        if latest is not None and self.max_window:
+            # Ids follow insert order, so everything in the window sits after its first id
+            since = latest - timedelta(seconds=self.max_window)
+            first_id = db.session.query(func.min(model.id)).filter(
+                time_column >= since, model.id <= position).scalar()
+            fetch = SOURCES[self.source]
+            after_id = (first_id or position + 1) - 1
+            while after_id < position:
+                events = fetch(after_id, until_id=position)
+                if not events:
+                    break
+                for event in events:
+                    self.observe(event, emit=False)
+                after_id = events[-1][0]
+
+            # Windowed rules that already fired stay quiet until their window passes
+            windowed = [rule.name for rule in self.rules if rule.window]
+            for user_id, rule, event_time in db.session.query(
+                    AmlAlert.user_id, AmlAlert.rule, func.max(AmlAlert.event_time)).filter(
+                    AmlAlert.source == self.source, AmlAlert.rule.in_(windowed),
+                    AmlAlert.source_id <= position, AmlAlert.event_time >= since).group_by(
+                    AmlAlert.user_id, AmlAlert.rule):
+                if user_id in self.users:
+                    self.users[user_id].last_alert[rule] = _seconds(event_time)
+        self.position = position
+
+_engines = {}
+_engines_lock = threading.Lock()
+
+def get_engine(source):
+    """This process's live engine for a stream"""
+    engine = _engines.get(source)
+    if engine is None:
+        with _engines_lock:
+            engine = _engines.setdefault(source, AmlEngine(source))
+    return engine
+
+def _save_alerts(alerts):
+    from app.models.aml import AmlAlert
+
+    if alerts:
+        db.session.execute(insert(AmlAlert), alerts)
+
+def _cursor(source):
+    """The stream's cursor, created at the current end of the table the first time"""
+    from app.models.aml import AmlCursor
+
+    cursor = db.session.get(AmlCursor, source)
+    if cursor is None:
+        try:
+            with db.session.begin_nested():
+                cursor = AmlCursor(source=source, position=_max_id(source), processed=0,
+                                   updated_at=datetime.utcnow())
+                db.session.add(cursor)
+        except IntegrityError:
+            cursor = db.session.get(AmlCursor, source)
+    return cursor
+
+def monitor_stream(source, limit=AML_BATCH_LIMIT):
+    """Evaluate up to `limit` new rows of one stream. Returns (rows evaluated, alerts raised)."""
+    from app.models.aml import AmlCursor
+
+    engine = get_engine(source)
+    if not engine.lock.acquire(blocking=False):
+        return 0, 0  # another thread in this process is on it
+    try:
+        cursor = _cursor(source)
+        start = cursor.position
+        if engine.position != start:
+            engine.warm(start)
+
+        fetch = SOURCES[source]
+        position, evaluated, alerts = start, 0, []
+        while evaluated < limit:
+            events = fetch(position, limit=min(AML_FETCH_SIZE, limit - evaluated))
+            if not events:
+                break
+            engine.note_gaps(position, events)
+            alerts.extend(engine.process(events))
+            position = events[-1][0]
+            evaluated += len(events)
+        if not evaluated:
+            return 0, 0
+
+        claimed = db.session.execute(
+            update(AmlCursor).where(AmlCursor.source == source, AmlCursor.position == start).values(
+                position=position, processed=AmlCursor.processed + evaluated, updated_at=datetime.utcnow()),
+            execution_options={'synchronize_session': False}
+        ).rowcount == 1
+        if not claimed:
+            # Another worker evaluated these rows first; this engine's state is now ahead of the cursor
+            engine.reset()
+            return 0, 0
+        _save_alerts(alerts)
+        db.session.expire(cursor)
+        return evaluated, len(alerts)
+    except Exception:
+        engine.reset()
+        raise
+    finally:
+        engine.lock.release()
+
+def backfill_chunk(source, after_id, until_id, chunk_size=AML_BACKFILL_CHUNK, engine=None):
+    """Evaluate rows (after_id, until_id] up to chunk_size of them, skipping alerts already raised.
+
+    Returns (last id evaluated, rows evaluated, alerts raised). Pass the
+    engine from the previous chunk to carry its windows over; otherwise
+    they are rebuilt from the rows before after_id.
+    """
+    from app.models.aml import AmlAlert
+
+    if engine is None or engine.position != after_id:
+        engine = engine or AmlEngine(source)
+        engine.warm(after_id)
+
+    fetch = SOURCES[source]
+    position, evaluated, alerts = after_id, 0, []
+    while evaluated < chunk_size:
+        events = fetch(position, until_id=until_id, limit=min(AML_FETCH_SIZE, chunk_size - evaluated))
+        if not events:
+            break
+        raised = {}
+        for source_id, rule in db.session.query(AmlAlert.source_id, AmlAlert.rule).filter(
+                AmlAlert.source == source, AmlAlert.source_id > position,
+                AmlAlert.source_id <= events[-1][0]):
+            raised.setdefault(source_id, set()).add(rule)
+        alerts.extend(engine.process(events, raised))
+        position = events[-1][0]
+        evaluated += len(events)
+
+    _save_alerts(alerts)
+    return position, evaluated, len(alerts)
+
+def recheck_late_rows(source):
+    """Evaluate rows that committed after the live monitor had read past their ids.
+
+    Returns the number of late rows found.
+    """
+    from app.models.aml import AmlCursor
+
+    engine = get_engine(source)
+    if not engine.missing or not engine.lock.acquire(blocking=False):
+        return 0
+    try:
+        expired = time.monotonic() - AML_LATE_ROW_WINDOW
+        engine.missing = {row_id: seen for row_id, seen in engine.missing.items() if seen >= expired}
+        if not engine.missing:
+            return 0
+        model, _ = _table(source)
+        ids = sorted(engine.missing)
+        late = []
+        for start in range(0, len(ids), 500):
+            late.extend(row_id for row_id, in db.session.query(model.id).filter(
+                model.id.in_(ids[start:start + 500])))
+        if not late:
+            return 0
+
+        position = db.session.query(AmlCursor.position).filter_by(source=source).scalar() or 0
+        after_id = min(late) - 1
+        while after_id < position:
+            after_id, evaluated, _ = backfill_chunk(source, after_id, position, AML_BATCH_LIMIT)
+            if not evaluated:
+                break
+        for row_id in late:
+            engine.missing.pop(row_id, None)
+        # The live windows never saw the late rows; rebuild them on the next batch
+        engine.reset()
+        logger.info(f"AML {source}: evaluated {len(late)} rows that committed late")
+        return len(late)
+    finally:
+        engine.lock.release()
+
+def start_backfill(source, until_id=None, chunk_size=AML_BACKFILL_CHUNK):
+    """Queue evaluation of a stream's history, from its first row up to until_id (default: its cursor)"""
+    until_id = until_id if until_id is not None else _cursor(source).position
+    return enqueue_job('aml_backfill', {'source': source, 'after_id': 0, 'until_id': until_id,
+                                        'chunk_size': chunk_size})
+
+def alert_summary():
+    """Figures for the AML monitoring dashboard"""
+    from app.models.aml import AmlAlert, AmlCursor
+
+    by_rule = dict(db.session.query(AmlAlert.rule, func.count(AmlAlert.id)).filter(
+        AmlAlert.status == 'open').group_by(AmlAlert.rule).all())
+    high_recent = db.session.query(AmlAlert.id).filter(
+        AmlAlert.status == 'open', AmlAlert.severity == 'high',
+        AmlAlert.event_time >= datetime.utcnow() - timedelta(days=1)).first() is not None
+    cursors = db.session.query(AmlCursor).all()
+    open_alerts = sum(by_rule.values())
+    return {
+        'risk_score': 'High' if high_recent else 'Medium' if open_alerts else 'Low',
+        'active_alerts': open_alerts,
+        'alerts_by_rule': by_rule,
+        'transactions_monitored': sum(cursor.processed for cursor in cursors),
+        'last_update': max((cursor.updated_at for cursor in cursors if cursor.updated_at), default=None)
+    }
+
+_last_wake = 0.0
+
+def _has_monitored_inserts(session):
+    from app.models.chama import Transaction, MpesaTransaction
+
+    return any(isinstance(obj, (Transaction, MpesaTransaction)) for obj in session.new)
+
+@event.listens_for(Session, 'after_flush')
+def _note_monitored_inserts(session, flush_context):
+    if not session.info.get('aml_rows_inserted') and _has_monitored_inserts(session):
+        session.info['aml_rows_inserted'] = True
+
+@event.listens_for(Session, 'before_commit')
+def _wake_monitor(session):
+    global _last_wake
+    # before_commit runs ahead of the commit's own flush, so rows may still be pending
+    if not (session.info.get('aml_rows_inserted') or _has_monitored_inserts(session)):
+        return
+    now = time.monotonic()
+    if now - _last_wake >= AML_WAKE_INTERVAL:
+        _last_wake = now
+        enqueue_job('aml_monitor', {})
+
+@event.listens_for(Session, 'after_commit')
+@event.listens_for(Session, 'after_rollback')
+def _forget_monitored_inserts(session):
+    session.info.pop('aml_rows_inserted', None)
+
+@job_handler('aml_monitor')
+def process_monitor(payload):
+    for source in SOURCES:
+        evaluated, _ = monitor_stream(source)
+        recheck_late_rows(source)
+        if evaluated >= AML_BATCH_LIMIT:
+            enqueue_job('aml_monitor', {})
+
+@job_handler('aml_backfill')
+def process_backfill(payload):
+    chunk_size = payload.get('chunk_size', AML_BACKFILL_CHUNK)
+    position, evaluated, _ = backfill_chunk(payload['source'], payload['after_id'], payload['until_id'], chunk_size)
+    if evaluated and position < payload['until_id']:
+        enqueue_job('aml_backfill', {'source': payload['source'], 'after_id': position,
+                                     'until_id': payload['until_id'], 'chunk_size': chunk_size})
+
+@periodic_task('aml_monitor', AML_POLL_INTERVAL)
+def schedule_monitor():
+    """Enqueue a monitor run unless one is already waiting"""
+    from app.models.jobs import OutboxJob
+
+    waiting = db.session.query(OutboxJob.id).filter_by(job_type='aml_monitor', status='pending').first()
+    if waiting is None:
+        enqueue_job('aml_monitor', {})
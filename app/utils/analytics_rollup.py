@@ -0,0 +1,210 @@
+"""
+CHAMAlink Analytics Rollups
+===========================
+Daily platform metrics (new users, new chamas, logins, active users and
+transaction volume by chama and type) pre-aggregated into daily_metrics.
+
+A scheduled job keeps the table current: it re-rolls the last
+ROLLUP_LATE_DAYS days, which catches late writes, and backfills any
+history it has not seen yet in month-sized chunks. Each chunk is a handful
+of GROUP BY queries over indexed date ranges.
+
+Dashboards read growth charts through daily_series / monthly_series /
+metric_total. Each of those is a single range read on the
+(metric, day) unique index, however much history the platform has.
+Figures for today are as fresh as the last rollup (ROLLUP_INTERVAL).
+"""
+
+from datetime import datetime, date, time, timedelta
+from sqlalchemy import func
+from app import db
+from app.utils.jobs import job_handler, periodic_task, enqueue_job
+
+# Seconds between scheduled rollups
+ROLLUP_INTERVAL = 15 * 60
+
+# Days before the newest rolled-up day that every run recomputes
+ROLLUP_LATE_DAYS = 1
+
+# Days rolled up per transaction when backfilling history
+ROLLUP_CHUNK_DAYS = 31
+
+METRICS = ('new_users', 'new_chamas', 'logins', 'active_users', 'transactions')
+
+def _as_date(value):
+    # func.date() comes back as a string on SQLite and a date on PostgreSQL
+    if isinstance(value, str):
+        return date.fromisoformat(value[:10])
+    if isinstance(value, datetime):
+        return value.date()
+    return value
+
+def _day_bounds(start_day, end_day):
+    return datetime.combine(start_day, time.min), datetime.combine(end_day + timedelta(days=1), time.min)
+
+def _aggregate(start_day, end_day):
+    """Metric rows for the days in [start_day, end_day]"""
+    from app.models.user import User
+    from app.models.chama import Chama, Transaction
+    from app.models.subscription import LoginAttempt
+
+    start_dt, end_dt = _day_bounds(start_day, end_day)
+    rows = []
+
+    def counts(metric, column, count_expr, *criteria):
+        day = func.date(column)
+        query = db.session.query(day, count_expr).filter(column >= start_dt, column < end_dt, *criteria)
+        for value, count in query.group_by(day):
+            rows.append({'metric': metric, 'day': _as_date(value), 'chama_id': 0, 'dimension': '',
+                         'count': count, 'amount': 0.0})
+
+    counts('new_users', User.created_at, func.count(User.id))
+    counts('new_chamas', Chama.created_at, func.count(Chama.id))
+    counts('logins', LoginAttempt.attempt_time, func.count(LoginAttempt.id), LoginAttempt.success.is_(True))
+    counts('active_users', LoginAttempt.attempt_time, func.count(func.distinct(LoginAttempt.user_id)),
+           LoginAttempt.success.is_(True))
+
+    day = func.date(Transaction.created_at)
+    volume = db.session.query(
+        day, Transaction.chama_id, Transaction.type,
+        func.count(Transaction.id), func.coalesce(func.sum(Transaction.amount), 0.0)
+    ).filter(
+        Transaction.created_at >= start_dt,
+        Transaction.created_at < end_dt,
+        Transaction.status == 'completed'
+    ).group_by(day, Transaction.chama_id, Transaction.type)
+    for value, chama_id, trans_type, count, amount in volume:
+        rows.append({'metric': 'transactions', 'day': _as_date(value), 'chama_id': chama_id,
+                     'dimension': trans_type or '', 'count': count, 'amount': float(amount)})
+    return rows
+
+def rollup_days(start_day, end_day):
+    """Recompute every metric for the days in [start_day, end_day]. Caller commits.
+
+    Returns the number of metric rows written.
+    """
+    from app.models.analytics import DailyMetric
+
+    rows = _aggregate(start_day, end_day)
+    DailyMetric.query.filter(
+        DailyMetric.metric.in_(METRICS),
+        DailyMetric.day >= start_day,
+        DailyMetric.day <= end_day
+    ).delete(synchronize_session=False)
+    if rows:
+        now = datetime.utcnow()
+        for row in rows:
+            row['updated_at'] = now
+        db.session.bulk_insert_mappings(DailyMetric, rows)
+    return len(rows)
+
+def _earliest_activity():
+    from app.models.user import User
+    from app.models.chama import Chama, Transaction
+
+    candidates = [
+        db.session.query(func.min(column)).scalar()
+        for column in (User.created_at, Chama.created_at, Transaction.created_at)
+    ]
+    candidates = [value for value in candidates if value is not None]
+    return min(candidates).date() if candidates else None
+
+def refresh_rollups(today=None, commit_chunks=False):
+    """Bring daily_metrics up to date. Returns (first day, last day, rows written).
+
+    With ``commit_chunks`` each backfill chunk is committed on its own, which
+    keeps a first run over years of history from holding one long transaction.
+    """
+    from app.models.analytics import DailyMetric
+
+    today = today or datetime.utcnow().date()
+    latest = db.session.query(func.max(DailyMetric.day)).scalar()
+    if latest is not None:
+        start_day = min(_as_date(latest), today) - timedelta(days=ROLLUP_LATE_DAYS)
+    else:
+        start_day = _earliest_activity() or today
+
+    written = 0
+    chunk_start = start_day
+    while chunk_start <= today:
+        chunk_end = min(chunk_start + timedelta(days=ROLLUP_CHUNK_DAYS - 1), today)
+        written += rollup_days(chunk_start, chunk_end)
+        if commit_chunks:
+            db.session.commit()
+        chunk_start = chunk_end + timedelta(days=1)
+    return start_day, today, written
+
+def _metric_query(metric, start_day, end_day, chama_id=None, dimension=None):
+    from app.models.analytics import DailyMetric
+
+    query = db.session.query(
+        DailyMetric.day,
+        func.sum(DailyMetric.count),
+        func.sum(DailyMetric.amount)
+    ).filter(
+        DailyMetric.metric == metric,
+        DailyMetric.day >= start_day,
+        DailyMetric.day <= end_day
+    )
+    if chama_id is not None:
+        query = query.filter(DailyMetric.chama_id == chama_id)
+    if dimension is not None:
+        query = query.filter(DailyMetric.dimension == dimension)
+    return query.group_by(DailyMetric.day)
+
+def daily_series(metric, start_day, end_day, chama_id=None, dimension=None):
+    """[{'date', 'count', 'amount'}] for every day in [start_day, end_day], zero-filled"""
+    by_day = {
+        _as_date(day): (int(count or 0), float(amount or 0.0))
+        for day, count, amount in _metric_query(metric, start_day, end_day, chama_id, dimension)
+    }
+    series = []
+    day = start_day
+    while day <= end_day:
+        count, amount = by_day.get(day, (0, 0.0))
+        series.append({'date': day.strftime('%Y-%m-%d'), 'count': count, 'amount': amount})
+        day += timedelta(days=1)
+    return series
+
+def monthly_series(metric, months=12, today=None, chama_id=None, dimension=None):
+    """[{'month', 'count', 'amount'}] for the last ``months`` calendar months, oldest first"""
+    today = today or datetime.utcnow().date()
+    first = today.replace(day=1)
+    for _ in range(months - 1):
+        first = (first - timedelta(days=1)).replace(day=1)
+
+    totals = {}
+    for day, count, amount in _metric_query(metric, first, today, chama_id, dimension):
+        month = _as_date(day).strftime('%Y-%m')
+        previous_count, previous_amount = totals.get(month, (0, 0.0))
+        totals[month] = (previous_count + int(count or 0), previous_amount + float(amount or 0.0))
+
+    series = []
+    month_start = first
+    while month_start <= today:
+        month = month_start.strftime('%Y-%m')
+        count, amount = totals.get(month, (0, 0.0))
+        series.append({'month': month, 'count': count, 'amount': amount})
+        month_start = (month_start + timedelta(days=32)).replace(day=1)
+    return series
+
+def metric_total(metric, start_day, end_day, chama_id=None, dimension=None):
+    """(count, amount) summed over [start_day, end_day]"""
+    count = amount = 0
+    for _, day_count, day_amount in _metric_query(metric, start_day, end_day, chama_id, dimension):
+        count += int(day_count or 0)
+        amount += float(day_amount or 0.0)
+    return count, amount
+
+@job_handler('analytics_rollup')
+def process_rollup(payload):
+    refresh_rollups()
+
+@periodic_task('analytics_rollup', ROLLUP_INTERVAL)
+def schedule_rollup():
+    """Enqueue a rollup unless one is already waiting, so one worker runs it"""
+    from app.models.jobs import OutboxJob
+
+    waiting = db.session.query(OutboxJob.id).filter_by(job_type='analytics_rollup', status='pending').first()
+    if waiting is None:
+        enqueue_job('analytics_rollup', {})
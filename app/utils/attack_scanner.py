@@ -0,0 +1,123 @@
+"""
+CHAMAlink Attack Pattern Scanner
+================================
+Compiles every attack signature into one combined alternation at start-up
+and scans request data field by field straight from the parsed
+form/JSON/args, without serializing the request. Each field is capped at
+MAX_FIELD_CHARS so an oversized body cannot make the scan expensive.
+
+The detector is a plain alternation matched against lower-cased text, which
+lets the regex engine use its literal-prefix fast paths. Only where it hits
+do the per-type alternations (and then the individual signatures of every
+type that matches there) run, to say what was found.
+"""
+
+import re
+
+# Characters scanned per field; payloads are detectable well inside this
+MAX_FIELD_CHARS = 4096
+
+# Fields visited per request before the scan stops
+MAX_FIELDS = 500
+
+# Matches examined per request; enough to report every attack type
+MAX_HITS = 50
+
+def _normalize_pattern(pattern):
+    """Lower-case a signature's literals and make its groups non-capturing.
+
+    Text is lower-cased before scanning, as the original detector did, so
+    the signature must be too; escapes and character classes are kept
+    intact. Signatures must not rely on backreferences.
+    """
+    out = []
+    in_class = False
+    index = 0
+    while index < len(pattern):
+        char = pattern[index]
+        if char == '\\' and index + 1 < len(pattern):
+            out.append(pattern[index:index + 2])
+            index += 2
+            continue
+        if in_class:
+            if char == ']':
+                in_class = False
+        elif char == '[':
+            in_class = True
+        elif char == '(' and not pattern.startswith('?', index + 1):
+            out.append('(?:')
+            index += 1
+            continue
+        out.append(char.lower())
+        index += 1
+    return ''.join(out)
+
+class AttackPatternScanner:
+    """Single-pass matcher for a {attack_type: [pattern, ...]} signature table"""
+
+    def __init__(self, attack_patterns, max_field_chars=MAX_FIELD_CHARS, max_fields=MAX_FIELDS, max_hits=MAX_HITS):
+        self.max_field_chars = max_field_chars
+        self.max_fields = max_fields
+        self.max_hits = max_hits
+
+        # attack_type -> (alternation of its signatures, [(pattern, compiled signature)])
+        self._types = {}
+        for attack_type, patterns in attack_patterns.items():
+            normalized = [_normalize_pattern(pattern) for pattern in patterns]
+            self._types[attack_type] = (
+                re.compile('|'.join(normalized)),
+                [(pattern, re.compile(regex)) for pattern, regex in zip(patterns, normalized)]
+            )
+
+        self.detector = re.compile('|'.join(alternation.pattern for alternation, _ in self._types.values()))
+
+    def iter_values(self, data):
+        """Yield the strings to scan from nested dicts/lists (keys included)"""
+        stack = [data]
+        while stack:
+            item = stack.pop()
+            if isinstance(item, dict):
+                for key, value in item.items():
+                    yield str(key)
+                    stack.append(value)
+            elif isinstance(item, (list, tuple)):
+                stack.extend(item)
+            elif item is not None and not isinstance(item, bool):
+                yield item if isinstance(item, str) else str(item)
+
+    def scan_value(self, value, found, hits=0):
+        """Record the signatures matching in one field into ``found``. Returns the running hit count."""
+        text = value[:self.max_field_chars].lower()
+        position = 0
+        while hits < self.max_hits:
+            match = self.detector.search(text, position)
+            if match is None:
+                break
+            hits += 1
+            start = match.start()
+            # A payload can match signatures of several types at the same position
+            for attack_type, (alternation, signatures) in self._types.items():
+                if not alternation.match(text, start):
+                    continue
+                for pattern, regex in signatures:
+                    key = (attack_type, pattern)
+                    if key not in found and regex.match(text, start):
+                        found[key] = text[:100] + '...' if len(text) > 100 else text
+            # Step one character on so signatures overlapping this match are still seen
+            position = start + 1
+        return hits
+
+    def scan(self, data):
+        """Return threats as [{'type', 'pattern', 'matched_text'}] for a dict, list or string"""
+        found = {}
+        hits = 0
+        values = [data] if isinstance(data, str) else self.iter_values(data)
+        for count, value in enumerate(values):
+            if count >= self.max_fields or hits >= self.max_hits:
+                break
+            hits = self.scan_value(value, found, hits)
+
+        return [
+            {'type': attack_type, 'pattern': pattern, 'matched_text': matched_text}
+            for (attack_type, pattern), matched_text in found.items()
+        ]
@@ -8,10 +8,11 @@ import time
 import hashlib
 import threading
 from datetime import datetime, timedelta
-from collections import defaultdict, deque
+from collections import defaultdict
 from flask import request, abort, current_app
 from app.models import User, LoginAttempt
 from app import db
+from app.utils.rate_limiter import get_limiter_backend, BlockList
 import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
@@ -21,17 +22,10 @@ import os
 class AdvancedBruteForceProtection:
     """Advanced brute force protection with multiple detection layers"""
     
-    def __init__(self):
-        # Track failed attempts by IP
-        self.ip_attempts = defaultdict(deque)
-        self.ip_blocked = {}
-        
-        # Track failed attempts by email
-        self.email_attempts = defaultdict(deque)
-        self.email_blocked = {}
-        
-        # Progressive rate limiting
-        self.rate_limits = defaultdict(deque)
+    def __init__(self, backend=None):
+        # Failed-attempt counters and lockouts live in the shared limiter
+        # backend so every worker process sees the same state
+        self.limiter = backend or get_limiter_backend()
         
         # Suspicious patterns tracking
         self.suspicious_patterns = defaultdict(list)
@@ -55,6 +49,9 @@ class AdvancedBruteForceProtection:
             'geo_blocking': True,          # Enable geographic anomaly detection
         }
         
+        self.ip_blocked = BlockList(self.limiter, 'bf:ip:', self.config['lockout_duration'])
+        self.email_blocked = BlockList(self.limiter, 'bf:email:', self.config['lockout_duration'])
+        
         print("🛡️  Advanced Brute Force Protection: INITIALIZED")
     
     def check_brute_force_attempt(self, ip_address, email=None, user_agent=None):
@@ -65,36 +62,29 @@ class AdvancedBruteForceProtection:
         current_time = time.time()
         
         # 1. Check if IP is currently blocked
-        if ip_address in self.ip_blocked:
-            if current_time < self.ip_blocked[ip_address]:
-                return False, self.ip_blocked[ip_address] - current_time, "IP_BLOCKED"
-            else:
-                del self.ip_blocked[ip_address]
+        blocked_until = self.limiter.blocked_until(f'bf:ip:{ip_address}')
+        if blocked_until is not None:
+            return False, blocked_until - current_time, "IP_BLOCKED"
         
         # 2. Check if email is currently blocked
-        if email and email in self.email_blocked:
-            if current_time < self.email_blocked[email]:
-                return False, self.email_blocked[email] - current_time, "EMAIL_BLOCKED"
-            else:
-                del self.email_blocked[email]
+        if email:
+            blocked_until = self.limiter.blocked_until(f'bf:email:{email}')
+            if blocked_until is not None:
+                return False, blocked_until - current_time, "EMAIL_BLOCKED"
         
         # 3. Check IP attempt rate
-        ip_attempts = self.ip_attempts[ip_address]
-        ip_attempts = deque([t for t in ip_attempts if current_time - t < self.config['time_window']])
-        self.ip_attempts[ip_address] = ip_attempts
+        ip_attempts = self.limiter.count(f'bf:ip:{ip_address}', self.config['time_window'])
         
-        if len(ip_attempts) >= self.config['max_attempts_per_ip']:
+        if ip_attempts >= self.config['max_attempts_per_ip']:
             self._block_ip(ip_address, current_time)
             self._send_security_alert(f"IP {ip_address} blocked for brute force attempts")
             return False, self.config['lockout_duration'], "IP_RATE_EXCEEDED"
         
         # 4. Check email attempt rate (if provided)
         if email:
-            email_attempts = self.email_attempts[email]
-            email_attempts = deque([t for t in email_attempts if current_time - t < self.config['time_window']])
-            self.email_attempts[email] = email_attempts
+            email_attempts = self.limiter.count(f'bf:email:{email}', self.config['time_window'])
             
-            if len(email_attempts) >= self.config['max_attempts_per_email']:
+            if email_attempts >= self.config['max_attempts_per_email']:
                 self._block_email(email, current_time)
                 self._send_security_alert(f"Email {email} blocked for brute force attempts")
                 return False, self.config['lockout_duration'], "EMAIL_RATE_EXCEEDED"
@@ -111,14 +101,14 @@ class AdvancedBruteForceProtection:
     
     def record_failed_attempt(self, ip_address, email=None, user_agent=None, details=None):
         """Record a failed login attempt"""
-        current_time = time.time()
-        
-        # Record IP attempt
-        self.ip_attempts[ip_address].append(current_time)
+        # Record IP attempt in every window the checks look at
+        for window in (self.config['time_window'], 60, 10):
+            self.limiter.hit(f'bf:ip:{ip_address}', window)
+        self.limiter.hit('bf:attempts', 3600)
         
         # Record email attempt if provided
         if email:
-            self.email_attempts[email].append(current_time)
+            self.limiter.hit(f'bf:email:{email}', self.config['time_window'])
         
         # Record suspicious patterns
         self._record_pattern(ip_address, email, user_agent, details)
@@ -128,22 +118,17 @@ class AdvancedBruteForceProtection:
     
     def record_successful_attempt(self, ip_address, email=None):
         """Record a successful login attempt"""
-        # Reset attempt counters for this IP/email combination
-        if ip_address in self.ip_attempts:
-            # Keep some history but reduce the penalty
-            recent_attempts = deque([
-                t for t in self.ip_attempts[ip_address] 
-                if time.time() - t < 60  # Only keep last minute
-            ])
-            self.ip_attempts[ip_address] = recent_attempts
-        
-        if email and email in self.email_attempts:
+        # Reset attempt counters for this IP/email combination.
+        # The short IP windows are kept so rapid-fire detection still applies.
+        self.limiter.reset(f'bf:ip:{ip_address}', self.config['time_window'])
+        
+        if email:
             # Clear email attempts on successful login
-            self.email_attempts[email].clear()
+            self.limiter.reset(f'bf:email:{email}')
     
     def _block_ip(self, ip_address, current_time):
         """Block an IP address"""
-        self.ip_blocked[ip_address] = current_time + self.config['lockout_duration']
+        self.ip_blocked.add(ip_address, self.config['lockout_duration'])
         
         # Log the blocking
         self._log_security_event({
@@ -155,7 +140,7 @@ class AdvancedBruteForceProtection:
     
     def _block_email(self, email, current_time):
         """Block an email address"""
-        self.email_blocked[email] = current_time + self.config['lockout_duration']
+        self.email_blocked.add(email, self.config['lockout_duration'])
         
         # Log the blocking
         self._log_security_event({
@@ -167,8 +152,8 @@ class AdvancedBruteForceProtection:
     
     def _calculate_progressive_delay(self, ip_address, email):
         """Calculate progressive delay based on attempt history"""
-        ip_count = len(self.ip_attempts.get(ip_address, []))
-        email_count = len(self.email_attempts.get(email, [])) if email else 0
+        ip_count = self.limiter.count(f'bf:ip:{ip_address}', self.config['time_window'])
+        email_count = self.limiter.count(f'bf:email:{email}', self.config['time_window']) if email else 0
         
         max_count = max(ip_count, email_count)
         delay_index = min(max_count, len(self.config['progressive_delays']) - 1)
@@ -177,13 +162,9 @@ class AdvancedBruteForceProtection:
     
     def _detect_suspicious_patterns(self, ip_address, email, user_agent):
         """Detect suspicious attack patterns"""
-        current_time = time.time()
-        
         # Pattern 1: Rapid sequential attempts
-        if ip_address in self.ip_attempts:
-            recent_attempts = [t for t in self.ip_attempts[ip_address] if current_time - t < 60]
-            if len(recent_attempts) >= 3:
-                return True
+        if self.limiter.count(f'bf:ip:{ip_address}', 60) >= 3:
+            return True
         
         # Pattern 2: Multiple different emails from same IP
         if self._count_unique_emails_from_ip(ip_address) > 5:
@@ -248,11 +229,9 @@ class AdvancedBruteForceProtection:
         current_time = time.time()
         
         # Check for rapid-fire attempts (more than 3 in 10 seconds)
-        if ip_address in self.ip_attempts:
-            recent = [t for t in self.ip_attempts[ip_address] if current_time - t < 10]
-            if len(recent) >= 3:
-                self._block_ip(ip_address, current_time)
-                self._send_emergency_alert(f"IMMEDIATE THREAT: Rapid-fire attack from {ip_address}")
+        if self.limiter.count(f'bf:ip:{ip_address}', 10) >= 3:
+            self._block_ip(ip_address, current_time)
+            self._send_emergency_alert(f"IMMEDIATE THREAT: Rapid-fire attack from {ip_address}")
     
     def _send_security_alert(self, message):
         """Send security alert to administrators"""
@@ -358,23 +337,17 @@ class AdvancedBruteForceProtection:
     
     def get_security_stats(self):
         """Get current security statistics"""
-        current_time = time.time()
-        
         return {
             'blocked_ips': len(self.ip_blocked),
             'blocked_emails': len(self.email_blocked),
-            'recent_attempts': sum(
-                len([t for t in attempts if current_time - t < 3600])
-                for attempts in self.ip_attempts.values()
-            ),
+            'recent_attempts': self.limiter.count('bf:attempts', 3600),
             'suspicious_patterns': sum(len(patterns) for patterns in self.suspicious_patterns.values()),
-            'total_events': len(self.ip_attempts) + len(self.email_attempts)
+            'total_events': self.limiter.key_count('bf:ip:') + self.limiter.key_count('bf:email:')
         }
     
     def unblock_ip(self, ip_address):
         """Manually unblock an IP address"""
-        if ip_address in self.ip_blocked:
-            del self.ip_blocked[ip_address]
+        if self.ip_blocked.discard(ip_address):
             self._log_security_event({
                 'event_type': 'IP_UNBLOCKED',
                 'ip_address': ip_address,
@@ -385,8 +358,7 @@ class AdvancedBruteForceProtection:
     
     def unblock_email(self, email):
         """Manually unblock an email address"""
-        if email in self.email_blocked:
-            del self.email_blocked[email]
+        if self.email_blocked.discard(email):
             self._log_security_event({
                 'event_type': 'EMAIL_UNBLOCKED',
                 'email': email,
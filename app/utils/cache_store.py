@@ -0,0 +1,150 @@
+"""
+CHAMAlink Cache Stores
+======================
+Key/value stores with a time to live, used by the caches that sit in front
+of the database (memberships, unread counts, fraud profiles, dashboard
+fragments, rate-limit lockouts).
+
+Backends, picked per cache by an environment variable:
+    memory - per-process store bounded by LRU eviction (default, single worker)
+    redis  - shared by every gunicorn worker; values are serialized with the
+             cache's serializer (json by default)
+
+get_store() returns a function that builds the store on first use and then
+hands every caller the same one.
+"""
+
+import json
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+
+class MemoryStore:
+    """In-process values with a time to live, bounded by LRU eviction"""
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._entries = OrderedDict()  # key -> (expires at, value)
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            if entry[0] <= time.time():
+                del self._entries[key]
+                return default
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value, timeout):
+        with self._lock:
+            self._entries[key] = (time.time() + timeout, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_keys:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, keys):
+        """Drop keys; returns how many were live"""
+        now = time.time()
+        with self._lock:
+            dropped = [self._entries.pop(key, None) for key in keys]
+            return sum(1 for entry in dropped if entry is not None and entry[0] > now)
+
+    def items(self, prefix=''):
+        """Live (key, value) pairs whose key starts with ``prefix``"""
+        now = time.time()
+        with self._lock:
+            return [(key, entry[1]) for key, entry in self._entries.items()
+                    if entry[0] > now and str(key).startswith(prefix)]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        with self._lock:
+            return {'backend': 'memory', 'entries': len(self._entries), 'max_keys': self.max_keys,
+                    'evictions': self.evictions}
+
+class RedisStore:
+    """Values kept in Redis under a prefix so all workers share them"""
+
+    def __init__(self, client, prefix, serializer=json):
+        self.client = client
+        self.prefix = prefix
+        self.serializer = serializer
+
+    def get(self, key, default=None):
+        value = self.client.get(f"{self.prefix}{key}")
+        return self.serializer.loads(value) if value is not None else default
+
+    def set(self, key, value, timeout):
+        self.client.set(f"{self.prefix}{key}", self.serializer.dumps(value), ex=max(int(math.ceil(timeout)), 1))
+
+    def delete(self, keys):
+        keys = [f"{self.prefix}{key}" for key in keys]
+        return self.client.delete(*keys) if keys else 0
+
+    def items(self, prefix=''):
+        keys = list(self.client.scan_iter(match=f"{self.prefix}{prefix}*"))
+        if not keys:
+            return []
+        start = len(self.prefix)
+        result = []
+        for redis_key, value in zip(keys, self.client.mget(keys)):
+            if value is not None:
+                name = redis_key.decode() if isinstance(redis_key, bytes) else redis_key
+                result.append((name[start:], self.serializer.loads(value)))
+        return result
+
+    def clear(self):
+        keys = list(self.client.scan_iter(match=f"{self.prefix}*"))
+        if keys:
+            self.client.delete(*keys)
+
+    def stats(self):
+        return {'backend': 'redis'}
+
+def redis_client():
+    """Client for REDIS_URL, checked with a ping"""
+    import redis
+    client = redis.from_url(os.getenv('REDIS_URL', 'redis://localhost:6379/0'))
+    client.ping()
+    return client
+
+def create_store(label, backend_env, prefix, serializer=json, max_keys=100000):
+    """Build the store named by ``backend_env``, falling back to memory"""
+    if os.getenv(backend_env, 'memory') == 'redis':
+        try:
+            return RedisStore(redis_client(), prefix, serializer)
+        except Exception as e:
+            print(f"⚠️  {label}: FALLBACK TO MEMORY ({str(e)})")
+    return MemoryStore(max_keys)
+
+def get_store(label, backend_env, prefix, serializer=json, max_keys=100000):
+    """A function returning one process-wide store, created on first call"""
+    state = {}
+    lock = threading.Lock()
+
+    def store():
+        if 'store' not in state:
+            with lock:
+                if 'store' not in state:
+                    state['store'] = create_store(label, backend_env, prefix, serializer, max_keys)
+        return state['store']
+
+    def reset():
+        with lock:
+            state.pop('store', None)
+
+    store.reset = reset
+    return store
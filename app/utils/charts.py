@@ -0,0 +1,199 @@
+"""
+CHAMAlink Chart Service
+=======================
+Financial charts for the reports dashboard.
+
+Series are aggregated in SQL (one row per month, member or day) rather than
+by loading every transaction. Images are drawn with matplotlib's
+object-oriented Figure API on a private Agg canvas, so no global pyplot
+state is shared between threaded workers, and default to screen
+resolution (CHART_DEFAULT_DPI) instead of print quality.
+
+Series and rendered images go through the fragment cache under the chama's
+namespace, so the key is (chama, chart type, date range, size, dpi, data
+version): repeated views of a chart cost one cache read, and any write to
+the chama's transactions moves the version and retires every cached chart.
+"""
+
+import base64
+import io
+import math
+from datetime import datetime
+from sqlalchemy import case, extract, func
+from app import db
+from app.utils.fragment_cache import cached_fragment, chama_namespace
+
+try:
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    MATPLOTLIB_AVAILABLE = True
+except ImportError:
+    MATPLOTLIB_AVAILABLE = False
+
+CHART_TYPES = ('contributions', 'member_contributions', 'balance_trend')
+
+CHART_DEFAULT_SIZE = (10, 6)  # inches
+CHART_DEFAULT_DPI = 100
+CHART_MAX_DPI = 300
+CHART_MAX_SIZE = (20, 12)
+
+# Requested sizes and dpi are rounded to these steps, so the image cache
+# holds a few variants per chart rather than one per float a client sends
+CHART_SIZE_STEP = 0.5  # inches
+CHART_DPI_STEP = 25
+
+# Transaction types that add to or take from the balance trend
+INFLOW_TYPES = ('contribution', 'loan_repayment', 'penalty_payment')
+OUTFLOW_TYPES = ('loan_disbursement',)
+
+def chart_options(width=None, height=None, dpi=None):
+    """Clamp requested size (inches) and dpi to what the service renders, in fixed steps"""
+    def clamp(value, default, low, high, step):
+        try:
+            value = float(value) if value is not None else default
+        except (TypeError, ValueError):
+            value = default
+        if math.isnan(value):
+            value = default
+        return round(min(max(value, low), high) / step) * step
+
+    return (
+        clamp(width, CHART_DEFAULT_SIZE[0], 2, CHART_MAX_SIZE[0], CHART_SIZE_STEP),
+        clamp(height, CHART_DEFAULT_SIZE[1], 2, CHART_MAX_SIZE[1], CHART_SIZE_STEP),
+        int(clamp(dpi, CHART_DEFAULT_DPI, 50, CHART_MAX_DPI, CHART_DPI_STEP))
+    )
+
+def _monthly_contributions(chama_id, start_dt, end_dt):
+    from app.models.chama import Transaction
+
+    year = extract('year', Transaction.created_at)
+    month = extract('month', Transaction.created_at)
+    rows = db.session.query(year, month, func.sum(Transaction.amount)).filter(
+        Transaction.chama_id == chama_id,
+        Transaction.type == 'contribution',
+        Transaction.created_at >= start_dt,
+        Transaction.created_at < end_dt
+    ).group_by(year, month).order_by(year, month).all()
+    return {
+        'labels': [f"{int(y):04d}-{int(m):02d}" for y, m, _ in rows],
+        'values': [float(total or 0) for _, _, total in rows]
+    }
+
+def _member_contributions(chama_id, start_dt, end_dt):
+    from app.models.chama import Transaction
+    from app.models.user import User
+
+    username = func.coalesce(User.username, 'Unknown')
+    rows = db.session.query(username, func.sum(Transaction.amount)).outerjoin(
+        User, User.id == Transaction.user_id
+    ).filter(
+        Transaction.chama_id == chama_id,
+        Transaction.type == 'contribution',
+        Transaction.created_at >= start_dt,
+        Transaction.created_at < end_dt
+    ).group_by(username).order_by(func.sum(Transaction.amount).desc()).all()
+    return {
+        'labels': [name for name, _ in rows],
+        'values': [float(total or 0) for _, total in rows]
+    }
+
+def _balance_trend(chama_id, start_dt, end_dt):
+    from app.models.chama import Transaction
+
+    day = func.date(Transaction.created_at)
+    change = func.sum(case(
+        (Transaction.type.in_(INFLOW_TYPES), Transaction.amount),
+        (Transaction.type.in_(OUTFLOW_TYPES), -Transaction.amount),
+        else_=0
+    ))
+    rows = db.session.query(day, change).filter(
+        Transaction.chama_id == chama_id,
+        Transaction.created_at >= start_dt,
+        Transaction.created_at < end_dt
+    ).group_by(day).order_by(day).all()
+
+    labels, values, balance = [], [], 0.0
+    for date, delta in rows:
+        balance += float(delta or 0)
+        labels.append(str(date))
+        values.append(balance)
+    return {'labels': labels, 'values': values}
+
+_SERIES_BUILDERS = {
+    'contributions': _monthly_contributions,
+    'member_contributions': _member_contributions,
+    'balance_trend': _balance_trend,
+}
+
+def chart_series(chama_id, chart_type, start_dt, end_dt):
+    """Aggregated {'labels', 'values'} for a chart, cached until the chama changes"""
+    builder = _SERIES_BUILDERS[chart_type]
+    return cached_fragment(
+        'chart_series', [chama_namespace(chama_id)],
+        lambda: builder(chama_id, start_dt, end_dt),
+        parts=(chama_id, chart_type, start_dt.isoformat(), end_dt.isoformat())
+    )
+
+def _style_axes(ax):
+    """The seaborn look, set per axes instead of through global rcParams"""
+    ax.set_facecolor('#EAEAF2')
+    ax.grid(True, color='white', linewidth=1)
+    ax.set_axisbelow(True)
+    for spine in ax.spines.values():
+        spine.set_visible(False)
+    ax.tick_params(length=0)
+
+def _no_data(ax, title):
+    ax.text(0.5, 0.5, 'No data available', transform=ax.transAxes, ha='center', va='center')
+    ax.set_title(title)
+
+def render_chart(chart_type, series, width=CHART_DEFAULT_SIZE[0], height=CHART_DEFAULT_SIZE[1],
+                 dpi=CHART_DEFAULT_DPI):
+    """PNG bytes for a series. Safe to call from concurrent threads."""
+    fig = Figure(figsize=(width, height), dpi=dpi)
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    labels, values = series['labels'], series['values']
+
+    if chart_type == 'contributions':
+        _style_axes(ax)
+        positions = range(len(labels))
+        ax.bar(positions, values, color='#28a745')
+        ax.set_xticks(positions, labels)
+        ax.set_title('Monthly Contributions')
+        ax.set_xlabel('Month')
+        ax.set_ylabel('Amount (KES)')
+        ax.tick_params(axis='x', labelrotation=45)
+    elif chart_type == 'member_contributions':
+        if labels:
+            ax.pie(values, labels=labels, autopct='%1.1f%%', startangle=90)
+            ax.set_title('Member Contributions Distribution')
+        else:
+            _no_data(ax, 'Member Contributions Distribution')
+    elif chart_type == 'balance_trend':
+        _style_axes(ax)
+        if labels:
+            dates = [datetime.strptime(label, '%Y-%m-%d').date() for label in labels]
+            ax.plot(dates, values, marker='o', color='#007bff')
+            ax.set_title('Balance Trend')
+            ax.set_xlabel('Date')
+            ax.set_ylabel('Balance (KES)')
+            ax.tick_params(axis='x', labelrotation=45)
+        else:
+            _no_data(ax, 'Balance Trend')
+
+    fig.tight_layout()
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format='png', dpi=dpi, bbox_inches='tight')
+    return buffer.getvalue()
+
+def chart_image(chama_id, chart_type, start_dt, end_dt, width=None, height=None, dpi=None):
+    """Base64 PNG of a chart, rendered once per data version, range, size and dpi"""
+    width, height, dpi = chart_options(width, height, dpi)
+    return cached_fragment(
+        'chart_image', [chama_namespace(chama_id)],
+        lambda: base64.b64encode(render_chart(
+            chart_type, chart_series(chama_id, chart_type, start_dt, end_dt), width, height, dpi
+        )).decode(),
+        parts=(chama_id, chart_type, start_dt.isoformat(), end_dt.isoformat(), width, height, dpi)
+    )
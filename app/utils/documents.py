@@ -0,0 +1,555 @@
+"""
+CHAMAlink Documents
+===================
+PDF receipts, financial reports, meeting minutes and member statements,
+rendered once and served from the artifact store.
+
+A document is produced in two steps:
+    1. the request (or job) gathers its data with a few SQL queries into
+       plain lists and strings
+    2. a pure function draws that data with ReportLab
+
+Step 2 runs in a process pool (PDF_RENDER_WORKERS processes; 0 renders in
+the calling thread), so CPU-bound layout work neither holds a web worker's
+GIL nor waits behind it. The PDF goes to the content-addressed artifact
+store and a DocumentArtifact row maps the document (receipt:12,
+statement:3:7:2026-09, ...) to it along with a hash of the data it was
+drawn from. A later download whose data hashes the same is served straight
+from storage; receipts never change once issued, so they skip even the
+data queries unless they were drawn with an older DOCUMENT_LAYOUT_VERSION.
+
+Month-end member statements are rendered by background jobs, one per
+chama, across the whole pool.
+"""
+
+import hashlib
+import io
+import json
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from xml.sax.saxutils import escape
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from app import db
+from app.utils.jobs import job_handler, periodic_task, enqueue_job
+from app.utils.s3_utils import get_artifact_store, send_artifact
+
+try:
+    from reportlab.lib import colors
+    from reportlab.lib.enums import TA_CENTER
+    from reportlab.lib.pagesizes import A4, letter
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.lib.units import inch
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, PageBreak
+    REPORTLAB_AVAILABLE = True
+except ImportError:
+    REPORTLAB_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Bump when a layout changes so every stored document is redrawn on next download
+DOCUMENT_LAYOUT_VERSION = 1
+
+PDF_RENDER_WORKERS = int(os.getenv('PDF_RENDER_WORKERS', min(4, os.cpu_count() or 1)))
+
+# Seconds one render call (a single document or one batch) may take
+PDF_RENDER_TIMEOUT = 120
+
+# Statements rendered and recorded per round trip to the pool
+STATEMENT_BATCH_SIZE = 200
+
+# Seconds between checks for a new month's statement run
+STATEMENT_SCHEDULE_INTERVAL = 60 * 60
+
+# Rows shown in the "recent transactions" tables of the financial reports
+RECENT_TRANSACTIONS = 20
+
+def _type_label(value):
+    return (value or '').replace('_', ' ').title()
+
+def _truncate(text, length=30):
+    text = text or ''
+    return text[:length] + '...' if len(text) > length else text
+
+# ---------------------------------------------------------------------------
+# Document data: SQL in the calling process, plain values out
+# ---------------------------------------------------------------------------
+
+def receipt_data(receipt):
+    rows = [
+        ['Receipt No:', receipt.receipt_number],
+        ['Date:', receipt.generated_at.strftime('%Y-%m-%d %H:%M')],
+        ['Chama:', receipt.chama.name],
+        ['Member:', receipt.user.full_name],
+        ['Payment Type:', _type_label(receipt.receipt_type)],
+        ['Amount:', f'KES {receipt.amount:,.2f}'],
+        ['Payment Method:', _type_label(receipt.payment_method or 'mpesa')],
+    ]
+    if receipt.payment_reference:
+        rows.append(['Reference:', receipt.payment_reference])
+    if receipt.description:
+        rows.append(['Notes:', receipt.description])
+    return {'rows': rows, 'issued': receipt.generated_at.strftime('%Y-%m-%d %H:%M')}
+
+def chama_report_data(chama, start_dt, end_dt):
+    from app.utils.reporting import build_chama_report
+
+    report = build_chama_report(chama.id, start_dt, end_dt)
+    return {
+        'chama': chama.name,
+        'start': start_dt.strftime('%Y-%m-%d'),
+        'end': end_dt.strftime('%Y-%m-%d'),
+        'summary': [
+            ['Total Contributions', f"{report['total_contributions']:,.0f}"],
+            ['Total Loans Disbursed', f"{report['total_loans']:,.0f}"],
+            ['Total Penalties', f"{report['total_penalties']:,.0f}"],
+            ['Current Balance', f"{chama.total_balance or 0:,.0f}"],
+        ],
+        'transactions': [[
+            t.created_at.strftime('%Y-%m-%d'),
+            _type_label(t.type),
+            f'{t.amount:,.0f}',
+            t.user.username if t.user else 'System',
+            _truncate(t.description)
+        ] for t in report['transactions']]
+    }
+
+def financial_report_data(chama):
+    from app.models.chama import Transaction, chama_members
+    from app.models.user import User
+
+    totals = dict(db.session.query(Transaction.type, func.coalesce(func.sum(Transaction.amount), 0.0)).filter(
+        Transaction.chama_id == chama.id,
+        Transaction.type.in_(('contribution', 'loan', 'loan_disbursement'))
+    ).group_by(Transaction.type).all())
+    recent = db.session.query(
+        Transaction.created_at, Transaction.type, Transaction.amount, User.username
+    ).outerjoin(User, User.id == Transaction.user_id).filter(
+        Transaction.chama_id == chama.id
+    ).order_by(Transaction.created_at.desc(), Transaction.id.desc()).limit(RECENT_TRANSACTIONS).all()
+    member_count = db.session.query(func.count()).select_from(chama_members).filter(
+        chama_members.c.chama_id == chama.id
+    ).scalar()
+
+    return {
+        'chama': chama.name,
+        'summary': [
+            ['Total Balance', f'KES {chama.total_balance or 0:,.2f}'],
+            ['Total Contributions', f"KES {totals.get('contribution', 0):,.2f}"],
+            ['Total Loans', f"KES {totals.get('loan', 0) + totals.get('loan_disbursement', 0):,.2f}"],
+            ['Monthly Target', f'KES {chama.monthly_contribution or 0:,.2f}'],
+            ['Number of Members', str(member_count)],
+        ],
+        'transactions': [[
+            created_at.strftime('%Y-%m-%d'), _type_label(trans_type), f'KES {amount:,.2f}', username or 'System'
+        ] for created_at, trans_type, amount, username in recent]
+    }
+
+def minutes_data(chama):
+    from app.models.meeting_minutes import MeetingMinutes
+    from app.models.user import User
+
+    rows = db.session.query(MeetingMinutes, User.username).outerjoin(
+        User, User.id == MeetingMinutes.secretary_id
+    ).filter(MeetingMinutes.chama_id == chama.id).order_by(
+        MeetingMinutes.meeting_date.desc(), MeetingMinutes.id.desc()
+    ).all()
+
+    def attendee_list(attendees):
+        if isinstance(attendees, (list, tuple)):
+            return ', '.join(str(attendee) for attendee in attendees)
+        return str(attendees) if attendees else ''
+
+    return {
+        'chama': chama.name,
+        'minutes': [{
+            'title': minutes.meeting_title,
+            'date': minutes.meeting_date.strftime('%B %d, %Y'),
+            'status': minutes.status or 'draft',
+            'secretary': secretary or 'Unknown',
+            'attendees': attendee_list(minutes.attendees),
+            'content': minutes.minutes_content or '',
+            'decisions': minutes.decisions_made or ''
+        } for minutes, secretary in rows]
+    }
+
+def period_bounds(period):
+    """[start, end) datetimes of a 'YYYY-MM' period"""
+    start = datetime.strptime(period, '%Y-%m')
+    end = start.replace(year=start.year + 1, month=1) if start.month == 12 else start.replace(month=start.month + 1)
+    return start, end
+
+def previous_period(now=None):
+    first = (now or datetime.utcnow()).replace(day=1)
+    return (first.replace(year=first.year - 1, month=12) if first.month == 1
+            else first.replace(month=first.month - 1)).strftime('%Y-%m')
+
+def statements_data(chama_id, period, user_ids=None):
+    """{user_id: statement data} for a chama's members, in three queries however many members"""
+    from app.models.chama import Chama, Transaction, chama_members
+    from app.models.user import User
+
+    start, end = period_bounds(period)
+    chama_name = db.session.query(Chama.name).filter(Chama.id == chama_id).scalar()
+    members = db.session.query(User.id, User.first_name, User.last_name, User.username).join(
+        chama_members, chama_members.c.user_id == User.id
+    ).filter(chama_members.c.chama_id == chama_id)
+    opening = db.session.query(Transaction.user_id, func.sum(Transaction.amount)).filter(
+        Transaction.chama_id == chama_id,
+        Transaction.type == 'contribution',
+        Transaction.created_at < start
+    )
+    activity = db.session.query(
+        Transaction.user_id, Transaction.created_at, Transaction.type, Transaction.amount, Transaction.transaction_id
+    ).filter(
+        Transaction.chama_id == chama_id,
+        Transaction.created_at >= start,
+        Transaction.created_at < end
+    )
+    if user_ids is not None:
+        members = members.filter(User.id.in_(user_ids))
+        opening = opening.filter(Transaction.user_id.in_(user_ids))
+        activity = activity.filter(Transaction.user_id.in_(user_ids))
+
+    opening = dict(opening.group_by(Transaction.user_id).all())
+    transactions, totals = {}, {}
+    for user_id, created_at, trans_type, amount, reference in activity.order_by(
+            Transaction.user_id, Transaction.created_at, Transaction.id):
+        transactions.setdefault(user_id, []).append(
+            [created_at.strftime('%Y-%m-%d'), _type_label(trans_type), f'KES {amount:,.2f}', reference or ''])
+        by_type = totals.setdefault(user_id, {})
+        by_type[trans_type] = by_type.get(trans_type, 0.0) + amount
+
+    statements = {}
+    for user_id, first_name, last_name, username in members.order_by(User.id):
+        by_type = totals.get(user_id, {})
+        opening_contributions = float(opening.get(user_id) or 0)
+        statements[user_id] = {
+            'chama': chama_name,
+            'member': f'{first_name} {last_name}' if first_name and last_name else username,
+            'period': start.strftime('%B %Y'),
+            'opening': f'KES {opening_contributions:,.2f}',
+            'closing': f"KES {opening_contributions + by_type.get('contribution', 0.0):,.2f}",
+            'totals': [[_type_label(t), f'KES {amount:,.2f}'] for t, amount in sorted(by_type.items())],
+            'transactions': transactions.get(user_id, [])
+        }
+    return statements
+
+def statement_key(chama_id, user_id, period):
+    return f'statement:{chama_id}:{user_id}:{period}'
+
+# ---------------------------------------------------------------------------
+# Rendering: pure functions of the data above, safe to run in any process
+# ---------------------------------------------------------------------------
+
+def _grid_table(rows, col_widths, font_size=10, header=True, align='CENTER'):
+    table = Table(rows, colWidths=col_widths)
+    style = [
+        ('ALIGN', (0, 0), (-1, -1), align),
+        ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
+        ('FONTSIZE', (0, 0), (-1, -1), font_size),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black),
+    ]
+    if header:
+        style += [
+            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+        ]
+    else:
+        style += [
+            ('BACKGROUND', (0, 0), (0, -1), colors.grey),
+            ('TEXTCOLOR', (0, 0), (0, -1), colors.whitesmoke),
+            ('BACKGROUND', (1, 0), (1, -1), colors.beige),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 12),
+        ]
+    table.setStyle(TableStyle(style))
+    return table
+
+def _build(elements, pagesize=letter):
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=pagesize, invariant=1)
+    doc.build(elements)
+    return buffer.getvalue()
+
+def _render_receipt(data):
+    styles = getSampleStyleSheet()
+    title_style = ParagraphStyle('ReceiptTitle', parent=styles['Heading1'], fontSize=24, spaceAfter=30,
+                                 alignment=TA_CENTER)
+    footer_style = ParagraphStyle('Footer', parent=styles['Normal'], fontSize=10, alignment=TA_CENTER)
+    return _build([
+        Paragraph("PAYMENT RECEIPT", title_style),
+        Spacer(1, 20),
+        _grid_table(data['rows'], [2 * inch, 4 * inch], font_size=12, header=False, align='LEFT'),
+        Spacer(1, 30),
+        Paragraph("This is an official receipt generated by ChamaLink", footer_style),
+        Paragraph(f"Issued on: {data['issued']}", footer_style),
+    ])
+
+def _render_chama_report(data):
+    styles = getSampleStyleSheet()
+    title_style = ParagraphStyle('ReportTitle', parent=styles['Heading1'], fontSize=18, textColor=colors.blue,
+                                 alignment=TA_CENTER)
+    elements = [
+        Paragraph(f"Financial Report - {escape(data['chama'])}", title_style),
+        Spacer(1, 12),
+        Paragraph(f"Report Period: {data['start']} to {data['end']}", styles['Normal']),
+        Spacer(1, 12),
+        Paragraph("Financial Summary", styles['Heading2']),
+        _grid_table([['Metric', 'Amount (KES)']] + data['summary'], [3 * inch, 2 * inch], font_size=12),
+        Spacer(1, 24),
+    ]
+    if data['transactions']:
+        elements.append(Paragraph("Recent Transactions", styles['Heading2']))
+        elements.append(_grid_table([['Date', 'Type', 'Amount', 'User', 'Description']] + data['transactions'],
+                                    [1.2 * inch, 1.3 * inch, 1 * inch, 1 * inch, 1.5 * inch], font_size=8))
+    return _build(elements, pagesize=A4)
+
+def _render_financial_report(data):
+    styles = getSampleStyleSheet()
+    elements = [
+        Paragraph(f"<b>Financial Report - {escape(data['chama'])}</b>", styles['Title']),
+        Spacer(1, 20),
+        _grid_table([['Financial Summary', '']] + data['summary'], [200, 200], font_size=12),
+        Spacer(1, 30),
+    ]
+    if data['transactions']:
+        elements.append(Paragraph("<b>Recent Transactions</b>", styles['Heading2']))
+        elements.append(Spacer(1, 10))
+        elements.append(_grid_table([['Date', 'Type', 'Amount', 'Member']] + data['transactions'],
+                                    [100, 80, 100, 120]))
+    return _build(elements)
+
+def _render_minutes(data):
+    styles = getSampleStyleSheet()
+    elements = [
+        Paragraph(f"<b>All Meeting Minutes - {escape(data['chama'])}</b>", styles['Title']),
+        Spacer(1, 30),
+        Paragraph("<b>Table of Contents</b>", styles['Heading1']),
+        Spacer(1, 10),
+    ]
+    for i, minutes in enumerate(data['minutes'], 1):
+        elements.append(Paragraph(f"{i}. {escape(minutes['title'])} - {minutes['date']}", styles['Normal']))
+    elements.append(PageBreak())
+
+    for i, minutes in enumerate(data['minutes'], 1):
+        elements.append(Paragraph(f"<b>{i}. {escape(minutes['title'])}</b>", styles['Heading1']))
+        elements.append(Spacer(1, 10))
+        details = (f"<b>Date:</b> {minutes['date']}<br/>"
+                   f"<b>Status:</b> {escape(minutes['status'].title())}<br/>"
+                   f"<b>Secretary:</b> {escape(minutes['secretary'])}<br/>")
+        if minutes['attendees']:
+            details += f"<b>Attendees:</b> {escape(minutes['attendees'])}<br/>"
+        elements.append(Paragraph(details, styles['Normal']))
+        elements.append(Spacer(1, 20))
+
+        elements.append(Paragraph("<b>Meeting Content:</b>", styles['Heading2']))
+        elements.append(Spacer(1, 10))
+        for line in minutes['content'].split('\n'):
+            if line.strip():
+                elements.append(Paragraph(escape(line), styles['Normal']))
+        if minutes['decisions']:
+            elements.append(Paragraph("<b>Decisions Made:</b>", styles['Heading2']))
+            for line in minutes['decisions'].split('\n'):
+                if line.strip():
+                    elements.append(Paragraph(escape(line), styles['Normal']))
+
+        if i < len(data['minutes']):
+            elements.append(PageBreak())
+    return _build(elements)
+
+def _render_statement(data):
+    styles = getSampleStyleSheet()
+    elements = [
+        Paragraph(f"<b>Member Statement - {escape(data['chama'] or '')}</b>", styles['Title']),
+        Spacer(1, 12),
+        Paragraph(f"<b>Member:</b> {escape(data['member'])}<br/><b>Period:</b> {data['period']}", styles['Normal']),
+        Spacer(1, 20),
+        _grid_table([
+            ['Contributions brought forward', data['opening']],
+            ['Contributions carried forward', data['closing']],
+        ], [3 * inch, 2.5 * inch], font_size=11, header=False, align='LEFT'),
+        Spacer(1, 20),
+    ]
+    if data['totals']:
+        elements.append(Paragraph("Summary", styles['Heading2']))
+        elements.append(_grid_table([['Type', 'Amount']] + data['totals'], [3 * inch, 2.5 * inch]))
+        elements.append(Spacer(1, 20))
+    elements.append(Paragraph("Transactions", styles['Heading2']))
+    if data['transactions']:
+        elements.append(_grid_table([['Date', 'Type', 'Amount', 'Reference']] + data['transactions'],
+                                    [1.2 * inch, 1.6 * inch, 1.5 * inch, 2 * inch], font_size=9))
+    else:
+        elements.append(Paragraph("No transactions in this period.", styles['Normal']))
+    return _build(elements)
+
+_RENDERERS = {
+    'receipt': _render_receipt,
+    'chama_report': _render_chama_report,
+    'financial_report': _render_financial_report,
+    'minutes': _render_minutes,
+    'statement': _render_statement,
+}
+
+def render_pdf(kind, data):
+    """PDF bytes for a document's data"""
+    return _RENDERERS[kind](data)
+
+_render_pool = None
+_render_pool_lock = threading.Lock()
+
+def get_render_pool():
+    """Process pool shared by every request thread and job worker, or None to render inline"""
+    global _render_pool
+    if PDF_RENDER_WORKERS <= 0:
+        return None
+    if _render_pool is None:
+        with _render_pool_lock:
+            if _render_pool is None:
+                # spawn, not fork: a forked child would inherit the web process's
+                # threads' locks and open database connections
+                _render_pool = ProcessPoolExecutor(max_workers=PDF_RENDER_WORKERS,
+                                                   mp_context=multiprocessing.get_context('spawn'))
+    return _render_pool
+
+def _discard_render_pool(pool):
+    global _render_pool
+    with _render_pool_lock:
+        if _render_pool is pool:
+            _render_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+def render_documents(kind, datas):
+    """PDF bytes for each data dict, rendered in parallel across the pool"""
+    pool = get_render_pool()
+    if pool is not None and datas:
+        chunksize = max(1, len(datas) // (PDF_RENDER_WORKERS * 4))
+        try:
+            return list(pool.map(render_pdf, [kind] * len(datas), datas,
+                                 timeout=PDF_RENDER_TIMEOUT, chunksize=chunksize))
+        except BrokenProcessPool as e:
+            logger.warning(f"PDF render pool died ({e}); rendering {len(datas)} {kind} documents inline")
+            _discard_render_pool(pool)
+    return [render_pdf(kind, data) for data in datas]
+
+# ---------------------------------------------------------------------------
+# Artifacts
+# ---------------------------------------------------------------------------
+
+def data_hash(kind, data):
+    payload = json.dumps([DOCUMENT_LAYOUT_VERSION, kind, data], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+def _record(artifact, document_key, kind, digest, pdf, filename, chama_id=None, user_id=None):
+    """Store a rendered PDF and point the document's row at it"""
+    from app.models.document import DocumentArtifact
+
+    content_hash = get_artifact_store().put(pdf)
+    now = datetime.utcnow()
+    fields = {'data_hash': digest, 'layout_version': DOCUMENT_LAYOUT_VERSION, 'content_hash': content_hash,
+              'size': len(pdf), 'filename': filename, 'rendered_at': now}
+    if artifact is None:
+        artifact = DocumentArtifact(document_key=document_key, kind=kind, chama_id=chama_id, user_id=user_id,
+                                    created_at=now, **fields)
+        try:
+            with db.session.begin_nested():
+                db.session.add(artifact)
+            return artifact
+        except IntegrityError:
+            # Another request rendered the same document at the same moment
+            artifact = DocumentArtifact.query.filter_by(document_key=document_key).one()
+    for name, value in fields.items():
+        setattr(artifact, name, value)
+    return artifact
+
+def get_document(kind, document_key, build_data, filename, chama_id=None, user_id=None, immutable=False):
+    """The DocumentArtifact for a document, rendering it only if its data changed.
+
+    build_data() returns the document's data; it is not called at all for
+    an immutable document already rendered with the current layout.
+    """
+    from app.models.document import DocumentArtifact
+
+    artifact = DocumentArtifact.query.filter_by(document_key=document_key).first()
+    if artifact is not None and immutable and artifact.layout_version == DOCUMENT_LAYOUT_VERSION:
+        return artifact
+    data = build_data()
+    digest = data_hash(kind, data)
+    if artifact is not None and artifact.data_hash == digest:
+        return artifact
+    pdf = render_documents(kind, [data])[0]
+    return _record(artifact, document_key, kind, digest, pdf, filename, chama_id, user_id)
+
+def serve_document(kind, document_key, build_data, download_name, chama_id=None, user_id=None, immutable=False):
+    """Download response for a document, served from the artifact store"""
+    artifact = get_document(kind, document_key, build_data, download_name, chama_id, user_id, immutable)
+    db.session.commit()
+    return send_artifact(artifact.content_hash, download_name)
+
+# ---------------------------------------------------------------------------
+# Month-end statements
+# ---------------------------------------------------------------------------
+
+def render_chama_statements(chama_id, period):
+    """Render every member's statement for a month; returns how many were (re)rendered"""
+    from app.models.document import DocumentArtifact
+
+    statements = statements_data(chama_id, period)
+    user_ids = sorted(statements)
+    rendered = 0
+    for i in range(0, len(user_ids), STATEMENT_BATCH_SIZE):
+        batch = {statement_key(chama_id, user_id, period): user_id for user_id in user_ids[i:i + STATEMENT_BATCH_SIZE]}
+        existing = {artifact.document_key: artifact for artifact in
+                    DocumentArtifact.query.filter(DocumentArtifact.document_key.in_(list(batch)))}
+        stale = []
+        for key, user_id in batch.items():
+            digest = data_hash('statement', statements[user_id])
+            artifact = existing.get(key)
+            if artifact is None or artifact.data_hash != digest:
+                stale.append((key, user_id, digest, artifact))
+
+        pdfs = render_documents('statement', [statements[user_id] for _, user_id, _, _ in stale])
+        for (key, user_id, digest, artifact), pdf in zip(stale, pdfs):
+            _record(artifact, key, 'statement', digest, pdf, f'statement_{period}_{user_id}.pdf', chama_id, user_id)
+        rendered += len(stale)
+    return rendered
+
+def queue_monthly_statements(period=None):
+    """One render_statements job per active chama; returns the number of jobs queued"""
+    from app.models.chama import Chama
+
+    period = period or previous_period()
+    chama_ids = [chama_id for (chama_id,) in db.session.query(Chama.id).filter(Chama.status == 'active')]
+    for chama_id in chama_ids:
+        enqueue_job('render_statements', {'chama_id': chama_id, 'period': period})
+    return len(chama_ids)
+
+@job_handler('render_statements')
+def process_statements(payload):
+    render_chama_statements(payload['chama_id'], payload['period'])
+
+@job_handler('queue_statements')
+def process_statement_run(payload):
+    queue_monthly_statements(payload['period'])
+
+@periodic_task('monthly_statements', STATEMENT_SCHEDULE_INTERVAL)
+def schedule_statements():
+    """Start last month's statement run once, on the first sweep of a new month"""
+    from app.models.jobs import OutboxJob
+
+    now = datetime.utcnow()
+    period = previous_period(now)
+    month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    runs = db.session.query(OutboxJob.payload).filter(
+        OutboxJob.job_type == 'queue_statements',
+        OutboxJob.created_at >= month_start
+    ).all()
+    if not any((payload or {}).get('period') == period for (payload,) in runs):
+        enqueue_job('queue_statements', {'period': period})
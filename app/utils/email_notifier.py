@@ -2,11 +2,11 @@
 Email notification system for security events
 """
 
-import smtplib
 import json
 from datetime import datetime
 from flask import current_app
 import logging
+from app.utils.mail_transport import get_smtp_pool, build_message
 
 # Configure email logger
 email_logger = logging.getLogger('email_notifications')
@@ -86,17 +86,24 @@ class SecurityEmailNotifier:
             return False
     
     def _send_email(self, to_email, subject, html_content, priority='normal'):
-        """Send email using SMTP - simplified version"""
+        """Send email over a pooled SMTP session, or log it when SMTP is not configured"""
         try:
-            # For now, just log the email content since SMTP setup may not be configured
-            email_logger.info(f"EMAIL TO: {to_email}")
-            email_logger.info(f"SUBJECT: {subject}")
-            email_logger.info(f"PRIORITY: {priority}")
-            email_logger.info(f"CONTENT: {html_content[:200]}...")
-            
-            # In production, implement proper SMTP sending here
-            # This simplified version just logs the email for demonstration
+            smtp_password = getattr(self, 'smtp_password', '')
+            if not smtp_password:
+                # SMTP not configured: log the email content instead
+                email_logger.info(f"EMAIL TO: {to_email}")
+                email_logger.info(f"SUBJECT: {subject}")
+                email_logger.info(f"PRIORITY: {priority}")
+                email_logger.info(f"CONTENT: {html_content[:200]}...")
+                return True
             
+            # Alerts go out one after another; the pool keeps the session logged in between them
+            pool = get_smtp_pool(self.smtp_server, self.smtp_port, self.smtp_username, smtp_password)
+            message = build_message(
+                self.from_email, to_email, subject, html_content,
+                headers={'X-Priority': '1' if priority == 'high' else '3'}
+            )
+            pool.send(self.from_email, to_email, message)
             return True
             
         except Exception as e:
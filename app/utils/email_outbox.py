@@ -0,0 +1,155 @@
+"""
+CHAMAlink Email Outbox
+======================
+Queued email delivery. queue_emails() writes one EmailMessage row per
+recipient in the caller's transaction and schedules the dispatcher, so a
+bulk job such as the subscription expiry warnings finishes as soon as its
+rows are committed.
+
+The dispatcher job claims due messages oldest first and sends them in
+batches of EMAIL_BATCH_SIZE, each batch over one pooled SMTP session (see
+mail_transport), with up to one batch per pooled connection in flight at a
+time. Sends are throttled per mail account through the rate limiter
+backend. Each claim and each batch's outcomes are committed as the
+dispatcher goes, so a message is sent once even if the job fails later.
+Temporary failures are retried with exponential backoff; 5xx rejections
+such as unknown mailboxes fail at once. Queueing, claiming and retries are
+the shared Outbox (see app.utils.outbox).
+"""
+
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from app import db
+from app.utils.jobs import job_handler, periodic_task
+from app.utils.mail_transport import is_permanent_failure
+from app.utils.outbox import Outbox
+
+logger = logging.getLogger(__name__)
+
+# Messages sent over one SMTP session before it goes back to the pool
+EMAIL_BATCH_SIZE = int(os.getenv('EMAIL_BATCH_SIZE', 50))
+
+# Messages one dispatcher job sends before handing over to the next
+EMAIL_DISPATCH_LIMIT = 1000
+
+# Messages per minute allowed per mail account, across all workers
+EMAIL_RATE_LIMIT = int(os.getenv('EMAIL_MESSAGES_PER_MINUTE', 600))
+EMAIL_RATE_WINDOW = 60
+
+# First retry delay in seconds; doubles with every attempt
+EMAIL_RETRY_DELAY = 60
+
+# Seconds between dispatcher runs scheduled by the job workers (retries coming due)
+EMAIL_DISPATCH_INTERVAL = 60
+
+# Seconds a claimed batch may stay 'sending' before the sweep takes it back
+EMAIL_CLAIM_TIMEOUT = 300
+
+outbox = Outbox('email_dispatch', 'app.models.email.EmailMessage')
+
+def get_email_transport():
+    """EmailService the dispatcher sends through"""
+    from app.utils.email_service import email_service
+    return email_service
+
+def queue_emails(messages, category=None, max_attempts=5):
+    """Queue rendered emails. Runs in the caller's transaction.
+
+    ``messages`` are dicts with recipient, subject and html_content, and
+    optionally text_content, user_id, broadcast_id and dedupe_key. A
+    message whose dedupe_key is already in the outbox is skipped. Returns
+    the number of messages queued.
+    """
+    seen = outbox.known_keys([message.get('dedupe_key') for message in messages])
+    now = datetime.utcnow()
+    rows = []
+    for message in messages:
+        key = message.get('dedupe_key')
+        if key:
+            if key in seen:
+                continue
+            seen.add(key)
+        rows.append({
+            'recipient': message['recipient'], 'subject': message['subject'],
+            'html_content': message['html_content'], 'text_content': message.get('text_content'),
+            'category': category, 'dedupe_key': key, 'status': 'queued', 'attempts': 0,
+            'max_attempts': max_attempts, 'next_attempt_at': now, 'user_id': message.get('user_id'),
+            'broadcast_id': message.get('broadcast_id'), 'created_at': now
+        })
+    return outbox.insert(rows)
+
+def queue_email(recipient, subject, html_content, text_content=None, category=None, user_id=None, dedupe_key=None):
+    """queue_emails() for a single message"""
+    return queue_emails([{'recipient': recipient, 'subject': subject, 'html_content': html_content,
+                          'text_content': text_content, 'user_id': user_id, 'dedupe_key': dedupe_key}],
+                        category=category)
+
+def _due_ids(group, now, size):
+    from app.models.email import EmailMessage
+
+    return [row[0] for row in db.session.query(EmailMessage.id).filter(
+        *outbox.due(now)
+    ).order_by(EmailMessage.id).limit(size)]
+
+def _send_chunk(transport, chunk):
+    try:
+        return transport.send_batch(chunk)
+    except Exception as e:
+        logger.warning(f"Email batch of {len(chunk)} failed: {e}")
+        return [e] * len(chunk)
+
+def _send(transport, batch, now):
+    """Send claimed messages, one chunk per pooled session in parallel, and record each outcome"""
+    # Sessions only see plain tuples; ORM rows stay on this thread
+    payloads = [(email.recipient, email.subject, email.html_content, email.text_content) for email in batch]
+    chunks = [payloads[start:start + EMAIL_BATCH_SIZE] for start in range(0, len(payloads), EMAIL_BATCH_SIZE)]
+    workers = min(len(chunks), transport.smtp_pool().size)
+    if workers > 1:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = [result for chunk_results in executor.map(lambda chunk: _send_chunk(transport, chunk), chunks)
+                       for result in chunk_results]
+    else:
+        results = [result for chunk in chunks for result in _send_chunk(transport, chunk)]
+
+    sent = 0
+    for email, error in zip(batch, results):
+        if error is None:
+            email.status = 'sent'
+            email.sent_at = now
+            email.claim_token = None
+            email.last_error = None
+            sent += 1
+        elif is_permanent_failure(error):
+            email.status = 'failed'
+            email.claim_token = None
+            email.last_error = str(error)
+        else:
+            outbox.retry_or_fail(email, str(error), now, EMAIL_RETRY_DELAY)
+    return sent
+
+def dispatch_emails(limit=EMAIL_DISPATCH_LIMIT):
+    """Send due messages over pooled SMTP sessions, within the account's rate limit.
+
+    Returns {'sent': n, 'processed': n, 'throttled': bool}.
+    """
+    transport = get_email_transport()
+    # Oldest first in one group; enough per round for one batch per pooled connection
+    return outbox.dispatch(lambda now: [None], _due_ids, lambda batch, now: _send(transport, batch, now),
+                           limiter_key=f'email:{transport.sender_email}', rate_limit=EMAIL_RATE_LIMIT,
+                           rate_window=EMAIL_RATE_WINDOW, batch_size=EMAIL_BATCH_SIZE * transport.smtp_pool().size,
+                           limit=limit, claim_timeout=EMAIL_CLAIM_TIMEOUT)
+
+@job_handler('email_dispatch')
+def process_dispatch(payload):
+    outbox.continue_dispatch(dispatch_emails(), EMAIL_RATE_WINDOW)
+
+@periodic_task('email_dispatch', EMAIL_DISPATCH_INTERVAL)
+def schedule_dispatch():
+    """Release stalled claims and enqueue a dispatcher for retries coming due"""
+    outbox.schedule_dispatch()
+
+def outbox_stats():
+    """Message counts by status"""
+    return outbox.stats()
@@ -1,12 +1,243 @@
 import smtplib
-import ssl
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from email.mime.base import MIMEBase
-from email import encoders
 import os
+import re
 from flask import current_app, render_template_string
 from datetime import datetime
+from app.utils.mail_transport import get_smtp_pool, build_message
+
+EMAIL_TEMPLATES = {
+    'verification': """
+    <!DOCTYPE html>
+    <html>
+    <head>
+        <style>
+            .email-container { max-width: 600px; margin: 0 auto; font-family: Arial, sans-serif; }
+            .header { background: #667eea; color: white; padding: 20px; text-align: center; }
+            .content { padding: 30px 20px; }
+            .button { display: inline-block; background: #667eea; color: white; padding: 12px 30px; text-decoration: none; border-radius: 5px; margin: 20px 0; }
+            .footer { background: #f8f9fa; padding: 20px; text-align: center; color: #6c757d; }
+        </style>
+    </head>
+    <body>
+        <div class="email-container">
+            <div class="header">
+                <h1>ChamaLink</h1>
+                <p>Welcome to Kenya's Premier Chama Management Platform</p>
+            </div>
+            <div class="content">
+                <h2>Welcome, {{ user_name }}!</h2>
+                <p>Thank you for joining ChamaLink. To complete your registration and secure your account, please verify your email address.</p>
+                <p>Click the button below to verify your email:</p>
+                <a href="{{ verification_url }}" class="button">Verify Email Address</a>
+                <p>If the button doesn't work, copy and paste this link into your browser:</p>
+                <p>{{ verification_url }}</p>
+                <p>This verification link will expire in 24 hours for security reasons.</p>
+            </div>
+            <div class="footer">
+                <p>&copy; 2025 ChamaLink. All rights reserved.</p>
+            </div>
+        </div>
+    </body>
+    </html>
+    """,
+    
+    'subscription_warning': """
+    <!DOCTYPE html>
+    <html>
+    <head>
+        <style>
+            .email-container { max-width: 600px; margin: 0 auto; font-family: Arial, sans-serif; }
+            .header { background: #ffc107; color: #212529; padding: 20px; text-align: center; }
+            .content { padding: 30px 20px; }
+            .button { display: inline-block; background: #667eea; color: white; padding: 12px 30px; text-decoration: none; border-radius: 5px; margin: 20px 0; }
+            .warning { background: #fff3cd; border: 1px solid #ffeaa7; padding: 15px; border-radius: 5px; margin: 20px 0; }
+        </style>
+    </head>
+    <body>
+        <div class="email-container">
+            <div class="header">
+                <h1>⚠️ Subscription Expiry Notice</h1>
+            </div>
+            <div class="content">
+                <h2>Hello {{ user_name }},</h2>
+                <div class="warning">
+                    <strong>Your ChamaLink {{ plan_name }} subscription will expire in {{ days_remaining }} days.</strong>
+                </div>
+                <p>To continue enjoying uninterrupted access to your chama management features, please renew your subscription.</p>
+                <a href="{{ renewal_url }}" class="button">Renew Subscription</a>
+                <p>Don't lose access to your important chama data and features!</p>
+            </div>
+            <div class="footer">
+                <p>&copy; 2025 ChamaLink. All rights reserved.</p>
+            </div>
+        </div>
+    </body>
+    </html>
+    """,
+    
+    'subscription_expired': """
+    <!DOCTYPE html>
+    <html>
+    <head>
+        <style>
+            .email-container { max-width: 600px; margin: 0 auto; font-family: Arial, sans-serif; }
+            .header { background: #dc3545; color: white; padding: 20px; text-align: center; }
+            .content { padding: 30px 20px; }
+            .button { display: inline-block; background: #667eea; color: white; padding: 12px 30px; text-decoration: none; border-radius: 5px; margin: 20px 0; }
+            .expired { background: #f8d7da; border: 1px solid #f5c6cb; padding: 15px; border-radius: 5px; margin: 20px 0; }
+        </style>
+    </head>
+    <body>
+        <div class="email-container">
+            <div class="header">
+                <h1>🚫 Subscription Expired</h1>
+            </div>
+            <div class="content">
+                <h2>Hello {{ user_name }},</h2>
+                <div class="expired">
+                    <strong>Your ChamaLink subscription has expired.</strong>
+                </div>
+                <p>Your account access has been limited. To restore full functionality and access to your chama data, please renew your subscription immediately.</p>
+                <a href="{{ renewal_url }}" class="button">Renew Now</a>
+                <p>Your data is safe and will be restored once you renew your subscription.</p>
+            </div>
+            <div class="footer">
+                <p>&copy; 2025 ChamaLink. All rights reserved.</p>
+            </div>
+        </div>
+    </body>
+    </html>
+    """,
+    
+    'payment_confirmation': """
+    <!DOCTYPE html>
+    <html>
+    <head>
+        <style>
+            .email-container { max-width: 600px; margin: 0 auto; font-family: Arial, sans-serif; }
+            .header { background: #28a745; color: white; padding: 20px; text-align: center; }
+            .content { padding: 30px 20px; }
+            .details { background: #d4edda; border: 1px solid #c3e6cb; padding: 15px; border-radius: 5px; margin: 20px 0; }
+        </style>
+    </head>
+    <body>
+        <div class="email-container">
+            <div class="header">
+                <h1>✅ Payment Confirmed</h1>
+            </div>
+            <div class="content">
+                <h2>Hello {{ user_name }},</h2>
+                <p>Your ChamaLink subscription payment has been successfully processed!</p>
+                <div class="details">
+                    <h3>Subscription Details:</h3>
+                    <p><strong>Plan:</strong> {{ plan_name }}</p>
+                    <p><strong>Amount Paid:</strong> {{ amount }}</p>
+                    <p><strong>Start Date:</strong> {{ start_date }}</p>
+                    <p><strong>Expires On:</strong> {{ end_date }}</p>
+                    <p><strong>Receipt Number:</strong> {{ receipt_number }}</p>
+                </div>
+                <p>Thank you for choosing ChamaLink for your chama management needs!</p>
+            </div>
+            <div class="footer">
+                <p>&copy; 2025 ChamaLink. All rights reserved.</p>
+            </div>
+        </div>
+    </body>
+    </html>
+    """,
+    
+    'loan_approval': """
+    <!DOCTYPE html>
+    <html>
+    <head>
+        <style>
+            .email-container { max-width: 600px; margin: 0 auto; font-family: Arial, sans-serif; }
+            .header { background: #007bff; color: white; padding: 20px; text-align: center; }
+            .content { padding: 30px 20px; }
+            .button { display: inline-block; background: #28a745; color: white; padding: 12px 30px; text-decoration: none; border-radius: 5px; margin: 20px 0; }
+            .loan-details { background: #e7f3ff; border: 1px solid #b3d9ff; padding: 15px; border-radius: 5px; margin: 20px 0; }
+        </style>
+    </head>
+    <body>
+        <div class="email-container">
+            <div class="header">
+                <h1>🏛️ Loan Approval Required</h1>
+            </div>
+            <div class="content">
+                <h2>Hello {{ admin_name }},</h2>
+                <p>A new loan application requires your approval in ChamaLink.</p>
+                <div class="loan-details">
+                    <h3>Loan Application Details:</h3>
+                    <p><strong>Applicant:</strong> {{ applicant_name }}</p>
+                    <p><strong>Amount:</strong> {{ amount }}</p>
+                    <p><strong>Purpose:</strong> {{ purpose }}</p>
+                    <p><strong>Chama:</strong> {{ chama_name }}</p>
+                </div>
+                <p>Click the secure link below to review and approve/reject this loan:</p>
+                <a href="{{ approval_url }}" class="button">Review Loan Application</a>
+                <p><strong>Important:</strong> This approval link expires on {{ expires_at }}.</p>
+                <p>Please provide your name and password to complete the approval process.</p>
+            </div>
+            <div class="footer">
+                <p>&copy; 2025 ChamaLink. All rights reserved.</p>
+            </div>
+        </div>
+    </body>
+    </html>
+    """,
+    
+    'account_locked': """
+    <!DOCTYPE html>
+    <html>
+    <head>
+        <style>
+            .email-container { max-width: 600px; margin: 0 auto; font-family: Arial, sans-serif; }
+            .header { background: #dc3545; color: white; padding: 20px; text-align: center; }
+            .content { padding: 30px 20px; }
+            .security { background: #f8d7da; border: 1px solid #f5c6cb; padding: 15px; border-radius: 5px; margin: 20px 0; }
+        </style>
+    </head>
+    <body>
+        <div class="email-container">
+            <div class="header">
+                <h1>🔒 Account Security Alert</h1>
+            </div>
+            <div class="content">
+                <h2>Hello {{ user_name }},</h2>
+                <div class="security">
+                    <strong>Your ChamaLink account has been temporarily locked due to multiple failed login attempts.</strong>
+                </div>
+                <p>For security reasons, your account will be automatically unlocked at {{ unlock_time }}.</p>
+                <p>If you didn't attempt to log in, please contact our support team immediately.</p>
+                <p>To protect your account in the future:</p>
+                <ul>
+                    <li>Use a strong, unique password</li>
+                    <li>Never share your login credentials</li>
+                    <li>Enable email verification for added security</li>
+                </ul>
+            </div>
+            <div class="footer">
+                <p>&copy; 2025 ChamaLink. All rights reserved.</p>
+            </div>
+        </div>
+    </body>
+    </html>
+    """
+}
+
+_PLACEHOLDER = re.compile(r"\{\{ (\w+) \}\}")
+_compiled_templates = {}
+
+def _compile_template(template_name):
+    """Split a template once into literal text and placeholder names.
+
+    Returns [text, name, text, name, ..., text]; rendering is then a join
+    instead of one str.replace() pass over the whole page per variable.
+    """
+    compiled = _compiled_templates.get(template_name)
+    if compiled is None:
+        compiled = _compiled_templates[template_name] = _PLACEHOLDER.split(EMAIL_TEMPLATES.get(template_name, ""))
+    return compiled
 
 class EmailService:
     def __init__(self):
@@ -16,7 +247,27 @@ class EmailService:
         self.sender_name = "ChamaLink Support"
         self.password = os.getenv('MAIL_PASSWORD')
         self.use_tls = os.getenv('MAIL_USE_TLS', 'True').lower() == 'true'
-        
+        # Without STARTTLS the server is reached over implicit TLS; MAIL_USE_SSL=false allows a plain local relay
+        self.use_ssl = os.getenv('MAIL_USE_SSL', str(not self.use_tls)).lower() == 'true'
+
+    @property
+    def security(self):
+        if self.use_tls:
+            return 'starttls'
+        return 'ssl' if self.use_ssl else 'none'
+
+    def smtp_pool(self):
+        """Process-wide pool of logged-in sessions to the configured server"""
+        return get_smtp_pool(self.smtp_server, self.port, self.sender_email, self.password, self.security)
+
+    def build_message(self, recipient_email, subject, html_content, text_content=None):
+        """MIME message with the platform's sender and deliverability headers"""
+        return build_message(
+            f"{self.sender_name} <{self.sender_email}>", recipient_email, f"[ChamaLink] {subject}",
+            html_content, text_content,
+            headers={"Reply-To": self.sender_email, "X-Mailer": "ChamaLink Platform", "X-Priority": "3"}
+        )
+
     def send_email(self, recipient_email, subject, html_content, text_content=None):
         """Send email with HTML content"""
         try:
@@ -24,39 +275,10 @@ class EmailService:
                 current_app.logger.error("Email password not configured")
                 return False
                 
-            message = MIMEMultipart("alternative")
-            message["Subject"] = f"[ChamaLink] {subject}"
-            message["From"] = f"{self.sender_name} <{self.sender_email}>"
-            message["To"] = recipient_email
-            message["Reply-To"] = self.sender_email
-            
-            # Add headers for better deliverability
-            message["X-Mailer"] = "ChamaLink Platform"
-            message["X-Priority"] = "3"
-            
-            # Create text part if provided
-            if text_content:
-                text_part = MIMEText(text_content, "plain", "utf-8")
-                message.attach(text_part)
+            message = self.build_message(recipient_email, subject, html_content, text_content)
             
-            # Create HTML part
-            html_part = MIMEText(html_content, "html", "utf-8")
-            message.attach(html_part)
-            
-            # Create secure connection and send email
-            context = ssl.create_default_context()
-            
-            if self.use_tls:
-                with smtplib.SMTP(self.smtp_server, self.port) as server:
-                    server.starttls(context=context)
-                    server.login(self.sender_email, self.password)
-                    text = message.as_string()
-                    server.sendmail(self.sender_email, recipient_email, text.encode('utf-8'))
-            else:
-                with smtplib.SMTP_SSL(self.smtp_server, self.port, context=context) as server:
-                    server.login(self.sender_email, self.password)
-                    text = message.as_string()
-                    server.sendmail(self.sender_email, recipient_email, text.encode('utf-8'))
+            # Reuse a logged-in pooled session instead of a TLS handshake and login per email
+            self.smtp_pool().send(self.sender_email, recipient_email, message)
             
             current_app.logger.info(f"Email sent successfully to {recipient_email}")
             return True
@@ -83,6 +305,18 @@ class EmailService:
                 return True
             return False
     
+    def send_batch(self, messages):
+        """Send [(recipient, subject, html_content, text_content)] over one pooled session.
+
+        Returns one entry per message: None when sent, otherwise the exception.
+        """
+        if not self.password:
+            raise RuntimeError("Email password not configured")
+        return self.smtp_pool().send_many([
+            (self.sender_email, recipient, self.build_message(recipient, subject, html_content, text_content))
+            for recipient, subject, html_content, text_content in messages
+        ])
+    
     def send_email_verification(self, user, verification_token):
         """Send email verification link"""
         verification_url = f"{os.getenv('BASE_URL', 'http://localhost:5000')}/auth/verify-email/{verification_token}"
@@ -225,15 +459,22 @@ class EmailService:
             current_app.logger.error(f"2FA email sending failed: {e}")
             return False
     
-    def send_subscription_expiry_warning(self, user, days_remaining):
-        """Send subscription expiry warning"""
+    def subscription_expiry_warning_content(self, user, days_remaining, plan_name):
+        """Subject and body of the expiry warning, shared with the bulk warning job"""
         subject = f"ChamaLink Subscription Expires in {days_remaining} Days"
         html_content = self._get_email_template('subscription_warning', {
             'user_name': user.full_name,
             'days_remaining': days_remaining,
-            'plan_name': user.current_subscription.plan.name.title(),
+            'plan_name': plan_name.title(),
             'renewal_url': f"{os.getenv('BASE_URL', 'http://localhost:5000')}/subscription/renew"
         })
+        return subject, html_content
+    
+    def send_subscription_expiry_warning(self, user, days_remaining):
+        """Send subscription expiry warning"""
+        subject, html_content = self.subscription_expiry_warning_content(
+            user, days_remaining, user.current_subscription.plan.name
+        )
         
         return self.send_email(user.email, subject, html_content)
     
@@ -407,231 +648,15 @@ class EmailService:
     
     def _get_email_template(self, template_name, context):
         """Get email template with context variables"""
-        templates = {
-            'verification': """
-            <!DOCTYPE html>
-            <html>
-            <head>
-                <style>
-                    .email-container { max-width: 600px; margin: 0 auto; font-family: Arial, sans-serif; }
-                    .header { background: #667eea; color: white; padding: 20px; text-align: center; }
-                    .content { padding: 30px 20px; }
-                    .button { display: inline-block; background: #667eea; color: white; padding: 12px 30px; text-decoration: none; border-radius: 5px; margin: 20px 0; }
-                    .footer { background: #f8f9fa; padding: 20px; text-align: center; color: #6c757d; }
-                </style>
-            </head>
-            <body>
-                <div class="email-container">
-                    <div class="header">
-                        <h1>ChamaLink</h1>
-                        <p>Welcome to Kenya's Premier Chama Management Platform</p>
-                    </div>
-                    <div class="content">
-                        <h2>Welcome, {{ user_name }}!</h2>
-                        <p>Thank you for joining ChamaLink. To complete your registration and secure your account, please verify your email address.</p>
-                        <p>Click the button below to verify your email:</p>
-                        <a href="{{ verification_url }}" class="button">Verify Email Address</a>
-                        <p>If the button doesn't work, copy and paste this link into your browser:</p>
-                        <p>{{ verification_url }}</p>
-                        <p>This verification link will expire in 24 hours for security reasons.</p>
-                    </div>
-                    <div class="footer">
-                        <p>&copy; 2025 ChamaLink. All rights reserved.</p>
-                    </div>
-                </div>
-            </body>
-            </html>
-            """,
-            
-            'subscription_warning': """
-            <!DOCTYPE html>
-            <html>
-            <head>
-                <style>
-                    .email-container { max-width: 600px; margin: 0 auto; font-family: Arial, sans-serif; }
-                    .header { background: #ffc107; color: #212529; padding: 20px; text-align: center; }
-                    .content { padding: 30px 20px; }
-                    .button { display: inline-block; background: #667eea; color: white; padding: 12px 30px; text-decoration: none; border-radius: 5px; margin: 20px 0; }
-                    .warning { background: #fff3cd; border: 1px solid #ffeaa7; padding: 15px; border-radius: 5px; margin: 20px 0; }
-                </style>
-            </head>
-            <body>
-                <div class="email-container">
-                    <div class="header">
-                        <h1>⚠️ Subscription Expiry Notice</h1>
-                    </div>
-                    <div class="content">
-                        <h2>Hello {{ user_name }},</h2>
-                        <div class="warning">
-                            <strong>Your ChamaLink {{ plan_name }} subscription will expire in {{ days_remaining }} days.</strong>
-                        </div>
-                        <p>To continue enjoying uninterrupted access to your chama management features, please renew your subscription.</p>
-                        <a href="{{ renewal_url }}" class="button">Renew Subscription</a>
-                        <p>Don't lose access to your important chama data and features!</p>
-                    </div>
-                    <div class="footer">
-                        <p>&copy; 2025 ChamaLink. All rights reserved.</p>
-                    </div>
-                </div>
-            </body>
-            </html>
-            """,
-            
-            'subscription_expired': """
-            <!DOCTYPE html>
-            <html>
-            <head>
-                <style>
-                    .email-container { max-width: 600px; margin: 0 auto; font-family: Arial, sans-serif; }
-                    .header { background: #dc3545; color: white; padding: 20px; text-align: center; }
-                    .content { padding: 30px 20px; }
-                    .button { display: inline-block; background: #667eea; color: white; padding: 12px 30px; text-decoration: none; border-radius: 5px; margin: 20px 0; }
-                    .expired { background: #f8d7da; border: 1px solid #f5c6cb; padding: 15px; border-radius: 5px; margin: 20px 0; }
-                </style>
-            </head>
-            <body>
-                <div class="email-container">
-                    <div class="header">
-                        <h1>🚫 Subscription Expired</h1>
-                    </div>
-                    <div class="content">
-                        <h2>Hello {{ user_name }},</h2>
-                        <div class="expired">
-                            <strong>Your ChamaLink subscription has expired.</strong>
-                        </div>
-                        <p>Your account access has been limited. To restore full functionality and access to your chama data, please renew your subscription immediately.</p>
-                        <a href="{{ renewal_url }}" class="button">Renew Now</a>
-                        <p>Your data is safe and will be restored once you renew your subscription.</p>
-                    </div>
-                    <div class="footer">
-                        <p>&copy; 2025 ChamaLink. All rights reserved.</p>
-                    </div>
-                </div>
-            </body>
-            </html>
-            """,
-            
-            'payment_confirmation': """
-            <!DOCTYPE html>
-            <html>
-            <head>
-                <style>
-                    .email-container { max-width: 600px; margin: 0 auto; font-family: Arial, sans-serif; }
-                    .header { background: #28a745; color: white; padding: 20px; text-align: center; }
-                    .content { padding: 30px 20px; }
-                    .details { background: #d4edda; border: 1px solid #c3e6cb; padding: 15px; border-radius: 5px; margin: 20px 0; }
-                </style>
-            </head>
-            <body>
-                <div class="email-container">
-                    <div class="header">
-                        <h1>✅ Payment Confirmed</h1>
-                    </div>
-                    <div class="content">
-                        <h2>Hello {{ user_name }},</h2>
-                        <p>Your ChamaLink subscription payment has been successfully processed!</p>
-                        <div class="details">
-                            <h3>Subscription Details:</h3>
-                            <p><strong>Plan:</strong> {{ plan_name }}</p>
-                            <p><strong>Amount Paid:</strong> {{ amount }}</p>
-                            <p><strong>Start Date:</strong> {{ start_date }}</p>
-                            <p><strong>Expires On:</strong> {{ end_date }}</p>
-                            <p><strong>Receipt Number:</strong> {{ receipt_number }}</p>
-                        </div>
-                        <p>Thank you for choosing ChamaLink for your chama management needs!</p>
-                    </div>
-                    <div class="footer">
-                        <p>&copy; 2025 ChamaLink. All rights reserved.</p>
-                    </div>
-                </div>
-            </body>
-            </html>
-            """,
-            
-            'loan_approval': """
-            <!DOCTYPE html>
-            <html>
-            <head>
-                <style>
-                    .email-container { max-width: 600px; margin: 0 auto; font-family: Arial, sans-serif; }
-                    .header { background: #007bff; color: white; padding: 20px; text-align: center; }
-                    .content { padding: 30px 20px; }
-                    .button { display: inline-block; background: #28a745; color: white; padding: 12px 30px; text-decoration: none; border-radius: 5px; margin: 20px 0; }
-                    .loan-details { background: #e7f3ff; border: 1px solid #b3d9ff; padding: 15px; border-radius: 5px; margin: 20px 0; }
-                </style>
-            </head>
-            <body>
-                <div class="email-container">
-                    <div class="header">
-                        <h1>🏛️ Loan Approval Required</h1>
-                    </div>
-                    <div class="content">
-                        <h2>Hello {{ admin_name }},</h2>
-                        <p>A new loan application requires your approval in ChamaLink.</p>
-                        <div class="loan-details">
-                            <h3>Loan Application Details:</h3>
-                            <p><strong>Applicant:</strong> {{ applicant_name }}</p>
-                            <p><strong>Amount:</strong> {{ amount }}</p>
-                            <p><strong>Purpose:</strong> {{ purpose }}</p>
-                            <p><strong>Chama:</strong> {{ chama_name }}</p>
-                        </div>
-                        <p>Click the secure link below to review and approve/reject this loan:</p>
-                        <a href="{{ approval_url }}" class="button">Review Loan Application</a>
-                        <p><strong>Important:</strong> This approval link expires on {{ expires_at }}.</p>
-                        <p>Please provide your name and password to complete the approval process.</p>
-                    </div>
-                    <div class="footer">
-                        <p>&copy; 2025 ChamaLink. All rights reserved.</p>
-                    </div>
-                </div>
-            </body>
-            </html>
-            """,
-            
-            'account_locked': """
-            <!DOCTYPE html>
-            <html>
-            <head>
-                <style>
-                    .email-container { max-width: 600px; margin: 0 auto; font-family: Arial, sans-serif; }
-                    .header { background: #dc3545; color: white; padding: 20px; text-align: center; }
-                    .content { padding: 30px 20px; }
-                    .security { background: #f8d7da; border: 1px solid #f5c6cb; padding: 15px; border-radius: 5px; margin: 20px 0; }
-                </style>
-            </head>
-            <body>
-                <div class="email-container">
-                    <div class="header">
-                        <h1>🔒 Account Security Alert</h1>
-                    </div>
-                    <div class="content">
-                        <h2>Hello {{ user_name }},</h2>
-                        <div class="security">
-                            <strong>Your ChamaLink account has been temporarily locked due to multiple failed login attempts.</strong>
-                        </div>
-                        <p>For security reasons, your account will be automatically unlocked at {{ unlock_time }}.</p>
-                        <p>If you didn't attempt to log in, please contact our support team immediately.</p>
-                        <p>To protect your account in the future:</p>
-                        <ul>
-                            <li>Use a strong, unique password</li>
-                            <li>Never share your login credentials</li>
-                            <li>Enable email verification for added security</li>
-                        </ul>
-                    </div>
-                    <div class="footer">
-                        <p>&copy; 2025 ChamaLink. All rights reserved.</p>
-                    </div>
-                </div>
-            </body>
-            </html>
-            """
-        }
-        
-        template = templates.get(template_name, "")
-        for key, value in context.items():
-            template = template.replace(f"{{{{ {key} }}}}", str(value))
-        
-        return template
+        parts = _compile_template(template_name)
+        rendered = []
+        for index, part in enumerate(parts):
+            if index % 2:
+                # Unknown placeholders are left in place, as before
+                rendered.append(str(context[part]) if part in context else f"{{{{ {part} }}}}")
+            else:
+                rendered.append(part)
+        return "".join(rendered)
 
 # Initialize email service
 email_service = EmailService()
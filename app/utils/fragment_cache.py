@@ -0,0 +1,360 @@
+"""
+CHAMAlink Fragment Cache
+========================
+Cached page data for the dashboards (main dashboard, chama detail, chama
+dashboard and chama analytics), keyed per chama and per user.
+
+Every cache key embeds the current version of the namespaces it depends
+on: ``chama:<id>``, ``user:<id>`` and the global ``all``. Writes never
+delete entries; they bump namespace versions, so every key built from the
+old versions simply stops being looked up and ages out through LRU or TTL.
+
+Versions are bumped from SQLAlchemy session hooks once the writing
+transaction commits. Watched writes:
+    Transaction, LoanApplication, Penalty, Event  -> chama and user namespaces
+    Chama rows and their members collection      -> chama and member namespaces
+    INSERT/UPDATE/DELETE on chama_members         -> chama and user namespaces
+Anything the hooks cannot attribute bumps ``all``.
+
+Backends (FRAGMENT_CACHE_BACKEND):
+    memory - per-process LRU (default, single worker)
+    redis  - shared by every gunicorn worker, so a commit in one worker
+             invalidates the pages served by all of them
+
+Values are plain dicts and lists, never ORM objects, so they survive the
+session that built them and pickle cleanly into Redis. Callers must treat
+a returned value as read-only.
+"""
+
+import logging
+import os
+import pickle
+import re
+import threading
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from app.utils.cache_store import MemoryStore, RedisStore, redis_client
+
+logger = logging.getLogger(__name__)
+
+# Seconds an entry lives even if nothing it depends on changes
+FRAGMENT_CACHE_TTL = int(os.getenv('FRAGMENT_CACHE_TTL', 300))
+
+GLOBAL_NAMESPACE = 'all'
+
+_MISSING = object()
+
+def chama_namespace(chama_id):
+    return f'chama:{chama_id}'
+
+def user_namespace(user_id):
+    return f'user:{user_id}'
+
+class LRUFragmentBackend:
+    """In-process fragment store bounded by LRU eviction"""
+
+    def __init__(self, max_entries=5000):
+        self.max_entries = max_entries
+        self._entries = MemoryStore(max_entries)
+        self._versions = {}  # namespace -> version, never evicted
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        return self._entries.get(key, _MISSING)
+
+    def set(self, key, value, timeout):
+        self._entries.set(key, value, timeout)
+
+    def versions(self, namespaces):
+        with self._lock:
+            return [self._versions.get(namespace, 0) for namespace in namespaces]
+
+    def bump(self, namespaces):
+        with self._lock:
+            for namespace in namespaces:
+                self._versions[namespace] = self._versions.get(namespace, 0) + 1
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self):
+        stats = self._entries.stats()
+        with self._lock:
+            return {
+                'backend': 'memory',
+                'entries': stats['entries'],
+                'namespaces': len(self._versions),
+                'max_entries': self.max_entries,
+                'evictions': stats['evictions']
+            }
+
+class RedisFragmentBackend:
+    """Fragments and namespace versions kept in Redis so all workers share them"""
+
+    def __init__(self, client, prefix='chamalink:fc:'):
+        self.client = client
+        self.prefix = prefix
+        self._entries = RedisStore(client, f"{prefix}f:", serializer=pickle)
+
+    def get(self, key):
+        return self._entries.get(key, _MISSING)
+
+    def set(self, key, value, timeout):
+        self._entries.set(key, value, timeout)
+
+    def versions(self, namespaces):
+        values = self.client.mget([f"{self.prefix}v:{namespace}" for namespace in namespaces])
+        return [int(value or 0) for value in values]
+
+    def bump(self, namespaces):
+        pipe = self.client.pipeline()
+        for namespace in namespaces:
+            pipe.incr(f"{self.prefix}v:{namespace}")
+        pipe.execute()
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self):
+        return {'backend': 'redis'}
+
+class FragmentCache:
+    """Versioned get-or-build cache with hit/miss counters per fragment name"""
+
+    def __init__(self, backend, default_timeout=FRAGMENT_CACHE_TTL):
+        self.backend = backend
+        self.default_timeout = default_timeout
+        self.counters = {}  # fragment name -> {'hits', 'misses'}
+        self.bumps = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def _count(self, name, outcome):
+        with self._lock:
+            counter = self.counters.setdefault(name, {'hits': 0, 'misses': 0})
+            counter[outcome] += 1
+
+    def make_key(self, name, namespaces, parts=()):
+        namespaces = (GLOBAL_NAMESPACE,) + tuple(namespaces)
+        versions = self.backend.versions(namespaces)
+        return '|'.join([name, *(str(part) for part in parts),
+                         *(f'{namespace}@{version}' for namespace, version in zip(namespaces, versions))])
+
+    def get_or_set(self, name, namespaces, builder, parts=(), timeout=None):
+        """Return the cached value for ``name`` or build, store and return it.
+
+        ``namespaces`` are the chama/user namespaces the value depends on;
+        ``parts`` are any other inputs (viewer role, month, ...).
+        """
+        try:
+            key = self.make_key(name, namespaces, parts)
+            value = self.backend.get(key)
+        except Exception as e:
+            # A cache outage must not take the dashboards down with it
+            self.errors += 1
+            logger.warning(f"Fragment cache read failed for {name}: {e}")
+            return builder()
+
+        if value is not _MISSING:
+            self._count(name, 'hits')
+            return value
+
+        self._count(name, 'misses')
+        value = builder()
+        try:
+            self.backend.set(key, value, timeout or self.default_timeout)
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"Fragment cache write failed for {name}: {e}")
+        return value
+
+    def bump(self, *namespaces):
+        """Invalidate every fragment that depends on any of ``namespaces``"""
+        if not namespaces:
+            return
+        try:
+            self.backend.bump(namespaces)
+            self.bumps += 1
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"Fragment cache invalidation failed for {namespaces}: {e}")
+
+    def stats(self):
+        with self._lock:
+            fragments = {name: dict(counter) for name, counter in self.counters.items()}
+        hits = sum(counter['hits'] for counter in fragments.values())
+        misses = sum(counter['misses'] for counter in fragments.values())
+        stats = dict(self.backend.stats())
+        stats.update({
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': round(hits / (hits + misses), 4) if hits + misses else None,
+            'bumps': self.bumps,
+            'errors': self.errors,
+            'fragments': fragments
+        })
+        return stats
+
+_fragment_cache = None
+_fragment_cache_lock = threading.Lock()
+
+def create_fragment_backend():
+    """Build the backend named by FRAGMENT_CACHE_BACKEND, falling back to memory"""
+    if os.getenv('FRAGMENT_CACHE_BACKEND', 'memory') == 'redis':
+        try:
+            return RedisFragmentBackend(redis_client())
+        except Exception as e:
+            print(f"⚠️  Fragment cache: FALLBACK TO MEMORY ({str(e)})")
+    return LRUFragmentBackend(int(os.getenv('FRAGMENT_CACHE_MAX_ENTRIES', 5000)))
+
+def get_fragment_cache():
+    """Process-wide fragment cache shared by the dashboard routes"""
+    global _fragment_cache
+    if _fragment_cache is None:
+        with _fragment_cache_lock:
+            if _fragment_cache is None:
+                _fragment_cache = FragmentCache(create_fragment_backend())
+    return _fragment_cache
+
+def cached_fragment(name, namespaces, builder, parts=(), timeout=None):
+    """Shortcut for get_fragment_cache().get_or_set(...)"""
+    return get_fragment_cache().get_or_set(name, namespaces, builder, parts, timeout)
+
+# --- Invalidation hooks ----------------------------------------------------
+
+_COMPILED_PARAM = re.compile(r'_\d+$')
+
+def _column_values(state, column):
+    """Current and previous values of a column attribute on a flushed object"""
+    values = set()
+    if column not in state.attrs:
+        return values
+    history = state.attrs[column].history
+    for value in (*history.added, *history.unchanged, *history.deleted):
+        if value is not None:
+            values.add(value)
+    if not values:
+        value = state.dict.get(column)
+        if value is not None:
+            values.add(value)
+    return values
+
+def _collection_changes(state, relationship):
+    if relationship not in state.attrs:
+        return []
+    history = state.attrs[relationship].history
+    return [*history.added, *history.deleted]
+
+def _namespaces_for(obj):
+    from app.models.chama import Chama, Transaction, LoanApplication, Penalty, Event
+    from app.models.user import User
+
+    state = inspect(obj)
+    namespaces = set()
+    if isinstance(obj, (Transaction, LoanApplication, Penalty, Event)):
+        namespaces.update(chama_namespace(chama_id) for chama_id in _column_values(state, 'chama_id'))
+        namespaces.update(user_namespace(user_id) for user_id in _column_values(state, 'user_id'))
+    elif isinstance(obj, Chama):
+        if obj.id is not None:
+            namespaces.add(chama_namespace(obj.id))
+        namespaces.update(user_namespace(user.id) for user in _collection_changes(state, 'members'))
+    elif isinstance(obj, User):
+        chamas = _collection_changes(state, 'chamas')
+        if chamas:
+            namespaces.add(user_namespace(obj.id))
+            namespaces.update(chama_namespace(chama.id) for chama in chamas)
+    return namespaces
+
+def _pending(session):
+    return session.info.setdefault('fragment_cache_namespaces', set())
+
+@event.listens_for(Session, 'after_flush')
+def _collect_flushed_namespaces(session, flush_context):
+    namespaces = set()
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        try:
+            namespaces.update(_namespaces_for(obj))
+        except Exception as e:
+            logger.warning(f"Fragment cache could not attribute {obj!r}: {e}")
+            namespaces.add(GLOBAL_NAMESPACE)
+    if namespaces:
+        _pending(session).update(namespaces)
+
+def dml_values(statement, parameters):
+    """Column name -> set of values bound in a Core INSERT/UPDATE/DELETE.
+
+    Covers .values(), WHERE comparisons and execute() parameters, which is
+    enough to tell which chama_members rows a statement touches.
+    """
+    values = {}
+    try:
+        for key, value in statement.compile().params.items():
+            values.setdefault(_COMPILED_PARAM.sub('', key), set()).add(value)
+    except Exception:
+        pass
+    for row in parameters if isinstance(parameters, list) else [parameters or {}]:
+        for key, value in row.items():
+            values.setdefault(key, set()).add(value)
+    return values
+
+def _membership_namespaces(statement, parameters):
+    """chama/user namespaces touched by Core DML on chama_members"""
+    values = dml_values(statement, parameters)
+    namespaces = {chama_namespace(value) for value in values.get('chama_id', ()) if value is not None}
+    namespaces.update(user_namespace(value) for value in values.get('user_id', ()) if value is not None)
+    if not values.get('chama_id') or not values.get('user_id'):
+        # A bulk statement over a whole chama or user: fall back to everything
+        namespaces.add(GLOBAL_NAMESPACE)
+    return namespaces
+
+@event.listens_for(Session, 'do_orm_execute')
+def _collect_membership_writes(orm_execute_state):
+    if not (orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    table = getattr(orm_execute_state.statement, 'table', None)
+    if getattr(table, 'name', None) != 'chama_members':
+        return
+    _pending(orm_execute_state.session).update(
+        _membership_namespaces(orm_execute_state.statement, orm_execute_state.parameters)
+    )
+
+@event.listens_for(Session, 'after_commit')
+def _bump_committed_namespaces(session):
+    namespaces = session.info.pop('fragment_cache_namespaces', None)
+    if namespaces:
+        get_fragment_cache().bump(*sorted(namespaces))
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_rolled_back_namespaces(session):
+    session.info.pop('fragment_cache_namespaces', None)
+
+# --- Snapshots -------------------------------------------------------------
+
+def transaction_snapshot(transaction):
+    """Template-ready copy of a Transaction (load ``user`` eagerly)"""
+    user = transaction.user
+    return {
+        'id': transaction.id,
+        'type': transaction.type,
+        'amount': transaction.amount,
+        'description': transaction.description,
+        'status': transaction.status,
+        'created_at': transaction.created_at,
+        'display_title': transaction.display_title,
+        'formatted_amount': transaction.formatted_amount,
+        'user': {'id': user.id, 'username': user.username} if user else None
+    }
+
+def event_snapshot(event):
+    """Template-ready copy of an Event"""
+    return {
+        'id': event.id,
+        'title': event.title,
+        'description': event.description,
+        'event_date': event.event_date,
+        'event_time': event.event_time,
+        'location': event.location,
+        'type': event.type,
+        'formatted_date': event.formatted_date,
+        'formatted_time': event.formatted_time
+    }
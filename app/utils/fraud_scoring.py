@@ -0,0 +1,449 @@
+"""
+CHAMAlink Fraud Scoring
+=======================
+Scores member payments for fraud risk by comparing each one with the
+member's own recent behaviour. Features:
+
+    amount_zscore - standard deviations above the member's usual amount
+    velocity      - payments beyond FRAUD_NORMAL_VELOCITY in FRAUD_VELOCITY_WINDOW
+    new_phone     - a phone number the member has not paid from before
+    unusual_hour  - an hour of the day the member rarely pays at
+    new_device    - a user agent the member has not paid from before
+    new_ip        - an address the member has not paid from before
+    thin_history  - too little history to judge the amount and hour
+
+The score is a logistic model over the feature matrix (FEATURE_WEIGHTS),
+so one payment and a chunk of fifty thousand run through the same NumPy
+code. Scores at FRAUD_REVIEW_SCORE are flagged for review; payments at
+FRAUD_BLOCK_SCORE are refused.
+
+Baselines (MemberRiskProfile) are precomputed from the last
+FRAUD_HISTORY_DAYS of payments by the fraud_profiles job, which aggregates
+a chunk of members at a time with NumPy, so nothing is aggregated while
+a payment waits:
+
+    score_payment() - inline, for mpesa.initiate_payment. The profile comes
+                      from the profile cache and the velocity from the
+                      shared sliding-window counters, so a cached member
+                      is scored without touching the database.
+    rescore_chunk() - batch, for the fraud_rescore job. Loads a chunk of
+                      transactions, their members' profiles and trailing
+                      windows with a few queries and scores them together,
+                      against each member's current baseline.
+
+Backends (FRAUD_PROFILE_CACHE_BACKEND):
+    memory - per-process cache with LRU eviction (default, single worker)
+    redis  - shared by every gunicorn worker
+"""
+
+import hashlib
+import logging
+import os
+from collections import defaultdict
+from datetime import datetime, timedelta
+import numpy as np
+from flask import has_request_context
+from sqlalchemy import event, func, insert, update
+from sqlalchemy.orm import Session
+from app import db
+from app.utils.cache_store import get_store
+from app.utils.jobs import job_handler, periodic_task, enqueue_job
+from app.utils.rate_limiter import get_limiter_backend
+
+logger = logging.getLogger(__name__)
+
+# Days of payments a member's baseline is computed from
+FRAUD_HISTORY_DAYS = 90
+
+# Payments members make into their chamas; withdrawals and disbursements are not scored
+FRAUD_SCORED_TYPES = ('contribution', 'loan_repayment', 'penalty_payment')
+
+# Seconds of activity counted by the velocity feature, and the payments in it that are unremarkable
+FRAUD_VELOCITY_WINDOW = 60 * 60
+FRAUD_NORMAL_VELOCITY = 2
+
+# Members with fewer payments are scored on velocity and new phone/device/address only
+FRAUD_MIN_HISTORY = 5
+
+# An hour of the day holding less than this share of a member's payments is unusual
+FRAUD_RARE_HOUR_SHARE = 0.02
+
+# Phone numbers, devices and addresses remembered per member
+FRAUD_KNOWN_LIMIT = 20
+
+FRAUD_REVIEW_SCORE = float(os.getenv('FRAUD_REVIEW_SCORE', 0.5))
+FRAUD_BLOCK_SCORE = float(os.getenv('FRAUD_BLOCK_SCORE', 0.95))
+
+# Seconds a cached profile lives; rebuilds drop affected entries sooner
+FRAUD_PROFILE_CACHE_TTL = int(os.getenv('FRAUD_PROFILE_CACHE_TTL', 600))
+
+# Members per profile rebuild job, transactions per rescoring job
+FRAUD_PROFILE_CHUNK = 1000
+FRAUD_RESCORE_CHUNK = 5000
+
+# Seconds between scheduled profile rebuilds
+FRAUD_PROFILE_INTERVAL = 60 * 60
+
+FEATURES = ('amount_zscore', 'velocity', 'new_phone', 'unusual_hour', 'new_device', 'new_ip', 'thin_history')
+FEATURE_WEIGHTS = np.array([0.6, 0.5, 1.5, 1.0, 1.0, 0.5, 0.5])
+FRAUD_BIAS = -4.0
+
+# Upper bound of the unbounded features, so one extreme value cannot decide alone
+FEATURE_CAP = 6.0
+
+# A feature adding this much to the logit is reported as a reason
+REASON_CONTRIBUTION = 0.5
+
+EMPTY_PROFILE = {'count': 0, 'mean': 0.0, 'std': 0.0, 'hours': [0] * 24, 'phones': [], 'devices': [], 'ips': []}
+
+get_profile_cache = get_store('Fraud profile cache', 'FRAUD_PROFILE_CACHE_BACKEND', 'chamalink:fraud:profile:')
+
+def _profile_dict(row):
+    """The baseline scoring uses, from a MemberRiskProfile row (or None)"""
+    if row is None:
+        return EMPTY_PROFILE
+    return {
+        'count': row.transaction_count,
+        'mean': row.amount_mean,
+        'std': row.amount_std,
+        'hours': row.hour_counts or [0] * 24,
+        'phones': row.phones or [],
+        'devices': row.devices or [],
+        'ips': row.ips or []
+    }
+
+def get_profile(user_id):
+    """A member's baseline, from the cache or their profile row"""
+    from app.models.fraud import MemberRiskProfile
+
+    cache = get_profile_cache()
+    profile = cache.get(user_id)
+    if profile is None:
+        # Members without a profile are cached too, so new members cost one lookup per TTL
+        profile = _profile_dict(db.session.get(MemberRiskProfile, user_id))
+        cache.set(user_id, profile, FRAUD_PROFILE_CACHE_TTL)
+    return profile
+
+def fingerprint(user_agent):
+    """Short stable identifier of a user agent string"""
+    if not user_agent:
+        return None
+    return hashlib.sha256(user_agent.encode('utf-8')).hexdigest()[:16]
+
+def _client_ip(ip):
+    # X-Forwarded-For lists the client first
+    return ip.split(',')[0].strip()[:45] if ip else None
+
+def _hours(times):
+    seconds = np.array(times, dtype='datetime64[s]').astype(np.int64)
+    return (seconds // 3600) % 24, seconds
+
+def feature_matrix(profiles, amounts, hours, velocities, phones, devices, ips):
+    """Feature rows (len(profiles) x len(FEATURES)) for payments described column by column"""
+    count = len(profiles)
+    counts = np.fromiter((profile['count'] for profile in profiles), dtype=np.float64, count=count)
+    means = np.fromiter((profile['mean'] for profile in profiles), dtype=np.float64, count=count)
+    stds = np.fromiter((profile['std'] for profile in profiles), dtype=np.float64, count=count)
+    hour_counts = np.fromiter((profile['hours'][hour] for profile, hour in zip(profiles, hours)),
+                              dtype=np.float64, count=count)
+    thin = counts < FRAUD_MIN_HISTORY
+
+    # Members who always pay the same amount have no spread; compare with a tenth of their mean instead
+    spread = np.maximum(stds, np.maximum(means * 0.1, 1.0))
+    zscores = np.clip((np.asarray(amounts, dtype=np.float64) - means) / spread, 0.0, FEATURE_CAP)
+    excess = np.clip(np.asarray(velocities, dtype=np.float64) - FRAUD_NORMAL_VELOCITY, 0.0, FEATURE_CAP)
+    shares = hour_counts / np.maximum(counts, 1.0)
+
+    def unseen(values, key):
+        # Only members with something on record can show up somewhere new
+        return np.fromiter((bool(value and profile[key] and value not in profile[key])
+                            for value, profile in zip(values, profiles)), dtype=np.float64, count=count)
+
+    matrix = np.empty((count, len(FEATURES)))
+    matrix[:, 0] = np.where(thin, 0.0, zscores)
+    matrix[:, 1] = excess
+    matrix[:, 2] = unseen(phones, 'phones')
+    matrix[:, 3] = (~thin & (shares < FRAUD_RARE_HOUR_SHARE)).astype(np.float64)
+    matrix[:, 4] = unseen(devices, 'devices')
+    matrix[:, 5] = unseen(ips, 'ips')
+    matrix[:, 6] = thin.astype(np.float64)
+    return matrix
+
+def score_matrix(matrix):
+    """Fraud probability for each feature row"""
+    return 1.0 / (1.0 + np.exp(-(matrix @ FEATURE_WEIGHTS + FRAUD_BIAS)))
+
+def decide(scores):
+    """allow / review / block for each score"""
+    return np.where(scores >= FRAUD_BLOCK_SCORE, 'block',
+                    np.where(scores >= FRAUD_REVIEW_SCORE, 'review', 'allow'))
+
+def explain(row):
+    """Names of the features that pushed one row's score up"""
+    contributions = row * FEATURE_WEIGHTS
+    return [FEATURES[index] for index in np.argsort(-contributions)
+            if contributions[index] >= REASON_CONTRIBUTION]
+
+def _feature_dict(row):
+    return {name: round(float(value), 3) for name, value in zip(FEATURES, row)}
+
+def score_payment(transaction, phone_number, client_info=None):
+    """Score a payment as it is initiated and add its FraudScore to the session.
+
+    client_info is SecurityMonitor.get_client_info() for the request (read
+    here when omitted). Returns the FraudScore, or None if scoring failed;
+    a fraud-scoring outage never stops a payment.
+    """
+    from app.models.fraud import FraudScore
+
+    try:
+        if client_info is None and has_request_context():
+            from app.utils.security_monitor import security_monitor
+            client_info = security_monitor.get_client_info()
+        client_info = client_info or {}
+        device = fingerprint(client_info.get('user_agent'))
+        ip = _client_ip(client_info.get('ip'))
+
+        profile = get_profile(transaction.user_id)
+        velocity = get_limiter_backend().hit(f'fraud:velocity:{transaction.user_id}', FRAUD_VELOCITY_WINDOW)
+        now = datetime.utcnow()
+        row = feature_matrix([profile], [transaction.amount], [now.hour], [velocity],
+                             [phone_number], [device], [ip])[0]
+        score = float(score_matrix(row[np.newaxis])[0])
+
+        fraud_score = FraudScore(
+            transaction_id=transaction.id, user_id=transaction.user_id, chama_id=transaction.chama_id,
+            amount=transaction.amount, score=score, decision=str(decide(np.array([score]))[0]),
+            features=_feature_dict(row), reasons=explain(row), phone_number=phone_number,
+            device=device, ip_address=ip, source='payment', scored_at=now
+        )
+        db.session.add(fraud_score)
+        return fraud_score
+    except Exception as e:
+        logger.warning(f"Fraud scoring failed for transaction {getattr(transaction, 'id', None)}: {e}")
+        return None
+
+def _velocities(user_ids, seconds, since, until):
+    """Payments by each member in the window ending at each payment, counted from the transactions table"""
+    from app.models.chama import Transaction
+
+    window = db.session.query(Transaction.user_id, Transaction.created_at).filter(
+        Transaction.user_id.in_(set(user_ids.tolist())), Transaction.type.in_(FRAUD_SCORED_TYPES),
+        Transaction.created_at >= since - timedelta(seconds=FRAUD_VELOCITY_WINDOW),
+        Transaction.created_at <= until
+    ).all()
+    if not window:
+        return np.zeros(len(user_ids))
+    window_users = np.fromiter((user_id for user_id, _ in window), dtype=np.int64, count=len(window))
+    _, window_seconds = _hours([created_at for _, created_at in window])
+
+    # One sorted key per (member, time) turns the windowed counts into two binary searches
+    scale = np.int64(10 ** 10)
+    keys = np.sort(window_users * scale + window_seconds)
+    targets = user_ids * scale + seconds
+    return (np.searchsorted(keys, targets, side='right')
+            - np.searchsorted(keys, targets - FRAUD_VELOCITY_WINDOW, side='right'))
+
+def rescore_chunk(after_id, until_id, chunk_size=FRAUD_RESCORE_CHUNK):
+    """Score transactions (after_id, until_id], up to chunk_size of them.
+
+    Returns (last id scored, transactions scored, flagged for review or blocked).
+    """
+    from app.models.chama import Transaction, MpesaTransaction
+    from app.models.fraud import FraudScore, MemberRiskProfile
+
+    rows = db.session.query(
+        Transaction.id, Transaction.user_id, Transaction.chama_id, Transaction.amount, Transaction.created_at
+    ).filter(
+        Transaction.id > after_id, Transaction.id <= until_id, Transaction.type.in_(FRAUD_SCORED_TYPES)
+    ).order_by(Transaction.id).limit(chunk_size).all()
+    if not rows:
+        return after_id, 0, 0
+
+    ids = [row[0] for row in rows]
+    user_ids = np.fromiter((row[1] for row in rows), dtype=np.int64, count=len(rows))
+    amounts = np.fromiter((row[3] or 0 for row in rows), dtype=np.float64, count=len(rows))
+    times = [row[4] or datetime.utcnow() for row in rows]
+    hours, seconds = _hours(times)
+
+    members = set(user_ids.tolist())
+    profiles = {row.user_id: _profile_dict(row) for row in
+                MemberRiskProfile.query.filter(MemberRiskProfile.user_id.in_(members))}
+    velocities = _velocities(user_ids, seconds, min(times), max(times))
+    phones = dict(db.session.query(MpesaTransaction.transaction_id, MpesaTransaction.phone_number).filter(
+        MpesaTransaction.transaction_id.in_(ids)))
+    # Device and address are only known for payments scored as they were made
+    existing = {transaction_id: (score_id, device, ip) for score_id, transaction_id, device, ip in
+                db.session.query(FraudScore.id, FraudScore.transaction_id, FraudScore.device,
+                                 FraudScore.ip_address).filter(FraudScore.transaction_id.in_(ids))}
+
+    matrix = feature_matrix(
+        [profiles.get(user_id, EMPTY_PROFILE) for user_id in user_ids.tolist()], amounts, hours.tolist(),
+        velocities, [phones.get(row_id) for row_id in ids],
+        [existing.get(row_id, (None, None, None))[1] for row_id in ids],
+        [existing.get(row_id, (None, None, None))[2] for row_id in ids]
+    )
+    scores = score_matrix(matrix)
+    decisions = decide(scores)
+
+    now = datetime.utcnow()
+    inserts, updates = [], []
+    for index, (row_id, user_id, chama_id, amount, _) in enumerate(rows):
+        values = {
+            'score': float(scores[index]), 'decision': str(decisions[index]),
+            'features': _feature_dict(matrix[index]), 'reasons': explain(matrix[index]), 'scored_at': now
+        }
+        if row_id in existing:
+            updates.append(dict(values, id=existing[row_id][0]))
+        else:
+            inserts.append(dict(values, transaction_id=row_id, user_id=user_id, chama_id=chama_id, amount=amount,
+                                phone_number=phones.get(row_id), source='rescore'))
+    if updates:
+        db.session.execute(update(FraudScore), updates)
+    if inserts:
+        db.session.execute(insert(FraudScore), inserts)
+    return ids[-1], len(rows), int(np.count_nonzero(decisions != 'allow'))
+
+def start_rescore(since=None, until_id=None, chunk_size=FRAUD_RESCORE_CHUNK):
+    """Queue rescoring of the payments made since a date (default: all of them)"""
+    from app.models.chama import Transaction
+
+    after_id = 0
+    if since is not None:
+        first_id = db.session.query(func.min(Transaction.id)).filter(Transaction.created_at >= since).scalar()
+        after_id = (first_id or 1) - 1
+    if until_id is None:
+        until_id = db.session.query(func.max(Transaction.id)).scalar() or 0
+    return enqueue_job('fraud_rescore', {'after_id': after_id, 'until_id': until_id, 'chunk_size': chunk_size})
+
+def rebuild_profiles(first_user_id, last_user_id):
+    """Recompute the baselines of members first_user_id..last_user_id. Returns the profiles written."""
+    from app.models.chama import Transaction, MpesaTransaction
+    from app.models.fraud import FraudScore, MemberRiskProfile
+
+    since = datetime.utcnow() - timedelta(days=FRAUD_HISTORY_DAYS)
+    payments = db.session.query(Transaction.user_id, Transaction.amount, Transaction.created_at).filter(
+        Transaction.user_id.between(first_user_id, last_user_id), Transaction.type.in_(FRAUD_SCORED_TYPES),
+        Transaction.status != 'failed', Transaction.created_at >= since
+    ).all()
+
+    profiles = {}
+    if payments:
+        users = np.fromiter((row[0] for row in payments), dtype=np.int64, count=len(payments))
+        amounts = np.fromiter((row[1] or 0 for row in payments), dtype=np.float64, count=len(payments))
+        hours, seconds = _hours([row[2] for row in payments])
+
+        # Every member in the chunk aggregated in one pass over the arrays
+        members, inverse = np.unique(users, return_inverse=True)
+        counts = np.bincount(inverse)
+        means = np.bincount(inverse, weights=amounts) / counts
+        variances = np.bincount(inverse, weights=amounts * amounts) / counts - means * means
+        stds = np.sqrt(np.maximum(variances, 0.0))
+        hour_counts = np.bincount(inverse * 24 + hours, minlength=len(members) * 24).reshape(-1, 24)
+        latest = np.zeros(len(members), dtype=np.int64)
+        np.maximum.at(latest, inverse, seconds)
+
+        for index, user_id in enumerate(members.tolist()):
+            profiles[user_id] = {
+                'user_id': user_id, 'transaction_count': int(counts[index]),
+                'amount_mean': round(float(means[index]), 2), 'amount_std': round(float(stds[index]), 2),
+                'hour_counts': hour_counts[index].tolist(),
+                'last_transaction_at': datetime.utcfromtimestamp(int(latest[index]))
+            }
+
+    known = defaultdict(lambda: {'phones': [], 'devices': [], 'ips': []})
+    for user_id, phone in db.session.query(MpesaTransaction.user_id, MpesaTransaction.phone_number).filter(
+            MpesaTransaction.user_id.between(first_user_id, last_user_id), MpesaTransaction.status != 'failed',
+            MpesaTransaction.created_date >= since).order_by(MpesaTransaction.created_date.desc()):
+        phones = known[user_id]['phones']
+        if phone and phone not in phones and len(phones) < FRAUD_KNOWN_LIMIT:
+            phones.append(phone)
+    # Blocked payments do not vouch for the device or address they came from
+    for user_id, device, ip in db.session.query(FraudScore.user_id, FraudScore.device, FraudScore.ip_address).filter(
+            FraudScore.user_id.between(first_user_id, last_user_id), FraudScore.decision != 'block',
+            FraudScore.scored_at >= since).order_by(FraudScore.scored_at.desc()):
+        entry = known[user_id]
+        if device and device not in entry['devices'] and len(entry['devices']) < FRAUD_KNOWN_LIMIT:
+            entry['devices'].append(device)
+        if ip and ip not in entry['ips'] and len(entry['ips']) < FRAUD_KNOWN_LIMIT:
+            entry['ips'].append(ip)
+
+    now = datetime.utcnow()
+    rows = []
+    for user_id in sorted(set(profiles) | set(known)):
+        row = profiles.get(user_id) or {'user_id': user_id, 'transaction_count': 0, 'amount_mean': 0.0,
+                                        'amount_std': 0.0, 'hour_counts': [0] * 24, 'last_transaction_at': None}
+        row.update(known[user_id] if user_id in known else {'phones': [], 'devices': [], 'ips': []})
+        row['computed_at'] = now
+        rows.append(row)
+
+    db.session.query(MemberRiskProfile).filter(
+        MemberRiskProfile.user_id.between(first_user_id, last_user_id)).delete(synchronize_session=False)
+    if rows:
+        db.session.execute(insert(MemberRiskProfile), rows)
+    db.session.info.setdefault('fraud_profile_users', set()).update(range(first_user_id, last_user_id + 1))
+    return len(rows)
+
+def rebuild_next_profiles(after_user_id, limit=FRAUD_PROFILE_CHUNK):
+    """Rebuild the profiles of the next `limit` members. Returns the last user id covered, or None when done."""
+    from app.models.user import User
+
+    user_ids = [row[0] for row in db.session.query(User.id).filter(User.id > after_user_id).order_by(
+        User.id).limit(limit)]
+    if not user_ids:
+        return None
+    rebuild_profiles(user_ids[0], user_ids[-1])
+    return user_ids[-1]
+
+@event.listens_for(Session, 'after_commit')
+def _drop_cached_profiles(session):
+    user_ids = session.info.pop('fraud_profile_users', None)
+    if user_ids:
+        try:
+            get_profile_cache().delete(user_ids)
+        except Exception as e:
+            logger.warning(f"Could not drop cached fraud profiles: {e}")
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_rebuilt_profiles(session):
+    session.info.pop('fraud_profile_users', None)
+
+def fraud_summary(days=30, user_id=None):
+    """Counts of scored payments by decision over the last `days` days"""
+    from app.models.fraud import FraudScore, MemberRiskProfile
+
+    query = db.session.query(FraudScore.decision, func.count(FraudScore.id)).filter(
+        FraudScore.scored_at >= datetime.utcnow() - timedelta(days=days))
+    if user_id is not None:
+        query = query.filter(FraudScore.user_id == user_id)
+    counts = dict(query.group_by(FraudScore.decision).all())
+    return {
+        'scored': sum(counts.values()),
+        'review': counts.get('review', 0),
+        'block': counts.get('block', 0),
+        'profiles': db.session.query(func.count(MemberRiskProfile.user_id)).scalar()
+    }
+
+@job_handler('fraud_profiles')
+def process_profiles(payload):
+    last_user_id = rebuild_next_profiles(payload.get('after_user_id', 0))
+    if last_user_id is not None:
+        enqueue_job('fraud_profiles', {'after_user_id': last_user_id})
+
+@job_handler('fraud_rescore')
+def process_rescore(payload):
+    chunk_size = payload.get('chunk_size', FRAUD_RESCORE_CHUNK)
+    position, scored, _ = rescore_chunk(payload['after_id'], payload['until_id'], chunk_size)
+    if scored and position < payload['until_id']:
+        enqueue_job('fraud_rescore', {'after_id': position, 'until_id': payload['until_id'],
+                                      'chunk_size': chunk_size})
+
+@periodic_task('fraud_profiles', FRAUD_PROFILE_INTERVAL)
+def schedule_profiles():
+    """Start a profile rebuild unless one is already running"""
+    from app.models.jobs import OutboxJob
+
+    running = db.session.query(OutboxJob.id).filter(
+        OutboxJob.job_type == 'fraud_profiles', OutboxJob.status.in_(['pending', 'running'])).first()
+    if running is None:
+        enqueue_job('fraud_profiles', {'after_user_id': 0})
@@ -3,8 +3,12 @@ Multi-language and theme support for ChamaLink
 """
 
 from flask import session, request, current_app
+from string import Formatter
+from types import MappingProxyType
 import os
 import json
+import threading
+import time
 
 # Supported languages
 SUPPORTED_LANGUAGES = {
@@ -65,46 +69,142 @@ def set_font(font_name):
         return True
     return False
 
-def load_translations(language_code):
-    """Load translations for a specific language"""
-    translations_file = os.path.join(
-        current_app.root_path, 
-        'translations', 
-        f'{language_code}.json'
-    )
-    
+class CompiledMessage(str):
+    """A translation with ``{name}`` placeholders, parsed once at load time"""
+
+    def __new__(cls, text, fields):
+        message = super().__new__(cls, text)
+        message.fields = fields
+        return message
+
+    def render(self, kwargs):
+        # Missing arguments leave the message unformatted, as before
+        if not self.fields.issubset(kwargs):
+            return str(self)
+        try:
+            return self.format_map(kwargs)
+        except (KeyError, IndexError, ValueError):
+            return str(self)
+
+def _compile_message(text):
+    if '{' not in text and '}' not in text:
+        return text
     try:
-        with open(translations_file, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        # Fallback to English
-        fallback_file = os.path.join(
-            current_app.root_path, 
-            'translations', 
-            'en.json'
+        fields = frozenset(
+            field_name.split('.')[0].split('[')[0]
+            for _, field_name, _, _ in Formatter().parse(text)
+            if field_name
         )
+    except ValueError:
+        # Malformed braces: treat as literal text
+        return text
+    return CompiledMessage(text, fields)
+
+class TranslationCatalog:
+    """Translations loaded once per process, one read-only mapping per language.
+
+    Each language's mapping already has its fallback chain merged in
+    (``sw_KE`` -> ``sw`` -> ``en``), so a lookup is a single dict access.
+    Messages with ``{}`` placeholders are parsed at load time; plain messages
+    are returned as-is without calling ``str.format``. With ``auto_reload``
+    the JSON files are re-read when their mtime changes (checked at most once
+    per ``check_interval`` seconds).
+    """
+
+    def __init__(self, directory, default_language='en', auto_reload=False, check_interval=1.0):
+        self.directory = directory
+        self.default_language = default_language
+        self.auto_reload = auto_reload
+        self.check_interval = check_interval
+        self._catalogs = {}
+        self._mtimes = {}
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+
+    def _path(self, language_code):
+        return os.path.join(self.directory, f'{language_code}.json')
+
+    def _fallback_chain(self, language_code):
+        chain = [language_code]
+        base = language_code.replace('-', '_').split('_')[0]
+        if base not in chain:
+            chain.append(base)
+        if self.default_language not in chain:
+            chain.append(self.default_language)
+        return chain
+
+    def _read(self, language_code):
+        path = self._path(language_code)
         try:
-            with open(fallback_file, 'r', encoding='utf-8') as f:
+            self._mtimes[path] = os.path.getmtime(path)
+            with open(path, 'r', encoding='utf-8') as f:
                 return json.load(f)
-        except FileNotFoundError:
+        except (OSError, ValueError):
+            self._mtimes[path] = None
             return {}
 
+    def _build(self, language_code):
+        messages = {}
+        for code in reversed(self._fallback_chain(language_code)):
+            messages.update(self._read(code))
+        return MappingProxyType({
+            key: _compile_message(value) if isinstance(value, str) else value
+            for key, value in messages.items()
+        })
+
+    def _check_for_changes(self):
+        now = time.monotonic()
+        if now - self._last_check < self.check_interval:
+            return
+        self._last_check = now
+        for path, mtime in list(self._mtimes.items()):
+            try:
+                current = os.path.getmtime(path)
+            except OSError:
+                current = None
+            if current != mtime:
+                with self._lock:
+                    self._catalogs = {}
+                    self._mtimes = {}
+                return
+
+    def messages(self, language_code):
+        """Read-only mapping of compiled messages for a language"""
+        if self.auto_reload:
+            self._check_for_changes()
+        catalog = self._catalogs.get(language_code)
+        if catalog is None:
+            with self._lock:
+                catalog = self._catalogs.get(language_code)
+                if catalog is None:
+                    catalog = self._build(language_code)
+                    self._catalogs = {**self._catalogs, language_code: catalog}
+        return catalog
+
+    def translate(self, language_code, key, **kwargs):
+        message = self.messages(language_code).get(key, key)
+        if kwargs and isinstance(message, CompiledMessage):
+            return message.render(kwargs)
+        return message
+
+def get_translation_catalog():
+    """The app's translation catalog, created on first use"""
+    catalog = current_app.extensions.get('translation_catalog')
+    if catalog is None:
+        catalog = TranslationCatalog(
+            os.path.join(current_app.root_path, 'translations'),
+            auto_reload=current_app.config.get('TRANSLATIONS_AUTO_RELOAD', current_app.debug)
+        )
+        current_app.extensions['translation_catalog'] = catalog
+    return catalog
+
+def load_translations(language_code):
+    """Load translations for a specific language"""
+    return get_translation_catalog().messages(language_code)
+
 def t(key, **kwargs):
     """Translate a key to current language"""
-    language = get_current_language()
-    translations = load_translations(language)
-    
-    # Get translation or fallback to key
-    translation = translations.get(key, key)
-    
-    # Format with kwargs if provided
-    if kwargs:
-        try:
-            translation = translation.format(**kwargs)
-        except KeyError:
-            pass
-    
-    return translation
+    return get_translation_catalog().translate(get_current_language(), key, **kwargs)
 
 # Template filter for translations
 def translate_filter(key, **kwargs):
@@ -114,6 +214,11 @@ def translate_filter(key, **kwargs):
 def init_internationalization(app):
     """Initialize internationalization features"""
     
+    app.extensions['translation_catalog'] = TranslationCatalog(
+        os.path.join(app.root_path, 'translations'),
+        auto_reload=app.config.get('TRANSLATIONS_AUTO_RELOAD', app.debug)
+    )
+    
     @app.template_filter('t')
     def translate_template_filter(key, **kwargs):
         return t(key, **kwargs)
@@ -0,0 +1,407 @@
+"""
+CHAMAlink Background Jobs
+=========================
+Transactional outbox with a small worker pool.
+
+enqueue_job() adds an OutboxJob row to the caller's transaction. Once that
+transaction commits, the job id is pushed to the queue backend; a worker
+claims the row, runs the registered handler and commits the handler's work
+together with the job's new status. Failed handlers are retried with
+exponential backoff until max_attempts is reached.
+
+Queue backends (JOB_QUEUE_BACKEND):
+    local - in-process queue served by worker threads started on demand
+    redis - Redis list shared with workers started by run_worker.py
+
+The queue is only a wake-up signal: workers also sweep the table for due
+jobs, so nothing is lost if a push is dropped or a worker dies mid-job.
+While a handler runs, a heartbeat keeps refreshing the job's lock, so only
+a job whose worker has really gone silent is claimed again, and only while
+it has attempts left; an abandoned job on its last attempt is marked failed.
+"""
+
+import importlib
+import logging
+import queue
+import threading
+import time
+from datetime import datetime, timedelta
+from flask import current_app, has_app_context
+from sqlalchemy import event, update, or_, and_
+from sqlalchemy.orm import Session
+from app import db
+
+logger = logging.getLogger(__name__)
+
+# Modules whose import registers job handlers and periodic tasks
+JOB_HANDLER_MODULES = (
+    'app.utils.mpesa_async',
+    'app.utils.mpesa_callbacks',
+    'app.utils.analytics_rollup',
+    'app.utils.mobile_sync',
+    'app.utils.notification_fanout',
+    'app.utils.notification_counters',
+    'app.utils.sms_outbox',
+    'app.utils.email_outbox',
+    'app.utils.documents',
+    'app.utils.aml_monitor',
+    'app.utils.fraud_scoring',
+    'app.utils.reconciliation',
+)
+
+# A running job whose worker has been silent this long is considered abandoned
+JOB_LOCK_TIMEOUT = 300
+
+# Seconds between refreshes of a running job's lock
+JOB_HEARTBEAT_INTERVAL = 60
+
+# Seconds between sweeps for jobs the queue never delivered (or retries coming due)
+JOB_POLL_INTERVAL = 5
+
+# First retry delay in seconds; doubles with every attempt
+JOB_RETRY_DELAY = 10
+
+_job_handlers = {}
+_periodic_tasks = {}
+_handlers_loaded = False
+_pool_lock = threading.Lock()
+
+def job_handler(job_type):
+    """Register a function(payload) as the handler for a job type.
+
+    Handlers make their database changes on db.session without committing;
+    the worker commits them together with the job's completion.
+    """
+    def decorator(f):
+        _job_handlers[job_type] = f
+        return f
+    return decorator
+
+def periodic_task(name, interval):
+    """Register a function() that job workers call every ``interval`` seconds.
+
+    Used as a safety net for work that is normally triggered by jobs; the
+    worker commits after each call.
+    """
+    def decorator(f):
+        _periodic_tasks[name] = (interval, f)
+        return f
+    return decorator
+
+def _load_handlers():
+    global _handlers_loaded
+    if not _handlers_loaded:
+        for module in JOB_HANDLER_MODULES:
+            importlib.import_module(module)
+        _handlers_loaded = True
+
+def get_job_handler(job_type):
+    _load_handlers()
+    return _job_handlers.get(job_type)
+
+def get_periodic_tasks():
+    _load_handlers()
+    return dict(_periodic_tasks)
+
+class LocalQueueBackend:
+    """In-process queue for development and tests"""
+
+    def __init__(self):
+        self._queue = queue.Queue()
+
+    def push(self, job_id):
+        self._queue.put(job_id)
+
+    def pop(self, timeout):
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+class RedisQueueBackend:
+    """Redis list shared between web processes and standalone workers"""
+
+    def __init__(self, url, key='chamalink:jobs'):
+        import redis
+        self._client = redis.from_url(url)
+        self._key = key
+
+    def push(self, job_id):
+        self._client.lpush(self._key, job_id)
+
+    def pop(self, timeout):
+        item = self._client.brpop(self._key, timeout=max(int(timeout), 1))
+        return int(item[1]) if item else None
+
+def get_queue_backend(app=None):
+    """Queue backend for the app, created on first use"""
+    app = app or current_app._get_current_object()
+    state = app.extensions.setdefault('jobs', {})
+    if 'backend' not in state:
+        if app.config.get('JOB_QUEUE_BACKEND') == 'redis':
+            state['backend'] = RedisQueueBackend(app.config.get('REDIS_URL', 'redis://localhost:6379/0'))
+        else:
+            state['backend'] = LocalQueueBackend()
+    return state['backend']
+
+def ensure_worker_pool(app=None):
+    """Start in-process workers for the local backend.
+
+    Does nothing for the redis backend (run_worker.py serves it) or when
+    JOB_WORKER_CONCURRENCY is 0, in which case run_pending_jobs() drains the
+    outbox synchronously.
+    """
+    app = app or current_app._get_current_object()
+    concurrency = app.config.get('JOB_WORKER_CONCURRENCY', 4)
+    if app.config.get('JOB_QUEUE_BACKEND') == 'redis' or concurrency <= 0:
+        return None
+
+    state = app.extensions.setdefault('jobs', {})
+    if 'pool' not in state:
+        with _pool_lock:
+            if 'pool' not in state:
+                pool = JobWorkerPool(app, get_queue_backend(app), concurrency)
+                pool.start()
+                state['pool'] = pool
+    return state['pool']
+
+def enqueue_job(job_type, payload, run_after=None, max_attempts=3):
+    """Add a job to the current transaction. It is published once the caller commits."""
+    from app.models.jobs import OutboxJob
+
+    job = OutboxJob(
+        job_type=job_type,
+        payload=payload,
+        run_after=run_after or datetime.utcnow(),
+        max_attempts=max_attempts
+    )
+    db.session.add(job)
+    db.session.flush()
+    db.session.info.setdefault('outbox_job_ids', []).append(job.id)
+    return job
+
+@event.listens_for(Session, 'after_commit')
+def _publish_committed_jobs(session):
+    job_ids = session.info.pop('outbox_job_ids', None)
+    if not job_ids or not has_app_context():
+        return
+    try:
+        backend = get_queue_backend()
+        for job_id in job_ids:
+            backend.push(job_id)
+        ensure_worker_pool()
+    except Exception as e:
+        # The rows are committed; the workers' sweep will still find them
+        logger.warning(f"Could not publish jobs {job_ids}: {e}")
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_rolled_back_jobs(session):
+    session.info.pop('outbox_job_ids', None)
+
+def _abandoned(now):
+    from app.models.jobs import OutboxJob
+    return and_(OutboxJob.status == 'running',
+                OutboxJob.locked_at < now - timedelta(seconds=JOB_LOCK_TIMEOUT))
+
+def _claimable(now):
+    from app.models.jobs import OutboxJob
+    return and_(
+        OutboxJob.run_after <= now,
+        or_(
+            OutboxJob.status == 'pending',
+            and_(_abandoned(now), OutboxJob.attempts < OutboxJob.max_attempts)
+        )
+    )
+
+def fail_abandoned_jobs():
+    """Mark abandoned jobs that have used all their attempts as failed. Returns how many."""
+    from app.models.jobs import OutboxJob
+
+    result = db.session.execute(
+        update(OutboxJob)
+        .where(_abandoned(datetime.utcnow()), OutboxJob.attempts >= OutboxJob.max_attempts)
+        .values(status='failed', locked_at=None,
+                last_error=f'Worker stopped responding for {JOB_LOCK_TIMEOUT}s on the last attempt'),
+        execution_options={'synchronize_session': False}
+    )
+    db.session.commit()
+    if result.rowcount:
+        logger.error(f"Marked {result.rowcount} abandoned jobs as failed")
+    return result.rowcount
+
+class _Heartbeat:
+    """Refreshes a running job's locked_at from a thread of its own.
+
+    Uses its own connection, so the handler's open transaction is untouched;
+    a missed beat (e.g. SQLite busy) is only logged.
+    """
+
+    def __init__(self, job_id, interval=JOB_HEARTBEAT_INTERVAL):
+        self.job_id = job_id
+        self.interval = interval
+        self.engine = db.engine
+        self._stopping = threading.Event()
+        self._thread = threading.Thread(target=self._beat, name=f'job-heartbeat-{job_id}', daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stopping.set()
+        self._thread.join()
+        return False
+
+    def beat(self):
+        from app.models.jobs import OutboxJob
+
+        with self.engine.begin() as connection:
+            connection.execute(
+                update(OutboxJob)
+                .where(OutboxJob.id == self.job_id, OutboxJob.status == 'running')
+                .values(locked_at=datetime.utcnow())
+            )
+
+    def _beat(self):
+        while not self._stopping.wait(self.interval):
+            try:
+                self.beat()
+            except Exception as e:
+                logger.warning(f"Heartbeat for job {self.job_id} missed: {e}")
+
+def claim_job(job_id):
+    """Atomically mark a due job as running. Returns False if another worker has it."""
+    from app.models.jobs import OutboxJob
+
+    now = datetime.utcnow()
+    result = db.session.execute(
+        update(OutboxJob)
+        .where(OutboxJob.id == job_id, _claimable(now))
+        .values(status='running', locked_at=now, attempts=OutboxJob.attempts + 1),
+        execution_options={'synchronize_session': False}
+    )
+    db.session.commit()
+    return result.rowcount == 1
+
+def due_job_ids(limit=100):
+    """Ids of jobs that are due, oldest first"""
+    from app.models.jobs import OutboxJob
+
+    rows = db.session.query(OutboxJob.id).filter(
+        _claimable(datetime.utcnow())
+    ).order_by(OutboxJob.run_after).limit(limit).all()
+    return [row[0] for row in rows]
+
+def run_job(job_id):
+    """Claim and run one job. Returns True if it completed."""
+    from app.models.jobs import OutboxJob
+
+    if not claim_job(job_id):
+        return False
+
+    job = db.session.get(OutboxJob, job_id)
+    try:
+        handler = get_job_handler(job.job_type)
+        if handler is None:
+            raise LookupError(f"No handler registered for job type '{job.job_type}'")
+        with _Heartbeat(job_id):
+            handler(job.payload or {})
+    except Exception as e:
+        db.session.rollback()
+        job = db.session.get(OutboxJob, job_id)
+        job.last_error = str(e)
+        job.locked_at = None
+        if job.attempts >= job.max_attempts:
+            job.status = 'failed'
+            logger.error(f"Job {job_id} ({job.job_type}) failed permanently: {e}")
+        else:
+            job.status = 'pending'
+            job.run_after = datetime.utcnow() + timedelta(seconds=JOB_RETRY_DELAY * 2 ** (job.attempts - 1))
+            logger.warning(f"Job {job_id} ({job.job_type}) failed, retrying: {e}")
+        db.session.commit()
+        return False
+
+    job.status = 'completed'
+    job.completed_at = datetime.utcnow()
+    job.locked_at = None
+    db.session.commit()
+    return True
+
+def run_pending_jobs(limit=100):
+    """Run due jobs in the calling thread. Returns the number that completed."""
+    fail_abandoned_jobs()
+    return sum(1 for job_id in due_job_ids(limit) if run_job(job_id))
+
+class JobWorkerPool:
+    """Threads that take job ids from a queue backend and run them.
+
+    Jobs here are dominated by network calls (Daraja, SMS, SMTP), so threads
+    are enough; run several run_worker.py processes to use more cores.
+    """
+
+    def __init__(self, app, backend, concurrency=4, poll_interval=JOB_POLL_INTERVAL):
+        self.app = app
+        self.backend = backend
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self._stopping = threading.Event()
+        self._threads = []
+        self._sweep_lock = threading.Lock()
+        self._last_sweep = 0.0
+        self._last_periodic = {}
+
+    def start(self):
+        for index in range(self.concurrency):
+            thread = threading.Thread(target=self._work, name=f'job-worker-{index}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout=10):
+        self._stopping.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def _work(self):
+        while not self._stopping.is_set():
+            job_id = self.backend.pop(self.poll_interval)
+            with self.app.app_context():
+                try:
+                    if job_id is not None:
+                        run_job(job_id)
+                    self._sweep()
+                except Exception:
+                    logger.exception("Job worker error")
+                    db.session.rollback()
+                finally:
+                    db.session.remove()
+
+    def _sweep(self):
+        """Let one thread at a time pick up due jobs the queue did not deliver"""
+        if time.time() - self._last_sweep < self.poll_interval:
+            return
+        if not self._sweep_lock.acquire(blocking=False):
+            return
+        try:
+            self._last_sweep = time.time()
+            fail_abandoned_jobs()
+            for job_id in due_job_ids():
+                if self._stopping.is_set():
+                    break
+                run_job(job_id)
+            self._run_periodic_tasks()
+        finally:
+            self._sweep_lock.release()
+
+    def _run_periodic_tasks(self):
+        now = time.time()
+        for name, (interval, task) in get_periodic_tasks().items():
+            if now - self._last_periodic.get(name, 0.0) < interval:
+                continue
+            self._last_periodic[name] = now
+            try:
+                task()
+                db.session.commit()
+            except Exception:
+                logger.exception(f"Periodic task {name} failed")
+                db.session.rollback()
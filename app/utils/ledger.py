@@ -0,0 +1,360 @@
+"""
+CHAMAlink Ledger
+================
+Append-only ledger with materialized chama and member balances.
+
+Every change to a chama's money goes through post_entry(), which appends a
+LedgerEntry and applies it to Chama.total_balance and MemberBalance with
+in-database arithmetic (UPDATE ... SET balance = balance + :x), so concurrent
+callbacks cannot lose updates. Reads of balances stay O(1); the rebuild and
+verify helpers recompute the snapshots from the ledger when needed.
+"""
+
+from datetime import datetime
+from sqlalchemy import update, case
+from sqlalchemy.exc import IntegrityError
+from app import db
+
+# Sign applied to the (positive) amount for each entry type.
+# opening_balance and adjustment are posted with the caller's sign.
+ENTRY_SIGNS = {
+    'contribution': 1,
+    'loan_repayment': 1,
+    'penalty_payment': 1,
+    'registration_fee': 1,
+    'loan_disbursement': -1,
+    'withdrawal': -1,
+    'opening_balance': None,
+    'adjustment': None,
+}
+
+def signed_amount(entry_type, amount):
+    """Return the amount with the sign implied by the entry type"""
+    if entry_type not in ENTRY_SIGNS:
+        raise ValueError(f"Unknown ledger entry type: {entry_type}")
+    sign = ENTRY_SIGNS[entry_type]
+    if sign is None:
+        return float(amount)
+    return sign * abs(float(amount))
+
+def post_entry(chama_id, entry_type, amount, user_id=None, transaction_id=None, description=None):
+    """Append a ledger entry and apply it to the balance snapshots.
+
+    Runs inside the caller's transaction (flushes, never commits) so the
+    entry, the snapshots and the caller's own rows commit or roll back together.
+    Returns the chama balance after the entry.
+    """
+    from app.models.chama import Chama
+    from app.models.ledger import LedgerEntry
+
+    value = signed_amount(entry_type, amount)
+
+    # Atomic in-database increment; RETURNING gives us the post-update balance
+    # without a separate read that another worker could race.
+    balance_after = db.session.execute(
+        update(Chama)
+        .where(Chama.id == chama_id)
+        .values(total_balance=db.func.coalesce(Chama.total_balance, 0) + value)
+        .returning(Chama.total_balance),
+        execution_options={'synchronize_session': 'fetch'}
+    ).scalar_one_or_none()
+
+    if balance_after is None:
+        raise ValueError(f"Chama {chama_id} not found")
+
+    entry = LedgerEntry(
+        chama_id=chama_id,
+        user_id=user_id,
+        entry_type=entry_type,
+        amount=value,
+        balance_after=balance_after,
+        description=description,
+        transaction_id=transaction_id
+    )
+    db.session.add(entry)
+
+    if user_id is not None:
+        contribution = value if entry_type == 'contribution' else 0.0
+        _apply_member_balance(chama_id, user_id, value, contribution)
+
+    db.session.flush()
+    return balance_after
+
+def post_entries(entries):
+    """Post many ledger entries with one balance update per chama and member.
+
+    ``entries`` is a list of dicts with the post_entry() arguments. Entries
+    keep their order within each chama, so balance_after still reads as a
+    running balance. Like post_entry(), flushes but never commits.
+    Returns {chama_id: balance after the last entry}.
+    """
+    from app.models.chama import Chama
+    from app.models.ledger import LedgerEntry
+
+    by_chama = {}
+    for entry in entries:
+        value = signed_amount(entry['entry_type'], entry['amount'])
+        by_chama.setdefault(entry['chama_id'], []).append((entry, value))
+
+    now = datetime.utcnow()
+    balances = {}
+    rows = []
+    members = {}
+    for chama_id, chama_entries in by_chama.items():
+        total = sum(value for _, value in chama_entries)
+        final_balance = db.session.execute(
+            update(Chama)
+            .where(Chama.id == chama_id)
+            .values(total_balance=db.func.coalesce(Chama.total_balance, 0) + total)
+            .returning(Chama.total_balance),
+            execution_options={'synchronize_session': 'fetch'}
+        ).scalar_one_or_none()
+        if final_balance is None:
+            raise ValueError(f"Chama {chama_id} not found")
+        balances[chama_id] = final_balance
+
+        running = final_balance - total
+        for entry, value in chama_entries:
+            running += value
+            rows.append({
+                'chama_id': chama_id,
+                'user_id': entry.get('user_id'),
+                'entry_type': entry['entry_type'],
+                'amount': value,
+                'balance_after': running,
+                'description': entry.get('description'),
+                'transaction_id': entry.get('transaction_id'),
+                'created_at': now
+            })
+            if entry.get('user_id') is not None:
+                totals = members.setdefault((chama_id, entry['user_id']), [0.0, 0.0, 0])
+                totals[0] += value
+                totals[1] += value if entry['entry_type'] == 'contribution' else 0.0
+                totals[2] += 1
+
+    db.session.bulk_insert_mappings(LedgerEntry, rows)
+    for (chama_id, user_id), (value, contribution, count) in members.items():
+        _apply_member_balance(chama_id, user_id, value, contribution, count)
+
+    db.session.flush()
+    return balances
+
+def _apply_member_balance(chama_id, user_id, value, contribution=0.0, count=1):
+    """Increment the member snapshot, creating it on first use"""
+    from app.models.ledger import MemberBalance
+
+    stmt = update(MemberBalance).where(
+        MemberBalance.chama_id == chama_id,
+        MemberBalance.user_id == user_id
+    ).values(
+        balance=MemberBalance.balance + value,
+        total_contributions=MemberBalance.total_contributions + contribution,
+        entry_count=MemberBalance.entry_count + count,
+        updated_at=datetime.utcnow()
+    )
+
+    if db.session.execute(stmt, execution_options={'synchronize_session': False}).rowcount:
+        return
+
+    try:
+        with db.session.begin_nested():
+            db.session.add(MemberBalance(
+                chama_id=chama_id,
+                user_id=user_id,
+                balance=value,
+                total_contributions=contribution,
+                entry_count=count
+            ))
+    except IntegrityError:
+        # Another worker created the row between our UPDATE and INSERT
+        db.session.execute(stmt, execution_options={'synchronize_session': False})
+
+def get_member_balance(chama_id, user_id):
+    """Get a member's snapshot for a chama, or None if they have no entries"""
+    from app.models.ledger import MemberBalance
+    return MemberBalance.query.get((chama_id, user_id))
+
+def get_member_balances(chama_id):
+    """Map user_id -> MemberBalance for every member with ledger activity in a chama"""
+    from app.models.ledger import MemberBalance
+    return {
+        balance.user_id: balance
+        for balance in MemberBalance.query.filter_by(chama_id=chama_id).all()
+    }
+
+def _ledger_totals(chama_id=None):
+    """Aggregate the ledger per chama in one grouped query"""
+    from app.models.ledger import LedgerEntry
+    query = db.session.query(
+        LedgerEntry.chama_id,
+        db.func.coalesce(db.func.sum(LedgerEntry.amount), 0)
+    ).group_by(LedgerEntry.chama_id)
+    if chama_id is not None:
+        query = query.filter(LedgerEntry.chama_id == chama_id)
+    return {row[0]: float(row[1]) for row in query.all()}
+
+def _member_ledger_totals(chama_id=None):
+    """Aggregate the ledger per (chama, member) in one grouped query"""
+    from app.models.ledger import LedgerEntry
+    query = db.session.query(
+        LedgerEntry.chama_id,
+        LedgerEntry.user_id,
+        db.func.coalesce(db.func.sum(LedgerEntry.amount), 0),
+        db.func.coalesce(db.func.sum(case(
+            (LedgerEntry.entry_type == 'contribution', LedgerEntry.amount), else_=0
+        )), 0),
+        db.func.count(LedgerEntry.id)
+    ).filter(LedgerEntry.user_id.isnot(None)).group_by(LedgerEntry.chama_id, LedgerEntry.user_id)
+    if chama_id is not None:
+        query = query.filter(LedgerEntry.chama_id == chama_id)
+    return {
+        (row[0], row[1]): (float(row[2]), float(row[3]), row[4])
+        for row in query.all()
+    }
+
+def verify_balances(chama_id=None, tolerance=0.005):
+    """Compare the snapshots against the ledger and return any discrepancies"""
+    from app.models.chama import Chama
+    from app.models.ledger import MemberBalance
+
+    discrepancies = []
+
+    ledger_totals = _ledger_totals(chama_id)
+    chama_query = db.session.query(Chama.id, Chama.total_balance)
+    if chama_id is not None:
+        chama_query = chama_query.filter(Chama.id == chama_id)
+    for cid, snapshot in chama_query.yield_per(1000):
+        expected = ledger_totals.get(cid, 0.0)
+        if abs((snapshot or 0.0) - expected) > tolerance:
+            discrepancies.append({
+                'chama_id': cid,
+                'user_id': None,
+                'snapshot': float(snapshot or 0.0),
+                'ledger': expected
+            })
+
+    member_totals = _member_ledger_totals(chama_id)
+    member_query = MemberBalance.query
+    if chama_id is not None:
+        member_query = member_query.filter_by(chama_id=chama_id)
+    seen = set()
+    for balance in member_query.yield_per(1000):
+        key = (balance.chama_id, balance.user_id)
+        seen.add(key)
+        expected = member_totals.get(key, (0.0, 0.0, 0))[0]
+        if abs(balance.balance - expected) > tolerance:
+            discrepancies.append({
+                'chama_id': balance.chama_id,
+                'user_id': balance.user_id,
+                'snapshot': balance.balance,
+                'ledger': expected
+            })
+    for key, totals in member_totals.items():
+        if key not in seen:
+            discrepancies.append({
+                'chama_id': key[0],
+                'user_id': key[1],
+                'snapshot': None,
+                'ledger': totals[0]
+            })
+
+    return discrepancies
+
+def rebuild_balances(chama_id=None):
+    """Recompute chama and member snapshots from the ledger. Caller commits."""
+    from app.models.chama import Chama
+    from app.models.ledger import MemberBalance
+
+    ledger_totals = _ledger_totals(chama_id)
+    chama_query = db.session.query(Chama.id)
+    if chama_id is not None:
+        chama_query = chama_query.filter(Chama.id == chama_id)
+    chama_ids = [row[0] for row in chama_query.all()]
+    for cid in chama_ids:
+        db.session.execute(
+            update(Chama).where(Chama.id == cid).values(total_balance=ledger_totals.get(cid, 0.0)),
+            execution_options={'synchronize_session': False}
+        )
+
+    delete_query = MemberBalance.query
+    if chama_id is not None:
+        delete_query = delete_query.filter_by(chama_id=chama_id)
+    delete_query.delete(synchronize_session=False)
+
+    member_totals = _member_ledger_totals(chama_id)
+    db.session.bulk_insert_mappings(MemberBalance, [
+        {
+            'chama_id': key[0],
+            'user_id': key[1],
+            'balance': balance,
+            'total_contributions': contributions,
+            'entry_count': count,
+            'updated_at': datetime.utcnow()
+        }
+        for key, (balance, contributions, count) in member_totals.items()
+    ])
+    db.session.flush()
+    return len(chama_ids), len(member_totals)
+
+def backfill_opening_balances():
+    """Seed the ledger for chamas that predate it.
+
+    Each member gets an opening entry equal to their completed transaction
+    history, and the chama gets an unattributed opening entry for whatever
+    remains of its current total_balance, so the ledger sums to today's
+    balances. Chamas that already have ledger entries are skipped. Caller commits.
+    """
+    from app.models.chama import Chama, Transaction
+    from app.models.ledger import LedgerEntry, MemberBalance
+
+    seeded = db.session.query(LedgerEntry.chama_id).distinct()
+    pending = db.session.query(Chama.id, Chama.total_balance).filter(~Chama.id.in_(seeded)).all()
+    if not pending:
+        return 0
+
+    pending_ids = [row[0] for row in pending]
+    signed = case(
+        (Transaction.type.in_(['loan', 'withdrawal']), -Transaction.amount),
+        (Transaction.type.in_(['contribution', 'loan_repayment', 'penalty_payment']), Transaction.amount),
+        else_=0
+    )
+    contributed = case((Transaction.type == 'contribution', Transaction.amount), else_=0)
+    history = db.session.query(
+        Transaction.chama_id,
+        Transaction.user_id,
+        db.func.coalesce(db.func.sum(signed), 0),
+        db.func.coalesce(db.func.sum(contributed), 0)
+    ).filter(
+        Transaction.chama_id.in_(pending_ids),
+        Transaction.status == 'completed'
+    ).group_by(Transaction.chama_id, Transaction.user_id).all()
+
+    now = datetime.utcnow()
+    attributed = {}
+    entries = []
+    balances = []
+    for cid, uid, net, contributions in history:
+        net = float(net)
+        attributed[cid] = attributed.get(cid, 0.0) + net
+        entries.append({
+            'chama_id': cid, 'user_id': uid, 'entry_type': 'opening_balance',
+            'amount': net, 'description': 'Opening balance from transaction history',
+            'created_at': now
+        })
+        balances.append({
+            'chama_id': cid, 'user_id': uid, 'balance': net,
+            'total_contributions': float(contributions), 'entry_count': 1, 'updated_at': now
+        })
+
+    for cid, total_balance in pending:
+        remainder = float(total_balance or 0.0) - attributed.get(cid, 0.0)
+        entries.append({
+            'chama_id': cid, 'user_id': None, 'entry_type': 'opening_balance',
+            'amount': remainder, 'balance_after': float(total_balance or 0.0),
+            'description': 'Opening balance (unattributed)', 'created_at': now
+        })
+
+    db.session.bulk_insert_mappings(LedgerEntry, entries)
+    db.session.bulk_insert_mappings(MemberBalance, balances)
+    db.session.flush()
+    return len(pending_ids)
@@ -0,0 +1,216 @@
+"""
+CHAMAlink Mail Transport
+========================
+Pool of persistent, authenticated SMTP connections.
+
+Opening an SMTP connection costs a TCP connect, EHLO, STARTTLS (a TLS
+handshake) and AUTH before the first byte of mail. The pool keeps up to
+SMTP_POOL_SIZE sessions open and hands them out in turn, so a bulk send
+pays that cost once per connection instead of once per message.
+send_many() sends a whole batch over one session.
+
+Connections are recycled after SMTP_MAX_MESSAGES messages or
+SMTP_MAX_IDLE idle seconds (servers drop idle sessions), and a session the
+server has closed is reopened once transparently.
+"""
+
+import logging
+import os
+import queue
+import smtplib
+import ssl
+import threading
+import time
+from contextlib import contextmanager
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+logger = logging.getLogger(__name__)
+
+SMTP_POOL_SIZE = int(os.getenv('SMTP_POOL_SIZE', 4))
+SMTP_MAX_MESSAGES = int(os.getenv('SMTP_MAX_MESSAGES', 100))
+SMTP_MAX_IDLE = 60
+SMTP_TIMEOUT = 30
+
+class _PooledConnection:
+    def __init__(self, server):
+        self.server = server
+        self.sent = 0
+        self.last_used = time.time()
+
+class SMTPConnectionPool:
+    """Thread-safe pool of logged-in SMTP sessions to one server"""
+
+    def __init__(self, host, port, username=None, password=None, security='starttls',
+                 size=SMTP_POOL_SIZE, max_messages=SMTP_MAX_MESSAGES, max_idle=SMTP_MAX_IDLE, timeout=SMTP_TIMEOUT):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.security = security  # starttls, ssl, none
+        self.size = size
+        self.max_messages = max_messages
+        self.max_idle = max_idle
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self.connections_opened = 0
+        self.messages_sent = 0
+        self.reconnects = 0
+
+    def _connect(self):
+        context = ssl.create_default_context()
+        if self.security == 'ssl':
+            server = smtplib.SMTP_SSL(self.host, self.port, timeout=self.timeout, context=context)
+        else:
+            server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+            if self.security == 'starttls':
+                server.starttls(context=context)
+        server.ehlo_or_helo_if_needed()
+        # Local relays and test servers may not offer AUTH at all
+        if self.username and self.password and server.has_extn('auth'):
+            server.login(self.username, self.password)
+        with self._lock:
+            self.connections_opened += 1
+        return _PooledConnection(server)
+
+    @staticmethod
+    def _quit(connection):
+        try:
+            connection.server.quit()
+        except Exception:
+            try:
+                connection.server.close()
+            except Exception:
+                pass
+
+    def _checkout(self):
+        while True:
+            try:
+                connection = self._idle.get_nowait()
+            except queue.Empty:
+                return self._connect()
+            if time.time() - connection.last_used > self.max_idle:
+                self._quit(connection)
+                continue
+            return connection
+
+    @contextmanager
+    def connection(self):
+        """Borrow a session; it goes back to the pool unless it broke or is worn out"""
+        self._slots.acquire()
+        connection = None
+        healthy = False
+        try:
+            connection = self._checkout()
+            yield connection
+            healthy = True
+        finally:
+            if connection is not None:
+                if healthy and connection.sent < self.max_messages:
+                    connection.last_used = time.time()
+                    self._idle.put(connection)
+                else:
+                    self._quit(connection)
+            self._slots.release()
+
+    def _sendmail(self, connection, sender, recipient, message):
+        try:
+            connection.server.sendmail(sender, recipient, message)
+        except smtplib.SMTPServerDisconnected:
+            # The server closed an idle session; reopen once and resend
+            self._quit(connection)
+            connection.server = self._connect().server
+            with self._lock:
+                self.reconnects += 1
+            connection.server.sendmail(sender, recipient, message)
+        connection.sent += 1
+        with self._lock:
+            self.messages_sent += 1
+
+    def send(self, sender, recipient, message):
+        """Send one message (str or bytes) over a pooled session. Raises on failure."""
+        with self.connection() as connection:
+            self._sendmail(connection, sender, recipient, message)
+
+    def send_many(self, messages):
+        """Send [(sender, recipient, message)] over one session.
+
+        Returns one entry per message: None when sent, otherwise the
+        exception. A refused recipient does not stop the rest of the batch;
+        a broken session fails the remaining messages with its error.
+        """
+        results = []
+        try:
+            with self.connection() as connection:
+                for sender, recipient, message in messages:
+                    if connection.sent >= self.max_messages:
+                        # Worn out mid-batch: swap in a fresh session
+                        self._quit(connection)
+                        fresh = self._connect()
+                        connection.server, connection.sent = fresh.server, 0
+                    try:
+                        self._sendmail(connection, sender, recipient, message)
+                        results.append(None)
+                    except (smtplib.SMTPRecipientsRefused, smtplib.SMTPDataError, smtplib.SMTPSenderRefused) as e:
+                        results.append(e)
+        except Exception as e:
+            logger.warning(f"SMTP session to {self.host} failed: {e}")
+            results.extend([e] * (len(messages) - len(results)))
+        return results
+
+    def close(self):
+        """Close every idle session"""
+        while True:
+            try:
+                self._quit(self._idle.get_nowait())
+            except queue.Empty:
+                return
+
+    def stats(self):
+        with self._lock:
+            return {
+                'host': self.host,
+                'size': self.size,
+                'idle': self._idle.qsize(),
+                'connections_opened': self.connections_opened,
+                'messages_sent': self.messages_sent,
+                'reconnects': self.reconnects
+            }
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+def get_smtp_pool(host, port, username=None, password=None, security='starttls'):
+    """Process-wide pool for a server and account, created on first use"""
+    key = (host, port, username, password, security)
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                pool = SMTPConnectionPool(host, port, username, password, security)
+                _pools[key] = pool
+    return pool
+
+def build_message(sender, recipient, subject, html_content, text_content=None, headers=None):
+    """multipart/alternative message as UTF-8 bytes, ready for sendmail()"""
+    message = MIMEMultipart("alternative")
+    message["Subject"] = subject
+    message["From"] = sender
+    message["To"] = recipient
+    for name, value in (headers or {}).items():
+        message[name] = value
+    if text_content:
+        message.attach(MIMEText(text_content, "plain", "utf-8"))
+    message.attach(MIMEText(html_content, "html", "utf-8"))
+    return message.as_string().encode('utf-8')
+
+def is_permanent_failure(error):
+    """Whether retrying a failed message can never help (5xx replies, refused recipients)"""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return True
+    if isinstance(error, (smtplib.SMTPDataError, smtplib.SMTPSenderRefused)):
+        return 500 <= error.smtp_code < 600
+    return False
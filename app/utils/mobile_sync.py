@@ -0,0 +1,508 @@
+"""
+CHAMAlink Mobile Sync
+=====================
+Delta sync for the mobile app: after the first full snapshot a client only
+receives the chamas, memberships, transactions, notifications and events
+that changed since its last sync.
+
+Changes are captured by SQLAlchemy session hooks into the sync_changes log
+in the same transaction as the write itself, so a change is logged exactly
+when it commits. ORM writes are picked up after flush; Core DML on
+chama_members (add_member, remove_member, role updates) when it executes.
+
+The sync token holds the last change id the client has seen and when the
+token was issued. A transaction that was still open when the token was
+issued can commit a change with a lower id, so each sync also re-reads the
+last SYNC_OVERLAP_SECONDS of changes before the token was issued. Clients
+apply upserts idempotently, so an occasional repeat is harmless.
+
+Offline actions sent with a sync are applied in one transaction, each in
+its own savepoint, and recorded under the client's idempotency key so a
+retried sync never applies an action twice.
+"""
+
+import base64
+import logging
+from datetime import datetime, timedelta, date
+from sqlalchemy import event, func, inspect, or_
+from sqlalchemy.orm import Session, joinedload
+from app import db
+from app.utils.jobs import job_handler, periodic_task, enqueue_job
+
+logger = logging.getLogger(__name__)
+
+# Change rows returned per sync; clients keep syncing while has_more is set
+SYNC_BATCH_SIZE = 500
+
+# Window re-read before each token to catch late-committing transactions
+SYNC_OVERLAP_SECONDS = 120
+
+# Change log kept this long; older tokens get a fresh full snapshot
+SYNC_RETENTION_DAYS = 30
+
+# Rows of history in a full snapshot (older ones come from the transaction feed)
+SYNC_SNAPSHOT_TRANSACTIONS = 100
+SYNC_SNAPSHOT_NOTIFICATIONS = 100
+SYNC_SNAPSHOT_EVENT_DAYS = 30
+
+ENTITIES = ('chamas', 'memberships', 'transactions', 'notifications', 'events')
+
+# --- Sync tokens -----------------------------------------------------------
+
+def encode_sync_token(last_id, issued_at):
+    raw = f"{last_id}|{int(issued_at.timestamp()) if issued_at else 0}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+def decode_sync_token(token):
+    """(last change id, issued at or None). Raises ValueError if malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)).decode()
+        last_id, issued = raw.split('|')
+        issued = int(issued)
+        return int(last_id), datetime.fromtimestamp(issued) if issued else None
+    except Exception:
+        raise ValueError('Invalid sync token')
+
+# --- Change capture --------------------------------------------------------
+
+def _membership_key(chama_id, user_id):
+    return f"{chama_id if chama_id is not None else '*'}:{user_id if user_id is not None else '*'}"
+
+def _change(entity, key, operation, chama_id=None, user_id=None):
+    return {'entity': entity, 'entity_key': str(key), 'operation': operation,
+            'chama_id': chama_id, 'user_id': user_id, 'changed_at': datetime.utcnow()}
+
+def _object_changes(session, obj, operation, is_new=False):
+    from app.models.chama import Chama, Transaction, Event
+    from app.models.notification import Notification
+    from app.models.user import User
+
+    changes = []
+    state = inspect(obj)
+    if isinstance(obj, Transaction):
+        changes.append(_change('transaction', obj.id, operation, chama_id=obj.chama_id))
+    elif isinstance(obj, Event):
+        changes.append(_change('event', obj.id, operation, chama_id=obj.chama_id))
+    elif isinstance(obj, Notification):
+        changes.append(_change('notification', obj.id, operation, user_id=obj.user_id))
+    elif isinstance(obj, Chama):
+        if is_new or operation == 'delete' or session.is_modified(obj, include_collections=False):
+            changes.append(_change('chama', obj.id, operation, chama_id=obj.id))
+        history = state.attrs.members.history
+        for user in history.added:
+            changes.append(_change('membership', _membership_key(obj.id, user.id), 'upsert', obj.id, user.id))
+        for user in history.deleted:
+            changes.append(_change('membership', _membership_key(obj.id, user.id), 'delete', obj.id, user.id))
+    elif isinstance(obj, User) and 'chamas' in state.attrs:
+        history = state.attrs.chamas.history
+        for chama in history.added:
+            changes.append(_change('membership', _membership_key(chama.id, obj.id), 'upsert', chama.id, obj.id))
+        for chama in history.deleted:
+            changes.append(_change('membership', _membership_key(chama.id, obj.id), 'delete', chama.id, obj.id))
+    return changes
+
+def _write_changes(session, changes):
+    from app.models.sync import SyncChange
+
+    unique = list({(c['entity'], c['entity_key'], c['operation']): c for c in changes}.values())
+    if unique:
+        session.connection().execute(SyncChange.__table__.insert(), unique)
+
+@event.listens_for(Session, 'after_flush')
+def _log_flushed_changes(session, flush_context):
+    changes = []
+    for objects, operation, is_new in ((session.new, 'upsert', True), (session.dirty, 'upsert', False),
+                                       (session.deleted, 'delete', False)):
+        for obj in objects:
+            try:
+                changes.extend(_object_changes(session, obj, operation, is_new))
+            except Exception as e:
+                logger.warning(f"Sync log could not record {obj!r}: {e}")
+    _write_changes(session, changes)
+
+@event.listens_for(Session, 'do_orm_execute')
+def _log_membership_writes(orm_execute_state):
+    if not (orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    table = getattr(orm_execute_state.statement, 'table', None)
+    if getattr(table, 'name', None) != 'chama_members':
+        return
+
+    from app.utils.fragment_cache import dml_values
+
+    operation = 'delete' if orm_execute_state.is_delete else 'upsert'
+    parameters = orm_execute_state.parameters
+    if isinstance(parameters, list) and parameters and all('chama_id' in p and 'user_id' in p for p in parameters):
+        pairs = {(p['chama_id'], p['user_id']) for p in parameters}
+    else:
+        values = dml_values(orm_execute_state.statement, parameters)
+        chama_ids = values.get('chama_id') or {None}
+        user_ids = values.get('user_id') or {None}
+        pairs = {(chama_id, user_id) for chama_id in chama_ids for user_id in user_ids}
+
+    changes = []
+    for chama_id, user_id in pairs:
+        if chama_id is None and user_id is None:
+            continue
+        # A statement over a whole roster is logged as a wildcard: clients replace that roster
+        wildcard = chama_id is None or user_id is None
+        changes.append(_change('membership', _membership_key(chama_id, user_id),
+                               'upsert' if wildcard else operation, chama_id, user_id))
+    _write_changes(orm_execute_state.session, changes)
+
+def log_bulk_changes(entity, rows, operation='upsert'):
+    """Log rows written with bulk inserts, which the session hooks never see.
+
+    ``rows`` is a select of (id, chama_id, user_id); the log rows are copied
+    with one INSERT ... SELECT in the caller's transaction.
+    """
+    from sqlalchemy import literal, cast, String
+    from app.models.sync import SyncChange
+
+    keys = rows.subquery()
+    id_column, chama_column, user_column = keys.c
+    source = db.select(
+        literal(entity), cast(id_column, String), literal(operation), chama_column, user_column,
+        literal(datetime.utcnow())
+    )
+    db.session.execute(SyncChange.__table__.insert().from_select(
+        ['entity', 'entity_key', 'operation', 'chama_id', 'user_id', 'changed_at'], source
+    ))
+
+# --- Serialization ---------------------------------------------------------
+
+def _iso(value):
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.isoformat() + 'Z'
+    return value.isoformat()
+
+def serialize_chama(chama):
+    return {
+        'id': chama.id,
+        'name': chama.name,
+        'description': chama.description,
+        'status': chama.status,
+        'monthly_contribution': float(chama.monthly_contribution or 0),
+        'registration_fee': float(chama.registration_fee or 0),
+        'total_balance': float(chama.total_balance or 0),
+        'meeting_day': chama.meeting_day,
+        'meeting_time': chama.meeting_time.strftime('%H:%M') if chama.meeting_time else None,
+        'next_meeting_date': _iso(chama.next_meeting_date),
+        'currency': chama.base_currency or 'KES',
+        'updated_at': _iso(chama.updated_at)
+    }
+
+def serialize_event(event):
+    return {
+        'id': event.id,
+        'chama_id': event.chama_id,
+        'title': event.title,
+        'description': event.description,
+        'event_date': _iso(event.event_date),
+        'event_time': event.event_time.strftime('%H:%M') if event.event_time else None,
+        'location': event.location,
+        'type': event.type,
+        'status': event.status
+    }
+
+def serialize_notification(notification):
+    return {
+        'id': notification.id,
+        'chama_id': notification.chama_id,
+        'title': notification.title,
+        'message': notification.message,
+        'type': notification.type,
+        'is_read': bool(notification.is_read),
+        'created_date': _iso(notification.created_date),
+        'related_id': notification.related_id
+    }
+
+def _memberships(chama_ids=None, user_ids=None):
+    """Membership rows of whole chamas and/or users, with usernames"""
+    from app.models.chama import chama_members
+    from app.models.user import User
+
+    query = db.session.query(
+        chama_members.c.chama_id, chama_members.c.user_id, chama_members.c.role,
+        chama_members.c.joined_at, User.username
+    ).join(User, User.id == chama_members.c.user_id)
+    criteria = []
+    if chama_ids:
+        criteria.append(chama_members.c.chama_id.in_(chama_ids))
+    if user_ids:
+        criteria.append(chama_members.c.user_id.in_(user_ids))
+    if not criteria:
+        return []
+    return [{
+        'key': _membership_key(chama_id, member_id),
+        'chama_id': chama_id,
+        'user_id': member_id,
+        'role': role,
+        'joined_at': _iso(joined_at),
+        'username': username
+    } for chama_id, member_id, role, joined_at, username in query.filter(or_(*criteria))]
+
+# --- Snapshots and deltas --------------------------------------------------
+
+def _empty_changes():
+    return {entity: {'upserted': [], 'deleted': []} for entity in ENTITIES}
+
+def _chama_snapshot(changes, chama_ids):
+    """Add everything a member of ``chama_ids`` needs to start syncing them"""
+    from app.models.chama import Chama, Event
+    from app.utils.transaction_feed import transaction_page, serialize_transaction
+
+    if not chama_ids:
+        return
+    changes['chamas']['upserted'].extend(
+        serialize_chama(chama) for chama in Chama.query.filter(Chama.id.in_(chama_ids)).order_by(Chama.id)
+    )
+    changes['memberships']['upserted'].extend(_memberships(chama_ids=chama_ids))
+    for chama_id in sorted(chama_ids):
+        page = transaction_page([chama_id], limit=SYNC_SNAPSHOT_TRANSACTIONS)
+        changes['transactions']['upserted'].extend(serialize_transaction(t) for t in page['transactions'])
+    since = date.today() - timedelta(days=SYNC_SNAPSHOT_EVENT_DAYS)
+    changes['events']['upserted'].extend(serialize_event(e) for e in Event.query.filter(
+        Event.chama_id.in_(chama_ids), Event.event_date >= since
+    ).order_by(Event.event_date))
+
+def build_snapshot(user_id):
+    """Everything the user can see, plus the token to delta-sync from afterwards"""
+    from app.models.notification import Notification
+    from app.models.sync import SyncChange
+    from app.utils.permissions import get_user_memberships
+
+    # Read the watermark first: anything written during the snapshot is re-sent next time
+    issued_at = datetime.utcnow()
+    last_id = db.session.query(func.max(SyncChange.id)).scalar() or 0
+
+    changes = _empty_changes()
+    _chama_snapshot(changes, set(get_user_memberships(user_id)))
+    changes['notifications']['upserted'] = [serialize_notification(n) for n in Notification.query.filter(
+        Notification.user_id == user_id
+    ).order_by(Notification.created_date.desc()).limit(SYNC_SNAPSHOT_NOTIFICATIONS)]
+
+    return {
+        'full_snapshot': True,
+        'changes': changes,
+        'sync_token': encode_sync_token(last_id, issued_at),
+        'has_more': False
+    }
+
+def _split_keys(latest, entity):
+    upserts = [key for (kind, key), operation in latest.items() if kind == entity and operation == 'upsert']
+    deletes = [key for (kind, key), operation in latest.items() if kind == entity and operation == 'delete']
+    return upserts, deletes
+
+def _int_keys(keys):
+    return [int(key) for key in keys if key.isdigit()]
+
+def build_delta(user_id, since_id, issued_at, limit=SYNC_BATCH_SIZE):
+    """Changes visible to the user after change ``since_id``, compacted per record"""
+    from app.models.chama import Chama, Transaction, Event
+    from app.models.notification import Notification
+    from app.models.sync import SyncChange
+    from app.utils.permissions import get_user_memberships
+    from app.utils.transaction_feed import serialize_transaction
+
+    now = datetime.utcnow()
+    chama_ids = set(get_user_memberships(user_id))
+
+    low = since_id
+    if issued_at is not None:
+        # Re-read changes logged shortly before the token was issued
+        overlap_start = db.session.query(func.min(SyncChange.id)).filter(
+            SyncChange.changed_at >= issued_at - timedelta(seconds=SYNC_OVERLAP_SECONDS)
+        ).scalar()
+        if overlap_start is not None:
+            low = min(low, overlap_start - 1)
+
+    scope = SyncChange.user_id == user_id
+    if chama_ids:
+        scope = or_(SyncChange.chama_id.in_(chama_ids), scope)
+    rows = SyncChange.query.filter(SyncChange.id > low, scope).order_by(SyncChange.id).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    latest = {}
+    for row in rows:
+        latest[(row.entity, row.entity_key)] = row.operation
+    changes = _empty_changes()
+
+    # Memberships: joining a chama brings its snapshot, leaving it removes the
+    # chama; any other change resends the affected rosters
+    joined, left, roster_chamas, roster_users = set(), set(), set(), set()
+    upserts, deletes = _split_keys(latest, 'membership')
+    for key in upserts:
+        chama_part, user_part = key.split(':')
+        if chama_part == '*':
+            roster_users.add(int(user_part))
+            continue
+        roster_chamas.add(int(chama_part))
+        if user_part == str(user_id):
+            joined.add(int(chama_part))
+    for key in deletes:
+        chama_part, user_part = key.split(':')
+        changes['memberships']['deleted'].append(key)
+        if user_part == str(user_id) and int(chama_part) not in chama_ids:
+            left.add(int(chama_part))
+
+    joined &= chama_ids
+    rosters = (roster_chamas & chama_ids) - joined
+    if rosters or roster_users:
+        changes['memberships']['upserted'] = [
+            membership for membership in _memberships(chama_ids=rosters, user_ids=roster_users)
+            if membership['chama_id'] in chama_ids and membership['chama_id'] not in joined
+        ]
+    _chama_snapshot(changes, joined)
+    changes['chamas']['deleted'].extend(str(chama_id) for chama_id in sorted(left))
+
+    def load(entity, model, serializer, visible, chama_of=None, options=()):
+        upserts, deletes = _split_keys(latest, entity)
+        found = set()
+        if upserts:
+            query = model.query.options(*options).filter(model.id.in_(_int_keys(upserts)))
+            for obj in query:
+                if not visible(obj):
+                    continue
+                found.add(str(obj.id))
+                # Already part of a newly joined chama's snapshot
+                if chama_of is None or chama_of(obj) not in joined:
+                    changes[f'{entity}s']['upserted'].append(serializer(obj))
+        # Rows gone (or no longer visible) since they were logged count as deleted
+        changes[f'{entity}s']['deleted'].extend(sorted(set(deletes) | (set(upserts) - found)))
+
+    load('chama', Chama, serialize_chama, lambda chama: chama.id in chama_ids, lambda chama: chama.id)
+    load('transaction', Transaction, serialize_transaction, lambda t: t.chama_id in chama_ids,
+         lambda t: t.chama_id, (joinedload(Transaction.user), joinedload(Transaction.chama)))
+    load('event', Event, serialize_event, lambda e: e.chama_id in chama_ids, lambda e: e.chama_id)
+    load('notification', Notification, serialize_notification, lambda n: n.user_id == user_id)
+
+    last_id = max([since_id] + [row.id for row in rows])
+    return {
+        'full_snapshot': False,
+        'changes': changes,
+        # Continuation pages skip the overlap window; only the final token opens a new one
+        'sync_token': encode_sync_token(last_id, None if has_more else now),
+        'has_more': has_more
+    }
+
+def sync_changes(user_id, token=None):
+    """Delta since ``token``, or a full snapshot for new and expired tokens"""
+    if not token:
+        return build_snapshot(user_id)
+    from app.models.sync import SyncChange
+
+    since_id, issued_at = decode_sync_token(token)
+    if issued_at is not None and issued_at < datetime.utcnow() - timedelta(days=SYNC_RETENTION_DAYS):
+        return build_snapshot(user_id)
+    # Changes after the token may already have been pruned from the log
+    oldest = db.session.query(func.min(SyncChange.id)).scalar()
+    if oldest is not None and since_id < oldest - 1:
+        return build_snapshot(user_id)
+    return build_delta(user_id, since_id, issued_at)
+
+# --- Offline actions -------------------------------------------------------
+
+SYNC_ACTIONS = {}
+
+def sync_action(name):
+    """Register the handler for an offline action type: handler(user, data) -> dict"""
+    def decorator(func):
+        SYNC_ACTIONS[name] = func
+        return func
+    return decorator
+
+@sync_action('update_profile')
+def _update_profile(user, data):
+    user.first_name = data.get('first_name', user.first_name)
+    user.last_name = data.get('last_name', user.last_name)
+    return {'user_id': user.id}
+
+@sync_action('mark_notification_read')
+def _mark_notification_read(user, data):
+    from app.models.notification import Notification
+
+    notification = Notification.query.filter_by(id=data.get('notification_id'), user_id=user.id).first()
+    if notification is None:
+        raise ValueError('Notification not found')
+    notification.is_read = True
+    return {'notification_id': notification.id}
+
+def apply_offline_actions(user, actions):
+    """Apply queued offline actions in the caller's transaction. The caller commits once.
+
+    Each action needs an ``idempotency_key`` (``id`` is accepted for older
+    clients). Keys already applied return their stored result.
+    """
+    from app.models.sync import SyncAction
+
+    keys = {str(action.get('idempotency_key') or action.get('id') or '') for action in actions}
+    keys.discard('')
+    done = {}
+    if keys:
+        done = {a.idempotency_key: a for a in SyncAction.query.filter(
+            SyncAction.user_id == user.id, SyncAction.idempotency_key.in_(keys)
+        )}
+
+    results = []
+    for action in actions:
+        key = str(action.get('idempotency_key') or action.get('id') or '')
+        if not key:
+            results.append({'action_id': None, 'status': 'error', 'error': 'idempotency_key is required'})
+            continue
+        if key in done:
+            previous = done[key]
+            results.append({'action_id': key, 'status': previous.status, 'duplicate': True,
+                            'result': previous.result})
+            continue
+
+        action_type = action.get('type')
+        handler = SYNC_ACTIONS.get(action_type)
+        try:
+            if handler is None:
+                raise ValueError(f'Unknown action type: {action_type}')
+            with db.session.begin_nested():
+                result = handler(user, action.get('data') or {})
+            status = 'success'
+        except Exception as e:
+            status, result = 'error', {'error': str(e)}
+
+        record = SyncAction(user_id=user.id, idempotency_key=key, action_type=str(action_type)[:50],
+                            status=status, result=result)
+        db.session.add(record)
+        done[key] = record
+        entry = {'action_id': key, 'status': status}
+        entry.update({'error': result['error']} if status == 'error' else {'result': result})
+        results.append(entry)
+    return results
+
+# --- Retention -------------------------------------------------------------
+
+def prune_sync_log(now=None):
+    """Drop change-log rows and idempotency records past the retention window"""
+    from app.models.sync import SyncChange, SyncAction
+
+    cutoff = (now or datetime.utcnow()) - timedelta(days=SYNC_RETENTION_DAYS)
+    # Keep the newest row so sync_changes() can still tell pruned tokens apart
+    newest = db.session.query(func.max(SyncChange.id)).scalar() or 0
+    changes = SyncChange.query.filter(
+        SyncChange.changed_at < cutoff, SyncChange.id < newest
+    ).delete(synchronize_session=False)
+    actions = SyncAction.query.filter(SyncAction.created_at < cutoff).delete(synchronize_session=False)
+    return changes, actions
+
+@job_handler('sync_prune')
+def process_prune(payload):
+    prune_sync_log()
+
+@periodic_task('sync_prune', 24 * 60 * 60)
+def schedule_prune():
+    """Enqueue a prune unless one is already waiting, so one worker runs it"""
+    from app.models.jobs import OutboxJob
+
+    waiting = db.session.query(OutboxJob.id).filter_by(job_type='sync_prune', status='pending').first()
+    if waiting is None:
+        enqueue_job('sync_prune', {})
@@ -1,9 +1,89 @@
 import requests
 import base64
 import json
+import threading
+import time
 from datetime import datetime
 import os
 from flask import current_app
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# (connect, read) timeouts for Daraja calls, in seconds
+MPESA_TIMEOUT = (5, 30)
+
+# Refresh the OAuth token this many seconds before Daraja says it expires
+TOKEN_REFRESH_MARGIN = 60
+
+# Tokens are cached per (base_url, consumer_key) for the whole process, so
+# every worker thread shares one token instead of fetching one per STK push.
+_token_cache = {}
+_token_lock = threading.Lock()
+
+_http_session = None
+_http_session_lock = threading.Lock()
+
+mpesa_metrics = {
+    'token_hits': 0,
+    'token_misses': 0,
+    'token_errors': 0,
+    'requests': 0,
+    'request_errors': 0,
+    'latency_total_ms': 0.0,
+    'latency_max_ms': 0.0
+}
+
+def get_http_session():
+    """Process-wide keep-alive session for Daraja calls.
+
+    Connection failures are retried for every method, but only GETs are
+    retried after the request reached Safaricom, so an STK push is never
+    sent twice.
+    """
+    global _http_session
+    if _http_session is None:
+        with _http_session_lock:
+            if _http_session is None:
+                retry = Retry(
+                    total=3,
+                    connect=3,
+                    read=1,
+                    status=2,
+                    backoff_factor=0.5,
+                    status_forcelist=(500, 502, 503, 504),
+                    allowed_methods=frozenset(['GET'])
+                )
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=20, max_retries=retry)
+                session = requests.Session()
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                _http_session = session
+    return _http_session
+
+def _timed_request(method, url, **kwargs):
+    """Send a Daraja request on the pooled session and record its latency"""
+    kwargs.setdefault('timeout', MPESA_TIMEOUT)
+    started = time.perf_counter()
+    try:
+        return get_http_session().request(method, url, **kwargs)
+    except Exception:
+        mpesa_metrics['request_errors'] += 1
+        raise
+    finally:
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        mpesa_metrics['requests'] += 1
+        mpesa_metrics['latency_total_ms'] += elapsed_ms
+        mpesa_metrics['latency_max_ms'] = max(mpesa_metrics['latency_max_ms'], elapsed_ms)
+
+def get_mpesa_metrics():
+    """Token cache and Daraja latency figures for monitoring"""
+    lookups = mpesa_metrics['token_hits'] + mpesa_metrics['token_misses']
+    stats = dict(mpesa_metrics)
+    stats['token_hit_rate'] = round(mpesa_metrics['token_hits'] / lookups, 3) if lookups else 0.0
+    stats['latency_avg_ms'] = round(mpesa_metrics['latency_total_ms'] / mpesa_metrics['requests'], 1) if mpesa_metrics['requests'] else 0.0
+    stats['latency_total_ms'] = round(stats['latency_total_ms'], 1)
+    stats['latency_max_ms'] = round(stats['latency_max_ms'], 1)
+    return stats
 
 class MpesaAPI:
     def __init__(self):
@@ -35,8 +115,41 @@ class MpesaAPI:
         else:
             self.base_url = 'https://api.safaricom.co.ke'
     
+    @property
+    def _token_key(self):
+        return (self.base_url, self.consumer_key)
+
     def get_access_token(self):
-        """Get OAuth access token from M-Pesa"""
+        """Get OAuth access token from M-Pesa, reusing the cached one while it is fresh"""
+        cached = _token_cache.get(self._token_key)
+        if cached and cached['refresh_at'] > time.time():
+            mpesa_metrics['token_hits'] += 1
+            return cached['token']
+
+        # Single flight: one thread refreshes while the others wait and reuse it
+        with _token_lock:
+            cached = _token_cache.get(self._token_key)
+            if cached and cached['refresh_at'] > time.time():
+                mpesa_metrics['token_hits'] += 1
+                return cached['token']
+
+            mpesa_metrics['token_misses'] += 1
+            token, expires_in = self._fetch_access_token()
+            now = time.time()
+            if token:
+                _token_cache[self._token_key] = {
+                    'token': token,
+                    'refresh_at': now + max(expires_in - TOKEN_REFRESH_MARGIN, 0),
+                    'expires_at': now + expires_in
+                }
+                return token
+            if cached and cached['expires_at'] > now:
+                # Daraja is struggling; keep using the old token until it really expires
+                return cached['token']
+            return None
+
+    def _fetch_access_token(self):
+        """Request a new OAuth token. Returns (token, expires_in seconds)."""
         url = f"{self.base_url}/oauth/v1/generate?grant_type=client_credentials"
         
         # Create base64 encoded string
@@ -49,12 +162,34 @@ class MpesaAPI:
         }
         
         try:
-            response = requests.get(url, headers=headers)
+            response = _timed_request('GET', url, headers=headers)
             response.raise_for_status()
-            return response.json().get('access_token')
+            data = response.json()
+            return data.get('access_token'), int(data.get('expires_in', 3599))
         except Exception as e:
+            mpesa_metrics['token_errors'] += 1
             current_app.logger.error(f"M-Pesa access token error: {e}")
-            return None
+            return None, 0
+
+    def invalidate_access_token(self):
+        """Drop the cached token, e.g. after Daraja rejects it"""
+        _token_cache.pop(self._token_key, None)
+
+    def _post(self, url, payload):
+        """POST to Daraja with a bearer token, retrying once if the token was revoked"""
+        for attempt in range(2):
+            access_token = self.get_access_token()
+            if not access_token:
+                return None
+            headers = {
+                'Authorization': f'Bearer {access_token}',
+                'Content-Type': 'application/json'
+            }
+            response = _timed_request('POST', url, headers=headers, json=payload)
+            if response.status_code == 401 and attempt == 0:
+                self.invalidate_access_token()
+                continue
+            return response
     
     def generate_password(self):
         """Generate password for STK push"""
@@ -65,10 +200,6 @@ class MpesaAPI:
     
     def stk_push(self, phone_number, amount, account_reference, transaction_desc):
         """Initiate STK push payment"""
-        access_token = self.get_access_token()
-        if not access_token:
-            return {'success': False, 'message': 'Failed to get access token'}
-        
         password, timestamp = self.generate_password()
         
         # Format phone number (remove + and ensure it starts with 254)
@@ -81,11 +212,6 @@ class MpesaAPI:
         
         url = f"{self.base_url}/mpesa/stkpush/v1/processrequest"
         
-        headers = {
-            'Authorization': f'Bearer {access_token}',
-            'Content-Type': 'application/json'
-        }
-        
         payload = {
             'BusinessShortCode': self.business_short_code,
             'Password': password,
@@ -101,7 +227,9 @@ class MpesaAPI:
         }
         
         try:
-            response = requests.post(url, headers=headers, json=payload)
+            response = self._post(url, payload)
+            if response is None:
+                return {'success': False, 'message': 'Failed to get access token'}
             response.raise_for_status()
             result = response.json()
             
@@ -122,10 +250,6 @@ class MpesaAPI:
     
     def stk_push_subscription(self, phone_number, amount, account_reference, transaction_desc):
         """Initiate STK push payment for subscription (to till 5625121)"""
-        access_token = self.get_access_token()
-        if not access_token:
-            return {'success': False, 'message': 'Failed to get access token'}
-        
         # For subscription payments, we use CustomerBuyGoodsOnline to till number
         password, timestamp = self.generate_password()
         
@@ -139,11 +263,6 @@ class MpesaAPI:
         
         url = f"{self.base_url}/mpesa/stkpush/v1/processrequest"
         
-        headers = {
-            'Authorization': f'Bearer {access_token}',
-            'Content-Type': 'application/json'
-        }
-        
         payload = {
             'BusinessShortCode': self.business_short_code,
             'Password': password,
@@ -159,7 +278,9 @@ class MpesaAPI:
         }
         
         try:
-            response = requests.post(url, headers=headers, json=payload)
+            response = self._post(url, payload)
+            if response is None:
+                return {'success': False, 'message': 'Failed to get access token'}
             response.raise_for_status()
             result = response.json()
             
@@ -180,19 +301,10 @@ class MpesaAPI:
     
     def query_transaction_status(self, checkout_request_id):
         """Query the status of an STK push transaction"""
-        access_token = self.get_access_token()
-        if not access_token:
-            return {'success': False, 'message': 'Failed to get access token'}
-        
         password, timestamp = self.generate_password()
         
         url = f"{self.base_url}/mpesa/stkpushquery/v1/query"
         
-        headers = {
-            'Authorization': f'Bearer {access_token}',
-            'Content-Type': 'application/json'
-        }
-        
         payload = {
             'BusinessShortCode': self.business_short_code,
             'Password': password,
@@ -201,7 +313,9 @@ class MpesaAPI:
         }
         
         try:
-            response = requests.post(url, headers=headers, json=payload)
+            response = self._post(url, payload)
+            if response is None:
+                return {'success': False, 'message': 'Failed to get access token'}
             response.raise_for_status()
             return response.json()
         except Exception as e:
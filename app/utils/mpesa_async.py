@@ -0,0 +1,78 @@
+"""
+CHAMAlink Asynchronous STK Push
+===============================
+Moves the Daraja STK push out of the web request. initiate_payment writes
+the pending Transaction, a queued MpesaTransaction and an outbox job in one
+commit and returns at once; a job worker sends the push and records the
+CheckoutRequestID. Status polls are answered from the database or from a
+short-lived cache of Daraja query results instead of querying Daraja on
+every poll.
+"""
+
+from app import db
+from app.utils.jobs import job_handler, enqueue_job
+from app.utils.mpesa import get_mpesa_api
+from app.utils.simple_performance import SimpleCache
+
+# Minimum seconds between Daraja status queries for the same payment
+STATUS_QUERY_INTERVAL = 15
+
+_status_query_cache = SimpleCache(STATUS_QUERY_INTERVAL)
+
+def queue_stk_push(transaction, phone_number, account_reference, transaction_desc):
+    """Record a queued M-Pesa payment for a pending transaction and schedule the push.
+
+    Runs in the caller's transaction; the push is sent after the caller commits.
+    """
+    from app.models.chama import MpesaTransaction
+
+    mpesa_transaction = MpesaTransaction(
+        amount=transaction.amount,
+        phone_number=phone_number,
+        account_reference=account_reference,
+        transaction_desc=transaction_desc,
+        status='queued',
+        user_id=transaction.user_id,
+        chama_id=transaction.chama_id,
+        transaction_id=transaction.id
+    )
+    db.session.add(mpesa_transaction)
+    db.session.flush()
+
+    # Never retried: a failed push is reported to the member, not resent
+    enqueue_job('mpesa_stk_push', {'mpesa_transaction_id': mpesa_transaction.id}, max_attempts=1)
+    return mpesa_transaction
+
+@job_handler('mpesa_stk_push')
+def process_stk_push(payload):
+    """Send a queued STK push and record Daraja's answer"""
+    from app.models.chama import MpesaTransaction
+
+    mpesa_transaction = db.session.get(MpesaTransaction, payload['mpesa_transaction_id'])
+    if not mpesa_transaction or mpesa_transaction.status != 'queued':
+        return
+
+    mpesa_result = get_mpesa_api().stk_push(
+        phone_number=mpesa_transaction.phone_number,
+        amount=mpesa_transaction.amount,
+        account_reference=mpesa_transaction.account_reference,
+        transaction_desc=mpesa_transaction.transaction_desc
+    )
+
+    if mpesa_result.get('success'):
+        mpesa_transaction.checkout_request_id = mpesa_result['checkout_request_id']
+        mpesa_transaction.merchant_request_id = mpesa_result['merchant_request_id']
+        mpesa_transaction.status = 'pending'
+    else:
+        mpesa_transaction.status = 'failed'
+        mpesa_transaction.result_desc = mpesa_result.get('message', 'Payment initiation failed')
+        if mpesa_transaction.transaction:
+            mpesa_transaction.transaction.status = 'failed'
+
+def query_payment_status(checkout_request_id):
+    """Daraja status for a checkout, reusing a recent answer when there is one"""
+    status_result = _status_query_cache.get(checkout_request_id)
+    if status_result is None:
+        status_result = get_mpesa_api().query_transaction_status(checkout_request_id)
+        _status_query_cache.set(checkout_request_id, status_result)
+    return status_result
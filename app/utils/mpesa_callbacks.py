@@ -0,0 +1,206 @@
+"""
+CHAMAlink M-Pesa Callback Inbox
+===============================
+STK push callbacks are appended to the mpesa_callbacks inbox and
+acknowledged straight away. A job worker then applies them in
+micro-batches: one query loads the affected payments, and the payment and
+transaction statuses, ledger entries and balances for the whole batch are
+written in a single transaction.
+
+The inbox is unique on CheckoutRequestID, and a payment is settled by a
+conditional UPDATE that only matches while it is still queued or pending.
+Ledger entries are posted only by the writer whose UPDATE matched, so
+Safaricom's retries and a status poll racing a batch can never credit a
+chama twice.
+
+A callback can arrive before the STK push job has committed the payment's
+CheckoutRequestID. It is then left 'unmatched', and the sweep hands it back
+to the batches until CALLBACK_MATCH_WINDOW has passed since it was
+received; only then is it marked 'orphaned'.
+"""
+
+from datetime import datetime, timedelta
+from sqlalchemy import update, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import selectinload
+from sqlalchemy.orm.attributes import set_committed_value
+from app import db
+from app.utils.jobs import job_handler, periodic_task, enqueue_job
+from app.utils.ledger import post_entries
+
+# Callbacks applied per batch transaction
+CALLBACK_BATCH_SIZE = 500
+
+# Seconds between checks for callbacks that no batch job picked up
+CALLBACK_SWEEP_INTERVAL = 30
+
+# Seconds an unmatched callback keeps being retried before it is orphaned
+CALLBACK_MATCH_WINDOW = 600
+
+def _stk_callback(callback_data):
+    return (callback_data or {}).get('Body', {}).get('stkCallback', {})
+
+def record_callback(callback_data):
+    """Append a raw callback to the inbox and make sure a batch will run.
+
+    Returns False when the CheckoutRequestID was already received. Caller commits.
+    """
+    from app.models.mpesa import MpesaCallback
+
+    stk_callback = _stk_callback(callback_data)
+    checkout_request_id = stk_callback.get('CheckoutRequestID')
+    if not checkout_request_id:
+        raise ValueError('Callback has no CheckoutRequestID')
+
+    try:
+        with db.session.begin_nested():
+            db.session.add(MpesaCallback(
+                checkout_request_id=checkout_request_id,
+                result_code=str(stk_callback.get('ResultCode')),
+                result_desc=stk_callback.get('ResultDesc'),
+                payload=callback_data
+            ))
+    except IntegrityError:
+        return False
+
+    schedule_callback_batch()
+    return True
+
+def schedule_callback_batch():
+    """Enqueue a batch job unless one is already waiting to run"""
+    from app.models.jobs import OutboxJob
+
+    waiting = db.session.query(OutboxJob.id).filter_by(
+        job_type='mpesa_callback_batch', status='pending'
+    ).first()
+    if waiting is None:
+        enqueue_job('mpesa_callback_batch', {})
+
+def settle_payment(payment, status, **values):
+    """Move a payment out of queued/pending, at most once across all writers.
+
+    Returns True when this call settled it; the caller then updates the
+    transaction and posts the ledger entries. Returns False (and expires the
+    payment so it reads the winner's values) when someone else got there first.
+    """
+    from app.models.chama import MpesaTransaction
+
+    settled = db.session.execute(
+        update(MpesaTransaction)
+        .where(MpesaTransaction.id == payment.id, MpesaTransaction.status.in_(('queued', 'pending')))
+        .values(status=status, **values),
+        execution_options={'synchronize_session': False}
+    ).rowcount == 1
+    if not settled:
+        db.session.expire(payment)
+        return False
+    for key, value in dict(values, status=status).items():
+        set_committed_value(payment, key, value)
+    return True
+
+def apply_callback_batch(limit=CALLBACK_BATCH_SIZE):
+    """Apply up to ``limit`` received callbacks. Flushes; the caller commits.
+
+    Returns the number of callbacks taken from the inbox.
+    """
+    from app.models.chama import MpesaTransaction
+    from app.models.mpesa import MpesaCallback
+
+    # Claim the oldest callbacks; a concurrent batch skips rows already taken
+    now = datetime.utcnow()
+    oldest = select(MpesaCallback.id).where(
+        MpesaCallback.status == 'received'
+    ).order_by(MpesaCallback.id).limit(limit)
+    claimed = db.session.execute(
+        update(MpesaCallback)
+        .where(MpesaCallback.id.in_(oldest), MpesaCallback.status == 'received')
+        .values(status='processing', processed_at=now)
+        .returning(MpesaCallback.id, MpesaCallback.checkout_request_id, MpesaCallback.payload,
+                   MpesaCallback.received_at),
+        execution_options={'synchronize_session': False}
+    ).all()
+    if not claimed:
+        return 0
+
+    payments = {
+        payment.checkout_request_id: payment
+        for payment in MpesaTransaction.query.options(
+            selectinload(MpesaTransaction.transaction)
+        ).filter(
+            MpesaTransaction.checkout_request_id.in_([row.checkout_request_id for row in claimed])
+        )
+    }
+
+    outcomes = {'applied': [], 'duplicate': [], 'unmatched': [], 'orphaned': []}
+    entries = []
+    match_deadline = now - timedelta(seconds=CALLBACK_MATCH_WINDOW)
+    for callback_id, checkout_request_id, payload, received_at in claimed:
+        payment = payments.get(checkout_request_id)
+        if payment is None:
+            # The push job may not have committed the CheckoutRequestID yet
+            waiting = received_at is not None and received_at > match_deadline
+            outcomes['unmatched' if waiting else 'orphaned'].append(callback_id)
+            continue
+        stk_callback = _stk_callback(payload)
+        result_code = stk_callback.get('ResultCode')
+        values = {'result_code': str(result_code), 'result_desc': stk_callback.get('ResultDesc')}
+        if result_code == 0:
+            for item in stk_callback.get('CallbackMetadata', {}).get('Item', []):
+                if item.get('Name') == 'MpesaReceiptNumber':
+                    values['mpesa_receipt_number'] = item.get('Value')
+                elif item.get('Name') == 'TransactionDate':
+                    values['transaction_date'] = datetime.now()
+
+        if not settle_payment(payment, 'completed' if result_code == 0 else 'failed', **values):
+            # Already settled by an earlier callback or a status poll
+            outcomes['duplicate'].append(callback_id)
+            continue
+
+        transaction = payment.transaction
+        if result_code == 0:
+            if transaction:
+                transaction.status = 'completed'
+            if payment.chama_id:
+                entries.append({
+                    'chama_id': payment.chama_id,
+                    'entry_type': 'contribution',
+                    'amount': payment.amount,
+                    'user_id': payment.user_id,
+                    'transaction_id': transaction.id if transaction else None,
+                    'description': f'M-Pesa {payment.mpesa_receipt_number}'
+                })
+        elif transaction:
+            transaction.status = 'failed'
+        outcomes['applied'].append(callback_id)
+
+    if entries:
+        post_entries(entries)
+
+    for status, callback_ids in outcomes.items():
+        if callback_ids:
+            db.session.execute(
+                update(MpesaCallback).where(MpesaCallback.id.in_(callback_ids)).values(status=status),
+                execution_options={'synchronize_session': False}
+            )
+    db.session.flush()
+
+    if len(claimed) == limit:
+        # More are probably waiting; keep draining in fresh transactions
+        enqueue_job('mpesa_callback_batch', {})
+    return len(claimed)
+
+@job_handler('mpesa_callback_batch')
+def process_callback_batch(payload):
+    apply_callback_batch(payload.get('limit', CALLBACK_BATCH_SIZE))
+
+@periodic_task('mpesa_callback_sweep', CALLBACK_SWEEP_INTERVAL)
+def sweep_callbacks():
+    """Retry unmatched callbacks and schedule a batch for any that slipped past the running job"""
+    from app.models.mpesa import MpesaCallback
+
+    db.session.execute(
+        update(MpesaCallback).where(MpesaCallback.status == 'unmatched').values(status='received'),
+        execution_options={'synchronize_session': False}
+    )
+    if db.session.query(MpesaCallback.id).filter_by(status='received').first():
+        schedule_callback_batch()
@@ -0,0 +1,286 @@
+"""
+CHAMAlink Notification Counters
+===============================
+Per-user unread notification counts. The navbar polls the unread count on
+every page, so instead of a COUNT over notifications each poll reads one
+cache key; on a miss it reads the user's notification_counters row.
+
+Counters are kept in the writing transaction:
+    ORM inserts, deletes and is_read changes on Notification -> +/- per user
+    is_read set on an expired instance (old value unknown)    -> recount in
+                                                                 the same flush
+    UPDATE/DELETE statements on notifications naming user_id  -> recount of
+                                                                 those users
+    The fan-out's INSERT ... SELECT                           -> add_unread()
+A user's counter row is seeded with a COUNT on their first write, and
+cached counts of the users a transaction touched are dropped once it
+commits or rolls back.
+
+Writes the hooks cannot attribute (raw SQL, statements that do not name
+user_id) are repaired by the reconciliation job, which compares every
+counter with the notifications table every RECONCILE_INTERVAL seconds.
+
+Backends (NOTIFICATION_COUNTER_BACKEND):
+    memory - per-process cache with LRU eviction (default, single worker)
+    redis  - shared by every gunicorn worker
+"""
+
+import logging
+import os
+from collections import defaultdict
+from datetime import datetime
+from sqlalchemy import event, func, inspect, literal, select
+from sqlalchemy.orm import Session
+from app import db
+from app.utils.cache_store import get_store
+from app.utils.jobs import job_handler, periodic_task, enqueue_job
+
+logger = logging.getLogger(__name__)
+
+# Seconds a cached count lives; commits drop affected entries sooner
+UNREAD_CACHE_TTL = int(os.getenv('UNREAD_COUNT_CACHE_TTL', 300))
+
+# Seconds between scheduled reconciliation runs
+RECONCILE_INTERVAL = 60 * 60
+
+get_counter_cache = get_store('Notification counters', 'NOTIFICATION_COUNTER_BACKEND', 'chamalink:unread:')
+
+def _unread_count_query(user_id):
+    from app.models.notification import Notification
+
+    return select(func.count(Notification.id)).where(
+        Notification.user_id == user_id, Notification.is_read == False
+    ).scalar_subquery()
+
+def get_unread_count(user_id):
+    """Unread notifications of a user: a cache hit, else the counter row, else a COUNT"""
+    from app.models.notification import NotificationCounter
+
+    cache = get_counter_cache()
+    try:
+        cached = cache.get(user_id)
+    except Exception as e:
+        logger.warning(f"Unread count cache read failed: {e}")
+        cached = None
+    if cached is not None:
+        return cached
+
+    count = db.session.query(NotificationCounter.unread).filter_by(user_id=user_id).scalar()
+    if count is None:
+        count = db.session.execute(select(_unread_count_query(user_id))).scalar()
+    count = max(count, 0)
+    try:
+        cache.set(user_id, count, UNREAD_CACHE_TTL)
+    except Exception as e:
+        logger.warning(f"Unread count cache write failed: {e}")
+    return count
+
+# --- Maintenance -----------------------------------------------------------
+
+def _touched(session):
+    return session.info.setdefault('unread_counter_users', set())
+
+def _insert_ignore(connection, table):
+    """INSERT that skips rows whose key already exists, where the dialect supports it"""
+    if connection.dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif connection.dialect.name == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        return table.insert()
+    return insert(table).on_conflict_do_nothing(index_elements=['user_id'])
+
+def _apply_deltas(session, deltas):
+    """Add per-user deltas to the counters, seeding missing rows with a COUNT"""
+    from app.models.notification import NotificationCounter
+
+    counters = NotificationCounter.__table__
+    connection = session.connection()
+    now = datetime.utcnow()
+    for user_id, delta in deltas.items():
+        if not delta:
+            continue
+        updated = connection.execute(counters.update().where(counters.c.user_id == user_id).values(
+            unread=counters.c.unread + delta, updated_at=now
+        )).rowcount
+        if not updated:
+            # The COUNT already includes this transaction's flushed rows
+            count = connection.execute(select(_unread_count_query(user_id))).scalar()
+            seeded = connection.execute(_insert_ignore(connection, counters).values(
+                user_id=user_id, unread=count, updated_at=now
+            )).rowcount
+            if not seeded:
+                # Another transaction seeded it first
+                connection.execute(counters.update().where(counters.c.user_id == user_id).values(
+                    unread=counters.c.unread + delta, updated_at=now
+                ))
+    _touched(session).update(deltas)
+
+def _recount(session, user_ids):
+    """Set existing counters of ``user_ids`` from the notifications table"""
+    from app.models.notification import Notification, NotificationCounter
+
+    counters = NotificationCounter.__table__
+    actual = select(func.count(Notification.id)).where(
+        Notification.user_id == counters.c.user_id, Notification.is_read == False
+    ).scalar_subquery()
+    session.connection().execute(counters.update().where(counters.c.user_id.in_(list(user_ids))).values(
+        unread=actual, updated_at=datetime.utcnow()
+    ))
+    _touched(session).update(user_ids)
+
+def add_unread(user_ids_select, session=None):
+    """Count one new unread notification for each user id in ``user_ids_select``.
+
+    For bulk INSERT ... SELECT writers, which the session hooks never see.
+    Call it after the insert, in the same transaction.
+    """
+    from app.models.notification import Notification, NotificationCounter
+
+    session = session or db.session
+    counters = NotificationCounter.__table__
+    user_ids = [row[0] for row in session.execute(user_ids_select)]
+    if not user_ids:
+        return
+    now = datetime.utcnow()
+    connection = session.connection()
+    existing = set()
+    for start in range(0, len(user_ids), 500):
+        chunk = user_ids[start:start + 500]
+        existing.update(row[0] for row in connection.execute(
+            select(counters.c.user_id).where(counters.c.user_id.in_(chunk))))
+        connection.execute(counters.update().where(counters.c.user_id.in_(chunk)).values(
+            unread=counters.c.unread + 1, updated_at=now
+        ))
+    missing = [user_id for user_id in user_ids if user_id not in existing]
+    for start in range(0, len(missing), 500):
+        chunk = missing[start:start + 500]
+        connection.execute(counters.insert().from_select(
+            ['user_id', 'unread', 'updated_at'],
+            select(Notification.user_id, func.count(Notification.id), literal(now))
+            .where(Notification.user_id.in_(chunk), Notification.is_read == False)
+            .group_by(Notification.user_id)
+        ))
+    _touched(session).update(user_ids)
+
+def _is_unread(value):
+    return value is False
+
+@event.listens_for(Session, 'after_flush')
+def _count_flushed_notifications(session, flush_context):
+    from app.models.notification import Notification
+
+    deltas = defaultdict(int)
+    recount = set()
+    for obj in session.new:
+        if isinstance(obj, Notification) and _is_unread(obj.is_read):
+            deltas[obj.user_id] += 1
+    for obj in session.deleted:
+        if isinstance(obj, Notification) and _is_unread(obj.is_read):
+            deltas[obj.user_id] -= 1
+    for obj in session.dirty:
+        if not isinstance(obj, Notification):
+            continue
+        history = inspect(obj).attrs.is_read.history
+        if not history.has_changes():
+            continue
+        if not history.deleted:
+            # Previous value was never loaded (expired instance): recount below
+            recount.add(obj.user_id)
+            continue
+        deltas[obj.user_id] += int(_is_unread(obj.is_read)) - int(_is_unread(history.deleted[0]))
+    if deltas:
+        _apply_deltas(session, deltas)
+    if recount:
+        # Now, not at commit: this flush may be the commit's own, which runs
+        # after before_commit. The rows are written, so the COUNT is exact.
+        _recount(session, recount)
+
+@event.listens_for(Session, 'do_orm_execute')
+def _collect_bulk_notification_writes(orm_execute_state):
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    table = getattr(orm_execute_state.statement, 'table', None)
+    if getattr(table, 'name', None) != 'notifications':
+        return
+
+    from app.utils.fragment_cache import dml_values
+
+    user_ids = {value for value in dml_values(orm_execute_state.statement, orm_execute_state.parameters)
+                .get('user_id', ()) if value is not None}
+    if user_ids:
+        # Recounted just before commit, once the statement has run
+        orm_execute_state.session.info.setdefault('unread_counter_recount', set()).update(user_ids)
+    else:
+        logger.debug("Unattributed notifications write; left to counter reconciliation")
+
+@event.listens_for(Session, 'before_commit')
+def _recount_bulk_writes(session):
+    user_ids = session.info.pop('unread_counter_recount', None)
+    if user_ids:
+        _recount(session, user_ids)
+
+def _drop_cached_counts(session):
+    session.info.pop('unread_counter_recount', None)
+    user_ids = session.info.pop('unread_counter_users', None)
+    if user_ids:
+        try:
+            get_counter_cache().delete(user_ids)
+        except Exception as e:
+            logger.warning(f"Unread count cache invalidation failed: {e}")
+
+# Rolled back counts may have been cached by a read inside the transaction
+event.listen(Session, 'after_commit', _drop_cached_counts)
+event.listen(Session, 'after_rollback', _drop_cached_counts)
+
+# --- Reconciliation --------------------------------------------------------
+
+def reconcile_unread_counters():
+    """Repair counters that drifted from the notifications table.
+
+    Seeds counters for users with unread notifications but no row, so
+    their next poll is a single lookup too. Caller commits.
+    Returns (repaired, seeded).
+    """
+    from app.models.notification import Notification, NotificationCounter
+
+    counters = NotificationCounter.__table__
+    actual = select(Notification.user_id, func.count(Notification.id).label('unread')).where(
+        Notification.is_read == False
+    ).group_by(Notification.user_id).subquery()
+    now = datetime.utcnow()
+
+    drifted = db.session.execute(
+        select(counters.c.user_id, func.coalesce(actual.c.unread, 0))
+        .select_from(counters.outerjoin(actual, actual.c.user_id == counters.c.user_id))
+        .where(counters.c.unread != func.coalesce(actual.c.unread, 0))
+    ).all()
+    if drifted:
+        db.session.execute(counters.update().where(counters.c.user_id == db.bindparam('counter_user_id')).values(
+            unread=db.bindparam('count'), updated_at=now
+        ), [{'counter_user_id': user_id, 'count': count} for user_id, count in drifted])
+
+    seeded = db.session.execute(counters.insert().from_select(
+        ['user_id', 'unread', 'updated_at'],
+        select(actual.c.user_id, actual.c.unread, literal(now)).where(
+            actual.c.user_id.not_in(select(counters.c.user_id)))
+    )).rowcount
+
+    _touched(db.session).update(user_id for user_id, _ in drifted)
+    if drifted:
+        logger.warning(f"Repaired {len(drifted)} drifted unread notification counters")
+    return len(drifted), seeded
+
+@job_handler('notification_counter_reconcile')
+def process_reconcile(payload):
+    reconcile_unread_counters()
+
+@periodic_task('notification_counter_reconcile', RECONCILE_INTERVAL)
+def schedule_reconcile():
+    """Enqueue a reconciliation unless one is already waiting, so one worker runs it"""
+    from app.models.jobs import OutboxJob
+
+    waiting = db.session.query(OutboxJob.id).filter_by(job_type='notification_counter_reconcile',
+                                                       status='pending').first()
+    if waiting is None:
+        enqueue_job('notification_counter_reconcile', {})
@@ -0,0 +1,234 @@
+"""
+CHAMAlink Notification Fan-out
+==============================
+Platform notices and system alerts reach every chama creator or active
+user without holding up the request that sends them.
+
+start_broadcast() records a NotificationBroadcast and queues a fan-out
+job. Each fan-out job inserts the notifications for the next
+FANOUT_CHUNK_SIZE recipients (ordered by user id) with one INSERT ...
+SELECT, queues email/SMS delivery for that id range and queues the next
+chunk, all in the job's commit. Delivery jobs render a batch of messages
+and queue them in the email or SMS outbox, whose dispatchers send them
+under each provider's rate limit and retry failures. Every message carries
+a dedupe key naming its notification, recipient and channel, so a delivery
+job that runs twice queues nothing twice.
+
+Progress is read from the broadcast row and the outboxes (see
+NotificationBroadcast.to_dict and delivery_counts()).
+"""
+
+import logging
+import os
+from datetime import datetime
+from sqlalchemy import func, literal, select, update
+from app import db
+from app.utils.jobs import job_handler, enqueue_job
+
+logger = logging.getLogger(__name__)
+
+# Recipients whose notifications are inserted per fan-out job
+FANOUT_CHUNK_SIZE = 1000
+
+# Recipients whose messages are queued per delivery job
+FANOUT_DELIVERY_BATCH = int(os.getenv('FANOUT_DELIVERY_BATCH', 500))
+
+AUDIENCES = ('chama_creators', 'active_users')
+CHANNELS = ('email', 'sms')
+
+def _audience_filter(audience):
+    from app.models.user import User
+    from app.models.chama import Chama
+
+    if audience == 'chama_creators':
+        # IN, not a correlated EXISTS: chamas.creator_id has no index to probe
+        return User.id.in_(select(Chama.creator_id))
+    if audience == 'active_users':
+        return User.is_active == True
+    raise ValueError(f"Unknown audience '{audience}'")
+
+def audience_size(audience):
+    """Number of users a broadcast to ``audience`` would reach now"""
+    from app.models.user import User
+
+    return db.session.query(func.count(User.id)).filter(_audience_filter(audience)).scalar()
+
+def start_broadcast(kind, audience, title, message, sender=None, priority='info', channels=(),
+                    notification_type='system'):
+    """Record a broadcast and queue its fan-out. Runs in the caller's transaction."""
+    from app.models.notification import NotificationBroadcast
+
+    _audience_filter(audience)
+    unknown = set(channels) - set(CHANNELS)
+    if unknown:
+        raise ValueError(f"Unknown channels: {', '.join(sorted(unknown))}")
+
+    broadcast = NotificationBroadcast(
+        kind=kind,
+        audience=audience,
+        title=title,
+        message=message,
+        type=notification_type,
+        priority=priority,
+        channels=list(channels),
+        created_by=sender.id if sender else None
+    )
+    db.session.add(broadcast)
+    db.session.flush()
+    enqueue_job('notification_fanout', {'broadcast_id': broadcast.id})
+    return broadcast
+
+def notification_title(broadcast):
+    """Title of the in-app notification each recipient gets"""
+    if broadcast.kind == 'platform_notice':
+        return f"📢 Platform Notice: {broadcast.title}"
+    if broadcast.priority == 'high':
+        return f"{broadcast.title} ({broadcast.priority.upper()} Priority)"
+    return broadcast.title
+
+def _broadcast_notifications(broadcast, after, last):
+    from app.models.notification import Notification
+
+    return (Notification.broadcast_id == broadcast.id, Notification.user_id > after, Notification.user_id <= last)
+
+@job_handler('notification_fanout')
+def process_fanout(payload):
+    """Insert the next chunk of notifications and queue its deliveries"""
+    from app.models.user import User
+    from app.models.notification import Notification, NotificationBroadcast
+    from app.utils.mobile_sync import log_bulk_changes
+    from app.utils.notification_counters import add_unread
+
+    broadcast = db.session.get(NotificationBroadcast, payload['broadcast_id'])
+    if broadcast is None or broadcast.status not in ('queued', 'inserting'):
+        return
+
+    audience = _audience_filter(broadcast.audience)
+    after = broadcast.last_user_id
+    chunk = select(User.id).where(audience, User.id > after).order_by(User.id).limit(FANOUT_CHUNK_SIZE).subquery()
+    count, last = db.session.execute(select(func.count(), func.max(chunk.c.id))).one()
+    if not count:
+        broadcast.status = 'delivering' if broadcast.channels else 'completed'
+        broadcast.inserted_at = datetime.utcnow()
+        return
+
+    db.session.execute(Notification.__table__.insert().from_select(
+        ['user_id', 'title', 'message', 'type', 'is_read', 'created_date', 'broadcast_id'],
+        select(User.id, literal(notification_title(broadcast)), literal(broadcast.message),
+               literal(broadcast.type), literal(False), literal(datetime.utcnow()), literal(broadcast.id))
+        .where(audience, User.id > after, User.id <= last)
+    ))
+    # Bulk inserts bypass the session hooks, so log them for mobile sync and
+    # count them as unread here
+    log_bulk_changes('notification', select(Notification.id, Notification.chama_id, Notification.user_id)
+                     .where(*_broadcast_notifications(broadcast, after, last)))
+    add_unread(select(User.id).where(audience, User.id > after, User.id <= last))
+
+    broadcast.status = 'inserting'
+    broadcast.last_user_id = last
+    broadcast.recipients += count
+    for channel in broadcast.channels or []:
+        enqueue_job('notification_delivery', {'broadcast_id': broadcast.id, 'channel': channel,
+                                              'after': after, 'last': last})
+    enqueue_job('notification_fanout', {'broadcast_id': broadcast.id})
+
+def delivery_key(broadcast, notification_id, user_id, channel):
+    """Outbox dedupe key of one recipient's message"""
+    return f"broadcast:{broadcast.id}:{notification_id}:{user_id}:{channel}"
+
+def _email_message(broadcast, user, key):
+    if broadcast.kind == 'platform_notice':
+        from flask import render_template
+        subject = f"📢 Important Notice from ChamaLink: {broadcast.title}"
+        html_content = render_template('emails/platform_notice.html', user=user, title=broadcast.title,
+                                       message=broadcast.message, priority=broadcast.priority)
+    else:
+        sender = broadcast.sender.full_name if broadcast.sender else 'System Administrator'
+        sent_at = broadcast.created_at or datetime.utcnow()
+        subject = "🚨 High Priority System Alert - CHAMAlink"
+        html_content = f"""
+    <h2>{broadcast.title}</h2>
+    <p><strong>Priority:</strong> {broadcast.priority.upper()}</p>
+    <p><strong>Message:</strong> {broadcast.message}</p>
+    <p><strong>Sent by:</strong> System Administrator ({sender})</p>
+    <p><strong>Time:</strong> {sent_at.strftime('%B %d, %Y at %I:%M %p')}</p>
+    <hr>
+    <p><small>This is an automated system notification from CHAMAlink.</small></p>
+    """
+    return {'recipient': user.email, 'subject': subject, 'html_content': html_content,
+            'user_id': user.id, 'broadcast_id': broadcast.id, 'dedupe_key': key}
+
+def _queue_messages(channel, broadcast, recipients):
+    """Queue one message per (notification id, user) in the channel's outbox.
+
+    Returns (queued, skipped): messages new to the outbox, and recipients
+    that cannot get one (no address, or a phone number another recipient
+    in the batch already gets). Messages already in the outbox are neither.
+    """
+    if channel == 'email':
+        from flask import current_app
+        from app.utils.email_outbox import queue_emails
+        # Jobs have no request; the template's external links need one
+        with current_app.test_request_context(base_url=os.getenv('BASE_URL', 'http://localhost:5000')):
+            messages = [_email_message(broadcast, user, delivery_key(broadcast, notification_id, user.id, channel))
+                        for notification_id, user in recipients if user.email]
+        return queue_emails(messages, category=broadcast.kind), len(recipients) - len(messages)
+
+    from app.utils.sms_outbox import queue_sms
+    from app.utils.sms_service import format_phone_number
+    reachable = {}
+    for notification_id, user in recipients:
+        if user.phone_number and user.phone_number.strip():
+            reachable.setdefault(format_phone_number(user.phone_number), (notification_id, user))
+    queued = queue_sms([user.phone_number for _, user in reachable.values()],
+                       f"ChamaLink: {broadcast.title}\n{broadcast.message}", category=broadcast.kind,
+                       user_ids={user.phone_number: user.id for _, user in reachable.values()},
+                       dedupe_keys={user.phone_number: delivery_key(broadcast, notification_id, user.id, channel)
+                                    for notification_id, user in reachable.values()},
+                       broadcast_id=broadcast.id)
+    return queued, len(recipients) - len(reachable)
+
+@job_handler('notification_delivery')
+def process_delivery(payload):
+    """Queue one batch of a broadcast's emails or SMS in the outbox"""
+    from app.models.user import User
+    from app.models.notification import Notification, NotificationBroadcast
+
+    broadcast = db.session.get(NotificationBroadcast, payload['broadcast_id'])
+    if broadcast is None:
+        return
+    channel, after, last = payload['channel'], payload['after'], payload['last']
+
+    recipients = db.session.query(Notification.id, User).join(User, Notification.user_id == User.id).filter(
+        *_broadcast_notifications(broadcast, after, last)
+    ).order_by(User.id).limit(FANOUT_DELIVERY_BATCH).all()
+    if not recipients:
+        return
+
+    queued, skipped = _queue_messages(channel, broadcast, recipients)
+    prefix = 'emails' if channel == 'email' else 'sms'
+    queued_column = getattr(NotificationBroadcast, f'{prefix}_queued')
+    skipped_column = getattr(NotificationBroadcast, f'{prefix}_skipped')
+    db.session.execute(
+        update(NotificationBroadcast).where(NotificationBroadcast.id == broadcast.id)
+        .values({queued_column: queued_column + queued, skipped_column: skipped_column + skipped}),
+        execution_options={'synchronize_session': False}
+    )
+
+    after = recipients[-1][1].id
+    if len(recipients) == FANOUT_DELIVERY_BATCH and after < last:
+        enqueue_job('notification_delivery', {'broadcast_id': broadcast.id, 'channel': channel,
+                                              'after': after, 'last': last})
+
+def delivery_counts(broadcast):
+    """Outbox messages of a broadcast by channel and status"""
+    from app.models.email import EmailMessage
+    from app.models.sms import SmsMessage
+
+    counts = {}
+    for channel in broadcast.channels or []:
+        model = EmailMessage if channel == 'email' else SmsMessage
+        counts[channel] = {status: count for status, count in db.session.query(
+            model.status, func.count(model.id)
+        ).filter(model.broadcast_id == broadcast.id).group_by(model.status)}
+    return counts
@@ -0,0 +1,201 @@
+"""
+CHAMAlink Outboxes
+==================
+Dispatcher machinery shared by the email and SMS outboxes. A message table
+has status (queued, sending, sent, failed), attempts, max_attempts,
+next_attempt_at, claim_token, last_error and dedupe_key columns; an Outbox
+built over it
+
+    - inserts queued rows in the caller's transaction and schedules one
+      dispatcher job per transaction, however many rows it queued
+    - skips rows whose dedupe_key is already in the table
+    - claims due rows with a token, so concurrent dispatchers never send
+      the same row twice
+    - spends the account's throughput a batch at a time through the rate
+      limiter backend, and hands over to a later job once throttled
+    - retries failures with exponential backoff until max_attempts
+
+Unlike other job handlers, a dispatcher commits as it goes: the claim
+before a batch is sent, and the batch's outcomes straight after. A failure
+later in the job then never puts messages already sent back in the queue,
+and no row lock is held while the provider is being called. While a row is
+'sending', next_attempt_at holds when its claim runs out; the periodic
+sweep hands rows whose dispatcher died back to the queue, or fails them
+once they have used all their attempts.
+
+What a batch is and how it is sent stays in the outbox module
+(email_outbox, sms_outbox), which passes its tunables in on every call so
+they can be changed at runtime.
+"""
+
+import importlib
+import uuid
+from datetime import datetime, timedelta
+from sqlalchemy import event, func, update
+from sqlalchemy.orm import Session
+from app import db
+from app.utils.jobs import enqueue_job
+from app.utils.rate_limiter import get_limiter_backend
+
+# Seconds a claimed message may stay 'sending' before the sweep takes it back
+CLAIM_TIMEOUT = 300
+
+_outboxes = []
+
+class Outbox:
+    """Queue, claim and retry for one message table, dispatched by ``job_type`` jobs"""
+
+    def __init__(self, job_type, model_path):
+        self.job_type = job_type
+        self.model_path = model_path
+        self._model = None
+        _outboxes.append(self)
+
+    @property
+    def model(self):
+        # Imported on first use: the models import app, which imports the outboxes
+        if self._model is None:
+            module, name = self.model_path.rsplit('.', 1)
+            self._model = getattr(importlib.import_module(module), name)
+        return self._model
+
+    @property
+    def _queued_flag(self):
+        return f'{self.job_type}_queued'
+
+    def known_keys(self, keys):
+        """The dedupe keys among ``keys`` already in the outbox"""
+        keys = [key for key in keys if key]
+        seen = set()
+        for start in range(0, len(keys), 500):
+            seen.update(row[0] for row in db.session.query(self.model.dedupe_key).filter(
+                self.model.dedupe_key.in_(keys[start:start + 500])))
+        return seen
+
+    def insert(self, rows):
+        """Insert queued rows and schedule a dispatcher. Runs in the caller's transaction."""
+        if not rows:
+            return 0
+        db.session.bulk_insert_mappings(self.model, rows)
+        # One dispatcher per transaction is enough however many messages it queued
+        if not db.session.info.get(self._queued_flag):
+            enqueue_job(self.job_type, {})
+            db.session.info[self._queued_flag] = True
+        return len(rows)
+
+    def claim(self, ids, now, claim_timeout):
+        """Mark due messages as sending and commit. Returns the rows this dispatcher got."""
+        model = self.model
+        token = uuid.uuid4().hex
+        # Rows another dispatcher took first no longer match status == 'queued'
+        db.session.execute(
+            update(model).where(model.id.in_(ids), model.status == 'queued')
+            .values(status='sending', claim_token=token, attempts=model.attempts + 1,
+                    next_attempt_at=now + timedelta(seconds=claim_timeout)),
+            execution_options={'synchronize_session': False}
+        )
+        db.session.commit()
+        return model.query.filter_by(claim_token=token).order_by(model.id).all()
+
+    def release_stalled(self, now):
+        """Hand messages whose claim ran out back to the queue, or fail them. Returns how many."""
+        model = self.model
+        stalled = (model.status == 'sending', model.next_attempt_at <= now)
+        failed = db.session.execute(
+            update(model).where(*stalled, model.attempts >= model.max_attempts)
+            .values(status='failed', claim_token=None,
+                    last_error='Dispatcher stopped responding on the last attempt'),
+            execution_options={'synchronize_session': False}
+        ).rowcount
+        requeued = db.session.execute(
+            update(model).where(*stalled)
+            .values(status='queued', claim_token=None, next_attempt_at=now,
+                    last_error='Dispatcher stopped responding'),
+            execution_options={'synchronize_session': False}
+        ).rowcount
+        return failed + requeued
+
+    @staticmethod
+    def retry_or_fail(message, error, now, retry_delay):
+        message.last_error = error
+        message.claim_token = None
+        if message.attempts >= message.max_attempts:
+            message.status = 'failed'
+        else:
+            message.status = 'queued'
+            message.next_attempt_at = now + timedelta(seconds=retry_delay * 2 ** (message.attempts - 1))
+
+    def due(self, now):
+        """Filter for messages waiting to be sent"""
+        return (self.model.status == 'queued', self.model.next_attempt_at <= now)
+
+    def dispatch(self, groups, due_ids, send, limiter_key, rate_limit, rate_window, batch_size, limit,
+                 claim_timeout=CLAIM_TIMEOUT):
+        """Send due messages batch by batch within the account's rate limit.
+
+        ``groups(now)`` lists the groups due messages are batched by,
+        ``due_ids(group, now, size)`` the ids of a group's next batch and
+        ``send(batch, now)`` sends claimed rows, records each outcome and
+        returns how many were sent. Each claim and each batch's outcomes
+        are committed. Returns {'sent': n, 'processed': n, 'throttled': bool}.
+        """
+        limiter = get_limiter_backend()
+        now = datetime.utcnow()
+        sent = processed = 0
+        throttled = False
+
+        while processed < limit and not throttled:
+            found = False
+            for group in groups(now):
+                ids = due_ids(group, now, min(batch_size, limit - processed))
+                if not ids:
+                    continue
+                found = True
+                allowed = limiter.take(limiter_key, rate_limit, rate_window, len(ids))
+                if allowed:
+                    batch = self.claim(ids[:allowed], now, claim_timeout)
+                    if batch:
+                        sent += send(batch, now)
+                        db.session.commit()
+                        processed += len(batch)
+                if allowed < len(ids):
+                    throttled = True
+                    break
+                if processed >= limit:
+                    break
+            if not found:
+                break
+
+        return {'sent': sent, 'processed': processed, 'throttled': throttled}
+
+    def continue_dispatch(self, result, rate_window):
+        """After a dispatcher job: queue the next one while messages are due"""
+        now = datetime.utcnow()
+        more = db.session.query(self.model.id).filter(*self.due(now)).first()
+        if more is not None:
+            # Keep going; after hitting the rate limit wait for the window to move
+            delay = timedelta(seconds=rate_window / 4) if result['throttled'] else timedelta(0)
+            enqueue_job(self.job_type, {}, run_after=now + delay)
+
+    def schedule_dispatch(self):
+        """Release stalled claims, then enqueue a dispatcher for messages coming due unless one is waiting"""
+        from app.models.jobs import OutboxJob
+
+        now = datetime.utcnow()
+        self.release_stalled(now)
+        due = db.session.query(self.model.id).filter(*self.due(now)).first()
+        waiting = db.session.query(OutboxJob.id).filter_by(job_type=self.job_type, status='pending').first()
+        if due is not None and waiting is None:
+            enqueue_job(self.job_type, {})
+
+    def stats(self):
+        """Message counts by status"""
+        model = self.model
+        return {status: count for status, count in
+                db.session.query(model.status, func.count(model.id)).group_by(model.status)}
+
+@event.listens_for(Session, 'after_commit')
+@event.listens_for(Session, 'after_rollback')
+def _reset_dispatch_flags(session):
+    for outbox in _outboxes:
+        session.info.pop(outbox._queued_flag, None)
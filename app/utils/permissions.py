@@ -1,6 +1,133 @@
 from functools import wraps
-from flask import abort, flash, redirect, url_for, request
+from flask import abort, flash, jsonify, redirect, url_for, request, g, has_app_context
 from flask_login import current_user
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from app.utils.cache_store import get_store
+
+# Membership resolver: every (chama_id, role) pair for a user is loaded with a
+# single query, memoized on flask.g for the rest of the request and shared
+# across requests for a short TTL. Writes to chama_members must call
+# invalidate_user_memberships(); the shared entry is dropped straight away and
+# again once the write commits, so another worker cannot re-cache the old
+# roles in between, and a session never caches roles it has not committed.
+#
+# Backends (MEMBERSHIP_CACHE_BACKEND):
+#     memory - per-process cache (default, single worker)
+#     redis  - shared by every gunicorn worker, so an invalidation in one
+#              worker is seen by all of them
+MEMBERSHIP_CACHE_TTL = 30  # seconds
+ADMIN_ROLES = ['admin', 'creator']
+LEADERSHIP_ROLES = ['creator', 'chairperson', 'secretary', 'treasurer']
+
+get_membership_cache = get_store('Membership cache', 'MEMBERSHIP_CACHE_BACKEND', 'chamalink:members:')
+membership_cache_stats = {
+    'request_hits': 0,
+    'shared_hits': 0,
+    'misses': 0,
+    'invalidations': 0
+}
+
+def _normalize_chama_id(chama_id):
+    try:
+        return int(chama_id)
+    except (TypeError, ValueError):
+        return None
+
+def _request_memberships():
+    """Per-request memo on flask.g, or None outside an app context"""
+    if not has_app_context():
+        return None
+    if 'chama_memberships' not in g:
+        g.chama_memberships = {}
+    return g.chama_memberships
+
+def _pending_invalidation(user_id):
+    """True while this session holds uncommitted membership writes for the user"""
+    from app import db
+    info = db.session.info
+    return info.get('membership_all', False) or user_id in info.get('membership_users', ())
+
+def get_user_memberships(user_id):
+    """Map chama_id -> role for every chama the user belongs to"""
+    request_cache = _request_memberships()
+    if request_cache is not None and user_id in request_cache:
+        membership_cache_stats['request_hits'] += 1
+        return request_cache[user_id]
+    
+    pending = _pending_invalidation(user_id)
+    cached = None if pending else get_membership_cache().get(user_id)
+    if cached is not None:
+        membership_cache_stats['shared_hits'] += 1
+        memberships = {chama_id: role for chama_id, role in cached}
+    else:
+        membership_cache_stats['misses'] += 1
+        from app.models.chama import chama_members
+        from app import db
+        
+        rows = db.session.query(chama_members.c.chama_id, chama_members.c.role).filter(
+            chama_members.c.user_id == user_id
+        ).all()
+        memberships = {chama_id: role for chama_id, role in rows}
+        if not pending:
+            # Pairs rather than a dict: JSON would turn the chama ids into strings
+            get_membership_cache().set(user_id, list(memberships.items()), MEMBERSHIP_CACHE_TTL)
+    
+    if request_cache is not None:
+        request_cache[user_id] = memberships
+    return memberships
+
+def invalidate_user_memberships(user_id):
+    """Drop cached memberships for a user after chama_members changes"""
+    from app import db
+    membership_cache_stats['invalidations'] += 1
+    get_membership_cache().delete([user_id])
+    if db.session().in_transaction():
+        db.session.info.setdefault('membership_users', set()).add(user_id)
+    request_cache = _request_memberships()
+    if request_cache is not None:
+        request_cache.pop(user_id, None)
+
+def invalidate_all_memberships():
+    """Drop every cached membership (for bulk role changes across a chama)"""
+    from app import db
+    membership_cache_stats['invalidations'] += 1
+    get_membership_cache().clear()
+    if db.session().in_transaction():
+        db.session.info['membership_all'] = True
+    request_cache = _request_memberships()
+    if request_cache is not None:
+        request_cache.clear()
+
+@event.listens_for(Session, 'after_commit')
+def _drop_committed_memberships(session):
+    user_ids = session.info.pop('membership_users', None)
+    drop_all = session.info.pop('membership_all', False)
+    try:
+        if drop_all:
+            get_membership_cache().clear()
+        elif user_ids:
+            get_membership_cache().delete(user_ids)
+    except Exception as e:
+        print(f"⚠️  Membership cache: could not drop committed memberships ({str(e)})")
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_rolled_back_memberships(session):
+    user_ids = session.info.pop('membership_users', None)
+    drop_all = session.info.pop('membership_all', False)
+    # Roles read inside the rolled-back transaction may never have existed
+    request_cache = _request_memberships()
+    if request_cache is not None:
+        if drop_all:
+            request_cache.clear()
+        for user_id in user_ids or ():
+            request_cache.pop(user_id, None)
+
+def get_membership_cache_stats():
+    """Hit/miss counters for the membership resolver"""
+    lookups = sum(membership_cache_stats[k] for k in ('request_hits', 'shared_hits', 'misses'))
+    hits = membership_cache_stats['request_hits'] + membership_cache_stats['shared_hits']
+    return dict(membership_cache_stats, hit_rate=round(hits / lookups, 4) if lookups else None)
 
 def chama_member_required(f):
     """Decorator to ensure user is a member of the chama being accessed"""
@@ -11,7 +138,7 @@ def chama_member_required(f):
             abort(400, "Chama ID is required")
         
         # Check if user is a member of this chama
-        if not current_user.is_member_of_chama(chama_id):
+        if _normalize_chama_id(chama_id) not in get_user_memberships(current_user.id):
             flash('You do not have permission to access this chama.', 'error')
             return redirect(url_for('main.dashboard'))
         
@@ -27,22 +154,22 @@ def chama_admin_required(f):
             abort(400, "Chama ID is required")
         
         # Check if user is an admin of this chama
-        from app.models import Chama, chama_members
-        from app import db
+        role = get_user_memberships(current_user.id).get(_normalize_chama_id(chama_id))
         
-        membership = db.session.query(chama_members).filter(
-            chama_members.c.user_id == current_user.id,
-            chama_members.c.chama_id == chama_id,
-            chama_members.c.role.in_(['creator', 'chairperson', 'secretary', 'treasurer'])
-        ).first()
-        
-        if not membership:
+        if role not in LEADERSHIP_ROLES:
             flash('You do not have leadership permissions for this chama.', 'error')
             return redirect(url_for('main.dashboard'))
         
         return f(*args, **kwargs)
     return decorated_function
 
+def is_system_admin(user):
+    """True for system admins and super admins"""
+    return bool(user.is_authenticated and (
+        getattr(user, 'is_super_admin', False) or
+        getattr(user, 'is_admin', False) or
+        user.role in ('admin', 'super_admin')))
+
 def admin_required(f):
     """Decorator to ensure user is a system admin"""
     @wraps(f)
@@ -51,29 +178,26 @@ def admin_required(f):
             flash('Please log in to access this page.', 'error')
             return redirect(url_for('auth.login'))
         
-        # Check if user is a system admin or super admin
-        if not (getattr(current_user, 'is_super_admin', False) or 
-                getattr(current_user, 'is_admin', False) or 
-                current_user.role == 'admin' or 
-                current_user.role == 'super_admin'):
+        if not is_system_admin(current_user):
             flash('You do not have admin permissions.', 'error')
             return redirect(url_for('main.dashboard'))
         
         return f(*args, **kwargs)
     return decorated_function
 
+def admin_api_required(f):
+    """admin_required for JSON endpoints: answers 403 instead of redirecting"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if not is_system_admin(current_user):
+            return jsonify({'status': 'error', 'message': 'You do not have admin permissions.'}), 403
+        return f(*args, **kwargs)
+    return decorated_function
+
 def get_user_chama_role(user_id, chama_id):
     """Get the role of a user in a specific chama"""
-    from app.models.chama import chama_members
-    from app import db
-    
     try:
-        membership = db.session.query(chama_members).filter(
-            chama_members.c.user_id == user_id,
-            chama_members.c.chama_id == chama_id
-        ).first()
-        
-        return membership.role if membership else None
+        return get_user_memberships(user_id).get(_normalize_chama_id(chama_id))
     except Exception as e:
         print(f"Error in get_user_chama_role: {e}")
         return None
@@ -81,16 +205,7 @@ def get_user_chama_role(user_id, chama_id):
 def user_can_access_chama(user_id, chama_id):
     """Check if a user can access a specific chama"""
     try:
-        from app.models.chama import chama_members
-        from app import db
-        
-        # Direct database query to check membership
-        membership = db.session.query(chama_members).filter(
-            chama_members.c.user_id == user_id,
-            chama_members.c.chama_id == chama_id
-        ).first()
-        
-        return membership is not None
+        return _normalize_chama_id(chama_id) in get_user_memberships(user_id)
         
     except Exception as e:
         from flask import current_app
@@ -100,4 +215,4 @@ def user_can_access_chama(user_id, chama_id):
 def user_can_admin_chama(user_id, chama_id):
     """Check if a user can administer a specific chama"""
     role = get_user_chama_role(user_id, chama_id)
-    return role in ['admin', 'creator'] if role else False
+    return role in ADMIN_ROLES if role else False
@@ -0,0 +1,261 @@
+"""
+CHAMAlink Rate Limiter Backends
+===============================
+Shared storage for request counters and lockouts, used by
+AdvancedBruteForceProtection and SecurityMonitor.
+
+Counters are sliding-window counters: each (key, window) keeps the count of
+the current and the previous fixed window, and the previous one is weighted
+by how much of it still overlaps the sliding window. Updates and reads are
+O(1) and need two numbers per key, however many requests arrive.
+
+Backends (RATE_LIMIT_BACKEND):
+    memory - per-process store with LRU eviction (default, single worker)
+    redis  - shared by every gunicorn worker; any redis-py compatible
+             client works, including fakeredis in tests
+"""
+
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from app.utils.cache_store import MemoryStore, RedisStore, redis_client
+
+def _weighted_count(current, previous, window, now):
+    elapsed = (now % window) / window
+    return int(math.floor(current + previous * (1 - elapsed)))
+
+class MemoryLimiterBackend:
+    """In-process sliding-window counters and lockouts, bounded by LRU eviction"""
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._counters = OrderedDict()  # (key, window) -> [bucket, current, previous]
+        self._blocks = MemoryStore(max_keys)  # key -> blocked until (epoch seconds)
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def _touch(self, store, key, value):
+        store[key] = value
+        store.move_to_end(key)
+        while len(store) > self.max_keys:
+            store.popitem(last=False)
+            self.evictions += 1
+
+    def _advance(self, counter_key, window, now):
+        bucket = int(now // window)
+        counter = self._counters.get(counter_key)
+        if counter is None:
+            return [bucket, 0, 0]
+        if counter[0] != bucket:
+            previous = counter[1] if counter[0] == bucket - 1 else 0
+            return [bucket, 0, previous]
+        return counter
+
+    def hit(self, key, window):
+        """Record an event and return the count in the sliding window"""
+        now = time.time()
+        with self._lock:
+            counter = self._advance((key, window), window, now)
+            counter[1] += 1
+            self._touch(self._counters, (key, window), counter)
+            return _weighted_count(counter[1], counter[2], window, now)
+
+    def count(self, key, window):
+        """Count in the sliding window without recording an event"""
+        now = time.time()
+        with self._lock:
+            if (key, window) not in self._counters:
+                return 0
+            counter = self._advance((key, window), window, now)
+            return _weighted_count(counter[1], counter[2], window, now)
+
+    def allow(self, key, limit, window):
+        """Record an event only if the window is under ``limit``. Returns whether it was allowed."""
+        return self.take(key, limit, window, 1) == 1
+
+    def take(self, key, limit, window, count):
+        """Record up to ``count`` events while the window stays within ``limit``. Returns how many."""
+        now = time.time()
+        with self._lock:
+            counter = self._advance((key, window), window, now)
+            granted = max(min(count, limit - _weighted_count(counter[1], counter[2], window, now)), 0)
+            if granted:
+                counter[1] += granted
+                self._touch(self._counters, (key, window), counter)
+            return granted
+
+    def reset(self, key, window=None):
+        """Forget the counters for a key (one window, or all of them)"""
+        with self._lock:
+            if window is not None:
+                self._counters.pop((key, window), None)
+                return
+            for counter_key in [k for k in self._counters if k[0] == key]:
+                del self._counters[counter_key]
+
+    def block(self, key, duration):
+        self._blocks.set(key, time.time() + duration, duration)
+
+    def blocked_until(self, key):
+        return self._blocks.get(key)
+
+    def unblock(self, key):
+        return self._blocks.delete([key]) > 0
+
+    def blocked(self, prefix):
+        """Map key -> blocked-until for active blocks whose key starts with ``prefix``"""
+        return dict(self._blocks.items(prefix))
+
+    def key_count(self, prefix):
+        with self._lock:
+            return len({key for key, _ in self._counters if key.startswith(prefix)})
+
+    def stats(self):
+        blocks = self._blocks.stats()
+        with self._lock:
+            return {
+                'backend': 'memory',
+                'counters': len(self._counters),
+                'blocks': blocks['entries'],
+                'max_keys': self.max_keys,
+                'evictions': self.evictions + blocks['evictions']
+            }
+
+class RedisLimiterBackend:
+    """Sliding-window counters and lockouts kept in Redis so all workers share them"""
+
+    def __init__(self, client, prefix='chamalink:rl:'):
+        self.client = client
+        self.prefix = prefix
+        self._blocks = RedisStore(client, f"{prefix}b:")
+
+    def _bucket_keys(self, key, window, now):
+        bucket = int(now // window)
+        base = f"{self.prefix}c:{key}:{window}:"
+        return f"{base}{bucket}", f"{base}{bucket - 1}"
+
+    def hit(self, key, window):
+        now = time.time()
+        current_key, previous_key = self._bucket_keys(key, window, now)
+        pipe = self.client.pipeline()
+        pipe.incr(current_key)
+        pipe.expire(current_key, window * 2)
+        pipe.get(previous_key)
+        current, _, previous = pipe.execute()
+        return _weighted_count(int(current), int(previous or 0), window, now)
+
+    def count(self, key, window):
+        now = time.time()
+        current, previous = self.client.mget(self._bucket_keys(key, window, now))
+        return _weighted_count(int(current or 0), int(previous or 0), window, now)
+
+    def allow(self, key, limit, window):
+        return self.take(key, limit, window, 1) == 1
+
+    def take(self, key, limit, window, count):
+        now = time.time()
+        current_key, previous_key = self._bucket_keys(key, window, now)
+        pipe = self.client.pipeline()
+        pipe.incrby(current_key, count)
+        pipe.expire(current_key, window * 2)
+        pipe.get(previous_key)
+        current, _, previous = pipe.execute()
+        over = min(max(_weighted_count(int(current), int(previous or 0), window, now) - limit, 0), count)
+        if over:
+            # Past the limit: take back the part of the optimistic increment it could not have
+            self.client.decrby(current_key, over)
+        return count - over
+
+    def reset(self, key, window=None):
+        pattern = f"{self.prefix}c:{key}:{window if window is not None else '*'}:*"
+        keys = list(self.client.scan_iter(match=pattern))
+        if keys:
+            self.client.delete(*keys)
+
+    def block(self, key, duration):
+        self._blocks.set(key, time.time() + duration, duration)
+
+    def blocked_until(self, key):
+        return self._blocks.get(key)
+
+    def unblock(self, key):
+        return bool(self._blocks.delete([key]))
+
+    def blocked(self, prefix):
+        return dict(self._blocks.items(prefix))
+
+    def key_count(self, prefix):
+        start = len(f"{self.prefix}c:")
+        keys = set()
+        for redis_key in self.client.scan_iter(match=f"{self.prefix}c:{prefix}*"):
+            name = redis_key.decode() if isinstance(redis_key, bytes) else redis_key
+            keys.add(name[start:].rsplit(':', 2)[0])
+        return len(keys)
+
+    def stats(self):
+        return {'backend': 'redis'}
+
+class BlockList:
+    """Dict-like view of the active blocks under one key prefix.
+
+    Supports ``item in blocks``, ``blocks[item]`` (blocked-until timestamp),
+    ``del blocks[item]``, ``len()``, iteration, ``items()`` and ``add()``, so
+    code written against the old per-process dicts and sets keeps working.
+    """
+
+    def __init__(self, backend, prefix, default_duration):
+        self.backend = backend
+        self.prefix = prefix
+        self.default_duration = default_duration
+
+    def add(self, item, duration=None):
+        self.backend.block(self.prefix + item, duration or self.default_duration)
+
+    def discard(self, item):
+        return self.backend.unblock(self.prefix + item)
+
+    def items(self):
+        start = len(self.prefix)
+        return [(key[start:], until) for key, until in self.backend.blocked(self.prefix).items()]
+
+    def __contains__(self, item):
+        return item is not None and self.backend.blocked_until(self.prefix + item) is not None
+
+    def __getitem__(self, item):
+        until = self.backend.blocked_until(self.prefix + item)
+        if until is None:
+            raise KeyError(item)
+        return until
+
+    def __delitem__(self, item):
+        if not self.discard(item):
+            raise KeyError(item)
+
+    def __iter__(self):
+        return iter([item for item, _ in self.items()])
+
+    def __len__(self):
+        return len(self.backend.blocked(self.prefix))
+
+_limiter_backend = None
+_limiter_lock = threading.Lock()
+
+def create_limiter_backend():
+    """Build the backend named by RATE_LIMIT_BACKEND, falling back to memory"""
+    if os.getenv('RATE_LIMIT_BACKEND', 'memory') == 'redis':
+        try:
+            return RedisLimiterBackend(redis_client())
+        except Exception as e:
+            print(f"⚠️  Rate limiter: FALLBACK TO MEMORY ({str(e)})")
+    return MemoryLimiterBackend(int(os.getenv('RATE_LIMIT_MAX_KEYS', 100000)))
+
+def get_limiter_backend():
+    """Process-wide limiter backend shared by the security components"""
+    global _limiter_backend
+    if _limiter_backend is None:
+        with _limiter_lock:
+            if _limiter_backend is None:
+                _limiter_backend = create_limiter_backend()
+    return _limiter_backend
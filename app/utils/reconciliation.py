@@ -0,0 +1,597 @@
+"""
+CHAMAlink Statement Reconciliation
+==================================
+Checks M-Pesa paybill and bank statement exports (CSV) against the payment
+records: MpesaTransaction, Transaction, ManualPaymentVerification and
+RegistrationFeePayment.
+
+The statement is read as a stream, RECON_CHUNK_SIZE lines at a time:
+
+    1. Lines whose receipt number was already seen are duplicate_lines.
+    2. The chunk's receipt numbers are looked up in each table with one
+       indexed IN query, and the rows found are put in a hash index by
+       receipt number. A hit is a match; two rows of one table with the
+       receipt are a duplicate_record, a different amount an
+       amount_mismatch.
+    3. Lines left over are matched to records that have no receipt number
+       (an STK push whose callback never arrived, say) through a hash index
+       by whole shilling: same amount within RECON_AMOUNT_TOLERANCE, same
+       phone where both sides have one (statements mask the middle digits),
+       and within RECON_TIME_WINDOW. The closest in time wins.
+    4. Anything still left is an unmatched_line.
+
+When the file is done, settled records inside the statement's period that
+nothing claimed are reported as unmatched_records.
+
+Memory does not grow with the file beyond the two indexes that have to
+span it: the receipt numbers seen and the records claimed, kept as 64-bit
+fingerprints in sorted NumPy runs (8 bytes per line). A year of paybill
+statements at two million lines needs about 16 MB for them; everything
+else is per chunk. Exceptions are stored as ReconciliationItem rows, up to
+RECON_MAX_ITEMS of each kind per run; the counts on the run are always
+complete.
+
+Statement times are East Africa Time; records are stored in UTC, so
+statement times are shifted by RECON_STATEMENT_UTC_OFFSET hours.
+"""
+
+import csv
+import hashlib
+import logging
+import os
+import re
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta
+import numpy as np
+from sqlalchemy import and_, insert
+from app import db
+from app.utils.jobs import job_handler, enqueue_job
+
+logger = logging.getLogger(__name__)
+
+# Statement lines matched per round of queries
+RECON_CHUNK_SIZE = 5000
+
+# Receipt numbers per IN (...) query
+RECON_LOOKUP_BATCH = 900
+
+# How far a record's time may be from the statement's for an amount/phone match
+RECON_TIME_WINDOW = 30 * 60
+
+# Shillings two amounts may differ by and still match
+RECON_AMOUNT_TOLERANCE = 1.0
+
+# Exceptions stored per kind per run
+RECON_MAX_ITEMS = 10000
+
+RECON_STATEMENT_UTC_OFFSET = float(os.getenv('RECON_STATEMENT_UTC_OFFSET', 3))
+
+# Lines read looking for the header row (exports start with a summary block)
+RECON_HEADER_SCAN = 50
+
+# Header names of each field, most specific first
+COLUMN_ALIASES = {
+    'receipt': ('receipt no.', 'receipt no', 'receipt number', 'receipt', 'transaction id',
+                'transaction reference', 'reference', 'ref no', 'ref'),
+    'time': ('completion time', 'transaction time', 'transaction date', 'value date', 'date', 'initiation time'),
+    'paid_in': ('paid in', 'credit', 'credit amount', 'money in', 'amount'),
+    'withdrawn': ('withdrawn', 'debit', 'debit amount', 'money out'),
+    'phone': ('other party info', 'phone number', 'phone', 'msisdn', 'sender'),
+    'account': ('a/c no.', 'account no', 'account reference', 'bill ref number', 'account'),
+    'status': ('transaction status', 'status'),
+}
+
+# Header names only M-Pesa statements have
+MPESA_COLUMNS = ('paid in', 'withdrawn', 'other party info', 'receipt no.', 'completion time', 'msisdn')
+
+TIME_FORMATS = (
+    '%d-%m-%Y %H:%M:%S', '%Y-%m-%d %H:%M:%S', '%d/%m/%Y %H:%M:%S', '%d/%m/%Y %H:%M',
+    '%Y-%m-%dT%H:%M:%S', '%d-%m-%Y %H:%M', '%d/%m/%Y', '%Y-%m-%d', '%d-%m-%Y'
+)
+
+class StatementFormatError(ValueError):
+    """The file is not a statement this engine can read"""
+
+class StatementLine:
+    """One money-in line of a statement"""
+    __slots__ = ('line_number', 'receipt', 'occurred_at', 'amount', 'phone', 'account')
+
+    def __init__(self, line_number, receipt, occurred_at, amount, phone, account):
+        self.line_number = line_number
+        self.receipt = receipt
+        self.occurred_at = occurred_at
+        self.amount = amount
+        self.phone = phone
+        self.account = account
+
+class FingerprintSet:
+    """Set of 64-bit integers at 8 bytes each.
+
+    Values are kept in sorted NumPy runs merged like a binary counter, so
+    adding n values costs O(n log n) overall and a membership test is a
+    binary search per run (there are O(log n) of them).
+    """
+
+    def __init__(self):
+        self.runs = []
+
+    def add(self, values):
+        run = np.unique(np.asarray(values, dtype=np.int64))
+        while self.runs and len(self.runs[-1]) <= len(run):
+            run = np.union1d(self.runs.pop(), run)
+        if len(run):
+            self.runs.append(run)
+
+    def contains(self, values):
+        values = np.asarray(values, dtype=np.int64)
+        found = np.zeros(len(values), dtype=bool)
+        for run in self.runs:
+            index = np.minimum(np.searchsorted(run, values), len(run) - 1)
+            found |= run[index] == values
+        return found
+
+    def __len__(self):
+        return sum(len(run) for run in self.runs)
+
+    @property
+    def nbytes(self):
+        return sum(run.nbytes for run in self.runs)
+
+def fingerprint(text):
+    """64-bit fingerprint of a receipt number"""
+    return int.from_bytes(hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest(), 'little', signed=True)
+
+def normalize_receipt(value):
+    return (value or '').strip().upper()
+
+def normalize_phone(value):
+    """Kenyan numbers as 2547XXXXXXXX; masked digits stay as '*'"""
+    match = re.search(r'\+?[\d*]{9,15}', value or '')
+    if not match:
+        return None
+    phone = match.group(0).lstrip('+')
+    if phone.startswith('0') and len(phone) == 10:
+        phone = '254' + phone[1:]
+    elif len(phone) == 9 and phone[0] in '71':
+        phone = '254' + phone
+    return phone
+
+def phones_match(statement_phone, record_phone):
+    """Phones agree, or one side has none; masked digits match anything"""
+    if not statement_phone or not record_phone:
+        return True
+    if '*' not in statement_phone:
+        return statement_phone == record_phone
+    prefix, _, rest = statement_phone.partition('*')
+    suffix = rest.lstrip('*')
+    return (len(statement_phone) == len(record_phone) and record_phone.startswith(prefix)
+            and record_phone.endswith(suffix))
+
+def parse_amount(value):
+    value = (value or '').replace(',', '').strip()
+    if not value:
+        return 0.0
+    try:
+        return float(value)
+    except ValueError:
+        return 0.0
+
+class _TimeParser:
+    """Statement timestamps, remembering the format that worked last"""
+
+    def __init__(self):
+        self.format = None
+        self.offset = timedelta(hours=RECON_STATEMENT_UTC_OFFSET)
+
+    def __call__(self, value):
+        value = (value or '').strip()
+        if not value:
+            return None
+        if self.format:
+            try:
+                return datetime.strptime(value, self.format) - self.offset
+            except ValueError:
+                pass
+        for candidate in TIME_FORMATS:
+            try:
+                parsed = datetime.strptime(value, candidate)
+            except ValueError:
+                continue
+            self.format = candidate
+            return parsed - self.offset
+        return None
+
+def _find_columns(header):
+    names = [' '.join(cell.strip().lower().split()) for cell in header]
+    columns = {}
+    for field, aliases in COLUMN_ALIASES.items():
+        for alias in aliases:
+            if alias in names:
+                columns[field] = names.index(alias)
+                break
+    return columns
+
+def read_statement(stream, stats):
+    """Yield the money-in lines of a statement read from a text stream.
+
+    stats collects rows_read, skipped and statement_type as it goes.
+    """
+    reader = csv.reader(stream)
+    columns = header = None
+    for row in reader:
+        candidate = _find_columns(row)
+        if 'receipt' in candidate and 'time' in candidate and 'paid_in' in candidate:
+            columns, header = candidate, {' '.join(cell.strip().lower().split()) for cell in row}
+            break
+        if reader.line_num >= RECON_HEADER_SCAN:
+            break
+    if columns is None:
+        raise StatementFormatError('No statement header found (expected receipt, date and amount columns)')
+    stats['statement_type'] = 'mpesa' if header & set(MPESA_COLUMNS) else 'bank'
+
+    parse_time = _TimeParser()
+    receipt_at, time_at, paid_at = columns['receipt'], columns['time'], columns['paid_in']
+    phone_at = columns.get('phone')
+    account_at, status_at = columns.get('account'), columns.get('status')
+    width = max(columns.values()) + 1
+    for row in reader:
+        if len(row) < width or not any(row):
+            continue
+        stats['rows_read'] += 1
+        amount = parse_amount(row[paid_at])
+        receipt = normalize_receipt(row[receipt_at])
+        occurred_at = parse_time(row[time_at])
+        if (amount <= 0 or not receipt or occurred_at is None
+                or (status_at is not None and row[status_at].strip().lower() not in ('completed', ''))):
+            stats['skipped'] += 1
+            continue
+        yield StatementLine(
+            reader.line_num, receipt, occurred_at, amount,
+            normalize_phone(row[phone_at]) if phone_at is not None else None,
+            row[account_at].strip() if account_at is not None else None
+        )
+
+class RecordSource:
+    """One table of payment records, as the engine reads it"""
+
+    def __init__(self, name, number, model, receipt, occurred_at, amount, phone, settled, candidate,
+                 join_user=True, linked=None):
+        self.name = name
+        self.number = number  # distinguishes the tables' ids in the claimed-records index
+        self.model = model
+        self.receipt = receipt
+        self.occurred_at = occurred_at
+        self.amount = amount
+        self.phone = phone
+        # Per statement type: records that must appear on the statement, and
+        # records without a receipt that may match a line by amount
+        self.settled = settled
+        self.candidate = candidate
+        self.join_user = join_user
+        self.linked = linked  # another source's record this one stands for
+
+    def query(self, *columns):
+        from app.models.user import User
+
+        query = db.session.query(self.model.id, *columns)
+        if self.join_user:
+            query = query.outerjoin(User, User.id == self.model.user_id)
+        return query
+
+    def key(self, record_id):
+        return (self.number << 40) | record_id
+
+def record_sources():
+    """The tables reconciled, in the order a record without a receipt is preferred"""
+    from app.models.chama import Transaction, MpesaTransaction, ManualPaymentVerification, RegistrationFeePayment
+    from app.models.user import User
+
+    credit_types = ('contribution', 'loan_repayment', 'penalty_payment', 'registration_fee')
+    transaction_credits = {
+        method: and_(Transaction.payment_method == method, Transaction.type.in_(credit_types))
+        for method in ('mpesa', 'bank_transfer')
+    }
+    return (
+        RecordSource('mpesa', 1, MpesaTransaction, MpesaTransaction.mpesa_receipt_number,
+                     MpesaTransaction.created_date, MpesaTransaction.amount, MpesaTransaction.phone_number,
+                     settled={'mpesa': MpesaTransaction.status == 'completed'},
+                     candidate={'mpesa': and_(MpesaTransaction.mpesa_receipt_number.is_(None),
+                                              MpesaTransaction.status != 'failed')},
+                     join_user=False, linked=('transaction', MpesaTransaction.transaction_id)),
+        RecordSource('transaction', 2, Transaction, Transaction.transaction_id, Transaction.created_at,
+                     Transaction.amount, User.phone_number,
+                     # Transactions paid by STK push are claimed through their M-Pesa record
+                     settled={statement_type: and_(credits, Transaction.status == 'completed',
+                                                   Transaction.transaction_id.isnot(None))
+                              for statement_type, credits in (('mpesa', transaction_credits['mpesa']),
+                                                              ('bank', transaction_credits['bank_transfer']))},
+                     candidate={statement_type: and_(credits, Transaction.transaction_id.is_(None),
+                                                     Transaction.status != 'failed')
+                                for statement_type, credits in (('mpesa', transaction_credits['mpesa']),
+                                                                ('bank', transaction_credits['bank_transfer']))}),
+        RecordSource('manual', 3, ManualPaymentVerification, ManualPaymentVerification.transaction_id,
+                     ManualPaymentVerification.created_at, ManualPaymentVerification.amount, User.phone_number,
+                     settled={'mpesa': ManualPaymentVerification.verification_status == 'verified'},
+                     candidate={'mpesa': and_(ManualPaymentVerification.transaction_id.is_(None),
+                                              ManualPaymentVerification.verification_status != 'rejected')}),
+        RecordSource('registration_fee', 4, RegistrationFeePayment, RegistrationFeePayment.mpesa_receipt_number,
+                     RegistrationFeePayment.created_at, RegistrationFeePayment.amount, User.phone_number,
+                     settled={'mpesa': RegistrationFeePayment.payment_status == 'completed'},
+                     candidate={'mpesa': and_(RegistrationFeePayment.mpesa_receipt_number.is_(None),
+                                              RegistrationFeePayment.payment_status != 'failed')}),
+    )
+
+class StatementReconciler:
+    """Streams statement lines through the matching steps and records the results on a run"""
+
+    def __init__(self, run, chunk_size=RECON_CHUNK_SIZE):
+        self.run = run
+        self.chunk_size = chunk_size
+        self.sources = record_sources()
+        self.by_name = {source.name: source for source in self.sources}
+        self.receipts = FingerprintSet()  # receipt numbers seen on the statement
+        self.claimed = FingerprintSet()  # records matched to a line
+        self.counts = defaultdict(int)
+        self.stored = defaultdict(int)
+        self.items = []
+        self.stats = {'rows_read': 0, 'skipped': 0, 'statement_type': None}
+        self.period_start = self.period_end = None
+
+    def _item(self, kind, line=None, **values):
+        self.counts[kind] += 1
+        if self.stored[kind] >= RECON_MAX_ITEMS:
+            return
+        self.stored[kind] += 1
+        if line is not None:
+            values.setdefault('receipt_number', line.receipt)
+            values.setdefault('amount', line.amount)
+            values.setdefault('phone_number', line.phone)
+            values.setdefault('occurred_at', line.occurred_at)
+            values.setdefault('line_number', line.line_number)
+        values.update(run_id=self.run.id, kind=kind)
+        self.items.append(values)
+
+    def _flush_items(self):
+        if self.items:
+            from app.models.reconciliation import ReconciliationItem
+
+            rows = [dict({'receipt_number': None, 'amount': None, 'phone_number': None, 'occurred_at': None,
+                          'line_number': None, 'record_type': None, 'record_id': None, 'details': None}, **item)
+                    for item in self.items]
+            db.session.execute(insert(ReconciliationItem), rows)
+            self.items = []
+
+    def _claim(self, keys):
+        if keys:
+            self.claimed.add(keys)
+
+    def _lookup(self, receipts):
+        """receipt -> [(source, id, amount, linked key)] for the chunk's receipt numbers"""
+        index = defaultdict(list)
+        receipts = sorted(receipts)
+        for source in self.sources:
+            linked = source.linked[1] if source.linked else None
+            columns = [source.receipt, source.amount] + ([linked] if linked is not None else [])
+            for start in range(0, len(receipts), RECON_LOOKUP_BATCH):
+                batch = receipts[start:start + RECON_LOOKUP_BATCH]
+                for row in source.query(*columns).filter(source.receipt.in_(batch)):
+                    linked_key = (self.by_name[source.linked[0]].key(row[3])
+                                  if linked is not None and row[3] is not None else None)
+                    index[normalize_receipt(row[1])].append((source, row[0], float(row[2] or 0), linked_key))
+        return index
+
+    def _candidates(self, start, end):
+        """whole shilling -> [(time, phone, source, id, linked key, amount)] for records without a receipt"""
+        statement_type = self.stats['statement_type']
+        keys, entries = [], []
+        for source in self.sources:
+            candidate = source.candidate.get(statement_type)
+            if candidate is None:
+                continue
+            linked = source.linked[1] if source.linked else None
+            columns = [source.occurred_at, source.amount, source.phone] + ([linked] if linked is not None else [])
+            for row in source.query(*columns).filter(
+                    candidate, source.occurred_at >= start, source.occurred_at <= end):
+                linked_key = (self.by_name[source.linked[0]].key(row[4])
+                              if linked is not None and row[4] is not None else None)
+                keys.append(source.key(row[0]))
+                entries.append((row[1], normalize_phone(row[3]), source, row[0], linked_key, float(row[2] or 0)))
+
+        index = defaultdict(list)
+        if entries:
+            # A pending STK push and its pending transaction are one payment
+            represented = {entry[4] for entry in entries if entry[4] is not None}
+            taken = self.claimed.contains(keys)
+            for key, entry, is_taken in zip(keys, entries, taken):
+                if not is_taken and key not in represented:
+                    index[int(round(entry[5]))].append(entry)
+        return index
+
+    def _fuzzy_match(self, line, index):
+        shilling = int(round(line.amount))
+        best, best_gap = None, None
+        for key in range(shilling - int(RECON_AMOUNT_TOLERANCE) - 1, shilling + int(RECON_AMOUNT_TOLERANCE) + 2):
+            for entry in index.get(key, ()):
+                occurred_at, phone, _, _, _, amount = entry
+                if occurred_at is None or abs(amount - line.amount) > RECON_AMOUNT_TOLERANCE:
+                    continue
+                gap = abs((occurred_at - line.occurred_at).total_seconds())
+                if gap <= RECON_TIME_WINDOW and phones_match(line.phone, phone) and (best is None or gap < best_gap):
+                    best, best_gap = entry, gap
+        if best is not None:
+            index[int(round(best[5]))].remove(best)
+        return best, best_gap
+
+    def _match_chunk(self, lines):
+        fingerprints = np.fromiter((fingerprint(line.receipt) for line in lines), dtype=np.int64, count=len(lines))
+        seen = self.receipts.contains(fingerprints)
+        _, first = np.unique(fingerprints, return_index=True)
+        repeated = np.ones(len(lines), dtype=bool)
+        repeated[first] = False
+        self.receipts.add(fingerprints)
+
+        fresh = []
+        for line, duplicate in zip(lines, seen | repeated):
+            if duplicate:
+                self._item('duplicate_line', line)
+            else:
+                fresh.append(line)
+
+        index = self._lookup({line.receipt for line in fresh})
+        claimed, leftover = [], []
+        for line in fresh:
+            records = index.get(line.receipt)
+            if not records:
+                leftover.append(line)
+                continue
+            self.counts['matched'] += 1
+            per_source = defaultdict(list)
+            for source, record_id, amount, linked_key in records:
+                per_source[source.name].append(record_id)
+                claimed.append(source.key(record_id))
+                if linked_key is not None:
+                    claimed.append(linked_key)
+                if abs(amount - line.amount) > RECON_AMOUNT_TOLERANCE:
+                    self._item('amount_mismatch', line, record_type=source.name, record_id=record_id,
+                               details={'statement_amount': line.amount, 'record_amount': amount})
+            for name, record_ids in per_source.items():
+                if len(record_ids) > 1:
+                    self._item('duplicate_record', line, record_type=name, record_id=record_ids[1],
+                               details={'record_ids': record_ids})
+        self._claim(claimed)
+
+        if leftover:
+            window = timedelta(seconds=RECON_TIME_WINDOW)
+            candidates = self._candidates(min(line.occurred_at for line in leftover) - window,
+                                          max(line.occurred_at for line in leftover) + window)
+            claimed = []
+            for line in leftover:
+                entry, gap = self._fuzzy_match(line, candidates) if candidates else (None, None)
+                if entry is None:
+                    self._item('unmatched_line', line, details={'account': line.account} if line.account else None)
+                    continue
+                _, _, source, record_id, linked_key, amount = entry
+                claimed.append(source.key(record_id))
+                if linked_key is not None:
+                    claimed.append(linked_key)
+                self._item('fuzzy_match', line, record_type=source.name, record_id=record_id,
+                           details={'seconds_apart': int(gap), 'record_amount': amount})
+            self._claim(claimed)
+
+        self._flush_items()
+
+    def _sweep_unmatched_records(self):
+        """Settled records inside the statement period that no line claimed"""
+        if self.period_start is None:
+            return
+        for source in self.sources:
+            settled = source.settled.get(self.stats['statement_type'])
+            if settled is None:
+                continue
+            query = source.query(source.receipt, source.amount, source.phone, source.occurred_at).filter(
+                settled, source.occurred_at >= self.period_start, source.occurred_at <= self.period_end)
+            batch = []
+            for row in query.yield_per(self.chunk_size):
+                batch.append(row)
+                if len(batch) >= self.chunk_size:
+                    self._report_unclaimed(source, batch)
+                    batch = []
+            self._report_unclaimed(source, batch)
+        self._flush_items()
+
+    def _report_unclaimed(self, source, rows):
+        if not rows:
+            return
+        keys = np.fromiter((source.key(row[0]) for row in rows), dtype=np.int64, count=len(rows))
+        for row, is_claimed in zip(rows, self.claimed.contains(keys)):
+            if not is_claimed:
+                self._item('unmatched_record', receipt_number=row[1], amount=row[2], phone_number=row[3],
+                           occurred_at=row[4], record_type=source.name, record_id=row[0])
+
+    def reconcile(self, stream):
+        """Reconcile a statement read from a text stream; fills in and returns the run"""
+        started = time.perf_counter()
+        chunk = []
+        for line in read_statement(stream, self.stats):
+            if self.period_start is None or line.occurred_at < self.period_start:
+                self.period_start = line.occurred_at
+            if self.period_end is None or line.occurred_at > self.period_end:
+                self.period_end = line.occurred_at
+            chunk.append(line)
+            self.counts['credits'] += 1
+            if len(chunk) >= self.chunk_size:
+                self._match_chunk(chunk)
+                chunk = []
+        if chunk:
+            self._match_chunk(chunk)
+        self._sweep_unmatched_records()
+        elapsed = time.perf_counter() - started
+
+        run = self.run
+        run.statement_type = self.stats['statement_type']
+        run.rows_read = self.stats['rows_read']
+        run.skipped = self.stats['skipped']
+        run.credits = self.counts['credits']
+        run.matched = self.counts['matched']
+        run.fuzzy_matched = self.counts['fuzzy_match']
+        run.unmatched_lines = self.counts['unmatched_line']
+        run.duplicate_lines = self.counts['duplicate_line']
+        run.duplicate_records = self.counts['duplicate_record']
+        run.amount_mismatches = self.counts['amount_mismatch']
+        run.unmatched_records = self.counts['unmatched_record']
+        run.period_start, run.period_end = self.period_start, self.period_end
+        run.rows_per_second = round(run.rows_read / elapsed, 1) if elapsed else None
+        run.index_bytes = self.receipts.nbytes + self.claimed.nbytes
+        run.status = 'completed'
+        run.finished_at = datetime.utcnow()
+        return run
+
+def reconcile_file(run, path, chunk_size=RECON_CHUNK_SIZE):
+    """Reconcile the statement at path into run"""
+    # utf-8-sig drops the byte order mark Excel puts on exported CSVs
+    with open(path, newline='', encoding='utf-8-sig', errors='replace') as stream:
+        return StatementReconciler(run, chunk_size).reconcile(stream)
+
+def upload_dir():
+    """Where uploaded statements wait for a job worker (shared with the workers)"""
+    from flask import current_app
+
+    return os.getenv('RECONCILIATION_UPLOAD_PATH') or os.path.join(current_app.instance_path, 'reconciliation')
+
+def queue_statement(file_storage, filename, user_id=None):
+    """Save an uploaded statement and queue its reconciliation. Returns the run."""
+    from app.models.reconciliation import ReconciliationRun
+
+    directory = upload_dir()
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{uuid.uuid4().hex}.csv")
+    file_storage.save(path)
+
+    run = ReconciliationRun(filename=filename, status='queued', created_by=user_id)
+    db.session.add(run)
+    db.session.flush()
+    # Not retried: a rerun would store the run's exceptions twice
+    enqueue_job('reconcile_statement', {'run_id': run.id, 'path': path}, max_attempts=1)
+    return run
+
+@job_handler('reconcile_statement')
+def process_statement(payload):
+    from app.models.reconciliation import ReconciliationRun
+
+    path = payload['path']
+    try:
+        reconcile_file(db.session.get(ReconciliationRun, payload['run_id']), path)
+    except Exception as e:
+        db.session.rollback()
+        run = db.session.get(ReconciliationRun, payload['run_id'])
+        run.status = 'failed'
+        run.error = str(e)
+        run.finished_at = datetime.utcnow()
+        logger.error(f"Reconciliation run {run.id} failed: {e}")
+    finally:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
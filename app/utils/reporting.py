@@ -0,0 +1,118 @@
+"""
+CHAMAlink Reporting Queries
+===========================
+Report figures computed in the database. Totals, per-type sums and top
+contributors are GROUP BY queries and only the displayed page of
+transactions is loaded (with its users in the same query), so a report
+costs the same memory for a chama with fifty transactions or fifty
+thousand.
+"""
+
+from sqlalchemy import func, case
+from sqlalchemy.orm import joinedload
+from app import db
+
+# Transactions shown on the report page and in the PDF
+REPORT_PAGE_SIZE = 20
+
+# Members listed as top contributors
+TOP_CONTRIBUTORS = 5
+
+def transaction_totals(chama_id, start_dt, end_dt):
+    """{type: {'count', 'amount'}} for the chama's transactions in [start_dt, end_dt)"""
+    from app.models.chama import Transaction
+
+    rows = db.session.query(
+        Transaction.type,
+        func.count(Transaction.id),
+        func.coalesce(func.sum(Transaction.amount), 0.0)
+    ).filter(
+        Transaction.chama_id == chama_id,
+        Transaction.created_at >= start_dt,
+        Transaction.created_at < end_dt
+    ).group_by(Transaction.type).all()
+    return {trans_type: {'count': count, 'amount': float(amount)} for trans_type, count, amount in rows}
+
+def loan_totals(chama_id, start_dt, end_dt):
+    """Count of loan applications and amount approved in the period"""
+    from app.models.chama import LoanApplication
+
+    count, approved = db.session.query(
+        func.count(LoanApplication.id),
+        func.coalesce(func.sum(case((LoanApplication.status == 'approved', LoanApplication.amount), else_=0.0)), 0.0)
+    ).filter(
+        LoanApplication.chama_id == chama_id,
+        LoanApplication.application_date >= start_dt,
+        LoanApplication.application_date < end_dt
+    ).one()
+    return {'count': count, 'approved_amount': float(approved)}
+
+def penalty_totals(chama_id, start_dt, end_dt):
+    """Count and total amount of penalties issued in the period"""
+    from app.models.chama import Penalty
+
+    count, amount = db.session.query(
+        func.count(Penalty.id),
+        func.coalesce(func.sum(Penalty.amount), 0.0)
+    ).filter(
+        Penalty.chama_id == chama_id,
+        Penalty.created_date >= start_dt,
+        Penalty.created_date < end_dt
+    ).one()
+    return {'count': count, 'amount': float(amount)}
+
+def top_contributors(chama_id, start_dt, end_dt, limit=TOP_CONTRIBUTORS):
+    """[{'user': User, 'amount': float}] ranked by contributions in the period"""
+    from app.models.chama import Transaction
+    from app.models.user import User
+
+    totals = db.session.query(
+        Transaction.user_id.label('user_id'),
+        func.sum(Transaction.amount).label('amount')
+    ).filter(
+        Transaction.chama_id == chama_id,
+        Transaction.type == 'contribution',
+        Transaction.created_at >= start_dt,
+        Transaction.created_at < end_dt
+    ).group_by(Transaction.user_id).subquery()
+
+    rows = db.session.query(User, totals.c.amount).join(
+        totals, User.id == totals.c.user_id
+    ).order_by(totals.c.amount.desc(), User.id).limit(limit).all()
+    return [{'user': user, 'amount': float(amount)} for user, amount in rows]
+
+def transaction_page(chama_id, start_dt, end_dt, page=1, per_page=REPORT_PAGE_SIZE):
+    """One page of the period's transactions, newest first, users loaded alongside"""
+    from app.models.chama import Transaction
+
+    return Transaction.query.options(joinedload(Transaction.user)).filter(
+        Transaction.chama_id == chama_id,
+        Transaction.created_at >= start_dt,
+        Transaction.created_at < end_dt
+    ).order_by(
+        Transaction.created_at.desc(), Transaction.id.desc()
+    ).offset((max(page, 1) - 1) * per_page).limit(per_page).all()
+
+def build_chama_report(chama_id, start_dt, end_dt, page=1, per_page=REPORT_PAGE_SIZE):
+    """Everything the report dashboard and PDF show for one chama and period"""
+    by_type = transaction_totals(chama_id, start_dt, end_dt)
+    loans = loan_totals(chama_id, start_dt, end_dt)
+    penalties = penalty_totals(chama_id, start_dt, end_dt)
+
+    def type_amount(trans_type):
+        return by_type.get(trans_type, {}).get('amount', 0.0)
+
+    return {
+        'totals_by_type': by_type,
+        'transaction_count': sum(totals['count'] for totals in by_type.values()),
+        'loan_count': loans['count'],
+        'penalty_count': penalties['count'],
+        'total_contributions': type_amount('contribution'),
+        'total_loan_repayments': type_amount('loan_repayment'),
+        'total_loans': loans['approved_amount'],
+        'total_penalties': penalties['amount'],
+        'top_contributors': top_contributors(chama_id, start_dt, end_dt),
+        'transactions': transaction_page(chama_id, start_dt, end_dt, page, per_page),
+        'page': max(page, 1),
+        'per_page': per_page
+    }
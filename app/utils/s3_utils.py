@@ -1,16 +1,177 @@
-import boto3
-from flask import current_app
+"""
+CHAMAlink File Storage
+======================
+S3 uploads and the artifact store for generated documents.
+
+Artifacts are immutable blobs (rendered PDFs) stored under the SHA-256 of
+their content, so storing the same bytes twice is a no-op and a key never
+points at different content. Backends (ARTIFACT_STORE_BACKEND):
+    local - files under ARTIFACT_STORE_PATH (default instance/artifacts),
+            sent with send_file, so USE_X_SENDFILE or an nginx
+            X-Accel-Redirect location (ARTIFACT_ACCEL_REDIRECT_PREFIX) can
+            hand the transfer to the web server
+    s3    - objects in S3_BUCKET under ARTIFACT_S3_PREFIX, downloaded
+            straight from S3 through a short-lived presigned URL
+"""
+
+import hashlib
+import os
+import tempfile
+import threading
+from flask import current_app, make_response, redirect, send_file
 from werkzeug.utils import secure_filename
 
-s3 = boto3.client('s3')
-BUCKET = current_app.config.get('S3_BUCKET', 'chamalink-uploads')
+DEFAULT_BUCKET = 'chamalink-uploads'
+
+# Seconds a presigned download link stays valid
+ARTIFACT_URL_EXPIRY = 300
+
+_s3_client = None
+
+def get_s3_client():
+    global _s3_client
+    if _s3_client is None:
+        import boto3
+        _s3_client = boto3.client('s3')
+    return _s3_client
+
+def _bucket():
+    return current_app.config.get('S3_BUCKET') or os.getenv('S3_BUCKET', DEFAULT_BUCKET)
 
 def upload_file_to_s3(file, filename=None):
     if not filename:
         filename = secure_filename(file.filename)
-    s3.upload_fileobj(file, BUCKET, filename)
-    return f'https://{BUCKET}.s3.amazonaws.com/{filename}'
+    bucket = _bucket()
+    get_s3_client().upload_fileobj(file, bucket, filename)
+    return f'https://{bucket}.s3.amazonaws.com/{filename}'
 
 def download_file_from_s3(filename):
-    fileobj = s3.get_object(Bucket=BUCKET, Key=filename)
+    fileobj = get_s3_client().get_object(Bucket=_bucket(), Key=filename)
     return fileobj['Body'].read()
+
+def artifact_key(data):
+    """Content address of a blob"""
+    return hashlib.sha256(data).hexdigest()
+
+class LocalArtifactStore:
+    """Artifacts as files, fanned out into two levels of subdirectories"""
+
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+
+    def path(self, key):
+        return os.path.join(self.root, key[:2], key[2:4], key)
+
+    def put(self, data, content_type='application/pdf'):
+        key = artifact_key(data)
+        path = self.path(key)
+        if not os.path.exists(path):
+            directory = os.path.dirname(path)
+            os.makedirs(directory, exist_ok=True)
+            # Write then rename, so a concurrent reader never sees half a file
+            fd, temp_path = tempfile.mkstemp(dir=directory)
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        return key
+
+    def exists(self, key):
+        return os.path.exists(self.path(key))
+
+    def get(self, key):
+        with open(self.path(key), 'rb') as f:
+            return f.read()
+
+    def url(self, key, filename, content_type='application/pdf'):
+        return None
+
+class S3ArtifactStore:
+    """Artifacts as S3 objects, shared by every web and worker host"""
+
+    def __init__(self, client, bucket, prefix='artifacts/'):
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix
+
+    def _object_key(self, key):
+        return f'{self.prefix}{key[:2]}/{key}'
+
+    def put(self, data, content_type='application/pdf'):
+        key = artifact_key(data)
+        if not self.exists(key):
+            self.client.put_object(Bucket=self.bucket, Key=self._object_key(key), Body=data,
+                                   ContentType=content_type)
+        return key
+
+    def exists(self, key):
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self._object_key(key))
+            return True
+        except self.client.exceptions.ClientError:
+            return False
+
+    def get(self, key):
+        return self.client.get_object(Bucket=self.bucket, Key=self._object_key(key))['Body'].read()
+
+    def path(self, key):
+        return None
+
+    def url(self, key, filename, content_type='application/pdf'):
+        return self.client.generate_presigned_url('get_object', Params={
+            'Bucket': self.bucket,
+            'Key': self._object_key(key),
+            'ResponseContentType': content_type,
+            'ResponseContentDisposition': f'attachment; filename="{secure_filename(filename) or key}"'
+        }, ExpiresIn=ARTIFACT_URL_EXPIRY)
+
+_artifact_store = None
+_artifact_store_lock = threading.Lock()
+
+def _default_store_path():
+    project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    return os.path.join(project_root, 'instance', 'artifacts')
+
+def create_artifact_store():
+    """Build the store named by ARTIFACT_STORE_BACKEND, falling back to local files"""
+    if os.getenv('ARTIFACT_STORE_BACKEND', 'local') == 's3':
+        try:
+            client = get_s3_client()
+            bucket = os.getenv('S3_BUCKET', DEFAULT_BUCKET)
+            client.head_bucket(Bucket=bucket)
+            return S3ArtifactStore(client, bucket, os.getenv('ARTIFACT_S3_PREFIX', 'artifacts/'))
+        except Exception as e:
+            print(f"⚠️  Artifact store: FALLBACK TO LOCAL FILES ({str(e)})")
+    return LocalArtifactStore(os.getenv('ARTIFACT_STORE_PATH') or _default_store_path())
+
+def get_artifact_store():
+    """Process-wide artifact store"""
+    global _artifact_store
+    if _artifact_store is None:
+        with _artifact_store_lock:
+            if _artifact_store is None:
+                _artifact_store = create_artifact_store()
+    return _artifact_store
+
+def send_artifact(key, download_name, mimetype='application/pdf'):
+    """Download response for a stored artifact that never passes the bytes through Python.
+
+    S3 artifacts redirect to a presigned URL. Local ones are sent with
+    send_file (X-Sendfile when USE_X_SENDFILE is on), or as an nginx
+    X-Accel-Redirect to ARTIFACT_ACCEL_REDIRECT_PREFIX when that is set.
+    """
+    store = get_artifact_store()
+    url = store.url(key, download_name, mimetype)
+    if url:
+        return redirect(url)
+
+    accel_prefix = os.getenv('ARTIFACT_ACCEL_REDIRECT_PREFIX')
+    if accel_prefix:
+        response = make_response('')
+        response.headers['X-Accel-Redirect'] = '/'.join(
+            [accel_prefix.rstrip('/')] + os.path.relpath(store.path(key), store.root).split(os.sep))
+        response.headers['Content-Type'] = mimetype
+        response.headers.set('Content-Disposition', 'attachment', filename=download_name)
+        return response
+
+    return send_file(store.path(key), mimetype=mimetype, as_attachment=True,
+                     download_name=download_name, etag=key, conditional=True)
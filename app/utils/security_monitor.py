@@ -10,9 +10,13 @@ import hashlib
 import time
 import json
 from datetime import datetime, timedelta
-from collections import defaultdict
 import os
-import re
+
+from .rate_limiter import get_limiter_backend, BlockList
+from .attack_scanner import AttackPatternScanner
+
+# IPs blocked for attack patterns stay blocked this long (seconds)
+ATTACK_BLOCK_DURATION = 24 * 3600
 
 # Import email notifier
 try:
@@ -35,7 +39,7 @@ security_logger = logging.getLogger('security')
 class SecurityMonitor:
     """Advanced security monitoring and attack detection"""
     
-    def __init__(self):
+    def __init__(self, backend=None):
         # Check if we're in development/testing mode
         self.dev_mode = os.getenv('FLASK_DEBUG') == 'true' or os.getenv('TESTING') == 'True'
         
@@ -83,6 +87,9 @@ class SecurityMonitor:
             ]
         }
         
+        # Compile every signature once into a single-pass scanner
+        self.scanner = AttackPatternScanner(self.attack_patterns)
+        
         self.suspicious_user_agents = [
             'sqlmap', 'nikto', 'w3af', 'burp', 'nmap', 'masscan',
             'zap', 'gobuster', 'dirb', 'curl', 'wget', 
@@ -94,9 +101,9 @@ class SecurityMonitor:
             'python-requests', 'python/3', 'pytest', 'selenium', 'postman'
         ]
         
-        self.rate_limits = defaultdict(list)
-        self.blocked_ips = set()
-        self.failed_attempts = defaultdict(int)
+        # Counters and blocks are kept in the shared limiter backend
+        self.limiter = backend or get_limiter_backend()
+        self.blocked_ips = BlockList(self.limiter, 'sm:ip:', ATTACK_BLOCK_DURATION)
         
     def get_client_info(self):
         """Get comprehensive client information"""
@@ -116,42 +123,17 @@ class SecurityMonitor:
     
     def detect_attack_patterns(self, data_to_check):
         """Detect known attack patterns in request data"""
-        threats_found = []
-        
-        # Convert data to string for pattern matching
-        if isinstance(data_to_check, dict):
-            check_string = json.dumps(data_to_check).lower()
-        else:
-            check_string = str(data_to_check).lower()
-        
-        for attack_type, patterns in self.attack_patterns.items():
-            for pattern in patterns:
-                if re.search(pattern, check_string, re.IGNORECASE):
-                    threats_found.append({
-                        'type': attack_type,
-                        'pattern': pattern,
-                        'matched_text': check_string[:100] + '...' if len(check_string) > 100 else check_string
-                    })
-        
-        return threats_found
+        if not isinstance(data_to_check, (dict, list, str)):
+            data_to_check = str(data_to_check)
+        return self.scanner.scan(data_to_check)
     
     def check_rate_limiting(self, ip, max_requests=100, time_window=3600):
         """Implement rate limiting"""
-        current_time = time.time()
-        
-        # Clean old entries
-        self.rate_limits[ip] = [
-            timestamp for timestamp in self.rate_limits[ip]
-            if current_time - timestamp < time_window
-        ]
-        
-        # Check if rate limit exceeded
-        if len(self.rate_limits[ip]) >= max_requests:
-            return False
-        
-        # Add current request
-        self.rate_limits[ip].append(current_time)
-        return True
+        return self.limiter.allow(f'sm:rate:{ip}', max_requests, time_window)
+    
+    def record_attack_attempt(self, ip):
+        """Count an attack attempt from an IP and return its total for the day"""
+        return self.limiter.hit(f'sm:attack:{ip}', ATTACK_BLOCK_DURATION)
     
     def is_suspicious_user_agent(self, user_agent):
         """Check for suspicious user agents with better detection"""
@@ -337,8 +319,7 @@ def security_check(f):
             )
             
             # Block IP after multiple attack attempts
-            security_monitor.failed_attempts[ip] += 1
-            if security_monitor.failed_attempts[ip] >= 3:
+            if security_monitor.record_attack_attempt(ip) >= 3:
                 security_monitor.blocked_ips.add(ip)
                 security_monitor.log_security_event(
                     'IP_BLOCKED',
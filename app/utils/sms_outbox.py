@@ -0,0 +1,226 @@
+"""
+CHAMAlink SMS Outbox
+====================
+Queued SMS delivery. queue_sms() writes one SmsMessage row per recipient
+in the caller's transaction and schedules the dispatcher; request handlers
+return without waiting for the provider.
+
+The dispatcher job takes due messages oldest first and coalesces those
+with identical text into bulk requests of up to SMS_BATCH_SIZE numbers,
+so an AGM reminder to 5000 members costs 50 provider calls rather than
+5000. Sends are throttled per provider account through the rate limiter
+backend. Each claim and each batch's outcomes are committed as the
+dispatcher goes, so a message is sent once even if the job fails later.
+Recipients the provider rejects temporarily (or whole batches whose request
+fails) are retried with exponential backoff; permanent rejections such as
+invalid numbers fail at once. Queueing, claiming and
+retries are the shared Outbox (see app.utils.outbox).
+
+Providers (SMS_PROVIDER):
+    africastalking - SMSService (default)
+    local          - in-process stand-in that records messages, for tests
+                     and development
+"""
+
+import hashlib
+import logging
+import os
+import threading
+from datetime import datetime
+from sqlalchemy import func
+from app import db
+from app.utils.jobs import job_handler, periodic_task
+from app.utils.outbox import Outbox
+from app.utils.sms_service import format_phone_number
+
+logger = logging.getLogger(__name__)
+
+# Numbers per bulk request to the provider
+SMS_BATCH_SIZE = int(os.getenv('SMS_BATCH_SIZE', 100))
+
+# Messages one dispatcher job sends before handing over to the next
+SMS_DISPATCH_LIMIT = 2000
+
+# Messages per minute allowed per provider account, across all workers
+SMS_RATE_LIMIT = int(os.getenv('SMS_MESSAGES_PER_MINUTE', 1200))
+SMS_RATE_WINDOW = 60
+
+# First retry delay in seconds; doubles with every attempt
+SMS_RETRY_DELAY = 30
+
+# Seconds between dispatcher runs scheduled by the job workers (retries coming due)
+SMS_DISPATCH_INTERVAL = 60
+
+# Seconds a claimed batch may stay 'sending' before the sweep takes it back
+SMS_CLAIM_TIMEOUT = 120
+
+# Africa's Talking status codes that will never succeed on retry
+PERMANENT_FAILURES = {
+    403,  # InvalidPhoneNumber
+    404,  # UnsupportedNumberType
+    406,  # UserInBlacklist
+}
+SENT_STATUS_CODES = {100, 101, 102}  # Processed, Sent, Queued
+
+outbox = Outbox('sms_dispatch', 'app.models.sms.SmsMessage')
+
+class LocalSmsProvider:
+    """Records messages instead of sending them. Numbers in ``failures`` get that status code."""
+
+    account = 'local'
+
+    def __init__(self):
+        self.sent = []
+        self.requests = 0
+        self.failures = {}
+        self._lock = threading.Lock()
+
+    def send_batch(self, phone_numbers, message):
+        results = []
+        with self._lock:
+            self.requests += 1
+            for number in phone_numbers:
+                number = format_phone_number(number)
+                status_code = self.failures.get(number, 101)
+                if status_code in SENT_STATUS_CODES:
+                    self.sent.append((number, message))
+                results.append({
+                    'number': number,
+                    'status_code': status_code,
+                    'status': 'Success' if status_code in SENT_STATUS_CODES else 'Failed',
+                    'message_id': f'local-{len(self.sent)}' if status_code in SENT_STATUS_CODES else None,
+                    'cost': 'KES 0.0000'
+                })
+        return results
+
+    def clear(self):
+        with self._lock:
+            self.sent = []
+            self.requests = 0
+            self.failures = {}
+
+_sms_provider = None
+_provider_lock = threading.Lock()
+
+def create_sms_provider():
+    """Build the provider named by SMS_PROVIDER"""
+    if os.getenv('SMS_PROVIDER', 'africastalking') == 'local':
+        return LocalSmsProvider()
+    from app.utils.sms_service import sms_service
+    return sms_service
+
+def get_sms_provider():
+    """Process-wide SMS provider used by the dispatcher"""
+    global _sms_provider
+    if _sms_provider is None:
+        with _provider_lock:
+            if _sms_provider is None:
+                _sms_provider = create_sms_provider()
+    return _sms_provider
+
+def message_hash(message):
+    return hashlib.sha1(message.encode('utf-8')).hexdigest()
+
+def queue_sms(phone_numbers, message, category=None, chama_id=None, user_ids=None, dedupe_keys=None,
+              broadcast_id=None, max_attempts=5):
+    """Queue ``message`` for each number. Runs in the caller's transaction.
+
+    ``user_ids`` optionally maps each phone number to its recipient and
+    ``dedupe_keys`` to a key; a number whose key is already in the outbox is
+    skipped. ``broadcast_id`` marks the messages of a notification broadcast.
+    Blank and duplicate numbers are dropped. Returns the number of messages
+    queued.
+    """
+    user_ids = user_ids or {}
+    dedupe_keys = dedupe_keys or {}
+    numbers = {}
+    for phone in phone_numbers:
+        if phone and phone.strip():
+            numbers.setdefault(format_phone_number(phone), (user_ids.get(phone), dedupe_keys.get(phone)))
+    seen = outbox.known_keys([key for _, key in numbers.values()])
+
+    now = datetime.utcnow()
+    digest = message_hash(message)
+    return outbox.insert([
+        {'phone_number': number, 'message': message, 'message_hash': digest, 'category': category,
+         'dedupe_key': key, 'status': 'queued', 'attempts': 0, 'max_attempts': max_attempts,
+         'next_attempt_at': now, 'user_id': user_id, 'chama_id': chama_id, 'broadcast_id': broadcast_id,
+         'created_at': now}
+        for number, (user_id, key) in numbers.items() if key not in seen
+    ])
+
+def queue_sms_to_users(users, message, category=None, chama_id=None):
+    """queue_sms() for users, skipping those without a phone number"""
+    with_phone = [user for user in users if user.phone_number]
+    return queue_sms([user.phone_number for user in with_phone], message, category=category,
+                     chama_id=chama_id, user_ids={user.phone_number: user.id for user in with_phone})
+
+def _due_ids(digest, now, size):
+    from app.models.sms import SmsMessage
+
+    return [row[0] for row in db.session.query(SmsMessage.id).filter(
+        SmsMessage.message_hash == digest, *outbox.due(now)
+    ).order_by(SmsMessage.id).limit(size)]
+
+def _oldest_texts(now):
+    """Texts of the oldest due messages; each becomes one or more bulk batches"""
+    from app.models.sms import SmsMessage
+
+    return [digest for digest, _ in db.session.query(SmsMessage.message_hash, func.min(SmsMessage.id)).filter(
+        *outbox.due(now)
+    ).group_by(SmsMessage.message_hash).order_by(func.min(SmsMessage.id)).limit(10)]
+
+def _send(provider, batch, now):
+    """Send one claimed batch and record each recipient's outcome"""
+    try:
+        results = provider.send_batch([sms.phone_number for sms in batch], batch[0].message)
+    except Exception as e:
+        logger.warning(f"SMS batch of {len(batch)} failed: {e}")
+        for sms in batch:
+            outbox.retry_or_fail(sms, str(e), now, SMS_RETRY_DELAY)
+        return 0
+
+    by_number = {result['number']: result for result in results}
+    sent = 0
+    for sms in batch:
+        result = by_number.get(sms.phone_number)
+        if result is None:
+            outbox.retry_or_fail(sms, 'No result from provider', now, SMS_RETRY_DELAY)
+        elif result['status_code'] in SENT_STATUS_CODES:
+            sms.status = 'sent'
+            sms.sent_at = now
+            sms.claim_token = None
+            sms.provider_message_id = result.get('message_id')
+            sms.cost = result.get('cost')
+            sent += 1
+        elif result['status_code'] in PERMANENT_FAILURES:
+            sms.status = 'failed'
+            sms.claim_token = None
+            sms.last_error = result.get('status') or str(result['status_code'])
+        else:
+            outbox.retry_or_fail(sms, result.get('status') or str(result['status_code']), now, SMS_RETRY_DELAY)
+    return sent
+
+def dispatch_sms(limit=SMS_DISPATCH_LIMIT):
+    """Send due messages in coalesced batches, within the account's rate limit.
+
+    Returns {'sent': n, 'processed': n, 'throttled': bool}.
+    """
+    provider = get_sms_provider()
+    return outbox.dispatch(_oldest_texts, _due_ids, lambda batch, now: _send(provider, batch, now),
+                           limiter_key=f'sms:{provider.account}', rate_limit=SMS_RATE_LIMIT,
+                           rate_window=SMS_RATE_WINDOW, batch_size=SMS_BATCH_SIZE, limit=limit,
+                           claim_timeout=SMS_CLAIM_TIMEOUT)
+
+@job_handler('sms_dispatch')
+def process_dispatch(payload):
+    outbox.continue_dispatch(dispatch_sms(), SMS_RATE_WINDOW)
+
+@periodic_task('sms_dispatch', SMS_DISPATCH_INTERVAL)
+def schedule_dispatch():
+    """Release stalled claims and enqueue a dispatcher for retries coming due"""
+    outbox.schedule_dispatch()
+
+def outbox_stats():
+    """Message counts by status, for the health endpoint"""
+    return outbox.stats()
@@ -47,10 +47,7 @@ class SMSService:
         
         try:
             # Format phone number (ensure it starts with +254)
-            if phone_number.startswith('0'):
-                phone_number = '+254' + phone_number[1:]
-            elif not phone_number.startswith('+'):
-                phone_number = '+254' + phone_number
+            phone_number = format_phone_number(phone_number)
             
             # Send SMS
             response = self.sms.send(message, [phone_number])
@@ -79,14 +76,7 @@ class SMSService:
         
         try:
             # Format all phone numbers
-            formatted_numbers = []
-            for phone in phone_numbers:
-                if phone.startswith('0'):
-                    formatted_numbers.append('+254' + phone[1:])
-                elif not phone.startswith('+'):
-                    formatted_numbers.append('+254' + phone)
-                else:
-                    formatted_numbers.append(phone)
+            formatted_numbers = [format_phone_number(phone) for phone in phone_numbers]
             
             # Send bulk SMS
             response = self.sms.send(message, formatted_numbers)
@@ -111,9 +101,62 @@ class SMSService:
                 pass
             return False, f"Bulk SMS sending error: {str(e)}"
 
+    @property
+    def account(self):
+        """Africa's Talking username the messages are billed to"""
+        return os.getenv('AFRICASTALKING_USERNAME', 'sandbox')
+    
+    def send_batch(self, phone_numbers, message):
+        """Send one message to many numbers in a single request.
+        
+        Returns one {'number', 'status_code', 'status', 'message_id', 'cost'}
+        per recipient. Raises if the service is not configured or the request
+        itself fails, so the SMS outbox can retry the whole batch.
+        """
+        if not self.sms:
+            raise RuntimeError("SMS service not configured")
+        
+        response = self.sms.send(message, [format_phone_number(phone) for phone in phone_numbers])
+        return [
+            {
+                'number': recipient.get('number'),
+                'status_code': int(recipient.get('statusCode', 0)),
+                'status': recipient.get('status'),
+                'message_id': recipient.get('messageId'),
+                'cost': recipient.get('cost')
+            }
+            for recipient in response['SMSMessageData']['Recipients']
+        ]
+
+def format_phone_number(phone_number):
+    """Normalise a Kenyan phone number to +254..."""
+    phone_number = phone_number.strip().replace(' ', '')
+    if phone_number.startswith('0'):
+        return '+254' + phone_number[1:]
+    if not phone_number.startswith('+'):
+        return '+254' + phone_number
+    return phone_number
+
 # Global SMS service instance
 sms_service = SMSService()
 
+def _queue_bulk(users, message, category, chama=None, empty_message="No phone numbers found"):
+    """Queue one message to many users through the SMS outbox.
+    
+    Runs in the caller's transaction and does not commit: the queue_*
+    helpers built on it return (True, "N SMS queued") for rows that only
+    exist once the caller commits. The SMS dispatcher job sends them in
+    bulk batches, so large rosters never hold up the caller.
+    """
+    from app import db
+    from app.utils.sms_outbox import queue_sms_to_users
+    
+    queued = queue_sms_to_users(users, message, category=category, chama_id=chama.id if chama else None)
+    if not queued:
+        return False, empty_message
+    db.session.flush()
+    return True, f"{queued} SMS queued for delivery"
+
 def send_2fa_code_sms(phone_number, code):
     """Send 2FA code via SMS"""
     message = f"Your ChamaLink verification code is: {code}. This code expires in 10 minutes."
@@ -197,8 +240,8 @@ Please check your M-Pesa messages for confirmation.
     
     return sms_service.send_sms(user.phone, message)
 
-def send_bulk_meeting_reminder(chama, meeting_date):
-    """Send meeting reminder to all chama members"""
+def queue_bulk_meeting_reminder(chama, meeting_date):
+    """Queue a meeting reminder to all chama members. The caller commits."""
     from app.models.user import User
     from app.models.chama import chama_members
     from app import db
@@ -208,11 +251,6 @@ def send_bulk_meeting_reminder(chama, meeting_date):
         chama_members.c.chama_id == chama.id
     ).all()
     
-    phone_numbers = [member.phone for member in members if member.phone]
-    
-    if not phone_numbers:
-        return False, "No phone numbers found for members"
-    
     message = f"""
 Dear Members,
 Reminder: {chama.name} meeting scheduled for {meeting_date.strftime('%A, %B %d, %Y')}.
@@ -223,7 +261,7 @@ Please attend on time.
 - {chama.name} Management
 """.strip()
     
-    return sms_service.send_bulk_sms(phone_numbers, message)
+    return _queue_bulk(members, message, 'meeting_reminder', chama, empty_message="No phone numbers found for members")
 
 def send_chama_creation_sms(creator, chama):
     """Send SMS when a new chama is created"""
@@ -247,13 +285,8 @@ Join here: {join_link}
     
     return sms_service.send_sms(invitee_phone, message)
 
-def send_loan_application_sms(admins, applicant, chama, loan_amount):
-    """Send SMS to admins when new loan application is submitted"""
-    admin_phones = [admin.phone for admin in admins if admin.phone]
-    
-    if not admin_phones:
-        return False, "No admin phone numbers found"
-    
+def queue_loan_application_sms(admins, applicant, chama, loan_amount):
+    """Queue SMS to admins when new loan application is submitted. The caller commits."""
     message = f"""
 New Loan Alert - {chama.name}
 {applicant.first_name} {applicant.last_name} has applied for a loan of KES {loan_amount:,.2f}.
@@ -261,7 +294,7 @@ Please log in to ChamaLink to review and approve.
 - ChamaLink
 """.strip()
     
-    return sms_service.send_bulk_sms(admin_phones, message)
+    return _queue_bulk(admins, message, 'loan_application', chama, empty_message="No admin phone numbers found")
 
 def send_loan_repayment_reminder_sms(borrower, chama, amount_due, due_date):
     """Send SMS reminder for loan repayment"""
@@ -275,13 +308,8 @@ Please make payment via M-Pesa or contact your chama treasurer.
     
     return sms_service.send_sms(borrower.phone, message)
 
-def send_savings_goal_achievement_sms(members, chama, goal_name, amount_achieved):
-    """Send SMS when chama achieves a savings goal"""
-    member_phones = [member.phone for member in members if member.phone]
-    
-    if not member_phones:
-        return False, "No member phone numbers found"
-    
+def queue_savings_goal_achievement_sms(members, chama, goal_name, amount_achieved):
+    """Queue SMS when chama achieves a savings goal. The caller commits."""
     message = f"""
 🎉 Goal Achieved! - {chama.name}
 Congratulations! We've reached our savings goal '{goal_name}' with KES {amount_achieved:,.2f}!
@@ -289,15 +317,10 @@ Thank you for your commitment and contributions.
 - ChamaLink
 """.strip()
     
-    return sms_service.send_bulk_sms(member_phones, message)
+    return _queue_bulk(members, message, 'savings_goal', chama, empty_message="No member phone numbers found")
 
-def send_emergency_alert_sms(members, chama, alert_message, sender_name):
-    """Send emergency alert to all chama members"""
-    member_phones = [member.phone for member in members if member.phone]
-    
-    if not member_phones:
-        return False, "No member phone numbers found"
-    
+def queue_emergency_alert_sms(members, chama, alert_message, sender_name):
+    """Queue emergency alert to all chama members. The caller commits."""
     message = f"""
 🚨 URGENT - {chama.name}
 From: {sender_name}
@@ -306,7 +329,7 @@ Please respond or contact your chama officials immediately.
 - ChamaLink Emergency Alert
 """.strip()
     
-    return sms_service.send_bulk_sms(member_phones, message)
+    return _queue_bulk(members, message, 'emergency_alert', chama, empty_message="No member phone numbers found")
 
 def send_monthly_statement_sms(member, chama, total_contributions, total_loans, balance):
     """Send monthly financial statement summary"""
@@ -323,13 +346,8 @@ Full statement available on ChamaLink.
     
     return sms_service.send_sms(member.phone, message)
 
-def send_agm_reminder_sms(members, chama, agm_date, venue):
-    """Send AGM (Annual General Meeting) reminder"""
-    member_phones = [member.phone for member in members if member.phone]
-    
-    if not member_phones:
-        return False, "No member phone numbers found"
-    
+def queue_agm_reminder_sms(members, chama, agm_date, venue):
+    """Queue AGM (Annual General Meeting) reminder. The caller commits."""
     message = f"""
 AGM Reminder - {chama.name}
 Dear Members,
@@ -339,7 +357,7 @@ Attendance is mandatory. Please confirm your participation.
 - {chama.name} Management
 """.strip()
     
-    return sms_service.send_bulk_sms(member_phones, message)
+    return _queue_bulk(members, message, 'agm_reminder', chama, empty_message="No member phone numbers found")
 
 def send_late_payment_warning_sms(member, chama, overdue_amount, penalty_amount):
     """Send warning for late payments"""
@@ -367,13 +385,8 @@ Access your account: chamalink.co.ke
     
     return sms_service.send_sms(new_member.phone, message)
 
-def send_system_maintenance_sms(users, maintenance_date, duration):
-    """Send system maintenance notification"""
-    user_phones = [user.phone for user in users if user.phone]
-    
-    if not user_phones:
-        return False, "No user phone numbers found"
-    
+def queue_system_maintenance_sms(users, maintenance_date, duration):
+    """Queue system maintenance notification. The caller commits."""
     message = f"""
 System Maintenance Notice
 ChamaLink will be under maintenance on {maintenance_date.strftime('%B %d, %Y')} for {duration}.
@@ -381,15 +394,10 @@ Services will be temporarily unavailable. We apologize for any inconvenience.
 - ChamaLink Technical Team
 """.strip()
     
-    return sms_service.send_bulk_sms(user_phones, message)
+    return _queue_bulk(users, message, 'system_maintenance', empty_message="No user phone numbers found")
 
-def send_suspicious_activity_alert_sms(admins, chama, activity_description):
-    """Send alert for suspicious account activity"""
-    admin_phones = [admin.phone for admin in admins if admin.phone]
-    
-    if not admin_phones:
-        return False, "No admin phone numbers found"
-    
+def queue_suspicious_activity_alert_sms(admins, chama, activity_description):
+    """Queue alert for suspicious account activity. The caller commits."""
     message = f"""
 🔒 Security Alert - {chama.name}
 Suspicious activity detected: {activity_description}
@@ -397,4 +405,4 @@ Please log in to ChamaLink immediately to review and secure your account.
 - ChamaLink Security Team
 """.strip()
     
-    return sms_service.send_bulk_sms(admin_phones, message)
+    return _queue_bulk(admins, message, 'security_alert', chama, empty_message="No admin phone numbers found")
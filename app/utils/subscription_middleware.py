@@ -3,50 +3,185 @@ Subscription middleware for CHAMAlink
 Enforces trial and subscription limits
 """
 
-from flask import request, redirect, url_for, flash, g, current_app
+from flask import request, redirect, url_for, flash, g, current_app, session, has_request_context
 from flask_login import current_user
-from datetime import datetime
+from datetime import datetime, timezone
 from app.models.subscription import UserSubscription, SubscriptionPlan
 from functools import wraps
+import time
 import re
 
-def check_subscription_status():
-    """Check current user's subscription status"""
-    if not current_user.is_authenticated:
-        return None
-    
-    # Super admin bypasses all checks
-    if current_user.is_super_admin:
-        return 'admin_access'
-    
-    # Get current subscription
-    subscription = UserSubscription.query.filter_by(user_id=current_user.id).first()
-    
+# How long a good subscription state is trusted before it is re-read.
+# Entries also expire at the subscription's own trial/end date, whichever is sooner.
+SUBSCRIPTION_STATE_TTL = 300
+SUBSCRIPTION_STATE_KEY = 'subscription_state'
+
+# Days before the end date at which an expiry warning email goes out, once each
+EXPIRY_WARNING_DAYS = (7, 3, 1)
+
+def _utc_timestamp(value):
+    """Epoch seconds for a naive UTC datetime as stored on UserSubscription"""
+    return value.replace(tzinfo=timezone.utc).timestamp()
+
+def _subscription_boundary(subscription):
+    """Earliest moment the subscription stops being usable"""
+    boundaries = [subscription.end_date]
+    if subscription.is_trial:
+        boundaries.append(subscription.trial_end_date)
+    boundaries = [boundary for boundary in boundaries if boundary is not None]
+    return min(boundaries) if boundaries else None
+
+def _evaluate_subscription(subscription, now):
+    """Work out the effective status from the stored row without writing to it.
+
+    Expiry transitions are persisted by expire_subscriptions(), not here.
+    """
     if not subscription:
         return 'no_subscription'
-    
-    now = datetime.now()
-    
-    # Check if trial is expired
+
     if subscription.is_trial and subscription.trial_end_date and subscription.trial_end_date < now:
-        subscription.status = 'trial_expired'
-        from app import db
-        db.session.commit()
         return 'trial_expired'
-    
-    # Check if subscription is expired
+
     if subscription.end_date and subscription.end_date < now:
-        subscription.status = 'expired'
-        from app import db
-        db.session.commit()
         return 'expired'
-    
-    # Check status
+
     if subscription.status in ['trial_expired', 'expired', 'cancelled']:
         return subscription.status
-    
+
     return 'active'
 
+def _load_subscription_state(user_id):
+    """Read the user's latest subscription and build a cacheable snapshot"""
+    subscription = UserSubscription.query.filter_by(user_id=user_id).order_by(
+        UserSubscription.end_date.desc()
+    ).first()
+
+    now = datetime.utcnow()
+    state = {
+        'user_id': user_id,
+        'status': _evaluate_subscription(subscription, now),
+        'is_trial': bool(subscription and subscription.is_trial),
+        'end_date': _utc_timestamp(subscription.end_date) if subscription and subscription.end_date else None,
+        'expires_at': None
+    }
+
+    # Only cache states that grant access. Blocked users keep hitting the
+    # database, so a renewal recorded by another request takes effect at once.
+    if state['status'] == 'active':
+        expires_at = time.time() + SUBSCRIPTION_STATE_TTL
+        boundary = _subscription_boundary(subscription)
+        if boundary is not None:
+            expires_at = min(expires_at, _utc_timestamp(boundary))
+        state['expires_at'] = expires_at
+
+    return state
+
+def get_subscription_state():
+    """Current user's subscription snapshot, served from the session when fresh.
+
+    Returns a dict with status, is_trial and end_date (a UTC timestamp), or
+    None for anonymous users. Super admins get 'admin_access' without a lookup.
+    """
+    if not current_user.is_authenticated:
+        return None
+
+    if current_user.is_super_admin:
+        return {'user_id': current_user.id, 'status': 'admin_access', 'is_trial': False, 'end_date': None}
+
+    state = g.get('subscription_state')
+    if state is not None and state['user_id'] == current_user.id:
+        return state
+
+    cached = session.get(SUBSCRIPTION_STATE_KEY)
+    if (cached and cached.get('user_id') == current_user.id
+            and cached.get('expires_at') and cached['expires_at'] > time.time()):
+        state = cached
+    else:
+        state = _load_subscription_state(current_user.id)
+        if state['expires_at']:
+            session[SUBSCRIPTION_STATE_KEY] = state
+        elif SUBSCRIPTION_STATE_KEY in session:
+            session.pop(SUBSCRIPTION_STATE_KEY)
+
+    g.subscription_state = state
+    return state
+
+def invalidate_subscription_state():
+    """Forget the cached subscription state for the current request's user"""
+    if not has_request_context():
+        return
+    g.pop('subscription_state', None)
+    session.pop(SUBSCRIPTION_STATE_KEY, None)
+
+def check_subscription_status():
+    """Check current user's subscription status"""
+    state = get_subscription_state()
+    return state['status'] if state else None
+
+def expire_subscriptions(now=None):
+    """Persist trial and subscription expiry in bulk.
+
+    Meant to run from a scheduled job (see expire_subscriptions.py) so request
+    handlers never have to write status changes. Caller commits.
+    Returns (expired_trials, expired_subscriptions).
+    """
+    from app import db
+
+    now = now or datetime.utcnow()
+
+    expired_trials = UserSubscription.query.filter(
+        UserSubscription.is_trial.is_(True),
+        UserSubscription.trial_end_date < now,
+        UserSubscription.status == 'trial'
+    ).update({'status': 'trial_expired', 'updated_at': now}, synchronize_session=False)
+
+    expired_subscriptions = UserSubscription.query.filter(
+        UserSubscription.end_date < now,
+        UserSubscription.status.in_(['trial', 'active'])
+    ).update({'status': 'expired', 'updated_at': now}, synchronize_session=False)
+
+    db.session.flush()
+    return expired_trials, expired_subscriptions
+
+def queue_expiry_warnings(now=None):
+    """Queue an expiry warning email for each subscription nearing its end date.
+
+    A subscription is warned once per EXPIRY_WARNING_DAYS threshold it has
+    crossed; the outbox's dedupe key makes reruns (and renewals to the same
+    end date) harmless. Emails go out through the email outbox. Caller commits.
+    Returns the number of warnings queued.
+    """
+    import math
+    from datetime import timedelta
+    from sqlalchemy.orm import joinedload
+    from app.utils.email_service import email_service
+    from app.utils.email_outbox import queue_emails
+
+    now = now or datetime.utcnow()
+    subscriptions = UserSubscription.query.options(
+        joinedload(UserSubscription.user), joinedload(UserSubscription.plan)
+    ).filter(
+        UserSubscription.status.in_(['trial', 'active']),
+        UserSubscription.end_date > now,
+        UserSubscription.end_date <= now + timedelta(days=max(EXPIRY_WARNING_DAYS))
+    ).all()
+
+    messages = []
+    for subscription in subscriptions:
+        user = subscription.user
+        if not user.email:
+            continue
+        days_left = math.ceil((subscription.end_date - now).total_seconds() / 86400)
+        threshold = min(days for days in EXPIRY_WARNING_DAYS if days >= days_left)
+        subject, html_content = email_service.subscription_expiry_warning_content(
+            user, days_left, subscription.plan.name
+        )
+        messages.append({
+            'recipient': user.email, 'subject': subject, 'html_content': html_content, 'user_id': user.id,
+            'dedupe_key': f"expiry_warning:{subscription.id}:{subscription.end_date:%Y%m%d}:{threshold}"
+        })
+    return queue_emails(messages, category='subscription_warning')
+
 def require_active_subscription(f):
     """Decorator to require active subscription for route access"""
     @wraps(f)
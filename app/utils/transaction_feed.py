@@ -0,0 +1,186 @@
+"""
+CHAMAlink Transaction Feed
+==========================
+Cursor-paginated transaction listings for the mobile API and the chama
+transactions page.
+
+Pages are ordered newest first on (created_at, id) and continue from an
+opaque cursor holding the last row's key, so fetching page 500 costs the
+same index range scan as page 1 and rows inserted meanwhile never shift
+or duplicate entries. OFFSET pagination reads and discards every earlier
+row instead.
+
+Filters are applied in SQL; summary totals come from one aggregate query
+over the same filters. etag_json() lets clients revalidate a page with
+If-None-Match and get an empty 304 when nothing changed. feed_data() keeps
+each page with its totals and ETag in the fragment cache under the chamas'
+namespaces, so revalidating an unchanged page runs no queries at all.
+"""
+
+import base64
+import hashlib
+import json
+from datetime import datetime
+from flask import request, jsonify, current_app
+from sqlalchemy import and_, or_, case, desc, func
+from sqlalchemy.orm import joinedload
+
+FEED_PAGE_SIZE = 50
+FEED_MAX_PAGE_SIZE = 100
+
+def encode_cursor(transaction):
+    """Opaque cursor pointing just past ``transaction``"""
+    raw = f"{transaction.created_at.isoformat()}|{transaction.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    """(created_at, id) from a cursor. Raises ValueError if it is malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        created_at, transaction_id = raw.rsplit('|', 1)
+        return datetime.fromisoformat(created_at), int(transaction_id)
+    except Exception:
+        raise ValueError('Invalid cursor')
+
+def parse_filter(value):
+    """'contribution,loan' -> ['contribution', 'loan']; empty -> None"""
+    if not value:
+        return None
+    values = [item.strip() for item in value.split(',') if item.strip()]
+    return values or None
+
+def feed_query(chama_ids, user_id=None, types=None, statuses=None):
+    """Transactions of the given chamas (optionally one member's), filtered in SQL"""
+    from app.models.chama import Transaction
+
+    query = Transaction.query.filter(Transaction.chama_id.in_(chama_ids))
+    if user_id is not None:
+        query = query.filter(Transaction.user_id == user_id)
+    if types:
+        query = query.filter(Transaction.type.in_(types))
+    if statuses:
+        query = query.filter(Transaction.status.in_(statuses))
+    return query
+
+def transaction_page(chama_ids, cursor=None, limit=FEED_PAGE_SIZE, user_id=None, types=None, statuses=None):
+    """One page of transactions, newest first.
+
+    Returns {'transactions': [Transaction], 'next_cursor': str or None}.
+    """
+    from app.models.chama import Transaction
+
+    if not chama_ids:
+        return {'transactions': [], 'next_cursor': None}
+
+    query = feed_query(chama_ids, user_id, types, statuses).options(
+        joinedload(Transaction.user), joinedload(Transaction.chama)
+    )
+    if cursor:
+        created_at, transaction_id = decode_cursor(cursor)
+        # The redundant <= bound is what lets the planner seek the
+        # (chama_id, created_at) index instead of filtering from the top
+        query = query.filter(
+            Transaction.created_at <= created_at,
+            or_(Transaction.created_at < created_at, Transaction.id < transaction_id)
+        )
+
+    rows = query.order_by(desc(Transaction.created_at), desc(Transaction.id)).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return {
+        'transactions': rows,
+        'next_cursor': encode_cursor(rows[-1]) if has_more else None
+    }
+
+def transaction_summary(chama_ids, user_id=None, types=None, statuses=None):
+    """Totals over every transaction matching the filters, in one aggregate query"""
+    from app.models.chama import Transaction
+
+    if not chama_ids:
+        return {'count': 0, 'total_contributions': 0.0, 'total_withdrawals': 0.0, 'pending_count': 0, 'balance': 0.0}
+
+    completed = Transaction.status == 'completed'
+    contributions = func.sum(case((Transaction.type == 'contribution', Transaction.amount), else_=0))
+    withdrawals = func.sum(case((Transaction.type == 'withdrawal', Transaction.amount), else_=0))
+    balance = func.sum(case(
+        (and_(completed, Transaction.type == 'contribution'), Transaction.amount),
+        (and_(completed, Transaction.type == 'withdrawal'), -Transaction.amount),
+        else_=0
+    ))
+    pending = func.sum(case((Transaction.status == 'pending', 1), else_=0))
+
+    row = feed_query(chama_ids, user_id, types, statuses).with_entities(
+        func.count(Transaction.id), contributions, withdrawals, pending, balance
+    ).one()
+    return {
+        'count': row[0] or 0,
+        'total_contributions': float(row[1] or 0),
+        'total_withdrawals': float(row[2] or 0),
+        'pending_count': int(row[3] or 0),
+        'balance': float(row[4] or 0)
+    }
+
+def feed_data(chama_ids, cursor=None, limit=FEED_PAGE_SIZE, types=None, statuses=None):
+    """A page with its filtered totals, as the mobile API serves it, and its ETag.
+
+    Cached per chama namespace version, so any committed write to the
+    chamas' transactions builds a fresh entry. Returns (data, etag); raises
+    ValueError for a malformed cursor.
+    """
+    from app.utils.fragment_cache import cached_fragment, chama_namespace
+
+    def build():
+        page = transaction_page(chama_ids, cursor, limit, types=types, statuses=statuses)
+        summary = transaction_summary(chama_ids, types=types, statuses=statuses)
+        data = {
+            'transactions': [serialize_transaction(t) for t in page['transactions']],
+            'pagination': {
+                'limit': limit,
+                'next_cursor': page['next_cursor'],
+                'has_more': page['next_cursor'] is not None
+            },
+            'total_count': summary['count'],
+            'summary': summary
+        }
+        return {'data': data, 'etag': json_etag(data)}
+
+    # One JSON part, so filter values cannot imitate the namespaces that follow it in the key
+    entry = cached_fragment('transaction_feed', sorted(chama_namespace(chama_id) for chama_id in set(chama_ids)),
+                            build, parts=(json.dumps([cursor, limit, types, statuses]),))
+    return entry['data'], entry['etag']
+
+def serialize_transaction(transaction):
+    """Mobile API representation of a Transaction (load user and chama eagerly)"""
+    return {
+        'id': transaction.id,
+        'chama_id': transaction.chama_id,
+        'chama_name': transaction.chama.name if transaction.chama else None,
+        'type': transaction.type,
+        'amount': float(transaction.amount or 0),
+        'currency': transaction.currency or 'KES',
+        'date': transaction.created_at.isoformat() + 'Z' if transaction.created_at else None,
+        'status': transaction.status,
+        'description': transaction.description,
+        'member_name': transaction.user.username if transaction.user else None,
+        'reference': transaction.transaction_id
+    }
+
+def json_etag(data):
+    """Strong ETag for a JSON-serializable value"""
+    body = json.dumps(data, sort_keys=True, default=str, separators=(',', ':'))
+    return hashlib.sha1(body.encode()).hexdigest()
+
+def etag_json(data, etag=None):
+    """{'success': True, 'data': data} with a strong ETag, or an empty 304 if the client has it.
+
+    Pass ``etag`` when it is already known (e.g. cached with the data).
+    """
+    etag = etag or json_etag(data)
+    if request.if_none_match.contains(etag):
+        response = current_app.response_class(status=304)
+    else:
+        response = jsonify({'success': True, 'data': data})
+    response.set_etag(etag)
+    # Always revalidate: the ETag makes an unchanged page cost one round trip
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Chart Benchmark
+Seeds a throwaway database with a busy chama and requests the report
+dashboard charts. Times the old pyplot path (every transaction loaded,
+300 dpi) against the chart service cold and warm, and checks that the SQL
+series match a Python recount, that repeated views are cache reads, that
+size and dpi requests are honoured in fixed steps that share cache entries,
+that a new transaction retires the cached charts, that the JSON series
+format works and that concurrent renders in threads produce identical
+images without touching pyplot.
+
+Usage:
+    python benchmark_charts.py                          # 20000 transactions
+    python benchmark_charts.py --transactions 100000
+"""
+
+import argparse
+import base64
+import os
+import random
+import struct
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+def png_size(image_base64):
+    """(width, height) in pixels from a PNG's IHDR chunk"""
+    return struct.unpack('>II', base64.b64decode(image_base64)[16:24])
+
+def old_chart(Transaction, chama_id, start_dt, end_dt):
+    """The previous contributions chart: every row loaded, pyplot state machine, 300 dpi"""
+    import io
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    plt.style.use('seaborn-v0_8')
+    fig, ax = plt.subplots(figsize=(10, 6))
+    monthly = {}
+    for transaction in Transaction.query.filter(
+            Transaction.chama_id == chama_id, Transaction.type == 'contribution',
+            Transaction.created_at >= start_dt, Transaction.created_at < end_dt).all():
+        month = transaction.created_at.strftime('%Y-%m')
+        monthly[month] = monthly.get(month, 0) + transaction.amount
+    ax.bar(list(monthly), list(monthly.values()), color='#28a745')
+    plt.tight_layout()
+    buffer = io.BytesIO()
+    plt.savefig(buffer, format='png', dpi=300, bbox_inches='tight')
+    plt.close()
+    return base64.b64encode(buffer.getvalue()).decode(), monthly
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the chart service')
+    parser.add_argument('--transactions', type=int, default=20000, help='Transactions in the chama')
+    parser.add_argument('--members', type=int, default=30, help='Members contributing')
+    parser.add_argument('--seed', type=int, default=5, help='Random seed')
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    workdir = tempfile.mkdtemp(prefix='chamalink-charts-')
+    os.environ['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(workdir, 'charts.db')}"
+    os.environ['JOB_WORKER_CONCURRENCY'] = '0'
+
+    from app import create_app, db
+    from app.models import User, Chama, Transaction
+    from app.utils.charts import render_chart, chart_series, CHART_TYPES
+    from app.utils.fragment_cache import get_fragment_cache
+
+    app = create_app()
+    app.config['WTF_CSRF_ENABLED'] = False
+
+    with app.app_context():
+        print("📈 CHART BENCHMARK")
+        print("=" * 50)
+        db.create_all()
+
+        users = [User(username=f'member{i}', email=f'member{i}@example.com', password_hash='x')
+                 for i in range(args.members)]
+        db.session.add_all(users)
+        db.session.flush()
+        chama = Chama(name='Busy Chama', creator_id=users[0].id, total_balance=0.0)
+        db.session.add(chama)
+        db.session.flush()
+        for user in users:
+            chama.add_member(user.id)
+        now = datetime.utcnow()
+        types = ['contribution'] * 6 + ['loan_repayment', 'loan_disbursement', 'withdrawal', 'penalty_payment']
+        db.session.bulk_insert_mappings(Transaction, [
+            {'type': random.choice(types), 'amount': float(random.randint(1, 100) * 50), 'status': 'completed',
+             'user_id': random.choice(users).id, 'chama_id': chama.id,
+             'created_at': now - timedelta(minutes=random.randint(0, 364 * 24 * 60))}
+            for _ in range(args.transactions)
+        ])
+        db.session.commit()
+        print(f"✅ Seeded {args.transactions} transactions")
+
+        start_date = (now - timedelta(days=365)).strftime('%Y-%m-%d')
+        end_date = now.strftime('%Y-%m-%d')
+        start_dt = datetime.strptime(start_date, '%Y-%m-%d')
+        end_dt = datetime.strptime(end_date, '%Y-%m-%d') + timedelta(days=1)
+
+        started = time.perf_counter()
+        _, old_monthly = old_chart(Transaction, chama.id, start_dt, end_dt)
+        old_ms = (time.perf_counter() - started) * 1000
+
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['_user_id'] = str(users[1].id)
+        url = f'/reports/chama/{chama.id}/chart/%s?start_date={start_date}&end_date={end_date}'
+
+        timings = {}
+        for chart_type in CHART_TYPES:
+            started = time.perf_counter()
+            cold = client.get(url % chart_type)
+            cold_ms = (time.perf_counter() - started) * 1000
+            started = time.perf_counter()
+            warm = client.get(url % chart_type)
+            warm_ms = (time.perf_counter() - started) * 1000
+            timings[chart_type] = (cold, warm, cold_ms, warm_ms)
+            print(f"⏱️  {chart_type}: {cold_ms:.0f}ms cold, {warm_ms:.1f}ms cached")
+        print(f"🐢 Old contributions chart: {old_ms:.0f}ms")
+
+        cold, warm, cold_ms, warm_ms = timings['contributions']
+        image = cold.get_json()['image']
+        hits = get_fragment_cache().stats()['fragments'].get('chart_image', {}).get('hits', 0)
+
+        # Series agree with a Python recount of every transaction
+        series = client.get(url % 'contributions' + '&format=json').get_json()['series']
+        series_ok = series['labels'] == sorted(old_monthly) and all(
+            abs(value - old_monthly[label]) < 1e-6 for label, value in zip(series['labels'], series['values']))
+        rows = Transaction.query.filter(Transaction.chama_id == chama.id, Transaction.created_at >= start_dt,
+                                        Transaction.created_at < end_dt).all()
+        expected_balance = sum(t.amount for t in rows if t.type in ('contribution', 'loan_repayment', 'penalty_payment')) \
+            - sum(t.amount for t in rows if t.type == 'loan_disbursement')
+        trend = chart_series(chama.id, 'balance_trend', start_dt, end_dt)
+        trend_ok = abs(trend['values'][-1] - expected_balance) < 1e-6
+
+        default_size = png_size(image)
+        hires = client.get(url % 'contributions' + '&dpi=200&width=5&height=3').get_json()['image']
+        hires_size = png_size(hires)
+        clamped = client.get(url % 'contributions' + '&dpi=5000').get_json()['image']
+
+        # Sizes a hair apart round to the same step and share one cached image
+        fragments = get_fragment_cache().stats()['fragments']['chart_image']
+        nudged = [client.get(url % 'contributions' + f'&dpi=201&width={width}&height=3.0{i}').get_json()['image']
+                  for i, width in enumerate(('5.01', '4.98', '5.1', '5'))]
+        after = get_fragment_cache().stats()['fragments']['chart_image']
+        rounded_ok = len(set(nudged)) == 1 and nudged[0] == hires and after['misses'] == fragments['misses']
+
+        # A new contribution moves the chama's data version
+        db.session.add(Transaction(type='contribution', amount=123456.0, user_id=users[2].id, chama_id=chama.id,
+                                   created_at=now - timedelta(hours=1)))
+        db.session.commit()
+        refreshed = client.get(url % 'contributions' + '&format=json').get_json()['series']
+        invalidated = abs(sum(refreshed['values']) - sum(series['values']) - 123456.0) < 1e-6
+
+        # Thread-safe rendering
+        data = chart_series(chama.id, 'contributions', start_dt, end_dt)
+        reference = render_chart('contributions', data)
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(lambda _: render_chart('contributions', data), range(16)))
+
+        unknown = client.get(url % 'nonsense')
+        bad_date = client.get(f'/reports/chama/{chama.id}/chart/contributions?start_date=yesterday')
+
+        checks = [
+            ('Every chart renders', all(t[0].status_code == 200 and t[0].get_json().get('image') for t in timings.values())),
+            ('Repeated view is a cache read', warm.get_json()['image'] == image and hits >= len(CHART_TYPES)),
+            ('Cached view much faster than the old chart', warm_ms * 10 < old_ms),
+            ('Cold render faster than the old chart', cold_ms < old_ms),
+            ('Monthly series matches a full recount', series_ok),
+            ('Balance trend ends at the recounted balance', trend_ok),
+            ('Default is screen resolution', default_size[0] <= 1000),
+            ('Requested size and dpi honoured', hires_size != default_size and hires_size[0] <= 1000),
+            ('Absurd dpi clamped', png_size(clamped)[0] <= 3000),
+            ('Nearby sizes share one cached image', rounded_ok),
+            ('New transaction retires cached charts', invalidated),
+            ('Concurrent renders identical', all(result == reference for result in results)),
+            ('Unknown chart type and bad dates rejected', unknown.status_code == 404 and bad_date.status_code == 400),
+        ]
+
+        print("\n🔍 Verification")
+        for label, passed in checks:
+            print(f"   {'✅' if passed else '❌'} {label}")
+
+        success = all(passed for _, passed in checks)
+        print("\n🎉 Chart benchmark passed" if success else "\n❌ Chart benchmark failed")
+        return success
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Dashboard Cache Benchmark
+Seeds a throwaway database with a few busy chamas, then times the main
+dashboard, chama detail, chama dashboard and chama analytics pages cold
+and warm, and checks that committing a transaction, a loan application, a
+penalty or a membership change invalidates exactly the affected pages.
+
+Usage:
+    python benchmark_dashboards.py                        # 20000 transactions
+    python benchmark_dashboards.py --transactions 100000 --requests 50
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the dashboard fragment cache')
+    parser.add_argument('--transactions', type=int, default=20000, help='Transactions per chama')
+    parser.add_argument('--chamas', type=int, default=3, help='Chamas the viewer belongs to')
+    parser.add_argument('--members', type=int, default=40, help='Members per chama')
+    parser.add_argument('--requests', type=int, default=20, help='Warm requests per page')
+    parser.add_argument('--seed', type=int, default=5, help='Random seed')
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    workdir = tempfile.mkdtemp(prefix='chamalink-dashboards-')
+    os.environ['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(workdir, 'dashboards.db')}"
+    os.environ['JOB_WORKER_CONCURRENCY'] = '0'
+    os.environ['FRAGMENT_CACHE_BACKEND'] = 'memory'
+
+    from app import create_app, db
+    from app.models import User, Chama, Transaction, LoanApplication, Penalty
+    from app.utils.fragment_cache import get_fragment_cache
+
+    app = create_app()
+    app.config['WTF_CSRF_ENABLED'] = False
+
+    with app.app_context():
+        print("🗂️  DASHBOARD CACHE BENCHMARK")
+        print("=" * 50)
+        db.create_all()
+
+        users = [User(username=f'member{i}', email=f'member{i}@example.com', password_hash='x') for i in range(args.members)]
+        db.session.add_all(users)
+        db.session.flush()
+        chamas = [Chama(name=f'Chama {i}', creator_id=users[0].id, total_balance=0.0) for i in range(args.chamas)]
+        other = Chama(name='Unrelated Chama', creator_id=users[1].id, total_balance=0.0)
+        db.session.add_all(chamas + [other])
+        db.session.flush()
+        for chama in chamas:
+            chama.add_member(users[0].id, 'creator')
+            for user in users[1:]:
+                chama.add_member(user.id)
+        other.add_member(users[1].id, 'creator')
+
+        now = datetime.utcnow()
+        types = ['contribution'] * 6 + ['loan', 'loan_repayment', 'withdrawal']
+        for chama in chamas:
+            db.session.bulk_insert_mappings(Transaction, [
+                {'type': random.choice(types), 'amount': float(random.randint(1, 100) * 50), 'status': 'completed',
+                 'user_id': random.choice(users).id, 'chama_id': chama.id, 'description': 'Seeded',
+                 'created_at': now - timedelta(minutes=random.randint(0, 180 * 24 * 60))}
+                for _ in range(args.transactions)
+            ])
+        db.session.commit()
+        print(f"✅ Seeded {args.chamas} chamas x {args.transactions} transactions, {args.members} members each")
+
+        cache = get_fragment_cache()
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['_user_id'] = str(users[0].id)
+
+        target = chamas[0]
+        pages = {
+            'main.dashboard': '/dashboard',
+            'chama.chama_detail': f'/chama/{target.id}',
+            'chama.chama_dashboard': f'/chama/{target.id}/dashboard',
+            'reports.chama_analytics': f'/reports/chama/{target.id}/analytics',
+        }
+
+        def timed(url):
+            started = time.perf_counter()
+            response = client.get(url)
+            return response, (time.perf_counter() - started) * 1000
+
+        print(f"\n⏱️  {'Page':<26}{'cold':>10}{'warm':>10}{'speedup':>10}")
+        statuses = {}
+        speedups = {}
+        for name, url in pages.items():
+            response, cold = timed(url)
+            warm = sorted(timed(url)[1] for _ in range(args.requests))[args.requests // 2]
+            statuses[name] = response.status_code
+            speedups[name] = cold / warm if warm else float('inf')
+            print(f"   {name:<26}{cold:>8.1f}ms{warm:>8.1f}ms{speedups[name]:>9.1f}x")
+
+        def misses():
+            return {name: counter['misses'] for name, counter in cache.stats()['fragments'].items()}
+
+        def refetch_all():
+            before = misses()
+            for url in pages.values():
+                client.get(url)
+            after = misses()
+            return {name for name in after if after[name] != before.get(name, 0)}
+
+        refetch_all()
+        db.session.add(Transaction(type='contribution', amount=1234.0, user_id=users[2].id, chama_id=target.id))
+        db.session.commit()
+        after_transaction = refetch_all()
+
+        db.session.add(LoanApplication(amount=5000.0, purpose='Stock', repayment_period=6, user_id=users[0].id,
+                                       chama_id=target.id))
+        db.session.commit()
+        after_loan = refetch_all()
+
+        db.session.add(Penalty(type='late_payment', amount=100.0, user_id=users[3].id, chama_id=target.id))
+        db.session.commit()
+        after_penalty = refetch_all()
+
+        other.add_member(users[0].id)
+        db.session.commit()
+        after_join = refetch_all()
+
+        db.session.add(Transaction(type='contribution', amount=99.0, user_id=users[1].id, chama_id=other.id))
+        db.session.rollback()
+        after_rollback = refetch_all()
+
+        detail = client.get(pages['chama.chama_detail'])
+        stats = client.get('/health/').get_json()['caches']['fragments']
+        print(f"\n📈 Health endpoint: {stats['hits']} hits, {stats['misses']} misses, hit rate {stats['hit_rate']}")
+
+        every_chama_page = {'main.dashboard', 'chama.chama_detail', 'chama.chama_dashboard.members',
+                            'chama.chama_dashboard.transactions', 'chama.chama_dashboard.monthly',
+                            'reports.chama_analytics'}
+        checks = [
+            ('All pages render', all(status == 200 for status in statuses.values())),
+            ('Warm requests are faster', all(speedup > 1.5 for speedup in speedups.values())),
+            ('New transaction invalidates every page of its chama', after_transaction == every_chama_page),
+            ('New transaction shows up', b'KES 1,234' in detail.data),
+            ('Loan application invalidates its chama', after_loan == every_chama_page),
+            ('Penalty invalidates its chama', after_penalty == every_chama_page),
+            ('Joining another chama only invalidates the main dashboard', after_join == {'main.dashboard'}),
+            ('Rolled-back writes invalidate nothing', after_rollback == set()),
+            ('Health endpoint reports hits and misses', stats['hits'] > 0 and stats['misses'] > 0),
+        ]
+
+        print("\n🔍 Verification")
+        for label, passed in checks:
+            print(f"   {'✅' if passed else '❌'} {label}")
+
+        success = all(passed for _, passed in checks)
+        print("\n🎉 Dashboard cache benchmark passed" if success else "\n❌ Dashboard cache benchmark failed")
+        return success
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
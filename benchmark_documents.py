@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+Document Benchmark
+Seeds a throwaway database with a chama, its transactions, receipts and
+meeting minutes, and stores artifacts in a temporary directory. Times a
+receipt download rendered in the request (the old path) against one served
+from the artifact store, and a month-end statement run rendered one by one
+against the batch job on the render pool. Checks that stored documents are
+served without re-rendering, that reports are redrawn when their figures
+or the layout version change, that identical PDFs share one blob, that a rerun of the statement
+job renders nothing, that members only get their own statements and that
+X-Accel-Redirect hands the transfer to the web server.
+
+Usage:
+    python benchmark_documents.py                        # 300 members
+    python benchmark_documents.py --members 2000 --workers 8
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the document rendering pool and artifact store')
+    parser.add_argument('--members', type=int, default=300, help='Members receiving a statement')
+    parser.add_argument('--transactions', type=int, default=3000, help='Transactions in the statement month')
+    parser.add_argument('--workers', type=int, default=2, help='PDF render processes')
+    parser.add_argument('--downloads', type=int, default=50, help='Receipt downloads to time')
+    parser.add_argument('--seed', type=int, default=3, help='Random seed')
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    workdir = tempfile.mkdtemp(prefix='chamalink-documents-')
+    os.environ['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(workdir, 'documents.db')}"
+    os.environ['JOB_WORKER_CONCURRENCY'] = '0'
+    os.environ['ARTIFACT_STORE_PATH'] = os.path.join(workdir, 'artifacts')
+    os.environ['PDF_RENDER_WORKERS'] = str(args.workers)
+
+    from app import create_app, db
+    from app.models import User, Chama, Transaction, Receipt, DocumentArtifact
+    from app.models.meeting_minutes import MeetingMinutes
+    from app.utils import documents
+    from app.utils.jobs import run_pending_jobs
+    from app.utils.s3_utils import get_artifact_store
+
+    app = create_app()
+    app.config['WTF_CSRF_ENABLED'] = False
+
+    with app.app_context():
+        print("🧾 DOCUMENT BENCHMARK")
+        print("=" * 50)
+        db.create_all()
+
+        db.session.bulk_insert_mappings(User, [
+            {'username': f'member{i}', 'email': f'member{i}@example.com', 'password_hash': 'x',
+             'first_name': 'Member', 'last_name': str(i)}
+            for i in range(args.members)
+        ])
+        db.session.flush()
+        user_ids = [row[0] for row in db.session.query(User.id).order_by(User.id)]
+        chama = Chama(name='Statement Chama', creator_id=user_ids[0], total_balance=0.0, status='active')
+        db.session.add(chama)
+        db.session.flush()
+        chama.add_member(user_ids[0], role='treasurer')
+        for user_id in user_ids[1:]:
+            chama.add_member(user_id)
+        outsider = User(username='outsider', email='outsider@example.com', password_hash='x')
+        db.session.add(outsider)
+
+        period = documents.previous_period()
+        month_start, month_end = documents.period_bounds(period)
+        types = ['contribution'] * 6 + ['loan_repayment', 'loan_disbursement', 'penalty_payment']
+        db.session.bulk_insert_mappings(Transaction, [
+            {'type': random.choice(types), 'amount': float(random.randint(1, 100) * 50), 'status': 'completed',
+             'user_id': random.choice(user_ids), 'chama_id': chama.id, 'transaction_id': f'QX{n:06d}',
+             'created_at': month_start + timedelta(seconds=random.randint(0, int((month_end - month_start).total_seconds()) - 1))}
+            for n in range(args.transactions)
+        ] + [
+            {'type': 'contribution', 'amount': 1000.0, 'status': 'completed', 'user_id': user_id,
+             'chama_id': chama.id, 'created_at': month_start - timedelta(days=40)}
+            for user_id in user_ids
+        ])
+        receipt = Receipt(user_id=user_ids[1], chama_id=chama.id, receipt_number='STA-0001',
+                          receipt_type='contribution', amount=2500.0, payment_reference='QX000001',
+                          description='Monthly contribution', generated_at=datetime(2026, 9, 30, 10, 15))
+        db.session.add(receipt)
+        db.session.add(MeetingMinutes(chama_id=chama.id, secretary_id=user_ids[0], meeting_date=month_start.date(),
+                                      meeting_title='AGM <2026> & budget', attendees=['Member 0', 'Member 1'],
+                                      minutes_content='Opened at 10am.\nLoan cap < 50,000 & rate > 10% agreed.',
+                                      decisions_made='Approve budget'))
+        db.session.commit()
+        print(f"✅ Seeded {args.members} members, {args.transactions} transactions in {period}")
+
+        def client_for(user_id):
+            client = app.test_client()
+            with client.session_transaction() as session:
+                session['_user_id'] = str(user_id)
+            return client
+
+        member = client_for(user_ids[1])
+        treasurer = client_for(user_ids[0])
+
+        def download_ms():
+            with app.app_context():
+                started = time.perf_counter()
+                response = member.get(f'/receipts/receipt/{receipt.id}/download')
+                pdf = response.get_data()
+                response.close()
+                return (time.perf_counter() - started) * 1000, response.status_code, pdf
+
+        # The old path: every download built the receipt in the request. Same
+        # request both ways, medians, so only the rendering differs.
+        receipt_key = f'receipt:{receipt.id}'
+        rendered_times = []
+        for _ in range(args.downloads):
+            DocumentArtifact.query.filter_by(document_key=receipt_key).delete()
+            db.session.commit()
+            rendered_times.append(download_ms()[0])
+        old_ms = statistics.median(rendered_times)
+
+        _, first_status, first_pdf = download_ms()
+        rendered_at = DocumentArtifact.query.filter_by(document_key=receipt_key).one().rendered_at
+        stored_times = []
+        for _ in range(args.downloads):
+            elapsed, _, pdf = download_ms()
+            stored_times.append(elapsed)
+        stored_ms = statistics.median(stored_times)
+        artifact = DocumentArtifact.query.filter_by(document_key=f'receipt:{receipt.id}').one()
+        served_rendered_at = artifact.rendered_at
+        print(f"\n⏱️  Receipt download: {old_ms:.1f}ms rendered in the request, {stored_ms:.1f}ms from storage")
+
+        with app.app_context():
+            denied = client_for(outsider.id).get(f'/receipts/receipt/{receipt.id}/download')
+
+        # Reports are redrawn only when their figures change
+        with app.app_context():
+            report_a = treasurer.get(f'/chama/{chama.id}/download/financial-report')
+            report_a.close()
+        hash_a = DocumentArtifact.query.filter_by(document_key=f'financial_report:{chama.id}').one().content_hash
+        with app.app_context():
+            treasurer.get(f'/chama/{chama.id}/download/financial-report').close()
+        hash_b = DocumentArtifact.query.filter_by(document_key=f'financial_report:{chama.id}').one().content_hash
+        db.session.add(Transaction(type='contribution', amount=777.0, user_id=user_ids[2], chama_id=chama.id))
+        chama.total_balance = (chama.total_balance or 0) + 777.0
+        db.session.commit()
+        with app.app_context():
+            treasurer.get(f'/chama/{chama.id}/download/financial-report').close()
+        hash_c = DocumentArtifact.query.filter_by(document_key=f'financial_report:{chama.id}').one().content_hash
+
+        start_date, end_date = month_start.strftime('%Y-%m-%d'), (month_end - timedelta(days=1)).strftime('%Y-%m-%d')
+        with app.app_context():
+            chama_report = treasurer.get(f'/reports/chama/{chama.id}/export/pdf?start_date={start_date}&end_date={end_date}')
+            chama_report_ok = chama_report.status_code == 200 and chama_report.get_data().startswith(b'%PDF')
+            chama_report.close()
+        with app.app_context():
+            minutes = treasurer.get(f'/minutes/{chama.id}/download-all')
+            minutes_ok = minutes.status_code == 200 and minutes.get_data().startswith(b'%PDF')
+            minutes.close()
+
+        # Month-end statements: one at a time in the request vs the batch job on the pool
+        statements = documents.statements_data(chama.id, period)
+        sample = user_ids[:min(50, len(user_ids))]
+        started = time.perf_counter()
+        for user_id in sample:
+            documents.render_pdf('statement', statements[user_id])
+        serial_s = (time.perf_counter() - started) / len(sample) * len(statements)
+
+        documents.queue_monthly_statements(period)
+        db.session.commit()
+        started = time.perf_counter()
+        while run_pending_jobs():
+            pass
+        batch_s = time.perf_counter() - started
+        stored = DocumentArtifact.query.filter_by(kind='statement').count()
+        print(f"📚 {len(statements)} statements: ~{serial_s:.1f}s one by one, {batch_s:.1f}s as a batch job "
+              f"({args.workers} render processes on {os.cpu_count()} CPUs)")
+
+        rerendered = documents.render_chama_statements(chama.id, period)
+        db.session.commit()
+        pooled = statements[user_ids[3]]
+        pool_matches_inline = documents.render_documents('statement', [pooled])[0] == documents.render_pdf('statement', pooled)
+
+        own_key = documents.statement_key(chama.id, user_ids[1], period)
+        own_hash = DocumentArtifact.query.filter_by(document_key=own_key).one().content_hash
+        with app.app_context():
+            own = member.get(f'/receipts/chama/{chama.id}/statement/{period}')
+            own_pdf = own.get_data()
+            own.close()
+        with app.app_context():
+            stranger = client_for(outsider.id).get(f'/receipts/chama/{chama.id}/statement/{period}')
+
+        store = get_artifact_store()
+        blobs = sum(len(files) for _, _, files in os.walk(store.root))
+        same_key = store.put(first_pdf) == artifact.content_hash
+        blobs_after = sum(len(files) for _, _, files in os.walk(store.root))
+
+        # A layout change redraws even documents whose data is never re-read
+        documents.DOCUMENT_LAYOUT_VERSION += 1
+        download_ms()
+        db.session.expire_all()
+        redrawn = DocumentArtifact.query.filter_by(document_key=receipt_key).one()
+        relaid = redrawn.rendered_at != rendered_at and redrawn.layout_version == documents.DOCUMENT_LAYOUT_VERSION
+        documents.DOCUMENT_LAYOUT_VERSION -= 1
+
+        os.environ['ARTIFACT_ACCEL_REDIRECT_PREFIX'] = '/protected-artifacts'
+        with app.app_context():
+            accel = member.get(f'/receipts/receipt/{receipt.id}/download')
+        del os.environ['ARTIFACT_ACCEL_REDIRECT_PREFIX']
+
+        checks = [
+            ('Receipt downloads are PDFs', first_status == 200 and first_pdf.startswith(b'%PDF')),
+            ('Stored receipt served without re-rendering', pdf == first_pdf and served_rendered_at == rendered_at),
+            ('Stored download faster than rendering', stored_ms < old_ms),
+            ('Layout version bump redraws a stored receipt', relaid),
+            ('Outsider cannot download the receipt', denied.status_code == 302),
+            ('Unchanged report not redrawn', hash_a == hash_b),
+            ('Changed figures redraw the report', hash_c != hash_b),
+            ('Period report and minutes render', chama_report_ok and minutes_ok),
+            ('Statement job stored one per member', stored == len(statements) == args.members),
+            ('Rerun renders nothing', rerendered == 0),
+            ('Pool output identical to inline rendering', pool_matches_inline),
+            ('Member downloads their stored statement',
+             own.status_code == 200 and documents.get_artifact_store().get(own_hash) == own_pdf),
+            ('Non-member refused a statement', stranger.status_code == 302),
+            ('Identical bytes share one blob', same_key and blobs_after == blobs),
+            ('X-Accel-Redirect hands off the transfer',
+             accel.headers.get('X-Accel-Redirect', '').startswith('/protected-artifacts/') and not accel.get_data()),
+        ]
+
+        print("\n🔍 Verification")
+        for label, passed in checks:
+            print(f"   {'✅' if passed else '❌'} {label}")
+
+        success = all(passed for _, passed in checks)
+        print("\n🎉 Document benchmark passed" if success else "\n❌ Document benchmark failed")
+        return success
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""
+Email Outbox Benchmark
+Runs a local SMTP stand-in (aiosmtpd when installed, otherwise the stdlib
+smtpd module) that adds a fixed delay to every new session, like the TLS
+handshake and login of a real provider. Queues subscription expiry
+warnings for a throwaway database full of subscriptions and drains the job
+outbox. Reports the throughput against the old connection-per-message
+send, and checks on the server's session count that sessions are reused.
+Also checks that warnings are queued once, that temporary failures are
+retried and permanent ones fail at once, that a dispatcher job failing
+after a send does not send again, that stalled claims are released, that
+a session the server dropped is reopened, and that the cached templates
+render exactly like the old str.replace() loop.
+
+Usage:
+    python benchmark_email_outbox.py                     # 600 subscriptions
+    python benchmark_email_outbox.py --subscriptions 2000 --handshake-ms 150
+"""
+
+import argparse
+import os
+import smtplib
+import socket
+import sys
+import tempfile
+import threading
+import time
+import warnings
+from datetime import datetime, timedelta
+
+class MailSink:
+    """Messages and sessions seen by the stand-in server"""
+
+    def __init__(self, handshake_delay):
+        self.handshake_delay = handshake_delay
+        self.sessions = 0
+        self.messages = []
+        self.failures = {}  # recipient -> SMTP reply
+        self.lock = threading.Lock()
+
+    def greet(self):
+        time.sleep(self.handshake_delay)
+        with self.lock:
+            self.sessions += 1
+
+    def deliver(self, recipients):
+        for recipient in recipients:
+            reply = self.failures.get(recipient)
+            if reply:
+                return reply
+        with self.lock:
+            self.messages.extend(recipients)
+        return None
+
+def start_aiosmtpd(sink, port):
+    from aiosmtpd.controller import Controller
+    import asyncio
+
+    class Handler:
+        async def handle_EHLO(self, server, session, envelope, hostname, responses):
+            await asyncio.get_running_loop().run_in_executor(None, sink.greet)
+            session.host_name = hostname
+            return responses
+
+        async def handle_DATA(self, server, session, envelope):
+            return sink.deliver(envelope.rcpt_tos) or '250 OK'
+
+    controller = Controller(Handler(), hostname='127.0.0.1', port=port)
+    controller.start()
+    return controller.stop
+
+def start_smtpd(sink, port):
+    warnings.simplefilter('ignore', DeprecationWarning)
+    import asyncore
+    import smtpd
+
+    class Channel(smtpd.SMTPChannel):
+        def smtp_EHLO(self, arg):
+            sink.greet()
+            super().smtp_EHLO(arg)
+
+    class Server(smtpd.SMTPServer):
+        channel_class = Channel
+
+        def process_message(self, peer, mailfrom, rcpttos, data, **kwargs):
+            return sink.deliver(rcpttos)
+
+    server = Server(('127.0.0.1', port), None, decode_data=False)
+    thread = threading.Thread(target=asyncore.loop, kwargs={'timeout': 0.01}, daemon=True)
+    thread.start()
+    return server.close
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark pooled SMTP sending through the email outbox')
+    parser.add_argument('--subscriptions', type=int, default=600, help='Subscriptions ending within a week')
+    parser.add_argument('--handshake-ms', type=float, default=50, help='Delay the server adds to each new session')
+    parser.add_argument('--baseline', type=int, default=20, help='Messages sent the old way for comparison')
+    args = parser.parse_args()
+
+    sink = MailSink(args.handshake_ms / 1000)
+    port = free_port()
+    try:
+        stop = start_aiosmtpd(sink, port)
+        server_name = 'aiosmtpd'
+    except ImportError:
+        stop = start_smtpd(sink, port)
+        server_name = 'stdlib smtpd'
+
+    workdir = tempfile.mkdtemp(prefix='chamalink-email-')
+    os.environ['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(workdir, 'email.db')}"
+    os.environ['JOB_WORKER_CONCURRENCY'] = '0'
+    os.environ.update({'MAIL_SERVER': '127.0.0.1', 'MAIL_PORT': str(port), 'MAIL_USE_TLS': 'false',
+                       'MAIL_USE_SSL': 'false', 'MAIL_USERNAME': 'noreply@chamalink.test', 'MAIL_PASSWORD': 'secret'})
+
+    from app import create_app, db
+    from app.models import User, SubscriptionPlan, UserSubscription, EmailMessage
+    from app.utils import email_outbox
+    from app.utils.email_service import email_service, EMAIL_TEMPLATES
+    from app.utils.jobs import run_pending_jobs
+    from app.utils.subscription_middleware import queue_expiry_warnings
+
+    app = create_app()
+
+    with app.app_context():
+        print("📧 EMAIL OUTBOX BENCHMARK")
+        print("=" * 50)
+        print(f"📮 Local SMTP server: {server_name} on port {port}, {args.handshake_ms:.0f}ms per new session")
+        db.create_all()
+        email_outbox.EMAIL_RATE_LIMIT = 10 ** 9
+        # However long the drain takes, the flaky mailbox's retry only comes due when the checks say so
+        email_outbox.EMAIL_RETRY_DELAY = 24 * 3600
+
+        # The old path: a new connection, EHLO and login for every message
+        message = email_service.build_message('old@example.com', 'Old path', '<p>Hello</p>')
+        sessions_before = sink.sessions
+        started = time.perf_counter()
+        for _ in range(args.baseline):
+            with smtplib.SMTP('127.0.0.1', port) as server:
+                server.ehlo()
+                server.sendmail(email_service.sender_email, 'old@example.com', message)
+        old_rate = args.baseline / (time.perf_counter() - started) * 60
+        old_sessions = sink.sessions - sessions_before
+        print(f"\n🐢 Connection per message: {old_sessions} sessions for {args.baseline} messages "
+              f"({old_rate:,.0f} messages/minute)")
+
+        plan = SubscriptionPlan(name='basic', price=500.0, max_chamas=3)
+        db.session.add(plan)
+        db.session.bulk_insert_mappings(User, [
+            {'username': f'member{i}', 'email': f'member{i}@example.com', 'password_hash': 'x', 'first_name': 'Member',
+             'last_name': str(i)}
+            for i in range(args.subscriptions)
+        ])
+        db.session.flush()
+        now = datetime.utcnow()
+        user_ids = [row[0] for row in db.session.query(User.id).order_by(User.id)]
+        db.session.bulk_insert_mappings(UserSubscription, [
+            {'user_id': user_id, 'plan_id': plan.id, 'status': 'active', 'is_trial': False,
+             'start_date': now - timedelta(days=30), 'end_date': now + timedelta(hours=6 + (i % 160))}
+            for i, user_id in enumerate(user_ids)
+        ])
+        db.session.commit()
+        sink.messages.clear()
+        sessions_before = sink.sessions
+
+        bounce, flaky = 'member1@example.com', 'member2@example.com'
+        sink.failures = {bounce: '550 No such user', flaky: '451 Try again later'}
+
+        started = time.perf_counter()
+        queued = queue_expiry_warnings()
+        db.session.commit()
+        queue_ms = (time.perf_counter() - started) * 1000
+        requeued = queue_expiry_warnings()
+        db.session.commit()
+
+        started = time.perf_counter()
+        while run_pending_jobs():
+            pass
+        drain = time.perf_counter() - started
+        delivered = list(sink.messages)
+        new_rate = len(sink.messages) / drain * 60
+        sessions = sink.sessions - sessions_before
+        print(f"⏱️  Queued {queued} warnings in {queue_ms:.0f}ms")
+        print(f"🚀 Pooled outbox: {len(sink.messages)} messages over {sessions} sessions in {drain:.2f}s "
+              f"({new_rate:,.0f} messages/minute, {new_rate / old_rate:.0f}x)")
+
+        bounce_row = EmailMessage.query.filter_by(recipient=bounce).one()
+        flaky_row = EmailMessage.query.filter_by(recipient=flaky).one()
+        flaky_backoff = flaky_row.status == 'queued' and flaky_row.next_attempt_at > datetime.utcnow()
+
+        # The flaky mailbox recovers once its retry comes due
+        sink.failures = {}
+        EmailMessage.query.filter_by(status='queued').update({EmailMessage.next_attempt_at: datetime.utcnow()})
+        db.session.commit()
+        email_outbox.schedule_dispatch()
+        db.session.commit()
+        while run_pending_jobs():
+            pass
+        db.session.refresh(flaky_row)
+
+        # A dispatcher job that fails after sending keeps what it sent
+        sink.messages.clear()
+        for i in range(3):
+            email_outbox.queue_email(f'late{i}@example.com', 'Late', '<p>Hi</p>')
+        db.session.commit()
+        continue_dispatch = email_outbox.outbox.continue_dispatch
+        email_outbox.outbox.continue_dispatch = lambda *args: 1 / 0
+        run_pending_jobs()
+        email_outbox.outbox.continue_dispatch = continue_dispatch
+        from app.models.jobs import OutboxJob
+        OutboxJob.query.filter_by(status='pending').update({OutboxJob.run_after: datetime.utcnow()})
+        db.session.commit()
+        while run_pending_jobs():
+            pass
+        kept_sent = (sorted(sink.messages) == [f'late{i}@example.com' for i in range(3)] and
+                     EmailMessage.query.filter(EmailMessage.recipient.like('late%'), EmailMessage.status == 'sent').count() == 3)
+
+        # Claims a dead dispatcher left behind go back to the queue, or fail on the last attempt
+        past = datetime.utcnow() - timedelta(seconds=1)
+        stalled = [EmailMessage(recipient=f'stalled{i}@example.com', subject='Stalled', html_content='<p>Hi</p>',
+                                status='sending', attempts=attempts, max_attempts=5, next_attempt_at=past,
+                                claim_token='dead')
+                   for i, attempts in enumerate((1, 5))]
+        db.session.add_all(stalled)
+        db.session.commit()
+        email_outbox.schedule_dispatch()
+        db.session.commit()
+        for row in stalled:
+            db.session.refresh(row)
+        released = [row.status for row in stalled] == ['queued', 'failed']
+        while run_pending_jobs():
+            pass
+
+        # Direct sends reuse the pooled session; a session the server dropped is reopened
+        pool = email_service.smtp_pool()
+        opened = pool.stats()['connections_opened']
+        direct = [email_service.send_email(f'direct{i}@example.com', 'Direct', '<p>Hi</p>') for i in range(5)]
+        reused = pool.stats()['connections_opened'] == opened
+        for connection in list(pool._idle.queue):
+            connection.server.close()
+        recovered = email_service.send_email('after-drop@example.com', 'Direct', '<p>Hi</p>')
+        reopened = pool.stats()['reconnects'] >= 1 and 'after-drop@example.com' in sink.messages
+
+        # Cached templates render like the old replace loop, unknown placeholders included
+        context = {'user_name': 'Wanjiku', 'days_remaining': 3, 'plan_name': 'Advanced'}
+        expected = EMAIL_TEMPLATES['subscription_warning']
+        for key, value in context.items():
+            expected = expected.replace(f"{{{{ {key} }}}}", str(value))
+        rendered = email_service._get_email_template('subscription_warning', context)
+        started = time.perf_counter()
+        for _ in range(2000):
+            email_service._get_email_template('subscription_warning', context)
+        cached_us = (time.perf_counter() - started) / 2000 * 10 ** 6
+        print(f"🧩 Template render: {cached_us:.1f}µs")
+
+        checks = [
+            ('Every subscription queued a warning', queued == args.subscriptions),
+            ('Rerun queues nothing new', requeued == 0),
+            ('Every reachable subscriber warned once',
+             sorted(delivered) == sorted({f'member{i}@example.com' for i in range(args.subscriptions)} - {bounce, flaky})),
+            ('Sessions reused across messages', sessions <= pool.size * 2),
+            ('Pooled sessions carry many messages each',
+             old_sessions >= args.baseline and sessions * 10 <= len(delivered)),
+            ('Permanent rejection failed without retry', bounce_row.status == 'failed' and bounce_row.attempts == 1),
+            ('Temporary failure retried with backoff', flaky_backoff),
+            ('Retry delivered once due', flaky_row.status == 'sent' and flaky_row.attempts == 2),
+            ('Failed dispatcher job resends nothing it sent', kept_sent),
+            ('Stalled claims requeued or failed', released),
+            ('send_email reuses the pooled session', all(direct) and reused),
+            ('Dropped session reopened', recovered and reopened),
+            ('Cached template matches the old rendering', rendered == expected),
+            ('Unknown placeholders left in place',
+             email_service._get_email_template('subscription_warning', {}).count('{{ user_name }}') == 1),
+        ]
+
+        print("\n🔍 Verification")
+        for label, passed in checks:
+            print(f"   {'✅' if passed else '❌'} {label}")
+
+        pool.close()
+        stop()
+        success = all(passed for _, passed in checks)
+        print("\n🎉 Email outbox benchmark passed" if success else "\n❌ Email outbox benchmark failed")
+        return success
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""
+Fraud Scoring Benchmark
+Seeds a throwaway database with members and a history of payments, builds
+the member risk profiles and measures both scoring paths: the inline score
+taken in mpesa.initiate_payment, against computing the same features with
+aggregate queries per payment, and the bulk rescoring job, against scoring
+the same rows one at a time. Checks that a cached inline score runs no
+queries, that ordinary payments are allowed, that a burst of outsized
+payments from a new phone is refused at the route, that devices are
+learnt on the next profile rebuild, that rescoring keeps one score per
+transaction, and that the dashboard and scan API work.
+
+Usage:
+    python benchmark_fraud.py                              # 2,000 members
+    python benchmark_fraud.py --members 20000 --payments 500000
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark fraud scoring')
+    parser.add_argument('--members', type=int, default=2000, help='Members with payment history')
+    parser.add_argument('--payments', type=int, default=100000, help='Payments in their history')
+    parser.add_argument('--days', type=int, default=60, help='Days the history covers')
+    parser.add_argument('--inline', type=int, default=600, help='Inline scores to time')
+    parser.add_argument('--seed', type=int, default=11, help='Random seed')
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    workdir = tempfile.mkdtemp(prefix='chamalink-fraud-')
+    os.environ['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(workdir, 'fraud.db')}"
+    os.environ['JOB_WORKER_CONCURRENCY'] = '0'
+
+    import numpy as np
+    from sqlalchemy import event, func
+    from app import create_app, db
+    from app.models import User, Chama, Transaction, MpesaTransaction, FraudScore, MemberRiskProfile, OutboxJob
+    from app.utils import fraud_scoring
+    from app.utils.jobs import enqueue_job, run_pending_jobs
+
+    app = create_app()
+    app.config['WTF_CSRF_ENABLED'] = False
+    app.config['MPESA_ASYNC_STK_PUSH'] = True
+
+    with app.app_context():
+        print("🛡️ FRAUD SCORING BENCHMARK")
+        print("=" * 50)
+        db.create_all()
+
+        db.session.bulk_insert_mappings(User, [
+            {'username': f'member{i}', 'email': f'member{i}@example.com', 'password_hash': 'x',
+             'phone_number': f'2547{10000000 + i}'}
+            for i in range(args.members)
+        ])
+        admin = User(username='risk', email='risk@example.com', password_hash='x', is_super_admin=True)
+        db.session.add(admin)
+        db.session.flush()
+        members = db.session.query(User.id, User.phone_number).filter(User.id != admin.id).order_by(User.id).all()
+        user_ids = [user_id for user_id, _ in members]
+        phones = dict(members)
+        chama = Chama(name='Scored Chama', creator_id=user_ids[0], total_balance=0.0, status='active')
+        db.session.add(chama)
+        db.session.flush()
+
+        # Every member pays around their own usual amount, at any hour
+        usual = {user_id: float(random.choice([500, 1000, 2000, 5000])) for user_id in user_ids}
+        now = datetime.utcnow()
+        span = args.days * 24 * 3600
+        history = sorted(
+            (now - timedelta(seconds=random.randint(3600, span)), random.choice(user_ids))
+            for _ in range(args.payments)
+        )
+        db.session.bulk_insert_mappings(Transaction, [
+            {'type': random.choice(['contribution'] * 8 + ['loan_repayment', 'penalty_payment']),
+             'amount': round(usual[user_id] * random.uniform(0.8, 1.2), 2), 'status': 'completed',
+             'user_id': user_id, 'chama_id': chama.id, 'created_at': when}
+            for when, user_id in history
+        ])
+        db.session.bulk_insert_mappings(MpesaTransaction, [
+            {'amount': usual[user_id], 'phone_number': phone, 'status': 'completed', 'user_id': user_id,
+             'chama_id': chama.id, 'created_date': now - timedelta(days=1)}
+            for user_id, phone in members
+        ])
+        db.session.commit()
+        print(f"✅ Seeded {args.members} members and {args.payments} payments over {args.days} days")
+
+        # Profiles: a chunk of members aggregated at once
+        enqueue_job('fraud_profiles', {'after_user_id': 0})
+        db.session.commit()
+        started = time.perf_counter()
+        while run_pending_jobs():
+            pass
+        profile_s = time.perf_counter() - started
+        profiles = MemberRiskProfile.query.count()
+        print(f"\n⏱️  Profiles: {profiles} members in {profile_s:.2f}s ({profiles / profile_s:,.0f} members/s)")
+
+        sample_user = user_ids[7]
+        amounts = [amount for amount, in db.session.query(Transaction.amount).filter(
+            Transaction.user_id == sample_user, Transaction.type.in_(fraud_scoring.FRAUD_SCORED_TYPES))]
+        stored = db.session.get(MemberRiskProfile, sample_user)
+        profile_matches = (stored.transaction_count == len(amounts)
+                           and abs(stored.amount_mean - statistics.fmean(amounts)) < 0.01
+                           and abs(stored.amount_std - statistics.pstdev(amounts)) < 0.01
+                           and sum(stored.hour_counts) == len(amounts)
+                           and stored.phones == [phones[sample_user]])
+
+        # Inline: the features as aggregate queries per payment, then from the profile cache
+        pending = [Transaction(type='contribution', amount=usual[user_id], status='pending', user_id=user_id,
+                               chama_id=chama.id) for user_id in random.sample(user_ids, args.inline)]
+        db.session.add_all(pending)
+        db.session.flush()
+        since = now - timedelta(days=fraud_scoring.FRAUD_HISTORY_DAYS)
+        statements = []
+
+        # Reads only: the FraudScore rows added by earlier scores are flushed in between
+        @event.listens_for(db.engine, 'before_cursor_execute')
+        def record(conn, cursor, statement, parameters, context, executemany):
+            if statement.lstrip().upper().startswith('SELECT'):
+                statements.append(statement)
+
+        started = time.perf_counter()
+        for transaction in pending[:100]:
+            scored = Transaction.query.filter(Transaction.user_id == transaction.user_id,
+                                              Transaction.type.in_(fraud_scoring.FRAUD_SCORED_TYPES),
+                                              Transaction.created_at >= since)
+            scored.with_entities(func.count(Transaction.id), func.avg(Transaction.amount),
+                                 func.avg(Transaction.amount * Transaction.amount)).one()
+            scored.filter(Transaction.created_at >= now - timedelta(hours=1)).with_entities(
+                func.count(Transaction.id)).scalar()
+            [created_at.hour for created_at, in scored.with_entities(Transaction.created_at)]
+            MpesaTransaction.query.filter_by(user_id=transaction.user_id,
+                                             phone_number=phones[transaction.user_id]).first()
+        naive_ms = (time.perf_counter() - started) / 100 * 1000
+        naive_queries = len(statements) / 100
+
+        client_info = {'ip': '41.90.1.1', 'user_agent': 'Mozilla/5.0 (Linux; Android 14) Chrome/126.0'}
+        fraud_scoring.get_profile_cache().delete(user_ids)
+        del statements[:]
+        started = time.perf_counter()
+        for transaction in pending[:100]:
+            fraud_scoring.score_payment(transaction, phones[transaction.user_id], client_info)
+        cold_ms = (time.perf_counter() - started) / 100 * 1000
+        cold_queries = len(statements) / 100
+        for transaction in pending[100:]:
+            fraud_scoring.get_profile(transaction.user_id)
+        del statements[:]
+        timings = []
+        for transaction in pending[100:]:
+            started = time.perf_counter()
+            fraud_scoring.score_payment(transaction, phones[transaction.user_id], client_info)
+            timings.append((time.perf_counter() - started) * 1000)
+        cached_queries = len(statements)
+        event.remove(db.engine, 'before_cursor_execute', record)
+        db.session.rollback()
+        p50, p99 = np.percentile(timings, [50, 99])
+        print(f"⏱️  Inline score: {naive_ms:.2f}ms with aggregate queries ({naive_queries:.0f} per payment), "
+              f"{cold_ms:.2f}ms on a cache miss ({cold_queries:.0f} per payment), "
+              f"{p50:.3f}ms p50 / {p99:.3f}ms p99 from cache ({cached_queries} queries)")
+
+        # Batch: a matrix of rows against the same rows one at a time
+        rows = [[random.random() * 6, random.randint(0, 6), random.randint(0, 1), random.randint(0, 1),
+                 random.randint(0, 1), random.randint(0, 1), random.randint(0, 1)] for _ in range(50000)]
+        matrix = np.array(rows, dtype=np.float64)
+        started = time.perf_counter()
+        vectorised = fraud_scoring.score_matrix(matrix)
+        fraud_scoring.decide(vectorised)
+        vector_s = time.perf_counter() - started
+        started = time.perf_counter()
+        one_by_one = np.array([fraud_scoring.score_matrix(row[np.newaxis])[0] for row in matrix[:5000]])
+        single_s = (time.perf_counter() - started) * 10
+        batch_matches = np.allclose(vectorised[:5000], one_by_one)
+
+        fraud_scoring.start_rescore(chunk_size=fraud_scoring.FRAUD_RESCORE_CHUNK)
+        db.session.commit()
+        started = time.perf_counter()
+        while run_pending_jobs():
+            pass
+        rescore_s = time.perf_counter() - started
+        rescored = FraudScore.query.count()
+        print(f"⏱️  Scoring 50,000 feature rows: {vector_s * 1000:.1f}ms as a matrix, ~{single_s * 1000:.0f}ms row by row")
+        print(f"⏱️  Rescoring job: {rescored} payments in {rescore_s:.2f}s ({rescored / rescore_s:,.0f}/s)")
+
+        # The route: an ordinary payment, then a burst from a new phone and device
+        honest, thief = user_ids[1], user_ids[2]
+        chama.add_member(honest)
+        chama.add_member(thief)
+        db.session.commit()
+
+        def client_for(user_id, user_agent):
+            client = app.test_client()
+            client.environ_base['HTTP_USER_AGENT'] = user_agent
+            client.environ_base['REMOTE_ADDR'] = '41.90.1.1' if user_agent == client_info['user_agent'] else '185.220.101.4'
+            with client.session_transaction() as session:
+                session['_user_id'] = str(user_id)
+            return client
+
+        def pay(client, amount, phone):
+            with app.app_context():
+                response = client.post('/mpesa/initiate_payment',
+                                       json={'chama_id': chama.id, 'amount': amount, 'phone_number': phone})
+                return response.status_code
+
+        honest_client = client_for(honest, client_info['user_agent'])
+        honest_status = pay(honest_client, usual[honest], phones[honest])
+        honest_score = FraudScore.query.filter_by(user_id=honest, source='payment').one()
+
+        thief_client = client_for(thief, 'python-requests/2.31')
+        statuses = [pay(thief_client, usual[thief] * 40, '+447700900123') for _ in range(6)]
+        thief_scores = [(score.score, score.decision, score.reasons) for score in
+                        FraudScore.query.filter_by(user_id=thief, source='payment').order_by(FraudScore.id)]
+        blocked = Transaction.query.filter_by(user_id=thief, status='failed').count()
+        # There is no Daraja to push to here
+        OutboxJob.query.filter_by(job_type='mpesa_stk_push').delete()
+        db.session.commit()
+        print(f"\n💳 Burst from a new phone scored "
+              f"{', '.join(f'{score:.2f}' for score, _, _ in thief_scores)}: {statuses}")
+
+        # The next rebuild learns the honest member's device
+        cached_before = fraud_scoring.get_profile(honest)
+        fraud_scoring.rebuild_profiles(honest, honest)
+        db.session.commit()
+        learnt = fraud_scoring.get_profile(honest)
+        device_learnt = (honest_score.device in learnt['devices'] and not cached_before['devices']
+                         and '41.90.1.1' in learnt['ips'])
+
+        # Rescoring updates the inline scores in place and keeps their device
+        fraud_scoring.start_rescore(since=now - timedelta(minutes=10))
+        db.session.commit()
+        while run_pending_jobs():
+            pass
+        db.session.expire_all()
+        honest_rescored = FraudScore.query.filter_by(transaction_id=honest_score.transaction_id).all()
+        scored_types = Transaction.query.filter(Transaction.type.in_(fraud_scoring.FRAUD_SCORED_TYPES)).count()
+        one_per_transaction = FraudScore.query.count() == scored_types
+
+        with app.app_context():
+            page = client_for(admin.id, 'Mozilla/5.0').get('/fraud/')
+            page_ok = page.status_code == 200 and b'Flagged Payments' in page.get_data()
+        with app.app_context():
+            scan = client_for(admin.id, 'Mozilla/5.0').post('/fraud/api/scan', json={'days': 7})
+        with app.app_context():
+            refused = client_for(honest, 'Mozilla/5.0').post('/fraud/api/scan', json={'days': 7})
+
+        checks = [
+            ('Profiles hold each member\'s statistics', profile_matches and profiles == args.members),
+            ('Cached inline score runs no queries', cached_queries == 0),
+            ('Cache miss costs one query, not one per feature', cold_queries <= 1 < naive_queries),
+            ('Matrix scoring matches row-by-row scoring', batch_matches),
+            ('Matrix scoring faster than row by row', vector_s < single_s),
+            ('Ordinary payment allowed', honest_status == 202 and honest_score.decision == 'allow'),
+            ('Burst of outsized payments from a new phone refused',
+             statuses[0] == 202 and statuses[-1] == 403 and blocked >= 1
+             and thief_scores[-1][1] == 'block'),
+            ('Reasons name the features', set(thief_scores[-1][2]) >= {'amount_zscore', 'new_phone', 'velocity'}),
+            ('Profile rebuild learns devices and drops the cached baseline', device_learnt),
+            ('Rescoring keeps one score per transaction', one_per_transaction and len(honest_rescored) == 1
+             and honest_rescored[0].device == honest_score.device),
+            ('Dashboard lists flagged payments', page_ok),
+            ('Admins can start a scan, members cannot', scan.status_code == 202 and refused.status_code == 403),
+        ]
+
+        print("\n🔍 Verification")
+        for label, passed in checks:
+            print(f"   {'✅' if passed else '❌'} {label}")
+
+        success = all(passed for _, passed in checks)
+        print("\n🎉 Fraud benchmark passed" if success else "\n❌ Fraud benchmark failed")
+        return success
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
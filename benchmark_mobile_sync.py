@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Mobile Sync Benchmark
+Seeds a throwaway database with a busy chama, takes a full snapshot for a
+member, then times delta syncs after small batches of writes and checks
+that inserts, edits, deletes and membership changes reach exactly the
+members who can see them. Also replays offline actions twice to check
+idempotency, and prunes the change log to check expired tokens fall back
+to a snapshot.
+
+Usage:
+    python benchmark_mobile_sync.py                       # 50000 transactions
+    python benchmark_mobile_sync.py --transactions 200000 --rounds 50
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark mobile delta sync')
+    parser.add_argument('--transactions', type=int, default=50000, help='Transactions in the busy chama')
+    parser.add_argument('--rounds', type=int, default=20, help='Delta syncs to time')
+    parser.add_argument('--writes', type=int, default=5, help='Transactions written between delta syncs')
+    parser.add_argument('--seed', type=int, default=3, help='Random seed')
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    workdir = tempfile.mkdtemp(prefix='chamalink-sync-')
+    os.environ['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(workdir, 'sync.db')}"
+    os.environ['JOB_WORKER_CONCURRENCY'] = '0'
+
+    from app import create_app, db
+    from app.models import User, Chama, Transaction, Notification, SyncChange
+    from app.utils.mobile_sync import (sync_changes, apply_offline_actions, prune_sync_log,
+                                       encode_sync_token, decode_sync_token)
+
+    app = create_app()
+    app.config['WTF_CSRF_ENABLED'] = False
+
+    with app.app_context():
+        print("🔄 MOBILE SYNC BENCHMARK")
+        print("=" * 50)
+        db.create_all()
+
+        users = [User(username=f'member{i}', email=f'member{i}@example.com', password_hash='x') for i in range(10)]
+        outsider = User(username='outsider', email='outsider@example.com', password_hash='x')
+        db.session.add_all(users + [outsider])
+        db.session.flush()
+        chama = Chama(name='Busy Chama', creator_id=users[0].id, total_balance=0.0)
+        other = Chama(name='Other Chama', creator_id=outsider.id, total_balance=0.0)
+        db.session.add_all([chama, other])
+        db.session.flush()
+        chama.add_member(users[0].id, 'creator')
+        for user in users[1:]:
+            chama.add_member(user.id)
+        other.add_member(outsider.id, 'creator')
+
+        now = datetime.utcnow()
+        db.session.bulk_insert_mappings(Transaction, [
+            {'type': 'contribution', 'amount': float(random.randint(1, 100) * 50), 'status': 'completed',
+             'user_id': random.choice(users).id, 'chama_id': chama.id,
+             'created_at': now - timedelta(minutes=random.randint(0, 90 * 24 * 60))}
+            for _ in range(args.transactions)
+        ])
+        db.session.commit()
+        print(f"✅ Seeded {args.transactions} transactions")
+
+        viewer = users[1]
+        started = time.perf_counter()
+        snapshot = sync_changes(viewer.id)
+        snapshot_ms = (time.perf_counter() - started) * 1000
+        print(f"\n📦 Snapshot: {snapshot_ms:.1f}ms, {len(snapshot['changes']['transactions']['upserted'])} transactions")
+
+        # Tokens normally open an overlap window; backdate the log so timings
+        # measure steady-state deltas rather than the window re-read
+        def age_log():
+            SyncChange.query.update({SyncChange.changed_at: datetime.utcnow() - timedelta(hours=1)})
+            db.session.commit()
+
+        age_log()
+        token = encode_sync_token(decode_sync_token(snapshot['sync_token'])[0], datetime.utcnow())
+        timings, complete = [], True
+        for _ in range(args.rounds):
+            written = []
+            for _ in range(args.writes):
+                transaction = Transaction(type='contribution', amount=100.0, user_id=random.choice(users).id,
+                                          chama_id=chama.id)
+                db.session.add(transaction)
+                written.append(transaction)
+            db.session.add(Transaction(type='contribution', amount=1.0, user_id=outsider.id, chama_id=other.id))
+            db.session.commit()
+            age_log()
+            started = time.perf_counter()
+            delta = sync_changes(viewer.id, token)
+            timings.append((time.perf_counter() - started) * 1000)
+            received = {t['id'] for t in delta['changes']['transactions']['upserted']}
+            complete = complete and received == {t.id for t in written}
+            token = encode_sync_token(decode_sync_token(delta['sync_token'])[0], datetime.utcnow())
+        timings.sort()
+        print(f"⚡ Delta after {args.writes} writes: median {timings[len(timings) // 2]:.1f}ms "
+              f"vs snapshot {snapshot_ms:.1f}ms")
+
+        # Edits, deletes and membership changes
+        latest = Transaction.query.filter_by(chama_id=chama.id).order_by(Transaction.id.desc()).first()
+        latest.status = 'reversed'
+        doomed = Transaction.query.filter_by(chama_id=chama.id).order_by(Transaction.id).first()
+        db.session.delete(doomed)
+        chama.name = 'Renamed Chama'
+        notification = Notification(user_id=viewer.id, title='Hello', message='Meeting moved')
+        db.session.add(notification)
+        db.session.commit()
+        other.add_member(viewer.id)
+        db.session.commit()
+        chama.remove_member(users[2].id)
+        db.session.commit()
+        delta = sync_changes(viewer.id, token)
+        changes = delta['changes']
+        leaver = sync_changes(users[2].id, token)['changes']
+        outsider_delta = sync_changes(outsider.id, token)['changes']
+
+        # Offline actions, replayed twice
+        actions = [
+            {'idempotency_key': 'a1', 'type': 'update_profile', 'data': {'first_name': 'Wanjiru'}},
+            {'idempotency_key': 'a2', 'type': 'mark_notification_read', 'data': {'notification_id': notification.id}},
+            {'idempotency_key': 'a3', 'type': 'mark_notification_read', 'data': {'notification_id': 0}},
+        ]
+        first = apply_offline_actions(viewer, actions)
+        db.session.commit()
+        replay_actions = [dict(action) for action in actions]
+        replay_actions[0]['data'] = {'first_name': 'Changed'}
+        replay = apply_offline_actions(viewer, replay_actions)
+        db.session.commit()
+
+        # Pruning the log forces old tokens back to a snapshot
+        SyncChange.query.update({SyncChange.changed_at: datetime.utcnow() - timedelta(days=60)})
+        db.session.commit()
+        pruned, _ = prune_sync_log()
+        db.session.commit()
+        stale = sync_changes(viewer.id, encode_sync_token(1, datetime.utcnow()))
+
+        checks = [
+            ('Every delta holds exactly the new visible transactions', complete),
+            ('Delta is cheaper than a snapshot', timings[len(timings) // 2] < snapshot_ms),
+            ('Edited transaction resent', any(t['id'] == latest.id and t['status'] == 'reversed'
+                                              for t in changes['transactions']['upserted'])),
+            ('Deleted transaction reported', str(doomed.id) in changes['transactions']['deleted']),
+            ('Renamed chama resent', any(c['name'] == 'Renamed Chama' for c in changes['chamas']['upserted'])),
+            ('Own notification delivered', [n['id'] for n in changes['notifications']['upserted']] == [notification.id]),
+            ('Joined chama arrives as a snapshot', any(c['id'] == other.id for c in changes['chamas']['upserted'])
+             and str(other.id) not in changes['chamas']['deleted']),
+            ('Removed member sees the chama deleted', str(chama.id) in leaver['chamas']['deleted']),
+            ('Roster change resent to members', f'{chama.id}:{users[2].id}' in changes['memberships']['deleted']),
+            ('Outsider sees no busy-chama rows', all(t['chama_id'] == other.id
+                                                     for t in outsider_delta['transactions']['upserted'])),
+            ('Offline actions applied once', [r['status'] for r in first] == ['success', 'success', 'error']
+             and db.session.get(User, viewer.id).first_name == 'Wanjiru'),
+            ('Replayed keys return stored results', all(r.get('duplicate') for r in replay)),
+            ('Pruned log falls back to a snapshot', pruned > 0 and stale['full_snapshot']),
+        ]
+
+        print("\n🔍 Verification")
+        for label, passed in checks:
+            print(f"   {'✅' if passed else '❌'} {label}")
+
+        success = all(passed for _, passed in checks)
+        print("\n🎉 Mobile sync benchmark passed" if success else "\n❌ Mobile sync benchmark failed")
+        return success
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+Notification Counter Benchmark
+Seeds a throwaway database with users and a large notifications table,
+then times the navbar poll (/api/notification-count) against the old
+COUNT(*) per poll. Checks that a cached poll sends no query to the
+notification tables and that the counters stay exact through ORM inserts,
+mark-read, mark-all-read, deletes, rollbacks and a broadcast fan-out, and
+that the reconciliation job repairs drift from a raw SQL write.
+
+Usage:
+    python benchmark_notification_counters.py                  # 2000 users, ~100 notifications each
+    python benchmark_notification_counters.py --users 5000 --per-user 200
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark cached unread notification counters')
+    parser.add_argument('--users', type=int, default=2000, help='Registered users')
+    parser.add_argument('--per-user', type=int, default=100, help='Average notifications per user')
+    parser.add_argument('--polls', type=int, default=500, help='Navbar polls to time')
+    parser.add_argument('--seed', type=int, default=11, help='Random seed')
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    workdir = tempfile.mkdtemp(prefix='chamalink-counters-')
+    os.environ['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(workdir, 'counters.db')}"
+    os.environ['JOB_WORKER_CONCURRENCY'] = '0'
+
+    from sqlalchemy import event, func, text
+    from app import create_app, db
+    from app.models import User, Notification, NotificationCounter
+    from app.utils.jobs import run_pending_jobs
+    from app.utils.notification_counters import get_unread_count, get_counter_cache, reconcile_unread_counters
+    from app.utils.notification_fanout import start_broadcast
+
+    app = create_app()
+    app.config['WTF_CSRF_ENABLED'] = False
+
+    with app.app_context():
+        print("🔔 NOTIFICATION COUNTER BENCHMARK")
+        print("=" * 50)
+        db.create_all()
+
+        db.session.bulk_insert_mappings(User, [
+            {'username': f'user{i}', 'email': f'user{i}@example.com', 'password_hash': 'x', 'is_active': True}
+            for i in range(args.users)
+        ])
+        db.session.flush()
+        user_ids = [row[0] for row in db.session.query(User.id).order_by(User.id)]
+        now = datetime.utcnow()
+        rows = []
+        for user_id in user_ids:
+            for n in range(random.randint(0, args.per_user * 2)):
+                rows.append({'user_id': user_id, 'title': 'Hello', 'message': 'Body', 'type': 'info',
+                             'is_read': random.random() < 0.7, 'created_date': now - timedelta(minutes=n)})
+        db.session.bulk_insert_mappings(Notification, rows)
+        db.session.commit()
+        print(f"✅ Seeded {len(user_ids)} users and {len(rows)} notifications")
+
+        def actual(user_id):
+            return Notification.query.filter_by(user_id=user_id, is_read=False).count()
+
+        def all_exact():
+            counts = dict(db.session.query(Notification.user_id, func.count(Notification.id))
+                          .filter(Notification.is_read == False).group_by(Notification.user_id))
+            counters = dict(db.session.query(NotificationCounter.user_id, NotificationCounter.unread))
+            return all(counters.get(user_id, counts.get(user_id, 0)) == counts.get(user_id, 0)
+                       for user_id in user_ids) and all(get_unread_count(u) == counts.get(u, 0) for u in user_ids[:200])
+
+        # Users without a counter row fall back to a COUNT
+        heavy = max(user_ids, key=lambda user_id: sum(1 for row in rows if row['user_id'] == user_id))
+        fallback_ok = get_unread_count(heavy) == actual(heavy)
+        get_counter_cache().delete([heavy])
+        _, seeded = reconcile_unread_counters()
+        db.session.commit()
+
+        statements = []
+
+        @event.listens_for(db.engine, 'before_cursor_execute')
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['_user_id'] = str(heavy)
+
+        started = time.perf_counter()
+        for _ in range(args.polls):
+            Notification.query.filter_by(user_id=heavy, is_read=False).count()
+        old_us = (time.perf_counter() - started) / args.polls * 10 ** 6
+
+        client.get('/api/notification-count')
+        statements.clear()
+        started = time.perf_counter()
+        for _ in range(args.polls):
+            response = client.get('/api/notification-count')
+        poll_ms = (time.perf_counter() - started) / args.polls * 1000
+        poll_queries = [s for s in statements if 'notification' in s.lower()]
+        started = time.perf_counter()
+        for _ in range(args.polls):
+            get_unread_count(heavy)
+        new_us = (time.perf_counter() - started) / args.polls * 10 ** 6
+        event.remove(db.engine, 'before_cursor_execute', record)
+
+        print(f"\n⏱️  Unread count: {old_us:.0f}µs COUNT(*) vs {new_us:.1f}µs cached ({old_us / new_us:.0f}x)")
+        print(f"🌐 Navbar poll: {poll_ms:.2f}ms per request, {len(poll_queries)} notification queries")
+        poll_ok = response.get_json()['count'] == actual(heavy)
+
+        # Writes through every path keep the count exact
+        user = db.session.get(User, user_ids[5])
+        steps = []
+        before = get_unread_count(user.id)
+        for _ in range(3):
+            db.session.add(Notification(user_id=user.id, title='New', message='Hi', type='info'))
+        db.session.commit()
+        steps.append(('ORM insert', get_unread_count(user.id) == before + 3 == actual(user.id)))
+
+        one = Notification.query.filter_by(user_id=user.id, is_read=False).first()
+        one.mark_as_read()
+        steps.append(('mark_as_read', get_unread_count(user.id) == before + 2 == actual(user.id)))
+
+        doomed = Notification.query.filter_by(user_id=user.id, is_read=False).first()
+        db.session.delete(doomed)
+        db.session.commit()
+        steps.append(('ORM delete', get_unread_count(user.id) == before + 1 == actual(user.id)))
+
+        db.session.add(Notification(user_id=user.id, title='Gone', message='Rolled back', type='info'))
+        db.session.flush()
+        # A read inside the transaction caches the uncommitted count; rollback must drop it
+        get_counter_cache().delete([user.id])
+        inside = get_unread_count(user.id)
+        db.session.rollback()
+        steps.append(('Rollback', inside == before + 2 and get_unread_count(user.id) == before + 1 == actual(user.id)))
+
+        # Committing expires the instance, so the old is_read is never loaded
+        stale = Notification.query.filter_by(user_id=user.id, is_read=False).first()
+        db.session.commit()
+        stale.is_read = True
+        db.session.commit()
+        steps.append(('Expired instance marked read', get_unread_count(user.id) == before == actual(user.id)))
+
+        reader = app.test_client()
+        with reader.session_transaction() as session:
+            session['_user_id'] = str(user.id)
+        with app.app_context():
+            reader.post('/notifications/mark-all-read')
+        steps.append(('Mark all read', get_unread_count(user.id) == 0 == actual(user.id)))
+
+        counts_before = {user_id: get_unread_count(user_id) for user_id in user_ids}
+        start_broadcast('system_alert', 'active_users', 'Downtime', 'Back soon')
+        db.session.commit()
+        while run_pending_jobs():
+            pass
+        fanned = all(get_unread_count(user_id) == counts_before[user_id] + 1 for user_id in user_ids)
+        steps.append(('Broadcast fan-out', fanned and all_exact()))
+
+        # A raw write the hooks never see drifts until reconciliation
+        victim = user_ids[7]
+        db.session.execute(text("UPDATE notifications SET is_read = 1 WHERE user_id = :u"), {'u': victim})
+        db.session.commit()
+        drifted = get_unread_count(victim) != actual(victim)
+        repaired, _ = reconcile_unread_counters()
+        db.session.commit()
+
+        for label, passed in steps:
+            print(f"   {'✅' if passed else '❌'} {label}")
+
+        checks = [
+            ('Users without a counter fall back to COUNT', fallback_ok),
+            ('Reconciliation seeds missing counters', seeded > 0),
+            ('Cached poll sends no notification queries', not poll_queries and poll_ok),
+            ('Cached count faster than COUNT(*)', new_us * 10 < old_us),
+            ('Counters exact through every write path', all(passed for _, passed in steps)),
+            ('Raw SQL write drifts, reconciliation repairs it',
+             drifted and repaired == 1 and get_unread_count(victim) == 0 == actual(victim)),
+            ('Every counter matches the notifications table', all_exact()),
+        ]
+
+        print("\n🔍 Verification")
+        for label, passed in checks:
+            print(f"   {'✅' if passed else '❌'} {label}")
+
+        success = all(passed for _, passed in checks)
+        print("\n🎉 Notification counter benchmark passed" if success else "\n❌ Notification counter benchmark failed")
+        return success
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
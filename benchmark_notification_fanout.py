@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+Notification Fan-out Benchmark
+Seeds a throwaway database with many users, sends a platform notice and a
+system notification through the founder endpoints and drains the job
+outbox. Times the request against the old one-ORM-object-per-user loop and
+checks that every recipient gets exactly one notification and one email,
+that a replayed delivery job queues nothing twice, that the email outbox
+respects the account's rate limit and that the status endpoint reports
+progress to completion.
+
+Emails are recorded by a stand-in transport instead of sent.
+
+Usage:
+    python benchmark_notification_fanout.py                   # 20000 users
+    python benchmark_notification_fanout.py --users 100000
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the notification fan-out engine')
+    parser.add_argument('--users', type=int, default=20000, help='Registered users')
+    parser.add_argument('--creator-share', type=float, default=0.3, help='Share of users who created a chama')
+    parser.add_argument('--seed', type=int, default=17, help='Random seed')
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    workdir = tempfile.mkdtemp(prefix='chamalink-fanout-')
+    os.environ['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(workdir, 'fanout.db')}"
+    os.environ['JOB_WORKER_CONCURRENCY'] = '0'
+
+    from app import create_app, db
+    from app.models import User, Chama, Notification, NotificationBroadcast, OutboxJob, SyncChange
+    from app.models import EmailMessage
+    from app.utils import email_outbox, notification_fanout
+    from app.utils.jobs import run_pending_jobs
+
+    class RecordingTransport:
+        sender_email = 'noreply@example.com'
+
+        def __init__(self):
+            self.sent = []  # (subject, recipient)
+
+        def smtp_pool(self):
+            return type('Pool', (), {'size': 1})()
+
+        def send_batch(self, messages):
+            self.sent.extend((subject, recipient) for recipient, subject, _, _ in messages)
+            return [None] * len(messages)
+
+    transport = RecordingTransport()
+    email_outbox.get_email_transport = lambda: transport
+    email_outbox.EMAIL_RATE_LIMIT = 10 ** 9
+
+    app = create_app()
+    app.config['WTF_CSRF_ENABLED'] = False
+
+    with app.app_context():
+        print("📢 NOTIFICATION FAN-OUT BENCHMARK")
+        print("=" * 50)
+        db.create_all()
+
+        db.session.bulk_insert_mappings(User, [
+            {'username': f'user{i}', 'email': f'user{i}@example.com', 'password_hash': 'x',
+             'is_active': random.random() > 0.1}
+            for i in range(args.users)
+        ])
+        founder = User(username='founder', email='founder@example.com', password_hash='x', is_super_admin=True)
+        db.session.add(founder)
+        db.session.flush()
+        user_ids = [row[0] for row in db.session.query(User.id).filter(User.id != founder.id)]
+        creators = random.sample(user_ids, int(len(user_ids) * args.creator_share))
+        db.session.bulk_insert_mappings(Chama, [
+            {'name': f'Chama {i}', 'creator_id': creator_id, 'total_balance': 0.0}
+            for i, creator_id in enumerate(creators)
+        ])
+        db.session.commit()
+        active_count = User.query.filter_by(is_active=True).count()
+        print(f"✅ Seeded {args.users} users, {len(creators)} chama creators, {active_count} active")
+
+        # The old request: one ORM object per recipient, all in the request
+        started = time.perf_counter()
+        for user in User.query.join(Chama, User.id == Chama.creator_id).distinct().all():
+            db.session.add(Notification(user_id=user.id, title='Old notice', message='Hello', type='system'))
+        db.session.flush()
+        old_ms = (time.perf_counter() - started) * 1000
+        db.session.rollback()
+
+        # Shares the first broadcast's id and type, but is not one of its notifications
+        unrelated = Notification(user_id=creators[0], title='Unrelated', message='Hello', type='system', related_id=1)
+        db.session.add(unrelated)
+        db.session.commit()
+
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['_user_id'] = str(founder.id)
+
+        started = time.perf_counter()
+        response = client.post('/founder-dashboard/platform-notice', json={
+            'title': 'Maintenance', 'message': 'We upgrade on Sunday', 'priority': 'info', 'send_email': True
+        })
+        request_ms = (time.perf_counter() - started) * 1000
+        notice = response.get_json()
+        print(f"\n⏱️  Request: {request_ms:.1f}ms (old loop spent {old_ms:.1f}ms before sending a single email)")
+
+        status_url = notice['status_url']
+        queued_status = client.get(status_url).get_json()['broadcast']['status']
+
+        started = time.perf_counter()
+        jobs = 0
+        while True:
+            ran = run_pending_jobs()
+            if not ran:
+                break
+            jobs += ran
+        drain = time.perf_counter() - started
+        print(f"🚚 Drained {jobs} jobs in {drain:.2f}s")
+        final = client.get(status_url).get_json()['broadcast']
+
+        broadcast_id = notice['broadcast_id']
+        notified = [row[0] for row in db.session.query(Notification.user_id).filter_by(broadcast_id=broadcast_id)]
+        unrelated_emailed = sum(1 for (key,) in db.session.query(EmailMessage.dedupe_key)
+                                if key and key.split(':')[2] == str(unrelated.id))
+        logged = SyncChange.query.filter_by(entity='notification').count()
+        creator_emails = sorted(f'user{user_id - 1}@example.com' for user_id in set(creators))
+        emailed = sorted(recipient for subject, recipient in transport.sent if subject.endswith(': Maintenance'))
+
+        # A delivery job that runs again (a retry, a duplicate enqueue) finds its messages queued
+        outbox_before = EmailMessage.query.count()
+        notification_fanout.process_delivery({'broadcast_id': broadcast_id, 'channel': 'email',
+                                              'after': 0, 'last': max(creators)})
+        db.session.commit()
+        while run_pending_jobs():
+            pass
+        replay_ok = EmailMessage.query.count() == outbox_before and len(transport.sent) == len(emailed) and \
+            client.get(status_url).get_json()['broadcast'] == final
+
+        # System alert to active users, high priority emails everyone
+        alert = client.post('/api/system-notification', json={'message': 'Scheduled downtime', 'priority': 'high'})
+        alert_data = alert.get_json()
+        while run_pending_jobs():
+            pass
+        alert_users = {row[0] for row in db.session.query(Notification.user_id).filter_by(
+            broadcast_id=alert_data['broadcast_id'], type='system')}
+        alert_final = client.get(alert_data['status_url']).get_json()['broadcast']
+        alert_titles = {row[0] for row in db.session.query(Notification.title).filter_by(
+            broadcast_id=alert_data['broadcast_id'])}
+
+        # Throttling: a tight limit leaves the rest of the outbox queued for later
+        email_outbox.EMAIL_RATE_LIMIT, email_outbox.EMAIL_RATE_WINDOW = 5, 3600
+        throttled = client.post('/founder-dashboard/platform-notice', json={
+            'title': 'Throttled', 'message': 'Slow down', 'send_email': True
+        }).get_json()
+        while run_pending_jobs():
+            pass
+        throttled_status = client.get(throttled['status_url']).get_json()['broadcast']
+        waiting = OutboxJob.query.filter_by(job_type='email_dispatch', status='pending').count()
+
+        denied_client = app.test_client()
+        with denied_client.session_transaction() as session:
+            session['_user_id'] = str(User.query.filter(User.is_active == True, User.id != founder.id).first().id)
+        with app.app_context():  # fresh g, so the founder's login is not reused
+            denied = denied_client.get(status_url)
+
+        checks = [
+            ('Request answers with 202 and a status URL', response.status_code == 202 and status_url),
+            ('Request is faster than the old insert loop', request_ms < old_ms),
+            ('Status starts queued', queued_status == 'queued'),
+            ('Every creator notified exactly once', sorted(notified) == sorted(set(creators))),
+            ('Every creator emailed exactly once', emailed == creator_emails),
+            ('Unrelated notification with the same id and type left out', unrelated_emailed == 0),
+            ('Status reports completion', final['status'] == 'completed'
+             and final['deliveries']['email'] == {'queued': len(creators), 'sent': len(creators), 'failed': 0,
+                                                  'skipped': 0, 'pending': 0}),
+            ('Replayed delivery job queues nothing twice', replay_ok),
+            ('Bulk inserts logged for mobile sync', logged >= len(creators)),
+            ('System alert reaches only active users', len(alert_users) == active_count
+             and alert_final['status'] == 'completed'),
+            ('High priority title kept', alert_titles == {'System Alert (HIGH Priority)'}),
+            ('Rate limit caps sends per window', throttled_status['deliveries']['email']['sent'] == 5
+             and throttled_status['status'] == 'delivering' and waiting >= 1),
+            ('Status endpoint is founder-only', denied.status_code == 403),
+        ]
+
+        print("\n🔍 Verification")
+        for label, passed in checks:
+            print(f"   {'✅' if passed else '❌'} {label}")
+
+        success = all(passed for _, passed in checks)
+        print("\n🎉 Notification fan-out benchmark passed" if success else "\n❌ Notification fan-out benchmark failed")
+        return success
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
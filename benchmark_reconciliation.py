@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+"""
+Statement Reconciliation Benchmark
+Seeds a throwaway database with a year of paybill payments spread over the
+four payment tables and writes the matching M-Pesa statement export, with
+known numbers of lines missing from the records, payments missing from the
+statement, callbacks that never arrived (no receipt number), masked phones,
+repeated lines, receipts recorded twice and amounts that differ. Reconciles
+it through the engine and measures throughput against looking each line up
+with its own queries, checks every count, that memory stays bounded, a bank
+statement, and the upload route, job and dashboard.
+
+Usage:
+    python benchmark_reconciliation.py                       # 200,000 lines
+    python benchmark_reconciliation.py --lines 2000000       # a busy paybill's year
+"""
+
+import argparse
+import csv
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+def statement_time(when):
+    """Statements show East Africa Time"""
+    return (when + timedelta(hours=3)).strftime('%d-%m-%Y %H:%M:%S')
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark statement reconciliation')
+    parser.add_argument('--lines', type=int, default=200000, help='Money-in lines on the statement')
+    parser.add_argument('--members', type=int, default=1000, help='Members paying in')
+    parser.add_argument('--naive', type=int, default=2000, help='Lines to look up one at a time')
+    parser.add_argument('--seed', type=int, default=5, help='Random seed')
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    workdir = tempfile.mkdtemp(prefix='chamalink-recon-')
+    os.environ['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(workdir, 'recon.db')}"
+    os.environ['JOB_WORKER_CONCURRENCY'] = '0'
+    os.environ['RECONCILIATION_UPLOAD_PATH'] = os.path.join(workdir, 'uploads')
+
+    from io import BytesIO
+    from app import create_app, db
+    from app.models import (User, Chama, Transaction, MpesaTransaction, ManualPaymentVerification,
+                            RegistrationFeePayment, ReconciliationRun, ReconciliationItem)
+    from app.utils import reconciliation
+    from app.utils.jobs import run_pending_jobs
+
+    app = create_app()
+    app.config['WTF_CSRF_ENABLED'] = False
+
+    with app.app_context():
+        print("🧾 STATEMENT RECONCILIATION BENCHMARK")
+        print("=" * 50)
+        db.create_all()
+
+        db.session.bulk_insert_mappings(User, [
+            {'username': f'member{i}', 'email': f'member{i}@example.com', 'password_hash': 'x',
+             'phone_number': f'2547{10000000 + i}'}
+            for i in range(args.members)
+        ])
+        admin = User(username='auditor', email='auditor@example.com', password_hash='x', is_super_admin=True)
+        db.session.add(admin)
+        db.session.flush()
+        members = db.session.query(User.id, User.phone_number).filter(User.id != admin.id).all()
+        chama = Chama(name='Reconciled Chama', creator_id=members[0][0], total_balance=0.0, status='active')
+        db.session.add(chama)
+        db.session.flush()
+
+        # A year of payments, one every few minutes
+        start = datetime(2025, 1, 1)
+        step = 365 * 24 * 3600 / args.lines
+        kinds = (['mpesa'] * 940 + ['manual'] * 10 + ['registration_fee'] * 10 + ['transaction'] * 10
+                 + ['fuzzy'] * 15 + ['unmatched_line'] * 5 + ['amount_mismatch'] * 5 + ['duplicate_record'] * 5)
+        mpesa, manual, fees, transactions, pending = [], [], [], [], []
+        lines, expected = [], dict.fromkeys(
+            ['matched', 'fuzzy_match', 'unmatched_line', 'amount_mismatch', 'duplicate_record'], 0)
+        for i in range(args.lines):
+            when = start + timedelta(seconds=i * step + random.uniform(0, step / 2))
+            user_id, phone = random.choice(members)
+            amount = round(random.uniform(100, 20000), 2)
+            receipt = f'S{i:09d}X'
+            kind = random.choice(kinds)
+            masked = False
+            if kind == 'mpesa':
+                mpesa.append({'amount': amount, 'phone_number': phone, 'mpesa_receipt_number': receipt,
+                              'status': 'completed', 'user_id': user_id, 'chama_id': chama.id,
+                              'created_date': when - timedelta(seconds=random.randint(5, 90))})
+            elif kind == 'manual':
+                manual.append({'user_id': user_id, 'chama_id': chama.id, 'payment_type': 'contribution',
+                               'amount': amount, 'mpesa_message': f'{receipt} Confirmed.', 'transaction_id': receipt,
+                               'verification_status': 'verified', 'created_at': when + timedelta(hours=2)})
+            elif kind == 'registration_fee':
+                fees.append({'user_id': user_id, 'chama_id': chama.id, 'amount': amount,
+                             'mpesa_receipt_number': receipt, 'payment_status': 'completed', 'created_at': when})
+            elif kind == 'transaction':
+                transactions.append({'type': 'contribution', 'amount': amount, 'status': 'completed',
+                                     'payment_method': 'mpesa', 'transaction_id': receipt, 'user_id': user_id,
+                                     'chama_id': chama.id, 'created_at': when})
+            elif kind == 'fuzzy':
+                # The STK push went through but its callback never arrived
+                masked = random.random() < 0.5
+                pending.append(({'type': 'contribution', 'amount': amount, 'status': 'pending',
+                                 'payment_method': 'mpesa', 'user_id': user_id, 'chama_id': chama.id,
+                                 'created_at': when - timedelta(seconds=random.randint(5, 120))},
+                                {'amount': amount, 'phone_number': phone, 'status': 'pending', 'user_id': user_id,
+                                 'chama_id': chama.id, 'created_date': when - timedelta(seconds=random.randint(5, 120))}))
+            elif kind == 'unmatched_line':
+                phone = f'2547{99000000 + i % 1000000:08d}'
+            elif kind == 'amount_mismatch':
+                mpesa.append({'amount': amount + 100, 'phone_number': phone, 'mpesa_receipt_number': receipt,
+                              'status': 'completed', 'user_id': user_id, 'chama_id': chama.id,
+                              'created_date': when})
+            elif kind == 'duplicate_record':
+                for _ in range(2):
+                    mpesa.append({'amount': amount, 'phone_number': phone, 'mpesa_receipt_number': receipt,
+                                  'status': 'completed', 'user_id': user_id, 'chama_id': chama.id,
+                                  'created_date': when})
+            expected[{'fuzzy': 'fuzzy_match', 'unmatched_line': 'unmatched_line'}.get(kind, 'matched')] += 1
+            if kind in ('amount_mismatch', 'duplicate_record'):
+                expected[kind] += 1
+            shown = f'{phone[:7]}***{phone[-2:]}' if masked else phone
+            lines.append([receipt, statement_time(when), statement_time(when), 'Pay Bill from ' + shown,
+                          'Completed', f'{amount:,.2f}', '', '', '', 'Pay Bill Online', f'{shown} - MEMBER',
+                          '', f'CHAMA{chama.id}'])
+
+        # Payments recorded as settled that never reached the paybill
+        missing = max(1, args.lines // 500)
+        for i in range(missing):
+            user_id, phone = random.choice(members)
+            mpesa.append({'amount': 1234.0, 'phone_number': phone, 'mpesa_receipt_number': f'M{i:09d}Z',
+                          'status': 'completed', 'user_id': user_id, 'chama_id': chama.id,
+                          'created_date': start + timedelta(days=random.randint(1, 360))})
+
+        db.session.bulk_insert_mappings(MpesaTransaction, mpesa)
+        db.session.bulk_insert_mappings(ManualPaymentVerification, manual)
+        db.session.bulk_insert_mappings(RegistrationFeePayment, fees)
+        db.session.bulk_insert_mappings(Transaction, transactions)
+        for transaction, stk_push in pending:
+            row = Transaction(**transaction)
+            db.session.add(row)
+            db.session.flush()
+            db.session.add(MpesaTransaction(transaction_id=row.id, **stk_push))
+        db.session.commit()
+
+        # Some lines exported twice, further down the file
+        repeats = max(1, args.lines // 300)
+        for _ in range(repeats):
+            index = random.randrange(len(lines) - 1)
+            lines.insert(random.randrange(index + 1, len(lines)), list(lines[index]))
+
+        path = os.path.join(workdir, 'paybill.csv')
+        debits = 0
+        with open(path, 'w', newline='') as handle:
+            writer = csv.writer(handle)
+            writer.writerow(['Organization Name:', 'CHAMALINK PAYBILL'])
+            writer.writerow(['Time Period:', '01-01-2025 - 31-12-2025'])
+            writer.writerow([])
+            writer.writerow(['Receipt No.', 'Completion Time', 'Initiation Time', 'Details', 'Transaction Status',
+                             'Paid In', 'Withdrawn', 'Balance', 'Balance Confirmed', 'Reason Type',
+                             'Other Party Info', 'Linked Transaction ID', 'A/C No.'])
+            for number, line in enumerate(lines):
+                writer.writerow(line)
+                if number % 20 == 0:
+                    debits += 1
+                    writer.writerow([f'W{number:09d}D', line[1], line[1], 'Business Payment', 'Completed', '',
+                                     '-5,000.00', '', '', 'Withdrawal', 'BANK', '', ''])
+        size = os.path.getsize(path)
+        credits = len(lines)
+        print(f"✅ Seeded {len(mpesa) + len(manual) + len(fees) + len(transactions) + 2 * len(pending):,} records; "
+              f"statement of {credits + debits:,} lines ({size / 1024 / 1024:.1f} MB)")
+
+        # Each line looked up with its own queries
+        sample = lines[:args.naive]
+        started = time.perf_counter()
+        for line in sample:
+            receipt = line[0]
+            found = (MpesaTransaction.query.filter_by(mpesa_receipt_number=receipt).all()
+                     + Transaction.query.filter_by(transaction_id=receipt).all()
+                     + ManualPaymentVerification.query.filter_by(transaction_id=receipt).all()
+                     + RegistrationFeePayment.query.filter_by(mpesa_receipt_number=receipt).all())
+            if not found:
+                amount = float(line[5].replace(',', ''))
+                MpesaTransaction.query.filter(MpesaTransaction.mpesa_receipt_number.is_(None),
+                                              MpesaTransaction.amount.between(amount - 1, amount + 1)).all()
+        naive_rate = len(sample) / (time.perf_counter() - started)
+        db.session.rollback()
+
+        run = ReconciliationRun(filename='paybill.csv', status='queued')
+        db.session.add(run)
+        db.session.commit()
+        started = time.perf_counter()
+        reconciliation.reconcile_file(run, path)
+        db.session.commit()
+        elapsed = time.perf_counter() - started
+        print(f"\n⏱️  Reconciled {run.rows_read:,} lines in {elapsed:.2f}s ({run.rows_per_second:,.0f} rows/s); "
+              f"one line at a time: {naive_rate:,.0f} rows/s")
+        print(f"   Receipt and record indexes: {run.index_bytes / 1024:,.0f} KB for a {size / 1024 / 1024:.1f} MB file")
+        print(f"   Matched {run.matched:,} by receipt and {run.fuzzy_matched:,} by amount/time; "
+              f"{run.unmatched_lines} lines and {run.unmatched_records} records unmatched")
+
+        stored = dict(db.session.query(ReconciliationItem.kind, db.func.count(ReconciliationItem.id)).filter(
+            ReconciliationItem.run_id == run.id).group_by(ReconciliationItem.kind).all())
+        masked_matched = ReconciliationItem.query.filter(ReconciliationItem.run_id == run.id,
+                                                         ReconciliationItem.kind == 'fuzzy_match',
+                                                         ReconciliationItem.phone_number.like('%*%')).count()
+        fuzzy_records = {record_type for record_type, in db.session.query(ReconciliationItem.record_type).filter(
+            ReconciliationItem.run_id == run.id, ReconciliationItem.kind == 'fuzzy_match').distinct()}
+
+        # Memory: the same file again, traced
+        traced = ReconciliationRun(filename='paybill.csv', status='queued')
+        db.session.add(traced)
+        db.session.commit()
+        tracemalloc.start()
+        reconciliation.reconcile_file(traced, path)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        db.session.commit()
+        print(f"🧠 Peak memory reconciling: {peak / 1024 / 1024:.1f} MB")
+
+        # A bank statement: references on transactions paid by bank transfer
+        bank_path = os.path.join(workdir, 'bank.csv')
+        user_id, phone = members[0]
+        bank_day = datetime(2025, 3, 3, 9)
+        db.session.bulk_insert_mappings(Transaction, [
+            {'type': 'contribution', 'amount': 50000.0, 'status': 'completed', 'payment_method': 'bank_transfer',
+             'transaction_id': 'FT2506211', 'user_id': user_id, 'chama_id': chama.id, 'created_at': bank_day},
+            {'type': 'contribution', 'amount': 75000.0, 'status': 'pending', 'payment_method': 'bank_transfer',
+             'user_id': user_id, 'chama_id': chama.id, 'created_at': bank_day + timedelta(minutes=40)},
+            {'type': 'loan_repayment', 'amount': 20000.0, 'status': 'completed', 'payment_method': 'bank_transfer',
+             'transaction_id': 'FT2506299', 'user_id': user_id, 'chama_id': chama.id,
+             'created_at': bank_day + timedelta(hours=3)},
+        ])
+        db.session.commit()
+        with open(bank_path, 'w', newline='') as handle:
+            writer = csv.writer(handle)
+            writer.writerow(['Account Statement'])
+            writer.writerow(['Transaction Date', 'Value Date', 'Reference', 'Narration', 'Debit', 'Credit', 'Balance'])
+            for when, reference, credit in ((bank_day, 'FT2506211', '50,000.00'),
+                                            (bank_day + timedelta(minutes=50), 'FT2506240', '75,000.00'),
+                                            (bank_day + timedelta(hours=5), 'FT2506288', '9,999.00')):
+                writer.writerow([statement_time(when), statement_time(when), reference, 'CHAMA DEPOSIT', '', credit, ''])
+            writer.writerow([statement_time(bank_day), statement_time(bank_day), 'CHG001', 'CHARGES', '150.00', '', ''])
+        bank = ReconciliationRun(filename='bank.csv', status='queued')
+        db.session.add(bank)
+        db.session.commit()
+        reconciliation.reconcile_file(bank, bank_path)
+        db.session.commit()
+
+        # The route: upload, job, dashboard
+        def client_for(user_id):
+            client = app.test_client()
+            with client.session_transaction() as session:
+                session['_user_id'] = str(user_id)
+            return client
+
+        upload = ''.join(open(path).readlines()[:2005]).encode('utf-8')
+        with app.app_context():
+            response = client_for(admin.id).post('/reconciliation/api/check', content_type='multipart/form-data',
+                                                 data={'statement': (BytesIO(upload), 'january.csv')})
+            queued = response.status_code == 202 and response.get_json()['status'] == 'queued'
+            uploaded_id = response.get_json().get('run_id')
+        while run_pending_jobs():
+            pass
+        db.session.expire_all()
+        uploaded = db.session.get(ReconciliationRun, uploaded_id) if uploaded_id else None
+        upload_dir = os.environ['RECONCILIATION_UPLOAD_PATH']
+        with app.app_context():
+            refused = client_for(members[1][0]).post('/reconciliation/api/check', content_type='multipart/form-data',
+                                                     data={'statement': (BytesIO(upload), 'january.csv')})
+        with app.app_context():
+            broken = client_for(admin.id).post('/reconciliation/api/check', content_type='multipart/form-data',
+                                               data={'statement': (BytesIO(b'not,a\nstatement,file\n'), 'junk.csv')})
+            broken_id = broken.get_json().get('run_id')
+        while run_pending_jobs():
+            pass
+        db.session.expire_all()
+        broken_run = db.session.get(ReconciliationRun, broken_id) if broken_id else None
+        with app.app_context():
+            page = client_for(admin.id).get(f'/reconciliation/?run={run.id}')
+            page_ok = page.status_code == 200 and b'Exceptions in paybill.csv' in page.get_data()
+        with app.app_context():
+            api = client_for(admin.id).get(f'/reconciliation/api/runs/{run.id}').get_json()
+
+        checks = [
+            ('Every money-in line read, debits skipped',
+             run.credits == credits and run.skipped == debits and run.rows_read == credits + debits),
+            ('Lines matched by receipt number', run.matched == expected['matched']),
+            ('Lines without a receipt matched by amount, phone and time',
+             run.fuzzy_matched == expected['fuzzy_match'] and masked_matched > 0 and fuzzy_records == {'mpesa'}),
+            ('Lines missing from the records found', run.unmatched_lines == expected['unmatched_line']),
+            ('Payments missing from the statement found', run.unmatched_records == missing),
+            ('Repeated lines found across chunks', run.duplicate_lines == repeats),
+            ('Receipts recorded twice found', run.duplicate_records == expected['duplicate_record']),
+            ('Amount mismatches found', run.amount_mismatches == expected['amount_mismatch']),
+            ('Every exception stored', stored.get('unmatched_line', 0) == run.unmatched_lines
+             and stored.get('fuzzy_match', 0) == run.fuzzy_matched
+             and stored.get('duplicate_line', 0) == run.duplicate_lines),
+            ('Faster than looking up each line', run.rows_per_second > naive_rate),
+            ('Indexes take a few bytes a line', run.index_bytes <= 24 * credits),
+            ('Memory held to a chunk plus the indexes', peak < 16 * 1024 * 1024 + 2 * traced.index_bytes),
+            ('Traced run agrees', traced.matched == run.matched and traced.unmatched_records == run.unmatched_records),
+            ('Bank statement reconciled against bank transfers',
+             bank.statement_type == 'bank' and bank.matched == 1 and bank.fuzzy_matched == 1
+             and bank.unmatched_lines == 1 and bank.unmatched_records == 1 and bank.skipped == 1),
+            ('Upload queued and reconciled by a job', queued and uploaded is not None
+             and uploaded.status == 'completed' and uploaded.rows_read == 2001 and not os.listdir(upload_dir)),
+            ('Unreadable statement marks the run failed', broken_run is not None and broken_run.status == 'failed'
+             and 'header' in (broken_run.error or '')),
+            ('Members cannot upload statements', refused.status_code == 403),
+            ('Dashboard and API show the run', page_ok and api['matched'] == run.matched and len(api['items']) > 0),
+        ]
+
+        print("\n🔍 Verification")
+        for label, passed in checks:
+            print(f"   {'✅' if passed else '❌'} {label}")
+
+        success = all(passed for _, passed in checks)
+        print("\n🎉 Reconciliation benchmark passed" if success else "\n❌ Reconciliation benchmark failed")
+        return success
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
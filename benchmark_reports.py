@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Report Benchmark
+Seeds a throwaway database with a busy chama (50,000 transactions over a
+year by default), renders the financial report dashboard and checks that
+the SQL-side figures match a full Python recount and that memory stays
+flat as the transaction count grows.
+
+Usage:
+    python benchmark_reports.py                        # 50000 transactions
+    python benchmark_reports.py --transactions 200000 --members 100
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the chama financial report')
+    parser.add_argument('--transactions', type=int, default=50000, help='Transactions in the busy chama')
+    parser.add_argument('--members', type=int, default=50, help='Members contributing')
+    parser.add_argument('--seed', type=int, default=3, help='Random seed')
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    workdir = tempfile.mkdtemp(prefix='chamalink-reports-')
+    os.environ['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(workdir, 'reports.db')}"
+    os.environ['JOB_WORKER_CONCURRENCY'] = '0'
+
+    from app import create_app, db
+    from app.models import User, Chama, Transaction, LoanApplication, Penalty
+    from app.utils.reporting import build_chama_report
+
+    app = create_app()
+    app.config['WTF_CSRF_ENABLED'] = False
+
+    with app.app_context():
+        print("📊 REPORT BENCHMARK")
+        print("=" * 50)
+        db.create_all()
+
+        users = [User(username=f'member{i}', email=f'member{i}@example.com', password_hash='x') for i in range(args.members)]
+        db.session.add_all(users)
+        db.session.flush()
+        small = Chama(name='Quiet Chama', creator_id=users[0].id, total_balance=0.0)
+        busy = Chama(name='Busy Chama', creator_id=users[0].id, total_balance=0.0)
+        db.session.add_all([small, busy])
+        db.session.flush()
+        for user in users:
+            busy.add_member(user.id)
+
+        now = datetime.utcnow()
+        types = ['contribution'] * 6 + ['loan_repayment'] * 2 + ['withdrawal', 'penalty_payment']
+        for chama, count in ((small, max(args.transactions // 10, 1)), (busy, args.transactions)):
+            db.session.bulk_insert_mappings(Transaction, [
+                {'type': random.choice(types), 'amount': float(random.randint(1, 100) * 50), 'status': 'completed',
+                 'user_id': random.choice(users).id, 'chama_id': chama.id, 'description': 'Seeded',
+                 'created_at': now - timedelta(minutes=random.randint(0, 365 * 24 * 60))}
+                for _ in range(count)
+            ])
+            db.session.bulk_insert_mappings(LoanApplication, [
+                {'amount': float(random.randint(10, 100) * 100), 'purpose': 'Stock', 'repayment_period': 6,
+                 'status': random.choice(['pending', 'approved', 'rejected']), 'user_id': random.choice(users).id,
+                 'chama_id': chama.id, 'application_date': now - timedelta(days=random.randint(0, 365))}
+                for _ in range(count // 100)
+            ])
+            db.session.bulk_insert_mappings(Penalty, [
+                {'type': 'late_payment', 'amount': 100.0, 'user_id': random.choice(users).id,
+                 'chama_id': chama.id, 'created_date': now - timedelta(days=random.randint(0, 365))}
+                for _ in range(count // 50)
+            ])
+        db.session.commit()
+        print(f"✅ Seeded {args.transactions} transactions for '{busy.name}' and {args.transactions // 10} for '{small.name}'")
+
+        start_dt = now - timedelta(days=366)
+        end_dt = now + timedelta(days=1)
+
+        # Memory: the report for 10x the rows should cost about the same
+        peaks = {}
+        for chama in (small, busy):
+            db.session.expire_all()
+            tracemalloc.start()
+            started = time.perf_counter()
+            report = build_chama_report(chama.id, start_dt, end_dt)
+            elapsed = time.perf_counter() - started
+            peaks[chama.id] = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            print(f"   {chama.name:<12} {report['transaction_count']:>8} transactions  "
+                  f"{elapsed * 1000:7.1f}ms  peak {peaks[chama.id] / 1024:7.0f} KiB")
+
+        # Correctness: recount the busy chama in Python
+        rows = Transaction.query.filter_by(chama_id=busy.id).all()
+        contributions = sum(t.amount for t in rows if t.type == 'contribution')
+        repayments = sum(t.amount for t in rows if t.type == 'loan_repayment')
+        by_member = {}
+        for t in rows:
+            if t.type == 'contribution':
+                by_member[t.user_id] = by_member.get(t.user_id, 0) + t.amount
+        expected_top = sorted(by_member.values(), reverse=True)[:5]
+        loans = LoanApplication.query.filter_by(chama_id=busy.id).all()
+        penalties = Penalty.query.filter_by(chama_id=busy.id).all()
+        report = build_chama_report(busy.id, start_dt, end_dt)
+
+        # Full page render through the real route
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['_user_id'] = str(users[0].id)
+        started = time.perf_counter()
+        response = client.get(f'/reports/chama/{busy.id}?start_date={start_dt:%Y-%m-%d}&end_date={now:%Y-%m-%d}')
+        render_ms = (time.perf_counter() - started) * 1000
+        print(f"\n🖥️  Report page rendered in {render_ms:.0f}ms (HTTP {response.status_code})")
+
+        checks = [
+            ('Transaction count', report['transaction_count'] == len(rows)),
+            ('Contribution total', abs(report['total_contributions'] - contributions) < 0.01),
+            ('Loan repayment total', abs(report['total_loan_repayments'] - repayments) < 0.01),
+            ('Approved loans total', abs(report['total_loans'] - sum(l.amount for l in loans if l.status == 'approved')) < 0.01),
+            ('Penalty total', abs(report['total_penalties'] - sum(p.amount for p in penalties)) < 0.01),
+            ('Top contributors', [round(c['amount'], 2) for c in report['top_contributors']] == [round(a, 2) for a in expected_top]),
+            ('One page of transactions', len(report['transactions']) == min(20, len(rows))),
+            ('Memory flat across 10x rows', peaks[busy.id] < peaks[small.id] * 2),
+            ('Report page renders', response.status_code == 200),
+        ]
+
+        print("\n🔍 Verification")
+        for label, passed in checks:
+            print(f"   {'✅' if passed else '❌'} {label}")
+
+        success = all(passed for _, passed in checks)
+        print("\n🎉 Report benchmark passed" if success else "\n❌ Report benchmark failed")
+        return success
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
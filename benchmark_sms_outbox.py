@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+SMS Outbox Benchmark
+Seeds a throwaway database with a large chama, queues an AGM reminder and
+a meeting reminder through the SMS helpers, commits, and drains the job
+outbox with the local stand-in provider. Checks that the helpers return without waiting
+for the provider, that identical messages are coalesced into bulk
+requests, that temporary failures are retried with backoff, permanent ones
+fail at once, that a dispatcher job failing after a send does not send
+again, and that the per-account rate limit holds messages back.
+
+Usage:
+    python benchmark_sms_outbox.py                   # 5000 members
+    python benchmark_sms_outbox.py --members 20000
+"""
+
+import argparse
+import math
+import os
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+class FrozenClock:
+    """Stands in for the time module in the rate limiter, so windows never roll over mid-run"""
+
+    def __init__(self, now):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the SMS outbox')
+    parser.add_argument('--members', type=int, default=5000, help='Members of the chama')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='chamalink-sms-')
+    os.environ['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(workdir, 'sms.db')}"
+    os.environ['JOB_WORKER_CONCURRENCY'] = '0'
+    os.environ['SMS_PROVIDER'] = 'local'
+
+    from app import create_app, db
+    from app.models import User, Chama, SmsMessage, OutboxJob, chama_members
+    from app.utils import sms_outbox
+    from app.utils.sms_outbox import get_sms_provider, SMS_BATCH_SIZE
+    from app.utils.sms_service import queue_agm_reminder_sms, queue_bulk_meeting_reminder, format_phone_number
+    from app.utils.jobs import run_pending_jobs
+    from app.utils import rate_limiter
+    from app.utils.rate_limiter import get_limiter_backend
+
+    app = create_app()
+
+    with app.app_context():
+        print("📨 SMS OUTBOX BENCHMARK")
+        print("=" * 50)
+        db.create_all()
+
+        db.session.bulk_insert_mappings(User, [
+            {'username': f'member{i}', 'email': f'member{i}@example.com', 'password_hash': 'x',
+             'phone_number': f'07{i:08d}' if i % 10 else None}
+            for i in range(args.members)
+        ])
+        db.session.flush()
+        user_ids = [row[0] for row in db.session.query(User.id)]
+        chama = Chama(name='Big Chama', creator_id=user_ids[0], total_balance=0.0)
+        db.session.add(chama)
+        db.session.flush()
+        db.session.execute(chama_members.insert(), [
+            {'chama_id': chama.id, 'user_id': user_id, 'role': 'member'} for user_id in user_ids
+        ])
+        db.session.commit()
+        members = User.query.all()
+        phones = [format_phone_number(m.phone_number) for m in members if m.phone_number]
+        print(f"✅ Seeded {args.members} members, {len(phones)} with phone numbers")
+
+        provider = get_sms_provider()
+        sms_outbox.SMS_RATE_LIMIT = 10 ** 9
+        # However long the drain takes, no retry comes due and no rate window moves until the checks say so
+        sms_outbox.SMS_RETRY_DELAY = 24 * 3600
+        sms_outbox.SMS_RATE_WINDOW = 24 * 3600
+        rate_limiter.time = FrozenClock(time.time())
+        invalid, flaky = phones[1], phones[2]
+        provider.failures = {invalid: 403, flaky: 500}
+
+        started = time.perf_counter()
+        ok, note = queue_agm_reminder_sms(members, chama, date.today() + timedelta(days=14), 'Community Hall')
+        agm_ms = (time.perf_counter() - started) * 1000
+        ok2, _ = queue_bulk_meeting_reminder(chama, date.today() + timedelta(days=7))
+        db.session.commit()
+        print(f"\n⏱️  AGM reminder call: {agm_ms:.1f}ms ({note})")
+
+        started = time.perf_counter()
+        while run_pending_jobs():
+            pass
+        drain = time.perf_counter() - started
+        first_requests = provider.requests
+        print(f"🚚 Sent {len(provider.sent)} messages in {first_requests} requests ({drain:.2f}s)")
+
+        expected_requests = 2 * math.ceil(len(phones) / SMS_BATCH_SIZE)
+        per_number = {}
+        for number, message in provider.sent:
+            per_number.setdefault(number, []).append(message)
+        invalid_row = SmsMessage.query.filter_by(phone_number=invalid, category='agm_reminder').one()
+        flaky_row = SmsMessage.query.filter_by(phone_number=flaky, category='agm_reminder').one()
+        flaky_backoff = flaky_row.status == 'queued' and flaky_row.next_attempt_at > datetime.utcnow()
+
+        # The flaky number recovers once its retry comes due
+        provider.failures = {invalid: 403}
+        SmsMessage.query.filter_by(status='queued').update({SmsMessage.next_attempt_at: datetime.utcnow()})
+        db.session.commit()
+        sms_outbox.schedule_dispatch()
+        db.session.commit()
+        while run_pending_jobs():
+            pass
+        db.session.refresh(flaky_row)
+
+        # A dispatcher job that fails after sending keeps what it sent
+        provider.clear()
+        sms_outbox.queue_sms(phones[:3], 'Late notice', category='late')
+        db.session.commit()
+        continue_dispatch = sms_outbox.outbox.continue_dispatch
+        sms_outbox.outbox.continue_dispatch = lambda *args: 1 / 0
+        run_pending_jobs()
+        sms_outbox.outbox.continue_dispatch = continue_dispatch
+        OutboxJob.query.filter_by(status='pending').update({OutboxJob.run_after: datetime.utcnow()})
+        db.session.commit()
+        while run_pending_jobs():
+            pass
+        kept_sent = (len(provider.sent) == 3 and
+                     SmsMessage.query.filter_by(category='late', status='sent').count() == 3)
+
+        # A tight account limit holds the rest back for a later dispatcher
+        provider.clear()
+        get_limiter_backend().reset('sms:local')
+        sms_outbox.SMS_RATE_LIMIT = 150
+        sms_outbox.queue_sms(phones[:400], 'Throttled notice', category='test')
+        db.session.commit()
+        while run_pending_jobs():
+            pass
+        held = SmsMessage.query.filter_by(category='test', status='queued').count()
+        delayed = OutboxJob.query.filter(OutboxJob.job_type == 'sms_dispatch', OutboxJob.status == 'pending',
+                                         OutboxJob.run_after > datetime.utcnow()).count()
+
+        checks = [
+            ('Helpers queue instead of sending', ok and ok2 and 'queued' in note),
+            ('Identical messages coalesced into bulk requests', first_requests == expected_requests),
+            ('Each reachable member got each reminder once',
+             all(len(messages) == 2 for number, messages in per_number.items() if number not in (invalid, flaky))
+             and len(per_number) == len(phones) - 2),
+            ('Invalid number failed without retry', invalid_row.status == 'failed' and invalid_row.attempts == 1),
+            ('Temporary failure retried with backoff', flaky_backoff),
+            ('Retry delivered once due', flaky_row.status == 'sent' and flaky_row.attempts == 2),
+            ('Failed dispatcher job resends nothing it sent', kept_sent),
+            ('Rate limit holds the rest back', held == 250 and delayed == 1),
+        ]
+
+        print("\n🔍 Verification")
+        for label, passed in checks:
+            print(f"   {'✅' if passed else '❌'} {label}")
+
+        success = all(passed for _, passed in checks)
+        print("\n🎉 SMS outbox benchmark passed" if success else "\n❌ SMS outbox benchmark failed")
+        return success
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Transaction Feed Benchmark
+Seeds a throwaway database with a busy chama, walks its whole transaction
+history with keyset (cursor) pagination and compares the cost of a deep
+page against OFFSET pagination. Also checks filters, summary totals and
+ETag revalidation (If-None-Match -> 304), which for an unchanged page must
+run no queries.
+
+Usage:
+    python benchmark_transaction_feed.py                       # 100000 transactions
+    python benchmark_transaction_feed.py --transactions 500000 --page-size 100
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark keyset pagination of the transaction feed')
+    parser.add_argument('--transactions', type=int, default=100000, help='Transactions in the busy chama')
+    parser.add_argument('--page-size', type=int, default=50, help='Rows per page')
+    parser.add_argument('--seed', type=int, default=11, help='Random seed')
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    workdir = tempfile.mkdtemp(prefix='chamalink-feed-')
+    os.environ['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(workdir, 'feed.db')}"
+    os.environ['JOB_WORKER_CONCURRENCY'] = '0'
+
+    from sqlalchemy import desc, event
+    from app import create_app, db
+    from app.models import User, Chama, Transaction
+    from app.utils.transaction_feed import (transaction_page, transaction_summary, feed_data, etag_json,
+                                            encode_cursor, decode_cursor)
+
+    app = create_app()
+    app.config['WTF_CSRF_ENABLED'] = False
+
+    with app.app_context():
+        print("📱 TRANSACTION FEED BENCHMARK")
+        print("=" * 50)
+        db.create_all()
+
+        users = [User(username=f'member{i}', email=f'member{i}@example.com', password_hash='x') for i in range(20)]
+        db.session.add_all(users)
+        db.session.flush()
+        chama = Chama(name='Busy Chama', creator_id=users[0].id, total_balance=0.0)
+        db.session.add(chama)
+        db.session.flush()
+        for user in users:
+            chama.add_member(user.id)
+
+        # Coarse timestamps so many rows share a created_at and the id tiebreak matters
+        now = datetime.utcnow().replace(microsecond=0)
+        db.session.bulk_insert_mappings(Transaction, [
+            {'type': random.choice(['contribution'] * 4 + ['withdrawal', 'loan']),
+             'status': random.choice(['completed'] * 9 + ['pending']),
+             'amount': float(random.randint(1, 100) * 50), 'user_id': random.choice(users).id,
+             'chama_id': chama.id, 'created_at': now - timedelta(minutes=random.randint(0, 30 * 24 * 60))}
+            for _ in range(args.transactions)
+        ])
+        db.session.commit()
+        print(f"✅ Seeded {args.transactions} transactions")
+
+        # Walk the full history page by page
+        started = time.perf_counter()
+        seen, cursor, pages, last_key, ordered = [], None, 0, None, True
+        while True:
+            page = transaction_page([chama.id], cursor, args.page_size)
+            for transaction in page['transactions']:
+                key = (transaction.created_at, transaction.id)
+                if last_key is not None and key >= last_key:
+                    ordered = False
+                last_key = key
+                seen.append(transaction.id)
+            pages += 1
+            cursor = page['next_cursor']
+            if cursor is None:
+                break
+            db.session.expunge_all()
+        walk = time.perf_counter() - started
+        print(f"\n🚶 Walked {pages} pages in {walk:.2f}s ({walk / pages * 1000:.2f}ms per page)")
+
+        # Deepest page: keyset vs OFFSET
+        deep_offset = (pages - 1) * args.page_size
+        started = time.perf_counter()
+        offset_rows = Transaction.query.filter_by(chama_id=chama.id).order_by(
+            desc(Transaction.created_at), desc(Transaction.id)
+        ).offset(deep_offset).limit(args.page_size).all()
+        offset_ms = (time.perf_counter() - started) * 1000
+
+        before_last = db.session.get(Transaction, seen[deep_offset - 1]) if deep_offset else None
+        started = time.perf_counter()
+        keyset_rows = transaction_page([chama.id], encode_cursor(before_last) if before_last else None,
+                                       args.page_size)['transactions']
+        keyset_ms = (time.perf_counter() - started) * 1000
+        print(f"📉 Last page: OFFSET {offset_ms:.1f}ms vs keyset {keyset_ms:.1f}ms")
+
+        # Filters and totals
+        filtered = transaction_page([chama.id], None, args.page_size, types=['withdrawal'], statuses=['pending'])
+        summary = transaction_summary([chama.id])
+        rows = Transaction.query.filter_by(chama_id=chama.id).all()
+        expected_balance = sum(t.amount if t.type == 'contribution' else -t.amount
+                               for t in rows if t.status == 'completed' and t.type in ('contribution', 'withdrawal'))
+
+        # ETag revalidation: an unchanged page comes from the fragment cache without queries
+        with app.test_request_context('/'):
+            first = etag_json(*feed_data([chama.id], None, args.page_size))
+        etag = first.get_etag()[0]
+        statements = []
+
+        @event.listens_for(db.engine, 'before_cursor_execute')
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        with app.test_request_context('/', headers={'If-None-Match': f'"{etag}"'}):
+            revalidated = etag_json(*feed_data([chama.id], None, args.page_size))
+        event.remove(db.engine, 'before_cursor_execute', record)
+        db.session.add(Transaction(type='contribution', amount=10.0, user_id=users[0].id, chama_id=chama.id))
+        db.session.commit()
+        with app.test_request_context('/', headers={'If-None-Match': f'"{etag}"'}):
+            after_write = etag_json(*feed_data([chama.id], None, args.page_size))
+
+        bad_cursor = False
+        try:
+            decode_cursor('not-a-cursor')
+        except ValueError:
+            bad_cursor = True
+
+        checks = [
+            ('Every transaction visited exactly once', sorted(seen) == sorted(t.id for t in rows) and len(seen) == len(set(seen))),
+            ('Strictly newest first on (created_at, id)', ordered),
+            ('Keyset last page matches OFFSET', [t.id for t in keyset_rows] == [t.id for t in offset_rows]),
+            ('Filters applied in SQL', all(t.type == 'withdrawal' and t.status == 'pending' for t in filtered['transactions'])),
+            ('Summary count', summary['count'] == len(rows)),
+            ('Summary pending count', summary['pending_count'] == sum(1 for t in rows if t.status == 'pending')),
+            ('Summary balance', abs(summary['balance'] - expected_balance) < 0.01),
+            ('Unchanged page revalidates with 304', first.status_code == 200 and revalidated.status_code == 304),
+            ('Revalidation runs no queries', not statements),
+            ('New transaction changes the ETag', after_write.status_code == 200),
+            ('Malformed cursor rejected', bad_cursor),
+        ]
+
+        print("\n🔍 Verification")
+        for label, passed in checks:
+            print(f"   {'✅' if passed else '❌'} {label}")
+
+        success = all(passed for _, passed in checks)
+        print("\n🎉 Transaction feed benchmark passed" if success else "\n❌ Transaction feed benchmark failed")
+        return success
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
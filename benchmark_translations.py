@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Translation Benchmark
+Renders a dashboard-sized template with 200 translated strings using the
+previous t() (open and json.load translations/<lang>.json on every call)
+and the in-memory TranslationCatalog, and reports render times.
+
+Usage:
+    python benchmark_translations.py                    # 500 renders, Kiswahili
+    python benchmark_translations.py --renders 2000 --language en --strings 400
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+def legacy_load_translations(root_path, language_code):
+    """The pre-catalog load_translations, kept here for comparison"""
+    translations_file = os.path.join(root_path, 'translations', f'{language_code}.json')
+    try:
+        with open(translations_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        fallback_file = os.path.join(root_path, 'translations', 'en.json')
+        try:
+            with open(fallback_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+def build_template(keys, strings):
+    """Dashboard-like markup: cards, table headers and buttons, half via t(), half via |t"""
+    rows = []
+    for index in range(strings):
+        key = keys[index % len(keys)]
+        if index % 2:
+            rows.append(f'<div class="card"><h5>{{{{ t("{key}") }}}}</h5><span>{{{{ amount }}}}</span></div>')
+        else:
+            rows.append(f'<button class="btn">{{{{ "{key}"|t }}}}</button>')
+    return '<div class="dashboard">\n' + '\n'.join(rows) + '\n</div>'
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark template translation')
+    parser.add_argument('--renders', type=int, default=500, help='Template renders per variant')
+    parser.add_argument('--strings', type=int, default=200, help='Translated strings per render')
+    parser.add_argument('--language', default='sw', help='Language to render in')
+    args = parser.parse_args()
+
+    # Throwaway database so create_app() does not need a configured one
+    workdir = tempfile.mkdtemp(prefix='chamalink-i18n-')
+    os.environ.setdefault('SQLALCHEMY_DATABASE_URI', f"sqlite:///{os.path.join(workdir, 'bench.db')}")
+    os.environ['JOB_WORKER_CONCURRENCY'] = '0'
+
+    from flask import session
+    from app import create_app
+    from app.utils.internationalization import get_current_language, get_translation_catalog
+
+    app = create_app()
+
+    print("🌍 TRANSLATION BENCHMARK")
+    print("=" * 50)
+
+    with app.test_request_context('/dashboard'):
+        session['language'] = args.language
+        keys = list(get_translation_catalog().messages('en').keys())
+        source = build_template(keys, args.strings)
+
+        def legacy_t(key, **kwargs):
+            translation = legacy_load_translations(app.root_path, get_current_language()).get(key, key)
+            if kwargs:
+                try:
+                    translation = translation.format(**kwargs)
+                except KeyError:
+                    pass
+            return translation
+
+        legacy_env = app.jinja_env.overlay()
+        legacy_env.filters['t'] = legacy_t
+        variants = [
+            ('legacy', legacy_env.from_string(source), {'t': legacy_t}),
+            ('catalog', app.jinja_env.from_string(source), {}),
+        ]
+
+        print(f"{args.renders} renders of {args.strings} strings in '{args.language}'\n")
+        results = {}
+        for label, template, extra in variants:
+            context = {'amount': 'KES 12,500', **extra}
+            app.update_template_context(context)
+            template.render(**context)  # warm up
+            started = time.perf_counter()
+            for _ in range(args.renders):
+                html = template.render(**context)
+            elapsed = time.perf_counter() - started
+            results[label] = html
+            print(f"   {label:<10} {elapsed / args.renders * 1000:8.3f}ms per render")
+            results[label + '_time'] = elapsed
+
+        same = results['legacy'] == results['catalog']
+        print(f"\n⚡ Speed-up: {results['legacy_time'] / results['catalog_time']:.1f}x")
+        print(f"{'✅' if same else '❌'} Rendered output {'identical' if same else 'differs'}")
+        return same
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
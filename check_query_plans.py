@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+Query Plan Regression Check
+Runs the hot queries behind reports.chama_dashboard, main.dashboard,
+Notification.get_unread_count and the M-Pesa callback through EXPLAIN on a
+seeded database and fails if any of them falls back to a full table scan.
+
+SQLite (default, throwaway database) reads EXPLAIN QUERY PLAN; PostgreSQL
+reads EXPLAIN with sequential scans disabled, so a Seq Scan in the plan
+means no usable index exists.
+
+Usage:
+    python check_query_plans.py                              # throwaway SQLite database
+    python check_query_plans.py --database postgresql://...  # existing schema, seeded data is left alone
+    python check_query_plans.py --verbose                    # print every plan
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+from datetime import datetime, date, timedelta
+
+# Tables the reports and dashboards hit on every page view
+HOT_TABLES = {
+    'transactions', 'chama_members', 'notifications', 'mpesa_transactions',
+    'mpesa_callbacks', 'loan_applications', 'penalties', 'events'
+}
+
+def hot_queries(user_id, chama_id, chama_ids, checkout_request_id):
+    """(label, select statement) for each query the check covers"""
+    from sqlalchemy import desc, func
+    from app import db
+    from app.models import Chama, Transaction, LoanApplication, Penalty, Event, Notification, MpesaTransaction, MpesaCallback
+    from app.models.chama import chama_members
+
+    start_dt = datetime.utcnow() - timedelta(days=30)
+    end_dt = datetime.utcnow() + timedelta(days=1)
+
+    return [
+        ('reports.chama_dashboard transactions', Transaction.query.filter(
+            Transaction.chama_id == chama_id,
+            Transaction.created_at >= start_dt,
+            Transaction.created_at < end_dt
+        ).order_by(Transaction.created_at.desc())),
+        ('reports.chama_dashboard contributions by member', db.session.query(
+            Transaction.user_id, func.sum(Transaction.amount)
+        ).filter(
+            Transaction.chama_id == chama_id,
+            Transaction.type == 'contribution',
+            Transaction.created_at >= start_dt,
+            Transaction.created_at < end_dt
+        ).group_by(Transaction.user_id)),
+        ('reports.chama_dashboard loans', LoanApplication.query.filter(
+            LoanApplication.chama_id == chama_id,
+            LoanApplication.application_date >= start_dt,
+            LoanApplication.application_date < end_dt
+        )),
+        ('reports.chama_dashboard penalties', Penalty.query.filter(
+            Penalty.chama_id == chama_id,
+            Penalty.created_date >= start_dt,
+            Penalty.created_date < end_dt
+        )),
+        ('main.dashboard user chamas', db.session.query(Chama).join(chama_members).filter(
+            chama_members.c.user_id == user_id
+        )),
+        ('main.dashboard recent transactions', Transaction.query.join(Chama).filter(
+            Chama.id.in_(chama_ids)
+        ).order_by(desc(Transaction.created_at)).limit(10)),
+        ('main.dashboard upcoming events', Event.query.join(Chama).filter(
+            Chama.id.in_(chama_ids),
+            Event.event_date >= date.today()
+        ).order_by(Event.event_date).limit(5)),
+        ('chama members', db.session.query(chama_members).filter(
+            chama_members.c.chama_id == chama_id
+        )),
+        ('membership check', db.session.query(chama_members).filter(
+            chama_members.c.user_id == user_id,
+            chama_members.c.chama_id == chama_id
+        )),
+        ('Notification.get_unread_count', Notification.query.filter_by(
+            user_id=user_id, is_read=False
+        ).with_entities(func.count(Notification.id))),
+        ('Notification.get_user_notifications', Notification.query.filter_by(
+            user_id=user_id
+        ).order_by(Notification.created_date.desc()).limit(50)),
+        ('mpesa_callback payment lookup', MpesaTransaction.query.filter_by(
+            checkout_request_id=checkout_request_id
+        )),
+        ('mpesa_callback transaction backref', MpesaTransaction.query.filter(
+            MpesaTransaction.transaction_id == 1
+        )),
+        ('mpesa_callback inbox batch', db.session.query(MpesaCallback.id).filter(
+            MpesaCallback.status == 'received'
+        ).order_by(MpesaCallback.id).limit(500)),
+        ('user payment history', MpesaTransaction.query.filter_by(
+            user_id=user_id
+        ).order_by(MpesaTransaction.created_date.desc()).limit(20)),
+    ]
+
+def explain(connection, statement):
+    """Return the plan as a list of text lines"""
+    compiled = statement.compile(dialect=connection.dialect, compile_kwargs={'render_postcompile': True})
+    if compiled.positional:
+        params = compiled.construct_params()
+        params = tuple(params[name] for name in compiled.positiontup)
+    else:
+        params = compiled.construct_params()
+
+    if connection.dialect.name == 'sqlite':
+        rows = connection.exec_driver_sql(f'EXPLAIN QUERY PLAN {compiled}', params).fetchall()
+        return [row[-1] for row in rows]
+    rows = connection.exec_driver_sql(f'EXPLAIN {compiled}', params).fetchall()
+    return [row[0] for row in rows]
+
+def full_scans(dialect_name, plan):
+    """Hot tables the plan reads in full"""
+    scanned = set()
+    for line in plan:
+        words = line.replace('(', ' ').split()
+        if dialect_name == 'sqlite':
+            # "SCAN t" reads every row; "SEARCH t USING INDEX" and covering
+            # index scans of a bounded range do not
+            if words[:1] == ['SCAN'] and len(words) > 1 and 'INDEX' not in words:
+                scanned.add(words[1])
+        elif 'Seq' in words and 'Scan' in words and 'on' in words:
+            scanned.add(words[words.index('on') + 1])
+    return scanned & HOT_TABLES
+
+def seed(db, chamas=20, members=10, transactions_per_chama=200):
+    """Enough rows that the planner has a real choice to make"""
+    from app.models import User, Chama, Transaction, Notification, MpesaTransaction, LoanApplication, Penalty
+    from app.models.chama import chama_members
+
+    users = [User(username=f'plan{i}', email=f'plan{i}@example.com', password_hash='x') for i in range(members)]
+    db.session.add_all(users)
+    db.session.flush()
+    chama_rows = [Chama(name=f'Plan Chama {i}', creator_id=users[0].id) for i in range(chamas)]
+    db.session.add_all(chama_rows)
+    db.session.flush()
+
+    db.session.execute(chama_members.insert(), [
+        {'user_id': user.id, 'chama_id': chama.id, 'role': 'member'} for chama in chama_rows for user in users
+    ])
+    now = datetime.utcnow()
+    db.session.bulk_insert_mappings(Transaction, [
+        {'type': 'contribution' if i % 3 else 'loan_repayment', 'amount': 100.0 + i, 'status': 'completed',
+         'user_id': users[i % members].id, 'chama_id': chama.id, 'created_at': now - timedelta(hours=i)}
+        for chama in chama_rows for i in range(transactions_per_chama)
+    ])
+    db.session.bulk_insert_mappings(Notification, [
+        {'user_id': user.id, 'title': 'Contribution received', 'message': 'Thanks', 'type': 'info',
+         'is_read': bool(i % 4), 'created_date': now - timedelta(hours=i)}
+        for user in users for i in range(100)
+    ])
+    db.session.bulk_insert_mappings(MpesaTransaction, [
+        {'checkout_request_id': f'ws_CO_PLAN{i:06d}', 'amount': 500.0, 'phone_number': '254712345678',
+         'status': 'completed', 'user_id': users[i % members].id, 'chama_id': chama_rows[i % chamas].id,
+         'transaction_id': i + 1, 'created_date': now - timedelta(hours=i)}
+        for i in range(chamas * 50)
+    ])
+    db.session.bulk_insert_mappings(LoanApplication, [
+        {'amount': 1000.0, 'purpose': 'Stock', 'repayment_period': 6, 'user_id': users[i % members].id,
+         'chama_id': chama.id, 'application_date': now - timedelta(days=i)}
+        for chama in chama_rows for i in range(20)
+    ])
+    db.session.bulk_insert_mappings(Penalty, [
+        {'type': 'late_payment', 'amount': 50.0, 'user_id': users[i % members].id,
+         'chama_id': chama.id, 'created_date': now - timedelta(days=i)}
+        for chama in chama_rows for i in range(20)
+    ])
+    db.session.commit()
+    return users[0].id, chama_rows[0].id, [chama.id for chama in chama_rows[:5]], 'ws_CO_PLAN000001'
+
+def main():
+    parser = argparse.ArgumentParser(description='Check that hot queries use indexes')
+    parser.add_argument('--database', help='Database URL (default: a throwaway SQLite database)')
+    parser.add_argument('--verbose', action='store_true', help='Print every plan')
+    args = parser.parse_args()
+
+    throwaway = not args.database
+    if throwaway:
+        workdir = tempfile.mkdtemp(prefix='chamalink-plans-')
+        args.database = f"sqlite:///{os.path.join(workdir, 'plans.db')}"
+    os.environ['SQLALCHEMY_DATABASE_URI'] = args.database
+    os.environ['JOB_WORKER_CONCURRENCY'] = '0'
+
+    from app import create_app, db
+    from app.models import User, Chama
+
+    app = create_app()
+
+    with app.app_context():
+        print("🧭 QUERY PLAN CHECK")
+        print("=" * 50)
+        print(f"Database: {db.engine.dialect.name}")
+
+        if throwaway:
+            db.create_all()
+            user_id, chama_id, chama_ids, checkout_request_id = seed(db)
+            print("✅ Seeded throwaway database")
+        else:
+            user_id = db.session.query(User.id).limit(1).scalar() or 1
+            chama_id = db.session.query(Chama.id).limit(1).scalar() or 1
+            chama_ids = [row[0] for row in db.session.query(Chama.id).limit(5)] or [1]
+            checkout_request_id = 'ws_CO_PLAN000001'
+
+        connection = db.session.connection()
+        if db.engine.dialect.name == 'sqlite':
+            connection.exec_driver_sql('ANALYZE')
+        elif db.engine.dialect.name == 'postgresql':
+            connection.exec_driver_sql('SET LOCAL enable_seqscan = off')
+
+        failures = 0
+        for label, query in hot_queries(user_id, chama_id, chama_ids, checkout_request_id):
+            statement = query.statement if hasattr(query, 'statement') else query
+            plan = explain(connection, statement)
+            scanned = full_scans(db.engine.dialect.name, plan)
+            if scanned:
+                failures += 1
+                print(f"   ❌ {label}: full scan of {', '.join(sorted(scanned))}")
+            else:
+                print(f"   ✅ {label}")
+            if args.verbose or scanned:
+                for line in plan:
+                    print(f"        {line}")
+
+        db.session.rollback()
+        print(f"\n{'🎉 All hot queries use indexes' if not failures else f'❌ {failures} queries scan hot tables'}")
+        return failures == 0
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+Subscription Expiry Sweeper
+Moves lapsed trials to 'trial_expired' and lapsed subscriptions to 'expired'
+in two bulk updates, and queues expiry warning emails for subscriptions
+ending within a week (each warning once). Run it from cron (e.g. every 15
+minutes) so request handlers only ever read subscription state; the job
+workers send the warnings through pooled SMTP connections.
+
+Usage:
+    python expire_subscriptions.py
+"""
+
+import sys
+from app import create_app, db
+from app.utils.subscription_middleware import expire_subscriptions, queue_expiry_warnings
+
+def main():
+    app = create_app()
+
+    with app.app_context():
+        print("⏰ SUBSCRIPTION EXPIRY SWEEP")
+        print("=" * 50)
+
+        try:
+            expired_trials, expired_subscriptions = expire_subscriptions()
+            warnings = queue_expiry_warnings()
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"❌ Expiry sweep failed: {e}")
+            import traceback
+            traceback.print_exc()
+            return False
+
+        print(f"✅ Expired {expired_trials} trials")
+        print(f"✅ Expired {expired_subscriptions} subscriptions")
+        print(f"✅ Queued {warnings} expiry warnings")
+        return True
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
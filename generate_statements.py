@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Member Statements
+Queues the month-end statement run: one background job per active chama
+renders every member's PDF statement into the artifact store. Job workers
+start last month's run on their own early each month; run this by hand to
+regenerate a month or to render in this process instead.
+
+Usage:
+    python generate_statements.py                     # queue last month
+    python generate_statements.py --period 2026-09
+    python generate_statements.py --chama 12 --now    # render one chama here
+"""
+
+import argparse
+import sys
+from app import create_app, db
+from app.utils.documents import queue_monthly_statements, render_chama_statements, period_bounds, previous_period
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate monthly member statements')
+    parser.add_argument('--period', help='Month to generate (YYYY-MM, default: last month)')
+    parser.add_argument('--chama', type=int, help='Only this chama')
+    parser.add_argument('--now', action='store_true', help='Render in this process instead of queueing jobs')
+    args = parser.parse_args()
+
+    period = args.period or previous_period()
+    try:
+        period_bounds(period)
+    except ValueError:
+        print(f"❌ Invalid period: {period}")
+        return False
+
+    app = create_app()
+
+    with app.app_context():
+        print("🧾 MEMBER STATEMENTS")
+        print("=" * 50)
+
+        try:
+            if args.now:
+                from app.models.chama import Chama
+                chama_ids = [args.chama] if args.chama else [
+                    chama_id for (chama_id,) in db.session.query(Chama.id).filter(Chama.status == 'active')]
+                rendered = 0
+                for chama_id in chama_ids:
+                    rendered += render_chama_statements(chama_id, period)
+                    db.session.commit()
+                print(f"✅ Rendered {rendered} statements for {period} across {len(chama_ids)} chamas")
+            else:
+                if args.chama:
+                    from app.utils.jobs import enqueue_job
+                    enqueue_job('render_statements', {'chama_id': args.chama, 'period': period})
+                    queued = 1
+                else:
+                    queued = queue_monthly_statements(period)
+                db.session.commit()
+                print(f"✅ Queued {period} statements for {queued} chamas")
+        except Exception as e:
+            db.session.rollback()
+            print(f"❌ Statement run failed: {e}")
+            import traceback
+            traceback.print_exc()
+            return False
+
+        return True
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+M-Pesa Callback Load Test
+Replays thousands of synthetic STK push callbacks (including Safaricom-style
+retries) against a throwaway database, drains the callback inbox in
+batches and checks that every payment was credited exactly once, and that
+a callback arriving before its CheckoutRequestID is recorded still settles
+the payment.
+
+Usage:
+    python load_test_mpesa_callbacks.py                      # 5000 callbacks, 20% retries
+    python load_test_mpesa_callbacks.py --callbacks 20000 --threads 8
+    python load_test_mpesa_callbacks.py --duplicates 0.5 --failures 0.2
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+def build_callback(checkout_request_id, amount, success):
+    """Callback body in the shape Daraja posts it"""
+    callback = {
+        'MerchantRequestID': f'LT-{checkout_request_id}',
+        'CheckoutRequestID': checkout_request_id,
+        'ResultCode': 0 if success else 1032,
+        'ResultDesc': 'The service request is processed successfully.' if success else 'Request cancelled by user'
+    }
+    if success:
+        callback['CallbackMetadata'] = {'Item': [
+            {'Name': 'Amount', 'Value': amount},
+            {'Name': 'MpesaReceiptNumber', 'Value': f'R{checkout_request_id[-9:]}'},
+            {'Name': 'TransactionDate', 'Value': int(time.strftime('%Y%m%d%H%M%S'))},
+            {'Name': 'PhoneNumber', 'Value': 254712345678}
+        ]}
+    return {'Body': {'stkCallback': callback}}
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test M-Pesa callback ingestion')
+    parser.add_argument('--callbacks', type=int, default=5000, help='Distinct payments to settle')
+    parser.add_argument('--duplicates', type=float, default=0.2, help='Share of callbacks that Safaricom sends twice')
+    parser.add_argument('--failures', type=float, default=0.1, help='Share of payments that fail or are cancelled')
+    parser.add_argument('--threads', type=int, default=4, help='Concurrent senders')
+    parser.add_argument('--chamas', type=int, default=10, help='Chamas the payments are spread over')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed')
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    workdir = tempfile.mkdtemp(prefix='chamalink-loadtest-')
+    os.environ['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(workdir, 'loadtest.db')}"
+    os.environ['JOB_WORKER_CONCURRENCY'] = '0'  # drain the inbox ourselves so the phases can be timed
+
+    from app import create_app, db
+    from app.models import User, Chama, Transaction, MpesaTransaction, MpesaCallback
+    from app.utils.jobs import run_pending_jobs
+    from app.utils.ledger import verify_balances, post_entry
+    from app.utils import mpesa_callbacks
+    from app.utils.mpesa_callbacks import settle_payment, sweep_callbacks
+
+    app = create_app()
+
+    with app.app_context():
+        print("📲 M-PESA CALLBACK LOAD TEST")
+        print("=" * 50)
+        print(f"Database: {app.config['SQLALCHEMY_DATABASE_URI']}")
+
+        db.create_all()
+
+        # Seed members, chamas and pending payments
+        user = User(username='loadtest', email='loadtest@example.com', password_hash='x', phone_number='0712345678')
+        db.session.add(user)
+        db.session.flush()
+        chamas = []
+        for index in range(args.chamas):
+            chama = Chama(name=f'Load Test Chama {index + 1}', creator_id=user.id, total_balance=0.0)
+            db.session.add(chama)
+            chamas.append(chama)
+        db.session.flush()
+
+        payments = []
+        for index in range(args.callbacks):
+            chama = chamas[index % len(chamas)]
+            amount = float(random.randint(1, 50) * 100)
+            payments.append({
+                'checkout_request_id': f'ws_CO_LT{index:09d}',
+                'amount': amount,
+                'chama_id': chama.id,
+                'success': random.random() >= args.failures
+            })
+        db.session.bulk_insert_mappings(Transaction, [
+            {'type': 'contribution', 'amount': p['amount'], 'status': 'pending', 'user_id': user.id,
+             'chama_id': p['chama_id'], 'description': 'Load test contribution'}
+            for p in payments
+        ])
+        db.session.flush()
+        transaction_ids = [row[0] for row in db.session.query(Transaction.id).order_by(Transaction.id).all()]
+        db.session.bulk_insert_mappings(MpesaTransaction, [
+            {'checkout_request_id': p['checkout_request_id'], 'amount': p['amount'], 'phone_number': '254712345678',
+             'status': 'pending', 'user_id': user.id, 'chama_id': p['chama_id'], 'transaction_id': transaction_id}
+            for p, transaction_id in zip(payments, transaction_ids)
+        ])
+        db.session.commit()
+        print(f"✅ Seeded {len(payments)} pending payments across {len(chamas)} chamas")
+
+        # Build the replay: every payment once, some twice, in random order
+        replay = [build_callback(p['checkout_request_id'], p['amount'], p['success']) for p in payments]
+        replay += [replay[i] for i in random.sample(range(len(replay)), int(len(replay) * args.duplicates))]
+        random.shuffle(replay)
+
+    # Phase 1: ingestion through the real endpoint
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+
+    def sender(chunk):
+        client = app.test_client()
+        local = []
+        for body in chunk:
+            started = time.perf_counter()
+            response = client.post('/mpesa/callback', json=body)
+            local.append((time.perf_counter() - started) * 1000)
+            if response.status_code != 200:
+                errors.append(response.status_code)
+        with lock:
+            latencies.extend(local)
+
+    chunks = [replay[i::args.threads] for i in range(args.threads)]
+    threads = [threading.Thread(target=sender, args=(chunk,)) for chunk in chunks]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    ingest_seconds = time.perf_counter() - started
+
+    latencies.sort()
+    print(f"\n📥 Ingested {len(replay)} callbacks in {ingest_seconds:.2f}s "
+          f"({len(replay) / ingest_seconds:.0f}/s, {args.threads} threads)")
+    print(f"   latency p50={statistics.median(latencies):.1f}ms "
+          f"p95={latencies[int(len(latencies) * 0.95) - 1]:.1f}ms max={latencies[-1]:.1f}ms")
+    if errors:
+        print(f"   ❌ {len(errors)} non-200 responses")
+
+    with app.app_context():
+        # Status polls that read these payments as pending just before the batch settled them
+        polled = [payment.id for payment in MpesaTransaction.query.filter_by(status='pending').limit(50)]
+        db.session.commit()
+
+        # Phase 2: apply the inbox in batches
+        started = time.perf_counter()
+        batches = 0
+        while True:
+            completed = run_pending_jobs()
+            if not completed:
+                break
+            batches += completed
+        apply_seconds = time.perf_counter() - started
+        print(f"\n⚙️  Applied inbox in {apply_seconds:.2f}s over {batches} batch jobs "
+              f"({len(payments) / apply_seconds:.0f} payments/s)")
+
+        # The polls now try to settle what they saw as pending
+        poll_wins = 0
+        for payment in MpesaTransaction.query.filter(MpesaTransaction.id.in_(polled)):
+            if settle_payment(payment, 'completed', result_code='0'):
+                poll_wins += 1
+                post_entry(chama_id=payment.chama_id, entry_type='contribution', amount=payment.amount,
+                           user_id=payment.user_id, transaction_id=payment.transaction_id,
+                           description='Status poll')
+        db.session.commit()
+
+        # Phase 3: verification
+        expected_success = [p for p in payments if p['success']]
+        expected_total = sum(p['amount'] for p in expected_success)
+        inbox_rows = MpesaCallback.query.count()
+        unapplied = MpesaCallback.query.filter(MpesaCallback.status != 'applied').count()
+        completed_payments = MpesaTransaction.query.filter_by(status='completed').count()
+        failed_payments = MpesaTransaction.query.filter_by(status='failed').count()
+        credited = db.session.query(db.func.coalesce(db.func.sum(Chama.total_balance), 0)).scalar()
+        discrepancies = verify_balances()
+
+        # A callback that beats the push job's commit waits unmatched until the payment is recorded
+        client = app.test_client()
+        user_id = db.session.query(User.id).filter_by(username='loadtest').scalar()
+        chama_id = payments[0]['chama_id']
+        early = Transaction(type='contribution', amount=700.0, status='pending', user_id=user_id,
+                            chama_id=chama_id, description='Early callback')
+        db.session.add(early)
+        db.session.flush()
+        early_payment = MpesaTransaction(amount=700.0, phone_number='254712345678', status='queued',
+                                         user_id=user_id, chama_id=chama_id, transaction_id=early.id)
+        db.session.add(early_payment)
+        db.session.commit()
+        client.post('/mpesa/callback', json=build_callback('ws_CO_EARLY', 700.0, True))
+        while run_pending_jobs():
+            pass
+        waited = MpesaCallback.query.filter_by(checkout_request_id='ws_CO_EARLY').one().status
+        early_payment.checkout_request_id = 'ws_CO_EARLY'
+        early_payment.status = 'pending'
+        db.session.commit()
+        sweep_callbacks()
+        db.session.commit()
+        while run_pending_jobs():
+            pass
+        db.session.refresh(early_payment)
+        early_settled = (waited == 'unmatched' and early_payment.status == 'completed' and
+                         MpesaCallback.query.filter_by(checkout_request_id='ws_CO_EARLY').one().status == 'applied'
+                         and not verify_balances())
+
+        # One that no payment ever claims is orphaned once the match window has passed
+        client.post('/mpesa/callback', json=build_callback('ws_CO_NOBODY', 300.0, True))
+        while run_pending_jobs():
+            pass
+        nobody = MpesaCallback.query.filter_by(checkout_request_id='ws_CO_NOBODY').one()
+        retried = nobody.status == 'unmatched'
+        nobody.received_at = datetime.utcnow() - timedelta(seconds=mpesa_callbacks.CALLBACK_MATCH_WINDOW + 1)
+        db.session.commit()
+        sweep_callbacks()
+        db.session.commit()
+        while run_pending_jobs():
+            pass
+        db.session.refresh(nobody)
+        orphaned = retried and nobody.status == 'orphaned'
+        checks = [
+            ('No ingestion errors', not errors),
+            ('One inbox row per payment', inbox_rows == len(payments)),
+            ('Every callback applied', unapplied == 0),
+            ('Successful payments completed', completed_payments == len(expected_success)),
+            ('Failed payments marked failed', failed_payments == len(payments) - len(expected_success)),
+            ('Polls racing the batch settle nothing', poll_wins == 0 and len(polled) > 0),
+            ('Chamas credited exactly once', abs(float(credited) - expected_total) < 0.01),
+            ('Ledger matches balances', not discrepancies),
+            ('Callback ahead of its CheckoutRequestID settles once recorded', early_settled),
+            ('Unclaimed callback orphaned after the match window', orphaned),
+        ]
+
+        print("\n🔍 Verification")
+        for label, passed in checks:
+            print(f"   {'✅' if passed else '❌'} {label}")
+        print(f"   expected KES {expected_total:,.0f}, credited KES {float(credited):,.0f}")
+
+        success = all(passed for _, passed in checks)
+        print("\n🎉 Load test passed" if success else "\n❌ Load test failed")
+        return success
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Ledger Rebuild & Verification Script
+Seeds the ledger for chamas that predate it, checks the materialized chama and
+member balances against the ledger, and optionally rebuilds them.
+
+Usage:
+    python rebuild_ledger.py                 # verify only
+    python rebuild_ledger.py --backfill      # seed opening balances, then verify
+    python rebuild_ledger.py --rebuild       # recompute snapshots from the ledger
+    python rebuild_ledger.py --chama-id 12   # limit verify/rebuild to one chama
+"""
+
+import argparse
+import sys
+from app import create_app, db
+from app.utils.ledger import backfill_opening_balances, verify_balances, rebuild_balances
+
+def main():
+    parser = argparse.ArgumentParser(description='Verify or rebuild CHAMAlink ledger balances')
+    parser.add_argument('--backfill', action='store_true', help='Create opening entries for chamas without ledger history')
+    parser.add_argument('--rebuild', action='store_true', help='Recompute balance snapshots from the ledger')
+    parser.add_argument('--chama-id', type=int, help='Only verify/rebuild this chama')
+    args = parser.parse_args()
+
+    app = create_app()
+
+    with app.app_context():
+        print("📒 CHAMA LEDGER CHECK")
+        print("=" * 50)
+
+        try:
+            if args.backfill:
+                seeded = backfill_opening_balances()
+                db.session.commit()
+                print(f"✅ Seeded opening balances for {seeded} chamas")
+
+            if args.rebuild:
+                chamas, members = rebuild_balances(args.chama_id)
+                db.session.commit()
+                print(f"✅ Rebuilt {chamas} chama balances and {members} member balances")
+
+            discrepancies = verify_balances(args.chama_id)
+        except Exception as e:
+            db.session.rollback()
+            print(f"❌ Ledger check failed: {e}")
+            import traceback
+            traceback.print_exc()
+            return False
+
+        if not discrepancies:
+            print("🎉 All balance snapshots match the ledger")
+            return True
+
+        print(f"⚠️  Found {len(discrepancies)} balance discrepancies:")
+        for item in discrepancies:
+            scope = f"member {item['user_id']}" if item['user_id'] else "chama"
+            print(f"   - chama {item['chama_id']} {scope}: snapshot={item['snapshot']} ledger={item['ledger']:.2f}")
+        print("💡 Run with --rebuild to recompute the snapshots from the ledger")
+        return False
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
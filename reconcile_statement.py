@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Statement Reconciliation
+Reconciles an M-Pesa paybill or bank statement export (CSV) against the
+payment records in this process, without the upload size limit or a job
+worker. Use it for a year of statements at once; the dashboard shows the run
+like any uploaded one.
+
+Usage:
+    python reconcile_statement.py statements/paybill_2025.csv
+    python reconcile_statement.py statements/paybill_2025.csv --chunk-size 20000
+"""
+
+import argparse
+import os
+import sys
+from app import create_app, db
+from app.models import ReconciliationRun
+from app.utils.reconciliation import reconcile_file, RECON_CHUNK_SIZE
+
+def main():
+    parser = argparse.ArgumentParser(description='Reconcile a statement against the payment records')
+    parser.add_argument('path', help='Statement CSV file')
+    parser.add_argument('--chunk-size', type=int, default=RECON_CHUNK_SIZE,
+                        help=f'Statement lines matched per round of queries (default: {RECON_CHUNK_SIZE})')
+    args = parser.parse_args()
+
+    app = create_app()
+
+    with app.app_context():
+        print("🧾 STATEMENT RECONCILIATION")
+        print("=" * 50)
+
+        run = ReconciliationRun(filename=os.path.basename(args.path), status='queued')
+        db.session.add(run)
+        db.session.commit()
+        try:
+            reconcile_file(run, args.path, chunk_size=args.chunk_size)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            run.status = 'failed'
+            run.error = str(e)
+            db.session.commit()
+            print(f"❌ Reconciliation failed: {e}")
+            import traceback
+            traceback.print_exc()
+            return False
+
+        print(f"✅ Run {run.id}: {run.rows_read:,} lines read, {run.credits:,} credits reconciled")
+        print(f"   Matched by receipt:        {run.matched:,}")
+        print(f"   Matched by amount/time:    {run.fuzzy_matched:,}")
+        print(f"   Unmatched lines:           {run.unmatched_lines:,}")
+        print(f"   Unmatched records:         {run.unmatched_records:,}")
+        print(f"   Duplicate lines / records: {run.duplicate_lines:,} / {run.duplicate_records:,}")
+        print(f"   Amount mismatches:         {run.amount_mismatches:,}")
+        print(f"⚡ {run.rows_per_second or 0:,.0f} rows/s, indexes {(run.index_bytes or 0) / 1024:,.0f} KB")
+        return True
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Analytics Rollup
+Brings the daily_metrics rollup table up to date: backfills history on the
+first run and afterwards re-rolls the most recent days. Job workers do this
+every 15 minutes; run it by hand after a data import or to rebuild a range.
+
+Usage:
+    python rollup_analytics.py                                    # incremental
+    python rollup_analytics.py --start 2025-01-01 --end 2025-12-31  # rebuild a range
+"""
+
+import argparse
+import sys
+from datetime import date, datetime, timedelta
+from app import create_app, db
+from app.utils.analytics_rollup import refresh_rollups, rollup_days, ROLLUP_CHUNK_DAYS
+
+def main():
+    parser = argparse.ArgumentParser(description='Roll up daily platform metrics')
+    parser.add_argument('--start', type=date.fromisoformat, help='First day to rebuild (YYYY-MM-DD)')
+    parser.add_argument('--end', type=date.fromisoformat, help='Last day to rebuild (default: today)')
+    args = parser.parse_args()
+
+    app = create_app()
+
+    with app.app_context():
+        print("📈 ANALYTICS ROLLUP")
+        print("=" * 50)
+
+        try:
+            if args.start:
+                end = args.end or datetime.utcnow().date()
+                first, written = args.start, 0
+                while first <= end:
+                    last = min(first + timedelta(days=ROLLUP_CHUNK_DAYS - 1), end)
+                    written += rollup_days(first, last)
+                    db.session.commit()
+                    first = last + timedelta(days=1)
+                start, end = args.start, end
+            else:
+                start, end, written = refresh_rollups(commit_chunks=True)
+                db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"❌ Rollup failed: {e}")
+            import traceback
+            traceback.print_exc()
+            return False
+
+        print(f"✅ Rolled up {start} to {end}: {written} metric rows")
+        return True
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Background Job Worker
+Runs outbox jobs (asynchronous STK pushes and friends) outside the web
+processes. Use it with JOB_QUEUE_BACKEND=redis so web requests hand their
+jobs over through Redis; with the local backend it simply polls the table.
+
+Usage:
+    python run_worker.py                   # serve jobs until interrupted
+    python run_worker.py --concurrency 8   # more worker threads
+    python run_worker.py --once            # run whatever is due, then exit
+"""
+
+import argparse
+import sys
+import time
+from app import create_app
+from app.utils.jobs import JobWorkerPool, get_queue_backend, run_pending_jobs
+
+def main():
+    parser = argparse.ArgumentParser(description='Run CHAMAlink background jobs')
+    parser.add_argument('--concurrency', type=int, default=None, help='Worker threads (default: JOB_WORKER_CONCURRENCY)')
+    parser.add_argument('--once', action='store_true', help='Run due jobs once and exit')
+    args = parser.parse_args()
+
+    app = create_app()
+
+    if args.once:
+        with app.app_context():
+            completed = run_pending_jobs()
+        print(f"✅ Completed {completed} jobs")
+        return True
+
+    concurrency = args.concurrency or app.config.get('JOB_WORKER_CONCURRENCY', 4)
+    pool = JobWorkerPool(app, get_queue_backend(app), concurrency)
+    pool.start()
+    print(f"👷 Job worker running with {concurrency} threads ({app.config.get('JOB_QUEUE_BACKEND')} backend)")
+
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        print("🛑 Stopping workers...")
+        pool.stop()
+    return True
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Meeting Reminders
+Queues an SMS reminder to every member of each chama with a meeting coming
+up. Messages go through the SMS outbox, so the job workers send them in
+bulk batches within the provider's rate limit; running the script twice
+for the same meetings does not queue the reminders again.
+
+Usage:
+    python send_meeting_reminders.py              # meetings tomorrow
+    python send_meeting_reminders.py --days 3     # meetings in three days
+    python send_meeting_reminders.py --dry-run    # count recipients only
+"""
+
+import argparse
+import sys
+from datetime import date, timedelta
+from app import create_app, db
+
+def reminder_text(event):
+    when = event.event_date.strftime('%A, %B %d, %Y')
+    if event.event_time:
+        when += f" at {event.event_time.strftime('%I:%M %p')}"
+    lines = [f"Dear Members,", f"Reminder: {event.chama.name} meeting '{event.title}' on {when}."]
+    if event.location:
+        lines.append(f"Venue: {event.location}")
+    lines.append("Please attend on time.")
+    lines.append(f"- {event.chama.name} Management")
+    return "\n".join(lines)
+
+def main():
+    parser = argparse.ArgumentParser(description='Queue SMS reminders for upcoming chama meetings')
+    parser.add_argument('--days', type=int, default=1, help='Remind about meetings this many days ahead')
+    parser.add_argument('--dry-run', action='store_true', help='Count recipients without queueing anything')
+    args = parser.parse_args()
+
+    app = create_app()
+
+    with app.app_context():
+        from app.models import Event, User, SmsMessage, chama_members
+        from app.utils.sms_outbox import queue_sms_to_users, message_hash
+
+        print("📅 MEETING REMINDERS")
+        print("=" * 50)
+
+        day = date.today() + timedelta(days=args.days)
+        events = Event.query.filter(Event.event_date == day, Event.type == 'meeting',
+                                    Event.status == 'scheduled').all()
+        print(f"🔍 {len(events)} meetings on {day.isoformat()}")
+
+        total = 0
+        try:
+            for event in events:
+                message = reminder_text(event)
+                already = db.session.query(SmsMessage.id).filter_by(
+                    chama_id=event.chama_id, category='meeting_reminder', message_hash=message_hash(message)
+                ).first()
+                if already is not None:
+                    print(f"   ⏭️  {event.chama.name}: already queued")
+                    continue
+
+                members = User.query.join(chama_members, chama_members.c.user_id == User.id).filter(
+                    chama_members.c.chama_id == event.chama_id
+                ).all()
+                if args.dry_run:
+                    queued = sum(1 for member in members if member.phone_number)
+                else:
+                    queued = queue_sms_to_users(members, message, category='meeting_reminder',
+                                                chama_id=event.chama_id)
+                total += queued
+                print(f"   📨 {event.chama.name}: {queued} reminders")
+
+            if not args.dry_run:
+                db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"❌ Queueing reminders failed: {e}")
+            return False
+
+        print(f"\n✅ {total} reminders {'would be queued' if args.dry_run else 'queued'}")
+        return True
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)